@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Totals by month/type/status/tax rate/customer: index tables vs extract-documents dicts.
+
+Usage: python benchmarks/bench_aggregates.py [invoices]
+
+Builds a document index for `invoices` (default 1000000) synthetic invoices of
+two lines each over twelve months (no XML: the index is built from records, as
+iter_records(lines=True) yields them) and aggregates them:
+  dicts  - the current approach on the extract-documents JSON: one dict per
+           invoice, Decimal sums per dimension in a loop (no tax rates: the
+           JSON has no lines)
+  index  - aggregates.aggregate on the loaded index (sums of the precomputed
+           per-month tables)
+and reports the extra build time the tables cost, the sidecar size and the
+memory of the dicts.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import SERIES  # noqa: E402
+from core import aggregates, doc_index  # noqa: E402
+
+
+def records(n, lines=True):
+    for i in range(n):
+        series = SERIES[i % len(SERIES)]
+        rec = {'InvoiceNo': f'{series}/{i // len(SERIES) + 1}',
+               'InvoiceDate': f'2025-{1 + i * 12 // n:02d}-{1 + i % 28:02d}', 'InvoiceType': series[:2],
+               'DocumentStatus': 'A' if i % 97 == 0 else 'N', 'CustomerID': f'C{i % 5000}',
+               'NetTotal': '25.00', 'TaxPayable': '4.90', 'GrossTotal': '29.90'}
+        if lines:
+            rec['Lines'] = [('23', '20.00', ''), ('6', '5.00', '')]
+        yield 'invoice', rec
+
+
+def with_dicts(documents):
+    groups = {'month': {}, 'type': {}, 'status': {}, 'customer': {}}
+    for doc in documents:
+        keys = {'month': doc['InvoiceDate'][:7], 'type': doc['InvoiceType'], 'status': doc['DocumentStatus'],
+                'customer': doc['CustomerID']}
+        for dim, key in keys.items():
+            cell = groups[dim].setdefault(key, [0, Decimal(0), Decimal(0), Decimal(0)])
+            cell[0] += 1
+            cell[1] += Decimal(doc['NetTotal'])
+            cell[2] += Decimal(doc['TaxPayable'])
+            cell[3] += Decimal(doc['GrossTotal'])
+    top = sorted(groups['customer'].items(), key=lambda kv: -kv[1][3])[:10]
+    return groups, top
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_aggregates_'), 'x.docs')
+    t = time.perf_counter()
+    doc_index.DocumentIndex.build(records(n, lines=False), 'fp')
+    plain = time.perf_counter() - t
+    t = time.perf_counter()
+    doc_index.DocumentIndex.build(records(n), 'fp').write(path)
+    built = time.perf_counter() - t
+    index = doc_index.DocumentIndex.load(path)
+    print(f'{n} invoices, 2 lines each; index build {plain:.1f} s without lines, {built:.1f} s with lines and '
+          f'tables; sidecar {os.path.getsize(path) / 1e6:.1f} MB '
+          f'(tables {sum(len(a) for a in index.tables.values()) * 8 / 1e3:.0f} kB)')
+
+    tracemalloc.start()
+    documents = [index.record(r) for r in range(index.count)]  # the extract-documents JSON
+    dicts_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    print(f"{'mode':<8}{'time s':>9}{'memory MB':>11}{'gross':>16}")
+    t = time.perf_counter()
+    groups, _ = with_dicts(documents)
+    gross = sum(cell[3] for key, cell in groups['status'].items() if key != 'A')
+    print(f"{'dicts':<8}{time.perf_counter() - t:>9.3f}{dicts_mb:>11.0f}{gross:>16}")
+    del documents, groups
+    t = time.perf_counter()
+    report = aggregates.aggregate(index)
+    print(f"{'index':<8}{time.perf_counter() - t:>9.3f}{'-':>11}{report['totals']['gross']:>16}")
+    t = time.perf_counter()
+    aggregates.aggregate(index, '2025-03', '2025-05')
+    print(f"{'index Q2':<8}{time.perf_counter() - t:>9.3f}")
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Apply a batch of fixes to an upload: per-fix full-text regexes vs saft_fixes.
+
+Usage: python benchmarks/bench_apply_fixes.py [size_mb] [fixes] [legacy_sample]
+
+Generates a synthetic SAF-T file of roughly `size_mb` MB (default 500) with
+`fixes` (default 5000) problems, half INVALID_COUNTRY customers and half empty
+TaxExemptionReason lines, and fixes them all:
+  legacy  - the old loop (read as str, one subn / splitlines+join per fix,
+            write back); only `legacy_sample` (default 10) fixes are timed and the
+            per-fix cost is extrapolated, the full batch would take hours
+  engine  - locator build + saft_fixes.apply_fixes (one streaming rewrite)
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import CUSTOMER, FOOTER, HEADER, SALES_START, invoice_xml  # noqa: E402
+from core import saft_fixes, xml_locator  # noqa: E402
+
+CUSTOMERS = 5000
+EMPTY_EXEMPTION = '<TaxExemptionReason /><TaxExemptionCode /><SettlementAmount>'
+
+
+def write_file(path, size_mb, n_fixes):
+    """Fixture with n_fixes // 2 bad countries and the rest empty exemptions; returns the fixes."""
+    bad_customers = n_fixes // 2
+    exempt = n_fixes - bad_customers
+    target = size_mb * 1024 * 1024
+    fixes = [{'code': 'INVALID_COUNTRY', 'customer_id': f'C{c}', 'value': 'CVE', 'suggestion': 'CV'}
+             for c in range(0, CUSTOMERS, max(CUSTOMERS // bad_customers, 1))][:bad_customers]
+    bad = {f['customer_id'] for f in fixes}
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        line = HEADER.count('\n') + 1
+        for c in range(CUSTOMERS):
+            xml = CUSTOMER.format(c=c)
+            f.write(xml.replace('<Country>PT</Country>', '<Country>CVE</Country>') if f'C{c}' in bad else xml)
+            line += 1
+        f.write(SALES_START)
+        line += SALES_START.count('\n')
+        approx = len(invoice_xml(0).encode())
+        every = max(int(target / approx) // max(exempt, 1), 1)
+        n = 0
+        while f.tell() < target or exempt:
+            xml = invoice_xml(n, CUSTOMERS)
+            if exempt and n % every == 0:
+                xml = xml.replace('<SettlementAmount>', EMPTY_EXEMPTION, 1)
+                fixes.append({'code': 'EMPTY_TAX_EXEMPTION', 'location': {'line': line},
+                              'selected_suggestion': {'reason': 'Isento Artigo 14.º do RITI', 'code': 'M16'}})
+                exempt -= 1
+            f.write(xml)
+            line += 1
+            n += 1
+        f.write(FOOTER)
+    return fixes
+
+
+def legacy(path, fixes):
+    """upload_apply_fixes_and_validate before the fix engine."""
+    txt = Path(path).read_text(encoding='utf-8', errors='replace')
+    applied = 0
+    for fx in fixes:
+        if fx['code'] == 'INVALID_COUNTRY':
+            cid, bad, new = fx['customer_id'], fx['value'], fx['suggestion']
+            pattern = re.compile(
+                rf"(<Customer>(?:(?!</Customer>).)*?<CustomerID>\s*{re.escape(cid)}\s*</CustomerID>(?:(?!</Customer>).)*?<Country>)\s*{re.escape(bad)}\s*(</Country>(?:(?!</Customer>).)*?</Customer>)",
+                re.IGNORECASE | re.DOTALL)
+            txt, n = pattern.subn(lambda m: m.group(1) + new + m.group(2), txt, count=1)
+        else:
+            lines = txt.splitlines(keepends=True)
+            i = fx['location']['line'] - 1
+            lines[i] = re.sub(r'<TaxExemptionReason\s*/>', '<TaxExemptionReason>Isento</TaxExemptionReason>', lines[i])
+            lines[i] = re.sub(r'<TaxExemptionCode\s*/>', '<TaxExemptionCode>M16</TaxExemptionCode>', lines[i])
+            txt, n = ''.join(lines), 1
+        applied += n
+    Path(path).write_text(txt, encoding='utf-8')
+    return applied
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    sample = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    workdir = tempfile.mkdtemp(prefix='bench_fixes_')
+    path = os.path.join(workdir, 'saft.xml')
+    fixes = write_file(path, size_mb, n)
+    copy = os.path.join(workdir, 'legacy.xml')
+    shutil.copyfile(path, copy)
+    print(f'{os.path.getsize(path) / 1e6:.0f} MB, {len(fixes)} fixes')
+
+    half = sample // 2
+    t = time.perf_counter()
+    legacy(copy, fixes[:half] + fixes[-(sample - half):])
+    legacy_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    locator = xml_locator.XmlLocator.build(path)
+    built = time.perf_counter()
+    applied, outcomes = saft_fixes.apply_fixes(path, locator, fixes)
+    done = time.perf_counter()
+    assert applied == len(fixes), [o for o in outcomes if o['status'] != 'applied'][:3]
+
+    print(f"{'mode':<8}{'fixes':>7}{'time s':>10}{'per fix ms':>12}")
+    print(f"{'legacy':<8}{sample:>7}{legacy_s:>10.2f}{legacy_s / sample * 1000:>12.1f}"
+          f"   (~{legacy_s / sample * len(fixes) / 60:.0f} min for all {len(fixes)})")
+    print(f"{'engine':<8}{len(fixes):>7}{done - t:>10.2f}{(done - t) / len(fixes) * 1000:>12.3f}"
+          f"   (index build {built - t:.2f} s, plan + rewrite {done - built:.2f} s)")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Streaming CSV/XLSX export vs materializing the extract-documents list first.
+
+Usage: python benchmarks/bench_document_export.py [invoices]
+
+Writes a synthetic SAF-T file with `invoices` invoices (default 500000) and, in
+a fresh subprocess per mode, exports it to a discarded byte sink, reporting the
+time to the first chunk, the total time, the bytes produced and the peak RSS:
+  list      extract_documents() to a list, then the CSV (the JSON-first path)
+  csv       doc_export.export_chunks(iter_documents(...), 'csv')
+  csv.gz    the same, gzip-compressed
+  xlsx      doc_export.export_chunks(iter_documents(...), 'xlsx')
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import write_saft  # noqa: E402
+
+RUNNER = r"""
+import resource, sys, time
+sys.path.insert(0, {root!r})
+from core import doc_export
+from core.saft_documents import extract_documents
+mode = {mode!r}
+t = time.perf_counter()
+if mode == 'list':
+    documents = extract_documents({path!r})
+    chunks = doc_export.export_chunks(documents, 'csv')
+else:
+    fmt, _, gz = mode.partition('.')
+    chunks = doc_export.export_chunks(doc_export.iter_documents({path!r}), fmt, gzip=bool(gz))
+first = None
+size = 0
+for chunk in chunks:
+    if first is None:
+        first = time.perf_counter() - t
+    size += len(chunk)
+dt = time.perf_counter() - t
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(f"{{first:.3f}} {{dt:.2f}} {{size}} {{rss:.1f}}")
+"""
+
+
+def main() -> None:
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    fd, path = tempfile.mkstemp(suffix='_bench.xml')
+    os.close(fd)
+    try:
+        write_saft(path, invoices=invoices)
+        print(f"file: {os.path.getsize(path) / 1024 / 1024:.0f} MB, {invoices} invoices")
+        print(f"{'mode':<8}{'first s':>9}{'total s':>9}{'output MB':>11}{'peak RSS MB':>13}")
+        for mode in ('list', 'csv', 'csv.gz', 'xlsx'):
+            out = subprocess.run([sys.executable, '-c', RUNNER.format(root=root, mode=mode, path=path)],
+                                 capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f"{mode:<8} failed ({out.stderr.strip().splitlines()[-1:]})")
+                continue
+            first, dt, size, rss = out.stdout.split()
+            print(f"{mode:<8}{float(first):>9.3f}{float(dt):>9.2f}{int(size) / 1e6:>11.1f}{float(rss):>13.1f}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
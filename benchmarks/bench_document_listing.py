@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Paginated document listing from the persisted document index.
+
+Usage: python benchmarks/bench_document_listing.py [invoices] [page_size]
+
+Generates a synthetic SAF-T file with `invoices` invoices (default 200000), builds
+its document index once, then reloads it from disk (as a fresh worker would)
+and times single page requests: page 50 via the cursor of page 49, in document
+order and sorted by total, plus a filtered first page with its match count.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import write_saft  # noqa: E402
+from core import doc_index  # noqa: E402
+
+
+def _page(index, cursor=None, sort='file', order='asc', limit=100, **filters):
+    key = doc_index.query_key(sort=sort, order=order, **filters)
+    start = doc_index.decode_cursor(index, key, cursor) if cursor else 0
+    match = index.matcher(**filters)
+    rows, nxt = index.page(sort, order == 'desc', start, limit, match)
+    docs = [index.record(r) for r in rows]
+    total = index.total(match) if not cursor else None
+    return docs, (doc_index.encode_cursor(index, key, nxt) if nxt is not None else None), total
+
+
+def _timed(fn, *args, **kwargs):
+    t = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - t) * 1000, result
+
+
+def main():
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    with tempfile.TemporaryDirectory() as d:
+        data = os.path.join(d, 'upload.bin')
+        write_saft(data, invoices=invoices)
+        print(f'file: {os.path.getsize(data) / 1024 / 1024:.0f} MB, {invoices} invoices, page size {limit}')
+        sidecar = os.path.join(d, 'upload.docs')
+        fp = doc_index.fingerprint(data)
+
+        ms, _ = _timed(lambda: asyncio.run(doc_index.get_index(sidecar, fp, lambda: doc_index.file_records(data))))
+        print(f'build index (one streaming pass): {ms / 1000:8.2f} s  sidecar {os.path.getsize(sidecar) / 1e6:.1f} MB')
+        doc_index._loaded.clear()
+        ms, (index, built) = _timed(lambda: asyncio.run(doc_index.get_index(sidecar, fp, None)))
+        print(f'load sidecar from disk:           {ms:8.1f} ms (built={built})')
+
+        for label, kwargs in (('file order', {}), ('sorted by total desc', {'sort': 'total', 'order': 'desc'})):
+            cursor = None
+            for _ in range(49):
+                _, cursor, _ = _page(index, cursor, limit=limit, **kwargs)
+            ms, (docs, _, _) = _timed(_page, index, cursor, limit=limit, **kwargs)
+            print(f'page 50, {label:<22} {ms:8.2f} ms  first {docs[0]["InvoiceNo"]}')
+
+        filters = {'types': ['FT'], 'statuses': ['N'], 'date_from': '2025-09-10', 'min_total': '20'}
+        ms, (docs, cursor, total) = _timed(_page, index, limit=limit, **filters)
+        print(f'filtered first page + total:      {ms:8.2f} ms  {total} matches')
+        ms, (docs, _, _) = _timed(_page, index, cursor, limit=limit, **filters)
+        print(f'filtered next page:               {ms:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
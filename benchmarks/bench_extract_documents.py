@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Compare the streaming document extractor against the old DOM + findall code.
+
+Usage: python benchmarks/bench_extract_documents.py [size_mb]
+
+Generates a synthetic SAF-T file of roughly `size_mb` MB (default 200) and runs
+each strategy in a fresh subprocess, reporting wall time and peak RSS.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import write_saft  # noqa: E402
+
+RUNNER = r"""
+import resource, sys, time
+sys.path.insert(0, {root!r})
+t = time.perf_counter()
+if {mode!r} == 'stream':
+    from core.saft_documents import extract_documents
+    documents = extract_documents({path!r})
+else:
+    # /pt/upload/extract-documents before the streaming extractor
+    import xml.etree.ElementTree as ET
+    root = ET.parse({path!r}).getroot()
+    ns = {{'saft': root.tag[1:root.tag.index('}}')]}}
+    def get_text(elem, path, default=''):
+        found = elem.find(path, ns)
+        if found is None:
+            found = elem.find(path.replace('saft:', ''))
+        return found.text if found is not None and found.text else default
+    documents = []
+    for inv in root.findall('.//saft:SourceDocuments/saft:SalesInvoices/saft:Invoice', ns):
+        documents.append({{
+            'InvoiceNo': get_text(inv, 'saft:InvoiceNo') or get_text(inv, 'InvoiceNo'),
+            'InvoiceDate': get_text(inv, 'saft:InvoiceDate') or get_text(inv, 'InvoiceDate'),
+            'InvoiceType': get_text(inv, 'saft:InvoiceType') or get_text(inv, 'InvoiceType'),
+            'DocumentStatus': get_text(inv, 'saft:DocumentStatus/saft:InvoiceStatus'),
+            'CustomerID': get_text(inv, 'saft:CustomerID') or get_text(inv, 'CustomerID'),
+            'CustomerName': '',
+            'NetTotal': get_text(inv, 'saft:DocumentTotals/saft:NetTotal') or '0',
+            'TaxPayable': get_text(inv, 'saft:DocumentTotals/saft:TaxPayable') or '0',
+            'GrossTotal': get_text(inv, 'saft:DocumentTotals/saft:GrossTotal') or '0',
+        }})
+    names = {{}}
+    for cust in root.findall('.//saft:MasterFiles/saft:Customer', ns):
+        names[get_text(cust, 'saft:CustomerID')] = get_text(cust, 'saft:CompanyName')
+    for doc in documents:
+        doc['CustomerName'] = names.get(doc['CustomerID'], '')
+dt = time.perf_counter() - t
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(f"{{dt:.4f}} {{rss:.1f}} {{len(documents)}} {{documents[-1]['CustomerName']}}")
+"""
+
+
+def main() -> None:
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    fd, path = tempfile.mkstemp(suffix='_bench.xml')
+    os.close(fd)
+    try:
+        invoices = write_saft(path, size_mb)
+        print(f"file: {os.path.getsize(path) / 1024 / 1024:.0f} MB, {invoices} invoices")
+        for mode in ('stream', 'dom'):
+            out = subprocess.run([sys.executable, '-c', RUNNER.format(root=root, mode=mode, path=path)],
+                                 capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f"{mode:>6}: failed ({out.stderr.strip().splitlines()[-1:]})")
+                continue
+            dt, rss, count, name = out.stdout.strip().split(' ', 3)
+            print(f"{mode:>6}: {float(dt):8.2f} s  peak RSS {float(rss):8.1f} MB  {count} documents, last customer {name!r}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
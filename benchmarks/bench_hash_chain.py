@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Hash-chain verification of a large upload (core.saft_hash.verify_chain).
+
+Usage: python benchmarks/bench_hash_chain.py [invoices] [workers]
+
+Writes a synthetic SAF-T file with `invoices` (default 1000000) invoices over
+three series, each correctly chained and signed with a throwaway RSA-1024 key
+(signing is the slow part of the setup: ~3 min per million), and verifies it:
+  structure - order and HashControl only (no public key)
+  inline    - signatures checked in the parsing process (workers=0)
+  pool      - signatures checked on a process pool of `workers` (default: CPUs)
+"""
+import base64
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import padding, rsa  # noqa: E402
+
+from benchmarks.saft_fixture import HEADER, SALES_START, FOOTER, SERIES  # noqa: E402
+from core import saft_hash  # noqa: E402
+
+INVOICE = ("<Invoice><InvoiceNo>{no}</InvoiceNo><ATCUD>0-{seq}</ATCUD><DocumentStatus><InvoiceStatus>N</InvoiceStatus>"
+           "</DocumentStatus><Hash>{hash}</Hash><HashControl>1</HashControl><InvoiceDate>{date}</InvoiceDate>"
+           "<InvoiceType>FT</InvoiceType><SystemEntryDate>{entry}</SystemEntryDate><CustomerID>C1</CustomerID>"
+           "<DocumentTotals><TaxPayable>2.30</TaxPayable><NetTotal>10.00</NetTotal><GrossTotal>{gross}</GrossTotal>"
+           "</DocumentTotals></Invoice>\n")
+
+
+def write_file(path, n):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+    pkcs1, sha1 = padding.PKCS1v15(), hashes.SHA1()
+    prev = dict.fromkeys(SERIES, '')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER + SALES_START)
+        for i in range(n):
+            series, seq = SERIES[i % len(SERIES)], i // len(SERIES) + 1
+            no = f'{series}/{seq}'
+            second = i // len(SERIES)
+            date = f'2025-09-{1 + second // 86400:02d}'
+            entry = f'{date}T{second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}'
+            gross = f'{12.30 + i % 100:.2f}'
+            h = base64.b64encode(key.sign(f'{date};{entry};{no};{gross};{prev[series]}'.encode(), pkcs1, sha1)).decode()
+            prev[series] = h
+            f.write(INVOICE.format(no=no, seq=seq, hash=h, date=date, entry=entry, gross=gross))
+        f.write(FOOTER)
+    return key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_hash_'), 'saft.xml')
+    t = time.perf_counter()
+    pem = write_file(path, n)
+    print(f'{n} invoices, {os.path.getsize(path) / 1e6:.0f} MB (generated and signed in {time.perf_counter() - t:.0f} s)')
+    print(f"{'mode':<10}{'workers':>8}{'time s':>9}{'docs/s':>10}{'verified':>10}")
+    for name, key, w in (('structure', None, 0), ('inline', pem, 0), ('pool', pem, workers)):
+        t = time.perf_counter()
+        report = saft_hash.verify_chain(path, key, workers=w)
+        elapsed = time.perf_counter() - t
+        verified = sum(s['verified'] for s in report['series'].values())
+        assert not report['counts'], report['counts']
+        print(f'{name:<10}{w:>8}{elapsed:>9.2f}{n / elapsed:>10.0f}{verified:>10}')
+    saft_hash.shutdown_pools()
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Compare streaming Header extraction against the full DOM parse.
+
+Usage: python benchmarks/bench_header_parse.py [size_mb]
+
+Generates a synthetic SAF-T file of roughly `size_mb` MB (default 500) and runs
+each strategy in a fresh subprocess, reporting wall time and peak RSS.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADER = b"""<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:OECD:StandardAuditFile-Tax:PT_1.04_01">
+<Header><AuditFileVersion>1.04_01</AuditFileVersion><CompanyName>ACME</CompanyName>
+<TaxRegistrationNumber>123456789</TaxRegistrationNumber><FiscalYear>2025</FiscalYear>
+<StartDate>2025-09-01</StartDate><EndDate>2025-09-30</EndDate></Header>
+<SourceDocuments><SalesInvoices>
+"""
+INVOICE = (
+    "<Invoice><InvoiceNo>FT A/{n}</InvoiceNo><InvoiceDate>2025-09-15</InvoiceDate>"
+    "<InvoiceType>FT</InvoiceType><CustomerID>C{c}</CustomerID>"
+    "<Line><LineNumber>1</LineNumber><ProductCode>P1</ProductCode><Quantity>1</Quantity>"
+    "<UnitPrice>10.00</UnitPrice><CreditAmount>10.00</CreditAmount>"
+    "<Tax><TaxType>IVA</TaxType><TaxCountryRegion>PT</TaxCountryRegion><TaxCode>NOR</TaxCode>"
+    "<TaxPercentage>23</TaxPercentage></Tax></Line>"
+    "<DocumentTotals><TaxPayable>2.30</TaxPayable><NetTotal>10.00</NetTotal>"
+    "<GrossTotal>12.30</GrossTotal></DocumentTotals></Invoice>\n"
+)
+FOOTER = b"</SalesInvoices></SourceDocuments></AuditFile>\n"
+
+RUNNER = r"""
+import resource, sys, time
+sys.path.insert(0, {root!r})
+from core.saft_validator import read_header_info, parse_xml, extract_cli_params
+t = time.perf_counter()
+if {mode!r} == 'stream':
+    params = read_header_info({path!r})[0]
+else:
+    with open({path!r}, 'rb') as f:
+        params = extract_cli_params(parse_xml(f.read()))
+dt = time.perf_counter() - t
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(f"{{dt:.4f}} {{rss:.1f}} {{params}}")
+"""
+
+
+def generate(path: str, size_mb: int) -> None:
+    target = size_mb * 1024 * 1024
+    with open(path, 'wb') as f:
+        f.write(HEADER)
+        n = 0
+        block = []
+        while f.tell() < target:
+            block = ''.join(INVOICE.format(n=n + i, c=(n + i) % 5000) for i in range(1000))
+            f.write(block.encode())
+            n += 1000
+        f.write(FOOTER)
+
+
+def main() -> None:
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    fd, path = tempfile.mkstemp(suffix='_bench.xml')
+    os.close(fd)
+    try:
+        generate(path, size_mb)
+        print(f"file: {os.path.getsize(path) / 1024 / 1024:.0f} MB")
+        for mode in ('stream', 'dom'):
+            out = subprocess.run([sys.executable, '-c', RUNNER.format(root=root, mode=mode, path=path)],
+                                 capture_output=True, text=True)
+            if out.returncode != 0:
+                print(f"{mode:>6}: failed ({out.stderr.strip().splitlines()[-1:]})")
+                continue
+            dt, rss, params = out.stdout.strip().split(' ', 2)
+            print(f"{mode:>6}: {float(dt) * 1000:10.1f} ms  peak RSS {float(rss):8.1f} MB  {params}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Locate JAR errors in a SAF-T file: full rereads vs the xml_locator index.
+
+Usage: python benchmarks/bench_issue_location.py [size_mb] [errors]
+
+Generates a synthetic SAF-T file of roughly `size_mb` MB (default 100) and
+resolves `errors` (default 40) JAR messages, half INVALID_COUNTRY for random
+customers and half "Linha: N; coluna: M" errors at random lines:
+  legacy  - the old per-error code: read and split the whole file each time
+  locator - one index build (as at upload finish), then mmap lookups
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import write_saft  # noqa: E402
+from core import xml_locator  # noqa: E402
+
+CUSTOMERS = 5000
+
+
+def legacy(path, errors):
+    """_find_line_info / the TaxExemptionReason snippet code before the locator."""
+    out = []
+    for kind, a, b in errors:
+        txt = Path(path).read_text(encoding='utf-8', errors='replace')
+        if kind == 'country':
+            m = re.compile(rf"<CustomerID>\s*{re.escape(a)}\s*</CustomerID>", re.IGNORECASE).search(txt)
+            start_idx = m.start() if m else 0
+            m2 = re.compile(rf"<Country>\s*{re.escape(b)}\s*</Country>", re.IGNORECASE).search(txt, pos=start_idx)
+            idx = m2.start() if m2 else (m.start() if m else 0)
+            pre = txt[:idx]
+            line = pre.count('\n') + 1
+            lines = txt.splitlines()
+            out.append((line, lines[line - 1][:400]))
+        else:
+            lines = txt.splitlines()
+            out.append((a, lines[a - 1] if 0 <= a - 1 < len(lines) else ''))
+    return out
+
+
+def indexed(path, errors):
+    locator = xml_locator.XmlLocator.build(path)
+    built = time.perf_counter()
+    out = []
+    with locator.reader(path) as r:
+        for kind, a, b in errors:
+            if kind == 'country':
+                line, col = r.line_col(r.find_country(a, b))
+                out.append((line, r.snippet(line, col)))
+            else:
+                out.append((a, r.snippet(a, b)))
+    return out, built
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_locate_'), 'saft.xml')
+    write_saft(path, size_mb, customers=CUSTOMERS)
+    with open(path, 'rb') as f:
+        total_lines = sum(1 for _ in f)
+    rnd = random.Random(7)
+    errors = [('country', f'C{rnd.randrange(CUSTOMERS)}', 'PT') if i % 2 == 0
+              else ('line', rnd.randrange(1, total_lines), 1) for i in range(n)]
+
+    print(f'{os.path.getsize(path) / 1e6:.0f} MB, {total_lines} lines, {n} errors')
+    t = time.perf_counter()
+    expected = legacy(path, errors)
+    legacy_s = time.perf_counter() - t
+    t = time.perf_counter()
+    got, built = indexed(path, errors)
+    done = time.perf_counter()
+    assert [line for line, _ in got] == [line for line, _ in expected]
+    print(f"{'mode':<10}{'total s':>9}{'per error ms':>14}")
+    print(f"{'legacy':<10}{legacy_s:>9.2f}{legacy_s / n * 1000:>14.1f}")
+    print(f"{'locator':<10}{done - t:>9.2f}{(done - built) / n * 1000:>14.3f}   (index build {built - t:.2f} s)")
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Parse a FACTEMICLI stdout with many <error> entries: old helpers vs core.jar_output.
+
+Usage: python benchmarks/bench_jar_output.py [errors]
+
+Writes a FACTEMICLI-shaped response (default 50000 errors, a mix of Country,
+TaxExemptionReason and other schema messages) and turns it into issues:
+  legacy - _extract_jar_errors + _detect_issues_from_stdout as they were: full
+           stdout buffered, regexes per error and several [DEBUG] prints per error
+           (sent to /dev/null)
+  stream - jar_output.IssueStream fed the output line by line, as on_line does
+Location lookups are left out of both (see bench_issue_location.py). Peak memory
+includes the 50k issue dicts both modes return.
+"""
+import contextlib
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import jar_output  # noqa: E402
+
+MESSAGES = (
+    'O valor ("CVE") no elemento "Country" do "Customer" com id C{i} nao e valido para o tipo',
+    "Linha: {i}; coluna: 33; cvc-minLength-valid: Value '' with length = '0' is not facet-valid with respect "
+    "to minLength '6' for type 'SAFPTPortugueseTaxExemptionReason'.",
+    "Linha: {i}; coluna: 41; cvc-pattern-valid: Value 'FT{i}' is not facet-valid with respect to pattern "
+    "'[^ ]+ [^/^ ]+/[0-9]+' for type 'InvoiceNo'.",
+)
+
+
+def write_output(path, n):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('A processar ficheiro...\n<?xml version="1.0" encoding="UTF-8"?>\n<response><code>-3</code>'
+                '<message>O ficheiro contem erros</message><errors>\n')
+        for i in range(n):
+            f.write(f'<error>{MESSAGES[i % 3].format(i=i + 1)}</error>\n')
+        f.write('</errors></response>\n')
+
+
+def legacy(stdout):
+    errs = []
+    m = re.search(r"<errors>(.*?)</errors>", stdout, re.DOTALL | re.IGNORECASE)
+    if m:
+        for em in re.finditer(r"<error>(.*?)</error>", m.group(1), re.DOTALL | re.IGNORECASE):
+            msg = em.group(1).strip()
+            errs.append(msg)
+            print(f"[DEBUG] _extract_jar_errors: Extracted error: {msg[:100]}...")
+    issues = []
+    for msg in errs:
+        print(f"[DEBUG] _detect_issues_from_stdout: Analyzing error: {msg[:100]}...")
+        m = re.search(r"O valor \(\"(?P<val>[^\"]+)\"\) no elemento \"Country\" do \"Customer\" com id (?P<cid>[A-Za-z0-9_\-]+)", msg)
+        if m:
+            print(f"[DEBUG] _detect_issues_from_stdout: MATCH! CustomerID={m.group('cid')}")
+            issues.append({'code': 'INVALID_COUNTRY', 'message': msg, 'customer_id': m.group('cid'), 'value': m.group('val')})
+            continue
+        m = re.search(r"Linha:\s*(?P<line>\d+);\s*coluna:\s*(?P<col>\d+);\s*cvc-minLength-valid.*?element.*?SAFPTPortugueseTaxExemptionReason", msg, re.IGNORECASE)
+        if not m:
+            m = re.search(r"Linha:\s*(?P<line>\d+);\s*coluna:\s*(?P<col>\d+).*?TaxExemptionReason", msg, re.IGNORECASE)
+        if m:
+            print(f"[DEBUG] _detect_issues_from_stdout: MATCH! TaxExemptionReason empty at line={m.group('line')}")
+            issues.append({'code': 'EMPTY_TAX_EXEMPTION', 'message': msg,
+                           'location': {'line': int(m.group('line')), 'column': int(m.group('col'))}})
+            continue
+        print("[DEBUG] _detect_issues_from_stdout: No pattern match, adding as JAR_ERROR")
+        print(f"[DEBUG] _detect_issues_from_stdout: Full error message: {msg}")
+        issues.append({'code': 'JAR_ERROR', 'message': msg})
+    return issues
+
+
+def run_legacy(path):
+    with open(path, 'rb') as f:
+        stdout = f.read()  # cold_run buffers the whole output first
+    return legacy(stdout.decode())
+
+
+def run_stream(path):
+    stream = jar_output.IssueStream()
+    issues = []
+    with open(path, 'rb') as f:
+        for line in f:
+            issues += stream.feed(line)
+    return issues + stream.close()
+
+
+def measure(fn, path):
+    """(issues, seconds, traced peak bytes); timed without tracemalloc, peak from a second run."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        t = time.perf_counter()
+        issues = fn(path)
+        elapsed = time.perf_counter() - t
+        tracemalloc.start()
+        fn(path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return issues, elapsed, peak
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_jar_out_'), 'stdout.txt')
+    write_output(path, n)
+    print(f'{n} errors, {os.path.getsize(path) / 1e6:.1f} MB of stdout')
+    print(f"{'mode':<8}{'time s':>9}{'peak MB':>9}{'issues':>8}")
+    results = {}
+    for name, fn in (('legacy', run_legacy), ('stream', run_stream)):
+        issues, elapsed, peak = measure(fn, path)
+        results[name] = [(i['code'], i['message']) for i in issues]
+        print(f'{name:<8}{elapsed:>9.3f}{peak / 1e6:>9.1f}{len(issues):>8}')
+    assert results['legacy'] == results['stream']
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
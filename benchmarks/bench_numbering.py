@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Numbering gaps/duplicates over a document index vs over extract-documents dicts.
+
+Usage: python benchmarks/bench_numbering.py [invoices]
+
+Builds a document index for `invoices` (default 500000) synthetic invoices over
+three series, with some numbers skipped, duplicated and reused by cancelled
+documents (no XML: the index is built from records, as iter_records yields
+them), and finds the problems:
+  dicts  - the obvious approach on the extract-documents JSON: parse every
+           InvoiceNo with a regex, group into per-series lists, sort, scan
+  index  - numbering.check_numbering on the loaded index (series/seq columns and
+           the persisted natural number order; no parsing, no sort)
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import SERIES  # noqa: E402
+from core import doc_index, numbering  # noqa: E402
+
+
+def records(n):
+    for i in range(n):
+        series, seq = SERIES[i % len(SERIES)], i // len(SERIES) + 1
+        status = 'N'
+        if i % 10007 == 0:
+            seq += 1  # skips one number, duplicates the next
+        elif i % 20011 == 0:
+            seq, status = seq - 1, 'A'  # a cancelled document reusing the previous number
+        yield 'invoice', {'InvoiceNo': f'{series}/{seq}', 'InvoiceDate': f'2025-09-{1 + i * 28 // n:02d}',
+                          'InvoiceType': series[:2], 'DocumentStatus': status, 'CustomerID': f'C{i % 5000}',
+                          'NetTotal': '25.00', 'TaxPayable': '4.90', 'GrossTotal': '29.90'}
+
+
+def with_dicts(documents):
+    pattern = re.compile(r'^(.*)/(\d+)$')
+    series = {}
+    for doc in documents:
+        m = pattern.match(doc['InvoiceNo'])
+        if m:
+            series.setdefault(m.group(1), []).append((int(m.group(2)), doc['InvoiceDate'], doc['DocumentStatus']))
+    problems = 0
+    for entries in series.values():
+        entries.sort()
+        for (prev, prev_date, _), (seq, date, _) in zip(entries, entries[1:]):
+            problems += (seq == prev) + (seq > prev + 1) + (date < prev_date)
+    return problems
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_numbering_'), 'x.docs')
+    doc_index.DocumentIndex.build(records(n), 'fp').write(path)
+    index = doc_index.DocumentIndex.load(path)
+    documents = [index.record(r) for r in range(index.count)]  # the extract-documents JSON
+    print(f'{n} invoices, {len(SERIES)} series')
+    print(f"{'mode':<8}{'time s':>9}{'problems':>10}")
+    t = time.perf_counter()
+    problems = with_dicts(documents)
+    print(f"{'dicts':<8}{time.perf_counter() - t:>9.3f}{problems:>10}")
+    t = time.perf_counter()
+    report = numbering.check_numbering(index)
+    print(f"{'index':<8}{time.perf_counter() - t:>9.3f}{sum(report['counts'].values()):>10}   {report['counts']}")
+    os.unlink(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Repeat opens of an archived SAFT through Storage.fetch_to_local.
+
+Usage: python benchmarks/bench_object_cache.py [size_mb] [latency_ms]
+
+Stores a `size_mb` MB (default 100) object on a local S3 stand-in that adds
+`latency_ms` (default 20) per call, then times:
+  cold       - first fetch (HEAD + download into the object cache)
+  warm       - repeat fetch (conditional HEAD answered 304, no download)
+  concurrent - 20 simultaneous fetches of a freshly overwritten object
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.s3_standin import S3StandIn  # noqa: E402
+
+KEY = 'pt/history/bench.zip'
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20.0) / 1000
+    with S3StandIn(latency=latency) as s3, tempfile.TemporaryDirectory() as cache_dir:
+        os.environ.update(s3.env())
+        os.environ['OBJECT_CACHE_DIR'] = cache_dir
+        from core import object_cache
+        from core.storage import Storage
+        storage = Storage()
+        storage.client.create_bucket(Bucket=s3.bucket)
+        storage.client.put_object(Bucket=s3.bucket, Key=KEY, Body=os.urandom(size_mb * 1024 * 1024))
+
+        async def fetch():
+            path = await storage.fetch_to_local('pt', KEY)
+            storage.release_local(path)
+
+        async def concurrent():
+            storage.client.put_object(Bucket=s3.bucket, Key=KEY, Body=os.urandom(size_mb * 1024 * 1024))
+            calls = s3.requests
+            start = time.perf_counter()
+            await asyncio.gather(*(fetch() for _ in range(20)))
+            return time.perf_counter() - start, s3.requests - calls
+
+        async def scenario():
+            rows = []
+            for name in ('cold', 'warm', 'warm'):
+                calls = s3.requests
+                start = time.perf_counter()
+                await fetch()
+                rows.append((name, time.perf_counter() - start, s3.requests - calls))
+            elapsed, calls = await concurrent()
+            rows.append(('concurrent', elapsed, calls))
+            return rows
+
+        print(f'{size_mb} MB object, {latency * 1000:.0f} ms per S3 call')
+        print(f"{'fetch':<12}{'time ms':>10}{'S3 calls':>10}")
+        for name, elapsed, calls in asyncio.run(scenario()):
+            print(f'{name:<12}{elapsed * 1000:>10.1f}{calls:>10}')
+        cache = object_cache.default()
+        print(f'cache: {cache.hits} hits, {cache.misses} misses, {cache.size / 1e6:.0f} MB on disk')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""In-process schema pre-check throughput (saft_validator.schema_precheck).
+
+Usage: python benchmarks/bench_schema_precheck.py [size_mb] [bad_countries]
+
+Generates a synthetic SAF-T file (default 100 MB) with `bad_countries` (default
+100) customers whose Country is 'CVE' and times:
+  full   - a complete pass (max_errors above the number of problems)
+  first  - stop at the first error (what SAFT_SCHEMA_SKIP_JAR needs to answer)
+FACTEMICLI itself is not run here; it needs a JVM start plus its own full
+parse, so compare against the JAR timings in the job logs.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.saft_fixture import write_saft  # noqa: E402
+from core.saft_validator import schema_precheck  # noqa: E402
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    bad = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    workdir = tempfile.mkdtemp(prefix='bench_schema_')
+    clean = os.path.join(workdir, 'saft.xml')
+    write_saft(clean, size_mb)
+    path = os.path.join(workdir, 'bad.xml')
+    with open(clean, encoding='utf-8') as src, open(path, 'w', encoding='utf-8') as dst:
+        for i, line in enumerate(src):
+            if 0 < i <= bad * 10 and i % 10 == 0:
+                line = line.replace('<Country>PT</Country>', '<Country>CVE</Country>')
+            dst.write(line)
+    os.unlink(clean)
+    size = os.path.getsize(path) / 1e6
+    print(f'{size:.0f} MB, {bad} invalid countries')
+    print(f"{'mode':<8}{'errors':>8}{'time s':>9}{'MB/s':>8}")
+    for name, limit in (('full', bad * 10), ('first', 1)):
+        t = time.perf_counter()
+        messages = schema_precheck(path, max_errors=limit)
+        elapsed = time.perf_counter() - t
+        print(f'{name:<8}{len(messages):>8}{elapsed:>9.2f}{size / elapsed:>8.1f}')
+    os.unlink(path)
+    os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
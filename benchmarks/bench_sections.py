@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""All SourceDocuments sections and the GLE in one pass vs one pass per section.
+
+Usage: python benchmarks/bench_sections.py [invoices]
+
+Writes a synthetic SAF-T file with `invoices` invoices (default 200000) plus
+half as many GLE transactions, payments, working documents and stock
+movements, then builds the SalesInvoices document index and the per-section
+records:
+  separate  a pass per section (doc index, then each other section on its own)
+  single    section_store.build: one pass feeding the index and the store
+and reads a page from the middle of each stored section.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import saft_fixture  # noqa: E402
+from core import doc_index, section_store  # noqa: E402
+from core.saft_documents import SECTIONS, iter_records  # noqa: E402
+
+TRANSACTION = ("<Transaction><TransactionID>2025-09-01 VND {n}</TransactionID><Period>9</Period>"
+               "<TransactionDate>2025-09-01</TransactionDate><SourceID>admin</SourceID><Description>FT A/{n}</Description>"
+               "<DocArchivalNumber>{n}</DocArchivalNumber><TransactionType>N</TransactionType>"
+               "<GLPostingDate>2025-09-01</GLPostingDate><CustomerID>C{c}</CustomerID><Lines>"
+               "<DebitLine><RecordID>1</RecordID><AccountID>211</AccountID><SystemEntryDate>2025-09-01T10:00:00"
+               "</SystemEntryDate><Description>FT</Description><DebitAmount>29.90</DebitAmount></DebitLine>"
+               "<CreditLine><RecordID>2</RecordID><AccountID>711</AccountID><SystemEntryDate>2025-09-01T10:00:00"
+               "</SystemEntryDate><Description>FT</Description><CreditAmount>29.90</CreditAmount></CreditLine>"
+               "</Lines></Transaction>\n")
+DOCUMENT = ("<{tag}><{number}>{prefix} A/{n}</{number}><DocumentStatus><{status}>N</{status}>"
+            "<{status}Date>2025-09-01T10:00:00</{status}Date><SourceID>admin</SourceID></DocumentStatus>"
+            "<{date}>2025-09-01</{date}><{type}>{prefix}</{type}><CustomerID>C{c}</CustomerID>"
+            "<Line><LineNumber>1</LineNumber><CreditAmount>25.00</CreditAmount></Line>"
+            "<DocumentTotals><TaxPayable>4.90</TaxPayable><NetTotal>25.00</NetTotal><GrossTotal>29.90</GrossTotal>"
+            "</DocumentTotals></{tag}>\n")
+OTHERS = (  # section, element, number, status, date, type, prefix
+    ('MovementOfGoods', 'StockMovement', 'DocumentNumber', 'MovementStatus', 'MovementDate', 'MovementType', 'GT'),
+    ('WorkingDocuments', 'WorkDocument', 'DocumentNumber', 'WorkStatus', 'WorkDate', 'WorkType', 'OR'),
+    ('Payments', 'Payment', 'PaymentRefNo', 'PaymentStatus', 'TransactionDate', 'PaymentType', 'RG'),
+)
+
+
+def write_file(path, invoices):
+    others = invoices // 2
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(saft_fixture.HEADER)
+        f.write(''.join(saft_fixture.CUSTOMER.format(c=c) for c in range(5000)))
+        f.write('</MasterFiles>\n<GeneralLedgerEntries><Journal><JournalID>VND</JournalID>'
+                '<Description>Vendas</Description>\n')
+        for start in range(0, others, 1000):
+            f.write(''.join(TRANSACTION.format(n=n, c=n % 5000) for n in range(start, min(start + 1000, others))))
+        f.write('</Journal></GeneralLedgerEntries>\n<SourceDocuments><SalesInvoices>\n')
+        for start in range(0, invoices, 1000):
+            f.write(''.join(saft_fixture.invoice_xml(n) for n in range(start, min(start + 1000, invoices))))
+        f.write('</SalesInvoices>\n')
+        for section, tag, number, status, date, type_, prefix in OTHERS:
+            f.write(f'<{section}>\n')
+            for start in range(0, others, 1000):
+                f.write(''.join(DOCUMENT.format(tag=tag, number=number, status=status, date=date, type=type_,
+                                                prefix=prefix, n=n, c=n % 5000)
+                                for n in range(start, min(start + 1000, others))))
+            f.write(f'</{section}>\n')
+        f.write('</SourceDocuments></AuditFile>\n')
+
+
+def separate(path, index_path, store_path):
+    doc_index.DocumentIndex.build(doc_index.file_records(path), 'fp').write(index_path)
+    for name in SECTIONS:
+        writer = section_store.SectionWriter(f'{store_path}.{name}')
+        for kind, rec in iter_records(path, sections=True):
+            if kind in (name, 'customer', 'supplier'):
+                writer.add(kind, rec)
+        writer.finish('fp')
+        os.unlink(f'{store_path}.{name}')
+
+
+def main():
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tmp = tempfile.mkdtemp(prefix='bench_sections_')
+    path = os.path.join(tmp, 'saft.xml')
+    index_path, store_path = os.path.join(tmp, 'x.docs'), os.path.join(tmp, 'x.sections')
+    try:
+        write_file(path, invoices)
+        print(f'file: {os.path.getsize(path) / 1e6:.0f} MB, {invoices} invoices, {invoices // 2} of each other record')
+        t = time.perf_counter()
+        separate(path, index_path, store_path)
+        print(f"{'separate':<10}{time.perf_counter() - t:>8.1f} s  ({1 + len(SECTIONS)} passes)")
+        t = time.perf_counter()
+        _, store = section_store.build(path, index_path, store_path, 'fp')
+        print(f"{'single':<10}{time.perf_counter() - t:>8.1f} s  store {os.path.getsize(store_path) / 1e6:.0f} MB")
+        for name, section in store.sections.items():
+            t = time.perf_counter()
+            records = section.records(section.count // 2, section.count // 2 + 100)
+            print(f"  {name:<22}{section.count:>8} records, page of {len(records)} in "
+                  f"{(time.perf_counter() - t) * 1000:.1f} ms")
+    finally:
+        for name in os.listdir(tmp):
+            os.unlink(os.path.join(tmp, name))
+        os.rmdir(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Throughput of concurrent presign + download requests against storage.
+
+Usage: python benchmarks/bench_storage_client.py [requests] [latency_ms]
+
+Fires `requests` (default 100) concurrent "presign a URL and fetch the object"
+requests at a local S3 stand-in that adds `latency_ms` (default 20) per call:
+  legacy - a fresh boto3 client per request, calls made directly on the event loop
+  pooled - the shared Storage client, calls on the bounded storage executor
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import boto3
+from botocore.config import Config
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.s3_standin import S3StandIn  # noqa: E402
+
+OBJECT_KEY = 'pt/bench/saft.xml'
+OBJECT_SIZE = 256 * 1024
+
+
+def _legacy_client(env):
+    return boto3.client('s3', endpoint_url=env['B2_ENDPOINT'], region_name=env['B2_REGION'],
+                        aws_access_key_id=env['B2_KEY_ID'], aws_secret_access_key=env['B2_APP_KEY'],
+                        config=Config(s3={'addressing_style': 'path'}))
+
+
+async def _run(n, request):
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(n)))
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20.0) / 1000
+    workdir = tempfile.mkdtemp(prefix='bench_storage_')
+    with S3StandIn(latency=latency) as s3:
+        env = s3.env()
+        os.environ.update(env)
+        from core.storage import Storage
+        storage = Storage()
+        storage.client.create_bucket(Bucket=s3.bucket)
+        storage.client.put_object(Bucket=s3.bucket, Key=OBJECT_KEY, Body=os.urandom(OBJECT_SIZE))
+
+        async def legacy(i):
+            client = _legacy_client(env)
+            client.generate_presigned_url('get_object', Params={'Bucket': s3.bucket, 'Key': OBJECT_KEY}, ExpiresIn=900)
+            target = os.path.join(workdir, f'legacy_{i}.xml')
+            client.download_file(s3.bucket, OBJECT_KEY, target)
+            os.unlink(target)
+
+        async def pooled(i):
+            await storage.presign_get('pt', OBJECT_KEY)
+            target = os.path.join(workdir, f'pooled_{i}.xml')
+            await storage.download(OBJECT_KEY, target)
+            os.unlink(target)
+
+        print(f'{n} concurrent presign+download requests, {latency * 1000:.0f} ms per S3 call')
+        print(f"{'mode':<10}{'time s':>9}{'req/s':>9}{'S3 calls':>10}")
+        for name, fn in (('legacy', legacy), ('pooled', pooled)):
+            calls = s3.requests
+            elapsed = asyncio.run(_run(n, fn))
+            print(f'{name:<10}{elapsed:>9.2f}{n / elapsed:>9.1f}{s3.requests - calls:>10}')
+    os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
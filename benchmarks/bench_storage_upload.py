@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Event-loop latency while archiving a large file to storage.
+
+Usage: python benchmarks/bench_storage_upload.py [size_mb]
+
+Uploads a `size_mb` MB (default 500) file to a local S3 stand-in twice:
+  blocking - storage.client.upload_file() called on the event loop (old archive step)
+  async    - await Storage.upload() (multipart, parts on the transfer thread pool)
+while a ticker coroutine measures how late each 10 ms tick fires.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.s3_standin import S3StandIn  # noqa: E402
+
+TICK = 0.01
+
+
+async def _measure(upload):
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - t0 - TICK)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await upload()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await task
+    lags.sort()
+    return elapsed, lags[-1] * 1000, lags[int(len(lags) * 0.99) - 1] * 1000, len(lags)
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with S3StandIn() as s3:
+        os.environ.update(s3.env())
+        from core.storage import Storage
+        storage = Storage()
+        storage.client.create_bucket(Bucket=s3.bucket)
+
+        fd, path = tempfile.mkstemp(suffix='.zip')
+        with os.fdopen(fd, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(block)
+        try:
+            async def blocking():
+                storage.client.upload_file(path, storage.bucket, 'pt/bench/blocking.zip')
+
+            async def streamed():
+                await storage.upload('pt/bench/async.zip', path)
+
+            print(f'{size_mb} MB archive, ticker every {TICK * 1000:.0f} ms')
+            print(f"{'mode':<10}{'time s':>9}{'max lag ms':>12}{'p99 lag ms':>12}{'ticks':>7}")
+            for name, fn in (('blocking', blocking), ('async', streamed)):
+                elapsed, max_lag, p99, ticks = asyncio.run(_measure(fn))
+                print(f'{name:<10}{elapsed:>9.2f}{max_lag:>12.1f}{p99:>12.1f}{ticks:>7}')
+        finally:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
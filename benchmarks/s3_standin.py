@@ -0,0 +1,216 @@
+"""Minimal local S3 stand-in for the storage benchmarks (no moto needed).
+
+Speaks just enough of the S3 REST API for boto3 with path-style addressing:
+PUT/GET/HEAD/DELETE object (GET with Range, HEAD/GET with If-None-Match) and
+multipart uploads (create, upload part, complete). Objects are kept as files in a
+temporary directory so large payloads do not sit in memory. Signatures are not
+checked. An optional per-request `latency` emulates a remote endpoint.
+
+    with S3StandIn(latency=0.02) as s3:
+        os.environ.update(s3.env())   # B2_ENDPOINT, B2_BUCKET, ... for core.storage
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+COPY_BLOCK = 1024 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: '_Server'
+
+    def log_message(self, *args):
+        pass
+
+    # -- helpers ---------------------------------------------------------
+    def _parse(self):
+        parts = urlsplit(self.path)
+        bucket, _, key = unquote(parts.path).lstrip('/').partition('/')
+        return bucket, key, parse_qs(parts.query, keep_blank_values=True)
+
+    def _obj_path(self, bucket, key):
+        return os.path.join(self.server.root, hashlib.sha1(f'{bucket}/{key}'.encode()).hexdigest())
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _read_body_to(self, path):
+        remaining = int(self.headers.get('Content-Length') or 0)
+        md5 = hashlib.md5()
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                block = self.rfile.read(min(COPY_BLOCK, remaining))
+                if not block:
+                    break
+                md5.update(block)
+                f.write(block)
+                remaining -= len(block)
+        return md5.hexdigest()
+
+    def _delay(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+
+    # -- verbs -----------------------------------------------------------
+    def do_PUT(self):
+        self._delay()
+        bucket, key, q = self._parse()
+        if 'uploadId' in q:
+            upload = self.server.uploads[q['uploadId'][0]]
+            part_path = f"{upload['dir']}/{int(q['partNumber'][0]):05d}"
+            etag = self._read_body_to(part_path)
+            return self._reply(200, headers={'ETag': f'"{etag}"'})
+        path = self._obj_path(bucket, key)
+        etag = self._read_body_to(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self.server.etags[path] = etag
+        self._reply(200, headers={'ETag': f'"{etag}"'})
+
+    def do_POST(self):
+        self._delay()
+        bucket, key, q = self._parse()
+        if 'uploads' in q:
+            upload_id = uuid.uuid4().hex
+            self.server.uploads[upload_id] = {'dir': tempfile.mkdtemp(dir=self.server.root)}
+            body = (f'<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult>'
+                    f'<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>'
+                    f'</InitiateMultipartUploadResult>').encode()
+            return self._reply(200, body, {'Content-Type': 'application/xml'})
+        upload = self.server.uploads.pop(q['uploadId'][0])
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        path = self._obj_path(bucket, key)
+        parts = sorted(os.listdir(upload['dir']))
+        with open(path + '.tmp', 'wb') as out:
+            for name in parts:
+                with open(os.path.join(upload['dir'], name), 'rb') as f:
+                    shutil.copyfileobj(f, out, COPY_BLOCK)
+        os.replace(path + '.tmp', path)
+        shutil.rmtree(upload['dir'], ignore_errors=True)
+        etag = f'{uuid.uuid4().hex}-{len(parts)}'
+        self.server.etags[path] = etag
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult>'
+                f'<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>"{etag}"</ETag>'
+                f'</CompleteMultipartUploadResult>').encode()
+        self._reply(200, body, {'Content-Type': 'application/xml'})
+
+    def _object_headers(self, path):
+        st = os.stat(path)
+        return st.st_size, {
+            'ETag': f'"{self.server.etags.get(path, "")}"',
+            'Last-Modified': formatdate(st.st_mtime, usegmt=True),
+            'Accept-Ranges': 'bytes',
+        }
+
+    def do_HEAD(self):
+        self._delay()
+        bucket, key, _ = self._parse()
+        path = self._obj_path(bucket, key)
+        if not os.path.exists(path):
+            return self._reply(404)
+        size, headers = self._object_headers(path)
+        if self.headers.get('If-None-Match') == headers['ETag']:
+            return self._reply(304, headers=headers)
+        self.send_response(200)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+    def do_GET(self):
+        self._delay()
+        bucket, key, _ = self._parse()
+        path = self._obj_path(bucket, key)
+        if not os.path.exists(path):
+            body = b'<?xml version="1.0"?><Error><Code>NoSuchKey</Code><Message>missing</Message></Error>'
+            return self._reply(404, body, {'Content-Type': 'application/xml'})
+        size, headers = self._object_headers(path)
+        if self.headers.get('If-None-Match') == headers['ETag']:
+            return self._reply(304, headers=headers)
+        start, end = 0, size - 1
+        status = 200
+        m = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if m:
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = f.read(min(COPY_BLOCK, remaining))
+                if not block:
+                    break
+                self.wfile.write(block)
+                remaining -= len(block)
+
+    def do_DELETE(self):
+        self._delay()
+        bucket, key, _ = self._parse()
+        path = self._obj_path(bucket, key)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._reply(204)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class S3StandIn:
+    def __init__(self, latency: float = 0.0, bucket: str = 'bench'):
+        self.bucket = bucket
+        self.root = tempfile.mkdtemp(prefix='s3standin_')
+        self.httpd = _Server(('127.0.0.1', 0), _Handler)
+        self.httpd.root = self.root
+        self.httpd.latency = latency
+        self.httpd.uploads = {}
+        self.httpd.etags = {}
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def env(self) -> dict:
+        return {
+            'B2_ENDPOINT': self.endpoint, 'B2_REGION': 'us-east-1', 'B2_BUCKET': self.bucket,
+            'B2_KEY_ID': 'bench', 'B2_APP_KEY': 'bench', 'B2_ADDRESSING_STYLE': 'path',
+        }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,71 @@
+"""Synthetic SAF-T PT files for the benchmarks.
+
+    write_saft(path, size_mb=200)        # roughly size_mb MB, returns invoice count
+    write_saft(path, invoices=200000)    # exactly that many invoices
+
+MasterFiles holds `customers` customers; SalesInvoices holds invoices spread
+over three series, each with DocumentStatus, Hash, two lines and totals.
+"""
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+
+HEADER = f"""<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="{NS}">
+<Header><AuditFileVersion>1.04_01</AuditFileVersion><CompanyName>ACME</CompanyName>
+<TaxRegistrationNumber>123456789</TaxRegistrationNumber><FiscalYear>2025</FiscalYear>
+<StartDate>2025-09-01</StartDate><EndDate>2025-09-30</EndDate><CurrencyCode>EUR</CurrencyCode></Header>
+<MasterFiles>
+"""
+CUSTOMER = ("<Customer><CustomerID>C{c}</CustomerID><AccountID>Desconhecido</AccountID>"
+            "<CustomerTaxID>5{c:08d}</CustomerTaxID><CompanyName>Cliente {c} Lda</CompanyName>"
+            "<BillingAddress><AddressDetail>Rua {c}</AddressDetail><City>Lisboa</City>"
+            "<PostalCode>1000-001</PostalCode><Country>PT</Country></BillingAddress>"
+            "<SelfBillingIndicator>0</SelfBillingIndicator></Customer>\n")
+SALES_START = "</MasterFiles>\n<SourceDocuments><SalesInvoices>\n"
+INVOICE = (
+    "<Invoice><InvoiceNo>{series} {seq}</InvoiceNo><ATCUD>0-{seq}</ATCUD>"
+    "<DocumentStatus><InvoiceStatus>{status}</InvoiceStatus>"
+    "<InvoiceStatusDate>2025-09-15T10:00:00</InvoiceStatusDate><SourceID>admin</SourceID>"
+    "<SourceBilling>P</SourceBilling></DocumentStatus>"
+    "<Hash>{hash}</Hash><HashControl>1</HashControl><Period>9</Period>"
+    "<InvoiceDate>2025-09-{day:02d}</InvoiceDate><InvoiceType>{itype}</InvoiceType>"
+    "<SpecialRegimes><SelfBillingIndicator>0</SelfBillingIndicator><CashVATSchemeIndicator>0</CashVATSchemeIndicator>"
+    "<ThirdPartiesBillingIndicator>0</ThirdPartiesBillingIndicator></SpecialRegimes>"
+    "<SourceID>admin</SourceID><SystemEntryDate>2025-09-{day:02d}T10:00:00</SystemEntryDate>"
+    "<CustomerID>C{c}</CustomerID>"
+    "<Line><LineNumber>1</LineNumber><ProductCode>P1</ProductCode><ProductDescription>Artigo 1</ProductDescription>"
+    "<Quantity>2</Quantity><UnitOfMeasure>UN</UnitOfMeasure><UnitPrice>10.00</UnitPrice>"
+    "<TaxPointDate>2025-09-{day:02d}</TaxPointDate><Description>Artigo 1</Description><CreditAmount>20.00</CreditAmount>"
+    "<Tax><TaxType>IVA</TaxType><TaxCountryRegion>PT</TaxCountryRegion><TaxCode>NOR</TaxCode>"
+    "<TaxPercentage>23</TaxPercentage></Tax><SettlementAmount>0</SettlementAmount></Line>"
+    "<Line><LineNumber>2</LineNumber><ProductCode>P2</ProductCode><ProductDescription>Artigo 2</ProductDescription>"
+    "<Quantity>1</Quantity><UnitOfMeasure>UN</UnitOfMeasure><UnitPrice>5.00</UnitPrice>"
+    "<TaxPointDate>2025-09-{day:02d}</TaxPointDate><Description>Artigo 2</Description><CreditAmount>5.00</CreditAmount>"
+    "<Tax><TaxType>IVA</TaxType><TaxCountryRegion>PT</TaxCountryRegion><TaxCode>RED</TaxCode>"
+    "<TaxPercentage>6</TaxPercentage></Tax><SettlementAmount>0</SettlementAmount></Line>"
+    "<DocumentTotals><TaxPayable>4.90</TaxPayable><NetTotal>25.00</NetTotal>"
+    "<GrossTotal>29.90</GrossTotal></DocumentTotals></Invoice>\n"
+)
+FOOTER = "</SalesInvoices></SourceDocuments></AuditFile>\n"
+SERIES = ('FT A', 'FT B', 'FR A')
+
+
+def invoice_xml(n: int, customers: int = 5000) -> str:
+    series = SERIES[n % len(SERIES)]
+    return INVOICE.format(series=series, seq=n // len(SERIES) + 1, status='A' if n % 97 == 0 else 'N',
+                          hash=f'{n:08x}' * 21, day=n % 28 + 1, itype=series[:2], c=n % customers)
+
+
+def write_saft(path: str, size_mb: int = 200, customers: int = 5000, invoices: int = 0) -> int:
+    """Write a file of roughly `size_mb` MB (or exactly `invoices` invoices); return the invoice count."""
+    target = size_mb * 1024 * 1024
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        f.write(''.join(CUSTOMER.format(c=c) for c in range(customers)))
+        f.write(SALES_START)
+        n = 0
+        while (n < invoices) if invoices else (f.tell() < target):
+            batch = min(1000, invoices - n) if invoices else 1000
+            f.write(''.join(invoice_xml(n + i, customers) for i in range(batch)))
+            n += batch
+        f.write(FOOTER)
+    return n
@@ -0,0 +1,127 @@
+"""
+VAT and totals aggregation over a DocumentIndex
+
+DocumentIndex.build() reduces a file's SalesInvoices to small per-month tables
+of integer cents (core.doc_index.TABLES): by type and status, by customer and,
+from the invoice lines, taxable base per TaxPercentage. aggregate() only sums
+the rows of those tables inside the requested month range, so a query costs
+the number of (month, key) cells, not the number of documents, and no XML is
+read once the index exists.
+
+Effective totals (totals, by_month, by_type, by_tax_rate, customers) leave out
+annulled and invoiced documents (status A/F) and count credit notes (NC) as
+negative; by_status reports every status with the amounts as written.
+"""
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from core.doc_index import EXCLUDED_STATUSES, NEGATIVE_TYPES, TABLES, DocumentIndex, format_cents, to_cents
+
+
+def _amounts(cell: List[int]) -> Dict[str, Any]:
+    count, net, tax, gross = cell
+    return {'documents': count, 'net': format_cents(net), 'tax': format_cents(tax), 'gross': format_cents(gross)}
+
+
+def _rows(index: DocumentIndex, table: str, month_from: int, month_to: int):
+    width = len(TABLES[table])
+    data = index.tables[table]
+    for i in range(0, len(data), width):
+        if month_from <= data[i] <= month_to:
+            yield data[i:i + width]
+
+
+def _add(cells: Dict[Any, List[int]], key: Any, values) -> None:
+    cell = cells.get(key)
+    if cell is None:
+        cells[key] = list(values)
+    else:
+        for i, v in enumerate(values):
+            cell[i] += v
+
+
+def month_key(text: Optional[str], default: int) -> int:
+    """'YYYY-MM' (or a full date) to YYYYMM; `default` when empty.
+
+    Raises:
+        ValueError: If `text` is not a month
+    """
+    if not text:
+        return default
+    digits = text[:7].replace('-', '')
+    if len(digits) != 6 or not digits.isdigit() or not 1 <= int(digits[4:]) <= 12:
+        raise ValueError(f'Invalid month "{text}", expected YYYY-MM')
+    return int(digits)
+
+
+def _month(key: int) -> str:
+    return f'{key // 100:04d}-{key % 100:02d}' if key else ''
+
+
+def aggregate(index: DocumentIndex, month_from: Optional[str] = None, month_to: Optional[str] = None,
+              top: int = 10) -> Dict[str, Any]:
+    """Totals of the documents dated in [month_from, month_to] ('YYYY-MM', both optional).
+
+    Returns totals, by_month, by_type, by_status, by_tax_rate (base and the tax
+    on the period's base per rate, '' for lines without a TaxPercentage),
+    by_customer and the `top` customers by gross total. Amounts are decimal
+    strings.
+
+    Raises:
+        ValueError: If a month is not 'YYYY-MM'
+    """
+    lo, hi = month_key(month_from, 0), month_key(month_to, 999999)
+    excluded = {i for i, name in enumerate(index.statuses) if name in EXCLUDED_STATUSES}
+    negative = {i for i, name in enumerate(index.types) if name in NEGATIVE_TYPES}
+
+    totals = [0, 0, 0, 0]
+    by_month: Dict[int, List[int]] = {}
+    by_type: Dict[int, List[int]] = {}
+    by_status: Dict[int, List[int]] = {}
+    for month, type_i, status_i, *cell in _rows(index, 'agg_docs', lo, hi):
+        _add(by_status, status_i, cell)
+        if status_i in excluded:
+            continue
+        if type_i in negative:
+            cell = [cell[0], -cell[1], -cell[2], -cell[3]]
+        _add(by_type, type_i, cell)
+        _add(by_month, month, cell)
+        for i, v in enumerate(cell):
+            totals[i] += v
+
+    by_rate: Dict[int, List[int]] = {}
+    for _, rate_i, base in _rows(index, 'agg_rates', lo, hi):
+        _add(by_rate, rate_i, (base,))
+
+    by_customer: Dict[int, List[int]] = {}
+    for _, cust_i, *cell in _rows(index, 'agg_customers', lo, hi):
+        _add(by_customer, cust_i, cell)
+
+    def customer(i: int) -> Dict[str, Any]:
+        cid, name = index.customers[i]
+        return {'customer_id': cid, 'customer_name': name, **_amounts(by_customer[i])}
+
+    ranked = sorted(by_customer, key=lambda i: (-by_customer[i][3], index.customers[i][0]))
+    return {
+        'documents': index.count,
+        'month_from': _month(lo), 'month_to': _month(hi) if hi != 999999 else '',
+        'totals': _amounts(totals),
+        'by_month': {_month(m): _amounts(by_month[m]) for m in sorted(by_month)},
+        'by_type': {index.types[i]: _amounts(by_type[i]) for i in sorted(by_type, key=lambda i: index.types[i])},
+        'by_status': {index.statuses[i]: _amounts(by_status[i])
+                      for i in sorted(by_status, key=lambda i: index.statuses[i])},
+        'by_tax_rate': {index.rates[i]: _rate(index.rates[i], base)
+                        for i, (base,) in sorted(by_rate.items(), key=lambda kv: _rate_order(index.rates[kv[0]]))},
+        'by_customer': [customer(i) for i in sorted(by_customer, key=lambda i: index.customers[i][0])],
+        'top_customers': [customer(i) for i in ranked[:max(top, 0)]],
+    }
+
+
+def _rate(rate: str, base: int) -> Dict[str, str]:
+    """Base and the tax due on it (rounded once per rate, as in a VAT return)."""
+    tax = to_cents(str(Decimal(base) * Decimal(rate or 0) / 10000))
+    return {'base': format_cents(base), 'tax': format_cents(tax)}
+
+
+def _rate_order(rate: str) -> float:
+    return float(rate) if rate else -1.0
@@ -0,0 +1,395 @@
+"""
+Chunked upload integrity - chunk bitmap, per-chunk digests and an incremental whole-file SHA-256
+
+An upload of `size` bytes is split into fixed `chunk_size` chunks (the last one
+may be shorter). The .meta JSON records which chunks arrived (a hex bitmap) and
+the SHA-256 of each, so an interrupted upload can be resumed by re-sending only
+the missing chunks - even after a server restart. The whole-file hash is fed as
+the contiguous prefix of received chunks grows, so finishing an upload does not
+re-read the file.
+
+Chunks of one upload may arrive concurrently and in any order: data goes through
+a cached per-upload file descriptor with os.pwrite (no shared file position), and
+only the .meta read-modify-write is serialised by the per-upload lock.
+
+Chunk bodies may be sent with Content-Encoding gzip/deflate (zstd too when the
+optional `zstandard` package is installed). They are inflated block by block
+while streaming to disk; offsets, lengths and digests always refer to the
+decompressed bytes, and the .meta keeps the wire size of every chunk.
+
+In-process state of an upload (hasher, lock, descriptor) is dropped at finish,
+or once it has been idle for UPLOAD_STATE_IDLE_SECONDS, so abandoned uploads do
+not accumulate; a later chunk or finish simply starts over (finish re-hashes
+the file from disk).
+
+Environment:
+    UPLOAD_MAX_OPEN_FILES        cached upload descriptors kept open (default 256)
+    UPLOAD_STATE_IDLE_SECONDS    idle time before an upload's state is dropped (default 3600)
+"""
+import asyncio
+import hashlib
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover - optional
+    zstandard = None
+
+
+class ChunkError(ValueError):
+    """A chunk that does not fit the upload (bad index, length or digest)."""
+
+
+class UnsupportedEncoding(ChunkError):
+    """Content-Encoding the server cannot decode."""
+
+
+def chunk_count(size: int, chunk_size: int) -> int:
+    return (size + chunk_size - 1) // chunk_size if size > 0 else 0
+
+
+def chunk_length(meta: dict, index: int) -> int:
+    """Expected byte length of chunk `index`."""
+    start = index * meta['chunk_size']
+    return max(0, min(meta['chunk_size'], meta['size'] - start))
+
+
+def has_layout(meta: dict) -> bool:
+    """False for unknown-size uploads and metas written before chunk bookkeeping."""
+    return 'chunks' in meta and meta['size'] > 0
+
+
+def new_meta(upload_id: str, filename: str, size: int, bin_path: str, chunk_size: int) -> dict:
+    chunks = chunk_count(size, chunk_size)
+    return {
+        'upload_id': upload_id,
+        'filename': filename,
+        'size': size,
+        'bin_path': bin_path,
+        'chunk_size': chunk_size,
+        'chunks': chunks,
+        'received': bytes((chunks + 7) // 8).hex(),
+        'digests': {},
+    }
+
+
+def _bitmap(meta: dict) -> bytearray:
+    return bytearray.fromhex(meta.get('received') or '')
+
+
+def is_received(meta: dict, index: int) -> bool:
+    bits = _bitmap(meta)
+    return index // 8 < len(bits) and bool(bits[index // 8] & (1 << (index % 8)))
+
+
+def mark_received(meta: dict, index: int, digest: str, wire_bytes: Optional[int] = None):
+    bits = _bitmap(meta)
+    bits[index // 8] |= 1 << (index % 8)
+    meta['received'] = bits.hex()
+    meta.setdefault('digests', {})[str(index)] = digest
+    if wire_bytes is not None:
+        meta.setdefault('wire', {})[str(index)] = wire_bytes
+
+
+def unmark_received(meta: dict, index: int):
+    """Forget a chunk whose bytes on disk can no longer be trusted."""
+    bits = _bitmap(meta)
+    if index // 8 < len(bits):
+        bits[index // 8] &= ~(1 << (index % 8)) & 0xFF
+        meta['received'] = bits.hex()
+    meta.get('digests', {}).pop(str(index), None)
+    meta.get('wire', {}).pop(str(index), None)
+
+
+def transfer_sizes(meta: dict) -> Dict[str, int]:
+    """Decompressed vs on-the-wire bytes received so far."""
+    lengths = [chunk_length(meta, int(i)) for i in meta.get('wire', {})] if has_layout(meta) else []
+    return {'raw_bytes': sum(lengths), 'wire_bytes': sum(meta.get('wire', {}).values())}
+
+
+def missing_chunks(meta: dict) -> List[int]:
+    """Indices not received yet (empty for legacy metas without a bitmap)."""
+    if 'chunks' not in meta:
+        return []
+    return [i for i in range(meta['chunks']) if not is_received(meta, i)]
+
+
+def check_index(meta: dict, index: int):
+    """Raises ChunkError if `index` is outside the upload layout."""
+    if has_layout(meta) and not 0 <= index < meta['chunks']:
+        raise ChunkError(f'chunk index {index} out of range (0..{meta["chunks"] - 1})')
+
+
+def max_chunk_bytes(meta: dict, index: int, default: int) -> int:
+    """Most decompressed bytes chunk `index` may carry."""
+    return chunk_length(meta, index) if has_layout(meta) else meta.get('chunk_size', default)
+
+
+def check_chunk(meta: dict, index: int, length: int, digest: str, expected_sha256: Optional[str] = None):
+    """Validate a received chunk (decompressed length and SHA-256).
+
+    Raises:
+        ChunkError: If the length is wrong or the client-supplied digest does not match
+    """
+    if expected_sha256 and expected_sha256.strip().lower() != digest:
+        raise ChunkError(f'chunk {index} digest mismatch (got {digest})')
+    if has_layout(meta) and length != chunk_length(meta, index):
+        raise ChunkError(f'chunk {index} has {length} bytes, expected {chunk_length(meta, index)}')
+
+
+class _LimitedSink:
+    """Write target for zstandard's stream_writer that stops a decompression bomb early."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.size = 0
+        self.parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.limit:
+            raise ChunkError(f'chunk inflates past {self.limit} bytes')
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        out, self.parts = b''.join(self.parts), []
+        return out
+
+
+def supported_encodings() -> List[str]:
+    return ['identity', 'gzip', 'deflate'] + (['zstd'] if zstandard is not None else [])
+
+
+class ChunkDecoder:
+    """Incremental Content-Encoding decoder that refuses to produce more than `limit` bytes."""
+
+    def __init__(self, encoding: Optional[str], limit: int):
+        self.encoding = (encoding or 'identity').strip().lower()
+        self.limit = limit
+        self.size = 0
+        self._zlib = None
+        self._zstd = None
+        if self.encoding in ('gzip', 'x-gzip'):
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self._zlib = zlib.decompressobj(32 + zlib.MAX_WBITS)  # zlib or gzip header
+        elif self.encoding == 'zstd' and zstandard is not None:
+            self._sink = _LimitedSink(limit)
+            self._zstd = zstandard.ZstdDecompressor().stream_writer(self._sink, closefd=False)
+        elif self.encoding != 'identity':
+            raise UnsupportedEncoding(f'unsupported Content-Encoding {self.encoding!r} (supported: {", ".join(supported_encodings())})')
+
+    def feed(self, block: bytes) -> bytes:
+        try:
+            if self._zlib is not None:
+                out = self._zlib.decompress(block, self.limit - self.size + 1)
+            elif self._zstd is not None:
+                self._zstd.write(block)
+                out = self._sink.take()
+            else:
+                out = block
+        except (zlib.error, ValueError) as e:
+            raise ChunkError(f'invalid {self.encoding} data: {e}')
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                raise ChunkError(f'invalid {self.encoding} data: {e}')
+            raise
+        self.size += len(out)
+        if self.size > self.limit:
+            raise ChunkError(f'chunk inflates past {self.limit} bytes')
+        return out
+
+    def finish(self) -> bytes:
+        """Flush the decoder; raises ChunkError if the compressed stream is truncated."""
+        if self._zlib is None:
+            return b''
+        out = self._zlib.flush()
+        if not self._zlib.eof:
+            raise ChunkError(f'truncated {self.encoding} stream')
+        self.size += len(out)
+        if self.size > self.limit:
+            raise ChunkError(f'chunk inflates past {self.limit} bytes')
+        return out
+
+
+class FileHasher:
+    """Whole-file SHA-256 fed with the contiguous prefix of received chunks.
+
+    `frontier` is the first chunk not hashed yet. Chunks that arrive ahead of it
+    are read back from disk once the gap closes. `digests` remembers what was
+    hashed so a later rewrite of an already-hashed chunk can be detected.
+    """
+
+    def __init__(self):
+        self.sha = hashlib.sha256()
+        self.frontier = 0
+        self.digests: Dict[int, str] = {}
+        self.broken = False
+        self.lock = asyncio.Lock()
+
+    def advance(self, meta: dict, read_chunk: Callable[[int], Iterable[bytes]]):
+        """Hash every received chunk from the frontier onwards (blocking; run in a thread).
+
+        `read_chunk(i)` yields chunk i in blocks, read back from disk (normally
+        still in the page cache, since it was just written). Each chunk is
+        checked against its recorded digest; a mismatch (chunk being rewritten
+        concurrently) gives up on the running hash.
+        """
+        while not self.broken and self.frontier < meta['chunks'] and is_received(meta, self.frontier):
+            i = self.frontier
+            digest = meta['digests'][str(i)]
+            check = hashlib.sha256()
+            for block in read_chunk(i):
+                check.update(block)
+                self.sha.update(block)
+            if check.hexdigest() != digest:
+                self.broken = True
+                return
+            self.digests[i] = digest
+            self.frontier += 1
+
+    def consistent(self, meta: dict) -> bool:
+        """True if the hashed chunks are exactly the ones recorded in meta."""
+        return not self.broken and self.frontier == meta['chunks'] and all(
+            meta['digests'].get(str(i)) == d for i, d in self.digests.items()
+        )
+
+    def hexdigest(self) -> str:
+        return self.sha.hexdigest()
+
+
+class FdCache:
+    """Open descriptors for in-progress uploads, shared by concurrent chunk writers.
+
+    Descriptors are reference counted so an fd is never closed under a running
+    pwrite; idle ones beyond `max_open` are closed least-recently-used first.
+    """
+
+    def __init__(self, max_open: int):
+        self.max_open = max_open
+        self._fds: "OrderedDict[str, List[int]]" = OrderedDict()  # upload_id -> [fd, refs]
+        self._closing: set = set()
+
+    def acquire(self, upload_id: str, path: str) -> int:
+        entry = self._fds.get(upload_id)
+        if entry is None:
+            entry = self._fds[upload_id] = [os.open(path, os.O_RDWR), 0]
+            self._evict()
+        self._fds.move_to_end(upload_id)
+        self._closing.discard(upload_id)
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, upload_id: str):
+        entry = self._fds.get(upload_id)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0 and upload_id in self._closing:
+            self._close(upload_id)
+
+    def close(self, upload_id: str):
+        """Close now if idle, otherwise once the last writer releases it."""
+        entry = self._fds.get(upload_id)
+        if entry is None:
+            return
+        if entry[1] <= 0:
+            self._close(upload_id)
+        else:
+            self._closing.add(upload_id)
+
+    def _close(self, upload_id: str):
+        fd, _ = self._fds.pop(upload_id)
+        self._closing.discard(upload_id)
+        os.close(fd)
+
+    def _evict(self):
+        for uid in [u for u, (_, refs) in self._fds.items() if refs <= 0]:
+            if len(self._fds) <= self.max_open:
+                break
+            self._close(uid)
+
+    def __len__(self):
+        return len(self._fds)
+
+
+def pwrite_all(fd: int, data: bytes, offset: int):
+    """os.pwrite until every byte is written (blocking; run in a thread)."""
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, offset)
+        view = view[n:]
+        offset += n
+
+
+def pread_blocks(fd: int, length: int, offset: int, block_size: int = 256 * 1024) -> Iterator[bytes]:
+    """Yield `length` bytes from `offset` in blocks of at most block_size."""
+    while length > 0:
+        block = os.pread(fd, min(block_size, length), offset)
+        if not block:
+            return
+        yield block
+        length -= len(block)
+        offset += len(block)
+
+
+fds = FdCache(int(os.getenv('UPLOAD_MAX_OPEN_FILES', '256')))
+_hashers: Dict[str, FileHasher] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+_last_used: "OrderedDict[str, float]" = OrderedDict()  # upload_id -> monotonic time, oldest first
+
+
+def _idle_seconds() -> float:
+    return float(os.getenv('UPLOAD_STATE_IDLE_SECONDS', '3600'))
+
+
+def _touch(upload_id: str):
+    """Record activity on upload_id and drop the state of uploads idle for too long."""
+    now = time.monotonic()
+    _last_used.pop(upload_id, None)
+    deadline = now - _idle_seconds()
+    busy = []
+    while _last_used:
+        uid, used = next(iter(_last_used.items()))
+        if used > deadline:
+            break
+        _last_used.pop(uid)
+        lk = _locks.get(uid)
+        h = _hashers.get(uid)
+        if (lk is not None and lk.locked()) or (h is not None and h.lock.locked()):
+            busy.append(uid)  # still in use: look again later
+        else:
+            discard(uid)
+    for uid in busy + [upload_id]:
+        _last_used[uid] = now
+
+
+def get_hasher(upload_id: str, create: bool = False) -> Optional[FileHasher]:
+    h = _hashers.get(upload_id)
+    if h is None and create:
+        h = _hashers[upload_id] = FileHasher()
+    if h is not None:
+        _touch(upload_id)
+    return h
+
+
+def discard(upload_id: str):
+    """Forget in-process state for an upload (after finish, on error or when idle)."""
+    _hashers.pop(upload_id, None)
+    _locks.pop(upload_id, None)
+    _last_used.pop(upload_id, None)
+    fds.close(upload_id)
+
+
+def lock(upload_id: str) -> asyncio.Lock:
+    """Per-upload lock serialising .meta read-modify-write cycles."""
+    _touch(upload_id)
+    lk = _locks.get(upload_id)
+    if lk is None:
+        lk = _locks[upload_id] = asyncio.Lock()
+    return lk
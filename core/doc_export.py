@@ -0,0 +1,198 @@
+"""
+Streaming CSV/XLSX export of a SAFT file's SalesInvoices
+
+Rows come straight from the iterparse extractor (core.saft_documents), one
+invoice at a time, with CustomerName resolved from the MasterFiles customers
+read before SourceDocuments; each writer yields byte chunks of about
+CHUNK_SIZE as it goes, so a download starts with the first invoices and the
+process holds one chunk (plus the customer names), whatever the file size.
+
+  csv   UTF-8 with a BOM (Excel detects the encoding), INVOICE_FIELDS columns;
+        text starting with = + - @ is quoted with ' so it is not run as a formula
+  xlsx  a single-sheet workbook; the sheet XML is written row by row into a
+        ZIP member with data descriptors, so nothing is buffered or seeked
+  gzip  gzip_chunks() compresses either stream on the fly
+"""
+import csv
+import io
+import re
+import zipfile
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List
+
+from core.saft_documents import INVOICE_FIELDS, Source, iter_records
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+_NUMERIC = frozenset({'NetTotal', 'TaxPayable', 'GrossTotal'})
+_NUMBER_RE = re.compile(r'-?\d+(\.\d+)?$')
+_FORMULA_START = ('=', '+', '-', '@', '\t', '\r')
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f￾￿]')
+
+
+def iter_documents(source: Source) -> Iterator[Dict[str, Any]]:
+    """SalesInvoices records in file order, CustomerName filled from MasterFiles.
+
+    Raises:
+        ET.ParseError: If XML is not well-formed (after the rows before the error)
+    """
+    customers: Dict[str, str] = {}
+    for kind, rec in iter_records(source):
+        if kind == 'invoice':
+            rec['CustomerName'] = customers.get(rec['CustomerID'], '')
+            yield rec
+        elif rec['CustomerID']:
+            customers[rec['CustomerID']] = rec['CompanyName']
+
+
+def _csv_cell(name: str, value: Any) -> Any:
+    """Text a spreadsheet would read as a formula gets a leading quote; amounts stay numbers."""
+    if isinstance(value, str) and value.startswith(_FORMULA_START):
+        if not (name in _NUMERIC and _NUMBER_RE.match(value)):
+            return "'" + value
+    return value
+
+
+def csv_chunks(documents: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    buf.write('﻿')
+    writer = csv.writer(buf, lineterminator='\r\n')
+    writer.writerow(INVOICE_FIELDS)
+    for doc in documents:
+        writer.writerow([_csv_cell(name, doc[name]) for name in INVOICE_FIELDS])
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+
+# -- xlsx ----------------------------------------------------------------------------
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>')
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>')
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Documents" sheetId="1" r:id="rId1"/></sheets></workbook>')
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '<Relationship Id="rId2" Target="styles.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+    '</Relationships>')
+_STYLES = (  # style 1: header in bold, style 2: amounts as 0.00
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="3"><xf/><xf fontId="1" applyFont="1"/><xf numFmtId="2" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>')
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/>'
+    '</sheetView></sheetViews><sheetData>')
+_SHEET_END = '</sheetData></worksheet>'
+
+
+class _Sink:
+    """Write-only file for ZipFile: collects the bytes written since the last drain()."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts = []
+        self.size = 0
+        return data
+
+
+def _text(value: str) -> str:
+    value = _XML_INVALID.sub('', value)
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _row(values: List[str], header: bool = False) -> str:
+    cells = []
+    for name, value in zip(INVOICE_FIELDS, values):
+        if not header and name in _NUMERIC and _NUMBER_RE.match(value):
+            cells.append(f'<c s="2"><v>{value}</v></c>')
+        else:
+            style = ' s="1"' if header else ''
+            cells.append(f'<c t="inlineStr"{style}><is><t xml:space="preserve">{_text(value)}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def xlsx_chunks(documents: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _ROOT_RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK)
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        zf.writestr('xl/styles.xml', _STYLES)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            pending = [_SHEET_START, _row(list(INVOICE_FIELDS), header=True)]
+            size = 0
+            for doc in documents:
+                row = _row([doc[name] for name in INVOICE_FIELDS])
+                pending.append(row)
+                size += len(row)
+                if size >= CHUNK_SIZE:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending, size = [], 0
+                    if sink.size:
+                        yield sink.drain()
+            pending.append(_SHEET_END)
+            sheet.write(''.join(pending).encode('utf-8'))
+    yield sink.drain()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(documents: Iterable[Dict[str, Any]], fmt: str, gzip: bool = False) -> Iterator[bytes]:
+    """Byte chunks of `documents` as `fmt` (a FORMATS key), gzip-compressed if asked."""
+    chunks = csv_chunks(documents) if fmt == 'csv' else xlsx_chunks(documents)
+    return gzip_chunks(chunks) if gzip else chunks
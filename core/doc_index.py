@@ -0,0 +1,438 @@
+"""
+Document index - compact, persisted listing of a SAFT file's SalesInvoices
+
+Built once per file from the streaming extractor (core.saft_documents) and kept
+as a binary sidecar next to the data (<upload>.docs for uploads, an object-cache
+sidecar for archived files). The sidecar stores one fixed-width column per field
+(date as YYYYMMDD, type/status/customer as small table indexes, totals in
+integer cents, byte span of the <Invoice> element, InvoiceNo as series index and
+integer sequence) plus precomputed sort orders, so a page is a slice of a
+permutation: no parsing and no full scan when unfiltered. Monthly aggregate
+tables (TABLES, read by core.aggregates) are built in the same pass. A fingerprint of the data file (size, mtime) invalidates stale
+sidecars. Cursors are positions in the chosen sort order, tied to the index and
+the filters they were issued for.
+
+Environment:
+    DOC_INDEX_CACHE_SIZE  indexes kept loaded in memory (default 4)
+"""
+import array
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import uuid
+from collections import OrderedDict
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b'SAFTDIX1'
+VERSION = 3
+SORT_KEYS = ('file', 'date', 'number', 'customer', 'total')
+MAX_PAGE = 1000
+
+# name -> array typecode, in file order
+_COLUMNS = (
+    ('date', 'i'), ('type', 'H'), ('status', 'H'), ('customer', 'i'),
+    ('net', 'q'), ('tax', 'q'), ('gross', 'q'), ('offset', 'q'), ('length', 'q'),
+    ('number_end', 'q'), ('series', 'i'), ('seq', 'q'),
+)
+_NUMBER_RE = re.compile(r'^(.*?)(\d+)$')
+
+# Pre-aggregated tables, one flat 'q' array each: name -> fields of a row
+TABLES = {
+    'agg_docs': ('month', 'type', 'status', 'count', 'net', 'tax', 'gross'),  # as in the file
+    'agg_customers': ('month', 'customer', 'count', 'net', 'tax', 'gross'),  # effective, signed
+    'agg_rates': ('month', 'rate', 'base'),  # effective, signed
+}
+EXCLUDED_STATUSES = frozenset({'A', 'F'})  # annulled / invoiced: left out of the effective totals
+NEGATIVE_TYPES = frozenset({'NC'})
+
+
+class CursorError(ValueError):
+    pass
+
+
+def to_cents(text: str) -> int:
+    """Monetary text to integer cents (half-up); unparsable values count as 0."""
+    units, _, fraction = text.partition('.')
+    if units.isdigit() and len(fraction) <= 2 and (fraction.isdigit() or not fraction):
+        return int(units) * 100 + int(fraction.ljust(2, '0'))  # the usual '123.45', without Decimal
+    try:
+        return int((Decimal(text or '0') * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        return 0
+
+
+def format_cents(cents: int) -> str:
+    sign = '-' if cents < 0 else ''
+    return f'{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}'
+
+
+def date_key(text: str) -> int:
+    """'YYYY-MM-DD' to YYYYMMDD (0 when not a date)."""
+    digits = (text or '')[:10].replace('-', '')
+    return int(digits) if len(digits) == 8 and digits.isdigit() else 0
+
+
+def _format_date(key: int) -> str:
+    return f'{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}' if key else ''
+
+
+def _number_key(number: str) -> Tuple[str, int]:
+    """Natural order for InvoiceNo: 'FT A/10' after 'FT A/9'."""
+    m = _NUMBER_RE.match(number)
+    return (m.group(1), int(m.group(2))) if m else (number, -1)
+
+
+def split_number(number: str) -> Tuple[str, int]:
+    """'FT A/123' -> ('FT A', 123); ('', -1) when InvoiceNo has no '<series>/<digits>' form."""
+    series, sep, seq = number.rpartition('/')
+    if sep and seq.isdigit():
+        return series, int(seq)
+    return '', -1
+
+
+def rate_key(text: str) -> str:
+    """TaxPercentage text as a canonical string ('23.00' -> '23'); '' when absent or invalid."""
+    try:
+        return format(Decimal(text).normalize(), 'f') if text else ''
+    except InvalidOperation:
+        return ''
+
+
+def _add(cells: Dict[Tuple[int, ...], List[int]], key: Tuple[int, ...], values: Tuple[int, ...]) -> None:
+    cell = cells.get(key)
+    if cell is None:
+        cells[key] = list(values)
+    else:
+        for i, v in enumerate(values):
+            cell[i] += v
+
+
+def fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+
+class DocumentIndex:
+    def __init__(self, meta: Dict[str, Any], columns: Dict[str, array.array], numbers: bytes,
+                 sorts: Dict[str, array.array], tables: Optional[Dict[str, array.array]] = None):
+        self.meta = meta
+        self.count: int = meta['count']
+        self.types: List[str] = meta['types']
+        self.statuses: List[str] = meta['statuses']
+        self.customers: List[List[str]] = meta['customers']
+        self.series: List[str] = meta['series']
+        self.columns = columns
+        self.numbers = numbers
+        self.sorts = sorts
+        self.tables = tables or {name: array.array('q') for name in TABLES}
+        self.rates: List[str] = meta.get('rates', [])
+        self.id = hashlib.sha256(f"{meta['fingerprint']}|{meta['built']}".encode()).hexdigest()[:16]
+
+    # -- build / persist ---------------------------------------------------
+    @classmethod
+    def build(cls, records: Iterable[Tuple[str, Dict[str, Any]]], source_fingerprint: str) -> 'DocumentIndex':
+        """Index the ('customer'|'invoice', record) stream of saft_documents.iter_records(offsets=True).
+
+        Per-month totals by type/status, by customer and by tax rate (from the
+        records' Lines, see iter_records(lines=True)) are accumulated on the way
+        into TABLES, so core.aggregates never scans the documents.
+        """
+        cols = {name: array.array(code) for name, code in _COLUMNS}
+        names: Dict[str, str] = {}
+        types: Dict[str, int] = {}
+        statuses: Dict[str, int] = {}
+        customer_ids: Dict[str, int] = {}
+        series_ids: Dict[str, int] = {}
+        rate_ids: Dict[str, int] = {}
+        rate_keys: Dict[str, int] = {}  # TaxPercentage text -> rate_ids index
+        cells: Dict[str, Dict[Tuple[int, ...], List[int]]] = {name: {} for name in TABLES}
+        numbers = bytearray()
+        spans_ok = True
+        for kind, rec in records:
+            if kind == 'customer':
+                if rec['CustomerID']:
+                    names[rec['CustomerID']] = rec['CompanyName']
+                continue
+            if kind != 'invoice':
+                continue
+            cols['date'].append(date_key(rec['InvoiceDate']))
+            cols['type'].append(types.setdefault(rec['InvoiceType'], len(types)))
+            cols['status'].append(statuses.setdefault(rec['DocumentStatus'], len(statuses)))
+            cols['customer'].append(customer_ids.setdefault(rec['CustomerID'], len(customer_ids)))
+            cols['net'].append(to_cents(rec['NetTotal']))
+            cols['tax'].append(to_cents(rec['TaxPayable']))
+            cols['gross'].append(to_cents(rec['GrossTotal']))
+            offset, length = rec.get('ByteOffset', -1), rec.get('ByteLength', -1)
+            spans_ok = spans_ok and offset >= 0
+            cols['offset'].append(offset)
+            cols['length'].append(length)
+            numbers += rec['InvoiceNo'].encode('utf-8')
+            cols['number_end'].append(len(numbers))
+            series, seq = split_number(rec['InvoiceNo'])
+            cols['series'].append(series_ids.setdefault(series, len(series_ids)) if seq >= 0 else -1)
+            cols['seq'].append(seq)
+            month = cols['date'][-1] // 100
+            totals = (cols['net'][-1], cols['tax'][-1], cols['gross'][-1])
+            _add(cells['agg_docs'], (month, cols['type'][-1], cols['status'][-1]), (1, *totals))
+            if rec['DocumentStatus'] in EXCLUDED_STATUSES:
+                continue
+            sign = -1 if rec['InvoiceType'] in NEGATIVE_TYPES else 1
+            _add(cells['agg_customers'], (month, cols['customer'][-1]), (1, *(sign * v for v in totals)))
+            bases: Dict[int, int] = {}
+            for rate, credit, debit in rec.get('Lines', ()):
+                rate_i = rate_keys.get(rate)
+                if rate_i is None:
+                    rate_i = rate_keys[rate] = rate_ids.setdefault(rate_key(rate), len(rate_ids))
+                bases[rate_i] = bases.get(rate_i, 0) + to_cents(credit) - to_cents(debit)
+            for rate_i, base in bases.items():
+                _add(cells['agg_rates'], (month, rate_i), (base,))
+        if not spans_ok:  # the raw tag scan lost step (e.g. an <Invoice> inside a comment)
+            cols['offset'] = array.array('q', [-1]) * len(cols['date'])
+            cols['length'] = array.array('q', [-1]) * len(cols['date'])
+        meta = {
+            'version': VERSION,
+            'fingerprint': source_fingerprint,
+            'built': uuid.uuid4().hex,
+            'byteorder': sys.byteorder,
+            'count': len(cols['date']),
+            'types': list(types),
+            'statuses': list(statuses),
+            'customers': [[cid, names.get(cid, '')] for cid in customer_ids],
+            'series': list(series_ids),
+            'rates': list(rate_ids),
+        }
+        tables = {name: array.array('q', [v for key, values in sorted(cells[name].items()) for v in (*key, *values)])
+                  for name in TABLES}
+        index = cls(meta, cols, bytes(numbers), {}, tables)
+        index.sorts = index._sort_orders()
+        return index
+
+    def _sort_orders(self) -> Dict[str, array.array]:
+        rows = range(self.count)
+        c = self.columns
+        cust = [name.casefold() + '\0' + cid for cid, name in self.customers]
+        keys = {
+            'date': lambda r: (c['date'][r], r),
+            'number': lambda r: (_number_key(self.number(r)), r),
+            'customer': lambda r: (cust[c['customer'][r]], r),
+            'total': lambda r: (c['gross'][r], r),
+        }
+        return {name: array.array('i', sorted(rows, key=key)) for name, key in keys.items()}
+
+    def write(self, path: str) -> None:
+        """Write atomically (temp file + rename)."""
+        meta = dict(self.meta, columns=[name for name, _ in _COLUMNS], sorts=list(self.sorts),
+                    numbers_size=len(self.numbers), tables={name: len(arr) for name, arr in self.tables.items()})
+        header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for name, _ in _COLUMNS:
+                self.columns[name].tofile(f)
+            f.write(self.numbers)
+            for name in self.sorts:
+                self.sorts[name].tofile(f)
+            for arr in self.tables.values():
+                arr.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'DocumentIndex':
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:8] != MAGIC:
+            raise ValueError('not a document index')
+        (size,) = struct.unpack_from('<I', data, 8)
+        meta = json.loads(data[12:12 + size])
+        if meta.get('version') != VERSION or meta.get('byteorder') != sys.byteorder:
+            raise ValueError('incompatible document index')
+        view = memoryview(data)
+        pos = 12 + size
+        n = meta['count']
+
+        def take(code: str) -> array.array:
+            nonlocal pos
+            arr = array.array(code)
+            end = pos + n * arr.itemsize
+            arr.frombytes(view[pos:end])
+            pos = end
+            return arr
+
+        columns = {name: take(code) for name, code in _COLUMNS}
+        numbers = bytes(view[pos:pos + meta['numbers_size']])
+        pos += meta['numbers_size']
+        sorts = {name: take('i') for name in meta['sorts']}
+        tables = {}
+        for name, size in meta.get('tables', {}).items():
+            tables[name] = array.array('q')
+            tables[name].frombytes(view[pos:pos + size * 8])
+            pos += size * 8
+        return cls(meta, columns, numbers, sorts, tables)
+
+    # -- read ----------------------------------------------------------------
+    def number(self, row: int) -> str:
+        ends = self.columns['number_end']
+        return self.numbers[ends[row - 1] if row else 0:ends[row]].decode('utf-8')
+
+    def record(self, row: int) -> Dict[str, Any]:
+        c = self.columns
+        cid, name = self.customers[c['customer'][row]]
+        return {
+            'InvoiceNo': self.number(row),
+            'InvoiceDate': _format_date(c['date'][row]),
+            'InvoiceType': self.types[c['type'][row]],
+            'DocumentStatus': self.statuses[c['status'][row]],
+            'CustomerID': cid,
+            'CustomerName': name,
+            'NetTotal': format_cents(c['net'][row]),
+            'TaxPayable': format_cents(c['tax'][row]),
+            'GrossTotal': format_cents(c['gross'][row]),
+            'ByteOffset': c['offset'][row],
+            'ByteLength': c['length'][row],
+        }
+
+    def matcher(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                types: Optional[Iterable[str]] = None, statuses: Optional[Iterable[str]] = None,
+                customer: Optional[str] = None, min_total: Optional[str] = None,
+                max_total: Optional[str] = None) -> Optional[Callable[[int], bool]]:
+        """Row predicate for the given filters, or None when nothing is filtered."""
+        c = self.columns
+        checks: List[Callable[[int], bool]] = []
+        if date_from:
+            lo = date_key(date_from)
+            checks.append(lambda r: c['date'][r] >= lo)
+        if date_to:
+            hi = date_key(date_to)
+            checks.append(lambda r: c['date'][r] <= hi)
+        if types:
+            type_names = set(types)
+            wanted_types = {i for i, v in enumerate(self.types) if v in type_names}
+            checks.append(lambda r: c['type'][r] in wanted_types)
+        if statuses:
+            status_names = set(statuses)
+            wanted_statuses = {i for i, v in enumerate(self.statuses) if v in status_names}
+            checks.append(lambda r: c['status'][r] in wanted_statuses)
+        if customer:
+            needle = customer.casefold()
+            wanted_customers = {i for i, (cid, name) in enumerate(self.customers)
+                                if cid == customer or needle in name.casefold()}
+            checks.append(lambda r: c['customer'][r] in wanted_customers)
+        if min_total not in (None, ''):
+            lo_cents = to_cents(min_total)
+            checks.append(lambda r: c['gross'][r] >= lo_cents)
+        if max_total not in (None, ''):
+            hi_cents = to_cents(max_total)
+            checks.append(lambda r: c['gross'][r] <= hi_cents)
+        if not checks:
+            return None
+        if len(checks) == 1:
+            return checks[0]
+        return lambda r: all(check(r) for check in checks)
+
+    def page(self, sort: str = 'file', descending: bool = False, start: int = 0, limit: int = 100,
+             match: Optional[Callable[[int], bool]] = None) -> Tuple[List[int], Optional[int]]:
+        """Rows of one page starting at sort position `start`, plus the next position (or None)."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f'sort must be one of: {", ".join(SORT_KEYS)}')
+        n = self.count
+        order = self.sorts.get(sort)
+        rows: List[int] = []
+        pos = start
+        while pos < n and len(rows) < limit:
+            i = n - 1 - pos if descending else pos
+            row = order[i] if order is not None else i
+            if match is None or match(row):
+                rows.append(row)
+            pos += 1
+        return rows, (pos if pos < n else None)
+
+    def total(self, match: Optional[Callable[[int], bool]] = None) -> int:
+        if match is None:
+            return self.count
+        return sum(1 for r in range(self.count) if match(r))
+
+
+# -- cursors ----------------------------------------------------------------
+def encode_cursor(index: DocumentIndex, query_key: str, position: int) -> str:
+    raw = json.dumps({'i': index.id, 'q': query_key, 'p': position}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(index: DocumentIndex, query_key: str, cursor: str) -> int:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        position = int(data['p'])
+    except Exception:
+        raise CursorError('Invalid cursor')
+    if data.get('i') != index.id or data.get('q') != query_key or not 0 <= position <= index.count:
+        raise CursorError('Cursor does not belong to this listing; start again without cursor')
+    return position
+
+
+def query_key(**params: Any) -> str:
+    """Stable digest of the sort/filter parameters a cursor is valid for."""
+    raw = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+# -- loading ----------------------------------------------------------------
+def file_records(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """iter_records(offsets=True, lines=True) over a plain XML file or the XML inside a ZIP archive."""
+    from core.saft_archiver import open_saft_xml
+    from core.saft_documents import iter_records
+    with open_saft_xml(path) as stream:
+        yield from iter_records(stream, offsets=True, lines=True)
+
+
+_loaded: 'OrderedDict[str, DocumentIndex]' = OrderedDict()
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _cache_size() -> int:
+    return int(os.getenv('DOC_INDEX_CACHE_SIZE', '4'))
+
+
+def _load_or_build(index_path: str, source_fingerprint: str,
+                   records: Callable[[], Iterable[Tuple[str, Dict[str, Any]]]]) -> Tuple[DocumentIndex, bool]:
+    if os.path.isfile(index_path):
+        try:
+            index = DocumentIndex.load(index_path)
+            if index.meta['fingerprint'] == source_fingerprint:
+                return index, False
+        except (OSError, ValueError, KeyError):
+            pass
+    index = DocumentIndex.build(records(), source_fingerprint)
+    index.write(index_path)
+    return index, True
+
+
+async def get_index(index_path: str, source_fingerprint: str,
+                    records: Callable[[], Iterable[Tuple[str, Dict[str, Any]]]]) -> Tuple[DocumentIndex, bool]:
+    """Return (index, built_now) for a data file, loading the sidecar or building it once.
+
+    `records` is called (in a worker thread) only when the sidecar is missing or
+    stale, and must return saft_documents.iter_records(..., offsets=True).
+    Concurrent callers for the same sidecar share one build.
+    """
+    index = _loaded.get(index_path)
+    if index is not None and index.meta['fingerprint'] == source_fingerprint:
+        _loaded.move_to_end(index_path)
+        return index, False
+    lock = _locks.setdefault(index_path, asyncio.Lock())
+    async with lock:
+        index = _loaded.get(index_path)
+        if index is not None and index.meta['fingerprint'] == source_fingerprint:
+            return index, False
+        index, built = await asyncio.to_thread(_load_or_build, index_path, source_fingerprint, records)
+        _loaded[index_path] = index
+        _loaded.move_to_end(index_path)
+        while len(_loaded) > max(_cache_size(), 1):
+            _loaded.popitem(last=False)
+    _locks.pop(index_path, None)
+    return index, built
@@ -0,0 +1,271 @@
+"""
+FACTEMICLI stdout parser and issue classifiers
+
+The JAR reports validation errors as <error> elements inside an <errors> block
+of its response XML, possibly tens of thousands of them. ErrorParser consumes
+stdout incrementally (as the subprocess writes it) and hands out each error
+message as soon as its closing tag arrives; it only keeps the unfinished tail,
+and a single message is capped at MAX_ERROR_CHARS, so memory stays bounded
+whatever the output size. Messages are turned into issue dicts by the
+classifiers in CLASSIFIERS (first match wins, JAR_ERROR otherwise); new issue
+codes are added with @classifier. Issues are located in the validated XML
+through its XmlLocator (core.xml_locator).
+"""
+import codecs
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Pattern, Tuple, Union
+
+from core import xml_locator
+
+MAX_ERROR_CHARS = 64 * 1024
+
+SUGGEST_COUNTRY_MAP = {
+    'CVE': 'CV',  # currency CVE mistaken as Country; should be CV
+    'CPV': 'CV',  # alpha-3 to alpha-2
+    'PRT': 'PT', 'ESP': 'ES', 'FRA': 'FR', 'DEU': 'DE', 'GBR': 'GB', 'ROU': 'RO',
+}
+
+_BLOCK_RE = re.compile(r'<errors>', re.IGNORECASE)
+_ITEM_RE = re.compile(r'<error>(.*?)</error>|(</errors>)', re.IGNORECASE | re.DOTALL)
+_ITEM_OPEN_RE = re.compile(r'<error>', re.IGNORECASE)
+_ITEM_CLOSE_RE = re.compile(r'</error>', re.IGNORECASE)
+_TAIL_KEEP = len('</errors>') - 1  # longest partial tag a chunk can end with
+
+
+class ErrorParser:
+    """Incremental extractor of <error> messages from the first <errors> block."""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buf = ''
+        self._in_block = False
+        self._done = False
+        self._long: Optional[str] = None  # head of an <error> longer than MAX_ERROR_CHARS
+        self.count = 0
+
+    def feed(self, data: Union[bytes, str]) -> List[str]:
+        """Consume a chunk of stdout; return the messages it completed."""
+        if self._done:
+            return []
+        text = self._decoder.decode(data) if isinstance(data, (bytes, bytearray)) else data
+        buf = self._buf + text
+        pos = 0
+        if not self._in_block:
+            m = _BLOCK_RE.search(buf)
+            if m is None:
+                self._buf = buf[-_TAIL_KEEP:]
+                return []
+            self._in_block = True
+            pos = m.end()
+        out: List[str] = []
+        while True:
+            if self._long is not None:
+                m = _ITEM_CLOSE_RE.search(buf, pos)
+                if m is None:
+                    self._buf = buf[-_TAIL_KEEP:]
+                    self.count += len(out)
+                    return out
+                out.append(self._long.strip())
+                self._long = None
+                pos = m.end()
+                continue
+            m = _ITEM_RE.search(buf, pos)
+            if m is None:
+                break
+            if m.group(2) is not None:  # </errors>
+                self._done = True
+                self._buf = ''
+                self.count += len(out)
+                return out
+            out.append(m.group(1)[:MAX_ERROR_CHARS].strip())
+            pos = m.end()
+        # Keep only an unfinished <error> (or a possible partial tag)
+        m = _ITEM_OPEN_RE.search(buf, pos)
+        if m is None:
+            self._buf = buf[max(pos, len(buf) - _TAIL_KEEP):]
+        elif len(buf) - m.end() > MAX_ERROR_CHARS:
+            self._long = buf[m.end():m.end() + MAX_ERROR_CHARS]
+            self._buf = buf[-_TAIL_KEEP:]
+        else:
+            self._buf = buf[m.start():]
+        self.count += len(out)
+        return out
+
+    def close(self) -> List[str]:
+        """Flush at end of output: an <error> still open (truncated output) is returned as is."""
+        out = self.feed(self._decoder.decode(b'', final=True))
+        if not self._done:
+            m = _ITEM_OPEN_RE.match(self._buf)
+            if self._long is not None:
+                out.append(self._long.strip())
+                self.count += 1
+            elif m:
+                out.append(self._buf[m.end():][:MAX_ERROR_CHARS].strip())
+                self.count += 1
+        self._long = None
+        self._buf = ''
+        self._done = True
+        return out
+
+
+def extract_errors(stdout: Union[bytes, str]) -> List[str]:
+    """All <error> messages of a complete stdout."""
+    parser = ErrorParser()
+    return parser.feed(stdout) + parser.close()
+
+
+# -- classifiers ------------------------------------------------------------
+# fn(match, message, locate) -> issue dict; locate() gives an xml_locator.Reader or None
+Classifier = Callable[[Any, str, Callable[[], Optional[xml_locator.Reader]]], Dict[str, Any]]
+CLASSIFIERS: List[Tuple[str, List[Pattern], Classifier, Optional[str]]] = []
+
+
+def classifier(code: str, *patterns: str, flags: int = 0, hint: Optional[str] = None):
+    """Register fn for messages matching any of `patterns` (tried in order).
+
+    `hint`, a literal every match contains (compared case-insensitively), lets
+    classify() skip the regexes for unrelated messages.
+    """
+    compiled = [re.compile(p, flags) for p in patterns]
+
+    def register(fn: Classifier) -> Classifier:
+        CLASSIFIERS.append((code, compiled, fn, hint.lower() if hint else None))
+        return fn
+    return register
+
+
+def classify(message: str, locate: Callable[[], Optional[xml_locator.Reader]] = lambda: None) -> Dict[str, Any]:
+    folded = None
+    for _, patterns, fn, hint in CLASSIFIERS:
+        if hint is not None:
+            if folded is None:
+                folded = message.lower()
+            if hint not in folded:
+                continue
+        for pattern in patterns:
+            m = pattern.search(message)
+            if m:
+                return fn(m, message, locate)
+    return {'code': 'JAR_ERROR', 'message': message}
+
+
+@classifier('INVALID_COUNTRY',
+            r"O valor \(\"(?P<val>[^\"]+)\"\) no elemento \"Country\" do \"Customer\" com id (?P<cid>[A-Za-z0-9_\-]+)",
+            hint='"Country"')
+def _invalid_country(m, message, locate):
+    bad, cid = m.group('val'), m.group('cid')
+    line = col = context = None
+    reader = locate()
+    if reader is not None:
+        try:
+            # Within the Customer record of that CustomerID, then the nearest <Country>bad</Country>
+            offset = reader.find_country(cid, bad) or 0
+            line, col = reader.line_col(offset)
+            context = reader.snippet(line, col)
+        except Exception:
+            line = col = context = None
+    return {
+        'code': 'INVALID_COUNTRY',
+        'message': message,
+        'customer_id': cid,
+        'value': bad,
+        'suggestion': SUGGEST_COUNTRY_MAP.get(bad),
+        'location': {'line': line, 'column': col, 'context': context},
+    }
+
+
+# Example: "Linha: 548869; coluna: 33; cvc-minLength-valid: Value '' with length = '0' is not facet-valid..."
+@classifier('EMPTY_TAX_EXEMPTION',
+            r"Linha:\s*(?P<line>\d+);\s*coluna:\s*(?P<col>\d+);\s*cvc-minLength-valid.*?element.*?SAFPTPortugueseTaxExemptionReason",
+            r"Linha:\s*(?P<line>\d+);\s*coluna:\s*(?P<col>\d+).*?TaxExemptionReason",
+            flags=re.IGNORECASE, hint='TaxExemptionReason')
+def _empty_tax_exemption(m, message, locate):
+    line, col = int(m.group('line')), int(m.group('col'))
+    location = {'line': line, 'column': col, 'context': None}
+    reader = locate()
+    if reader is not None:
+        try:
+            location['context'] = reader.snippet(line, col)
+            start = reader.line_offset(line)
+            if start is not None:
+                location.update(reader.element_at(start + max(col - 1, 0)))
+        except Exception:
+            pass
+    return {
+        'code': 'EMPTY_TAX_EXEMPTION',
+        'message': message,
+        'location': location,
+        'suggestions': [
+            {'label': 'M16 - Isento Artigo 14.º do RITI', 'reason': 'Isento Artigo 14.º do RITI (ou similar)', 'code': 'M16'},
+            {'label': 'M0 - Isento Artigo 9.º do RITI', 'reason': 'Isento Artigo 9.º do RITI (ou similar)', 'code': 'M0'},
+        ],
+    }
+
+
+# -- streams ------------------------------------------------------------------
+class IssueStream:
+    """Feed raw stdout chunks, get classified issues back as their <error> closes.
+
+    The XML is only indexed/opened the first time an issue needs a location;
+    call close() at the end (it returns the issues of any unterminated block).
+    """
+
+    def __init__(self, xml_path: Optional[str] = None, locator: Optional[xml_locator.XmlLocator] = None):
+        self.xml_path = xml_path
+        self.locator = locator
+        self.parser = ErrorParser()
+        self.counts: Dict[str, int] = {}
+        self._reader = None
+        self._reader_cm = None
+
+    def _locate(self) -> Optional[xml_locator.Reader]:
+        if self._reader is None:
+            self._reader = False
+            if self.xml_path:
+                try:
+                    if self.locator is None:
+                        self.locator = xml_locator.XmlLocator.build(self.xml_path)
+                    self._reader_cm = self.locator.reader(self.xml_path)
+                    self._reader = self._reader_cm.__enter__()
+                except (OSError, ValueError) as e:
+                    print(f"[JAR] sem indice de localizacao para {self.xml_path}: {e}")
+        return self._reader or None
+
+    def _classify(self, messages: List[str]) -> List[Dict[str, Any]]:
+        issues = [classify(msg, self._locate) for msg in messages]
+        for issue in issues:
+            self.counts[issue['code']] = self.counts.get(issue['code'], 0) + 1
+        return issues
+
+    def feed(self, data: Union[bytes, str]) -> List[Dict[str, Any]]:
+        return self._classify(self.parser.feed(data))
+
+    def add(self, messages: List[str]) -> List[Dict[str, Any]]:
+        """Classify messages that did not come from stdout (e.g. the schema pre-check)."""
+        return self._classify(messages)
+
+    def close(self) -> List[Dict[str, Any]]:
+        try:
+            return self._classify(self.parser.close())
+        finally:
+            if self._reader_cm is not None:
+                self._reader_cm.__exit__(None, None, None)
+            self._reader_cm = None
+            self._reader = None
+
+
+def iter_issues(chunks: Iterator[Union[bytes, str]], xml_path: Optional[str] = None,
+                locator: Optional[xml_locator.XmlLocator] = None) -> Iterator[Dict[str, Any]]:
+    stream = IssueStream(xml_path, locator)
+    try:
+        for chunk in chunks:
+            yield from stream.feed(chunk)
+    finally:
+        tail = stream.close()
+    yield from tail
+
+
+def detect_issues(stdout: Union[bytes, str], xml_path: Optional[str] = None,
+                  locator: Optional[xml_locator.XmlLocator] = None) -> List[Dict[str, Any]]:
+    """Issues for a complete stdout."""
+    return list(iter_issues([stdout], xml_path, locator))
@@ -0,0 +1,304 @@
+"""
+FACTEMICLI.jar worker pool - keeps warm JVMs around instead of a cold `java -jar` per request
+
+Each worker runs core/java/FactemiWorker.java, which loads FACTEMICLI.jar once and
+invokes its main class in-process per job. Workers are recycled after
+FACTEMICLI_POOL_MAX_JOBS jobs or when their RSS exceeds FACTEMICLI_POOL_MAX_RSS_MB.
+A worker that fails before a job is sent to it falls back to a cold `java -jar`
+spawn; once the job is sent it may have run (an `enviar` may have reached AT),
+so a failure from then on is raised as WorkerJobError and never re-run.
+
+Environment:
+    FACTEMICLI_POOL_SIZE        number of warm workers (default 0 = pool disabled)
+    FACTEMICLI_POOL_MAX_JOBS    jobs per worker before recycling (default 50)
+    FACTEMICLI_POOL_MAX_RSS_MB  RSS ceiling per worker in MB (default 1536)
+    FACTEMICLI_POOL_JAVA_OPTS   extra JVM options for workers (e.g. "-Xmx1g")
+"""
+import asyncio
+import os
+import shlex
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+WORKER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'java', 'FactemiWorker.java')
+STARTUP_TIMEOUT = 60
+STREAM_LIMIT = 1024 * 1024  # longest stdout line passed to on_line in one piece
+STREAM_BLOCK = 64 * 1024
+
+LineCallback = Optional[Callable[[bytes], None]]
+
+
+class WorkerJobError(RuntimeError):
+    """A warm worker failed after the job was sent to it; the job may have run."""
+
+
+@dataclass
+class JarResult:
+    """Outcome of a FACTEMICLI invocation (cold or warm)."""
+    returncode: Optional[int]
+    stdout: bytes
+    stderr: bytes
+    warm: bool = False
+    queue: Optional[Dict[str, Any]] = None  # filled in by core.jar_scheduler
+
+
+async def cold_run(cmd: List[str], timeout: float, on_line: LineCallback = None) -> JarResult:
+    """Spawn `cmd` as a fresh process and wait for it.
+
+    When on_line is given, stdout is read line by line as the process writes it
+    and each raw line is passed to the callback (the full output is still returned).
+
+    Raises:
+        asyncio.TimeoutError: If the process runs longer than timeout (it is killed)
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, limit=STREAM_LIMIT
+    )
+
+    def _emit(line: bytes, chunks: List[bytes]):
+        chunks.append(line)
+        on_line(line)
+
+    async def _pump_stdout() -> bytes:
+        # Blocks split into lines here: readline() drops buffered data on over-long lines
+        chunks: List[bytes] = []
+        tail = b''
+        while True:
+            block = await proc.stdout.read(STREAM_BLOCK)
+            if not block:
+                if tail:
+                    _emit(tail, chunks)
+                return b''.join(chunks)
+            *lines, tail = (tail + block).split(b'\n')
+            for line in lines:
+                _emit(line + b'\n', chunks)
+            if len(tail) >= STREAM_LIMIT:
+                # Line longer than STREAM_LIMIT: hand over what has arrived so far
+                _emit(tail, chunks)
+                tail = b''
+
+    async def _collect():
+        if on_line is None:
+            return await proc.communicate()
+        stdout, stderr, _ = await asyncio.gather(_pump_stdout(), proc.stderr.read(), proc.wait())
+        return stdout, stderr
+
+    try:
+        stdout, stderr = await asyncio.wait_for(_collect(), timeout=timeout)
+    except BaseException:  # timeout or cancellation: never leave the JVM running
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        raise
+    return JarResult(proc.returncode, stdout or b'', stderr or b'')
+
+
+class JarWorker:
+    """One warm JVM speaking the FactemiWorker line protocol."""
+
+    def __init__(self, jar_path: str):
+        self.jar_path = jar_path
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.jobs = 0
+
+    def _command(self) -> List[str]:
+        java_opts = shlex.split(os.getenv('FACTEMICLI_POOL_JAVA_OPTS', ''))
+        return ['java', *java_opts, '-Djava.security.manager=allow', '-cp', self.jar_path, WORKER_SOURCE, self.jar_path]
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            *self._command(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            line = await asyncio.wait_for(self.proc.stdout.readline(), timeout=STARTUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.kill()
+            raise RuntimeError('FACTEMICLI worker did not start in time')
+        except BaseException:
+            self.kill()
+            raise
+        if line.strip() != b'READY':
+            self.kill()
+            raise RuntimeError(f'FACTEMICLI worker failed to start: {line[:200]!r}')
+
+    async def run(self, args: List[str], timeout: float) -> JarResult:
+        """Send one job and wait for its reply.
+
+        Raises:
+            asyncio.TimeoutError: If the reply does not arrive within timeout
+            WorkerJobError: If the worker failed after the job was sent
+        """
+        if any('\n' in a or '\r' in a for a in args):
+            raise ValueError('arguments with newlines cannot be sent to a warm worker')
+        payload = f'JOB {len(args)}\n' + ''.join(a + '\n' for a in args)
+        sent = False
+
+        async def _exchange() -> JarResult:
+            nonlocal sent
+            sent = True  # from the first write on, the worker may run the job
+            self.proc.stdin.write(payload.encode('utf-8'))
+            await self.proc.stdin.drain()
+            header = (await self.proc.stdout.readline()).decode('ascii', 'replace').split()
+            if len(header) != 4 or header[0] != 'RC':
+                raise RuntimeError(f'unexpected worker reply: {header!r}')
+            rc, n_out, n_err = int(header[1]), int(header[2]), int(header[3])
+            stdout = await self.proc.stdout.readexactly(n_out)
+            stderr = await self.proc.stdout.readexactly(n_err)
+            return JarResult(rc, stdout, stderr, warm=True)
+
+        try:
+            result = await asyncio.wait_for(_exchange(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise
+        except Exception as e:
+            if sent:
+                raise WorkerJobError(f'worker failed after the job was sent ({e.__class__.__name__}: {e})') from e
+            raise
+        self.jobs += 1
+        return result
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    def rss_mb(self) -> Optional[float]:
+        """Resident set size of the worker JVM (Linux /proc only)."""
+        if not self.alive():
+            return None
+        try:
+            with open(f'/proc/{self.proc.pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+        return None
+
+    def kill(self):
+        if self.alive():
+            try:
+                self.proc.kill()
+            except ProcessLookupError:
+                pass
+
+
+class JarWorkerPool:
+    """Leases warm workers for FACTEMICLI jobs, one job per worker at a time."""
+
+    def __init__(self, jar_path: str, size: int, max_jobs: int = 50, max_rss_mb: float = 1536):
+        self.jar_path = jar_path
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self._idle: List[JarWorker] = []
+        self._sem = asyncio.Semaphore(size)
+        self.stats = {'warm': 0, 'cold': 0, 'spawned': 0, 'recycled': 0}
+
+    async def run(self, args: List[str], timeout: float, on_line: LineCallback = None) -> JarResult:
+        """Run FACTEMICLI with `args` on a warm worker, falling back to a cold spawn.
+
+        Warm workers return output in one piece, so on_line is replayed after the job.
+
+        Raises:
+            asyncio.TimeoutError: If the job exceeds timeout (the worker is discarded)
+            WorkerJobError: If the worker failed after the job was sent (not re-run cold)
+        """
+        async with self._sem:
+            worker = self._idle.pop() if self._idle else None
+            if worker is None or not worker.alive():
+                worker = await self._spawn()
+            if worker is None:
+                return await self._cold(args, timeout, on_line)
+            try:
+                result = await worker.run(args, timeout)
+            except (asyncio.TimeoutError, WorkerJobError) as e:
+                print(f"[JAR-POOL] worker discarded: {e.__class__.__name__}: {e}")
+                worker.kill()
+                raise
+            except Exception as e:
+                print(f"[JAR-POOL] worker failed before the job was sent ({e.__class__.__name__}: {e}); "
+                      "falling back to cold spawn")
+                worker.kill()
+                return await self._cold(args, timeout, on_line)
+            except BaseException:
+                # Cancelled mid-job: its reply is still due, so the worker cannot be reused
+                worker.kill()
+                raise
+            self.stats['warm'] += 1
+            self._release(worker)
+            if on_line is not None:
+                for line in result.stdout.splitlines(keepends=True):
+                    on_line(line)
+            return result
+
+    async def _spawn(self) -> Optional[JarWorker]:
+        worker = JarWorker(self.jar_path)
+        try:
+            await worker.start()
+        except Exception as e:
+            print(f"[JAR-POOL] could not start worker: {e}")
+            return None
+        self.stats['spawned'] += 1
+        return worker
+
+    async def _cold(self, args: List[str], timeout: float, on_line: LineCallback = None) -> JarResult:
+        self.stats['cold'] += 1
+        return await cold_run(['java', '-jar', self.jar_path, *args], timeout, on_line)
+
+    def _release(self, worker: JarWorker):
+        rss = worker.rss_mb()
+        if worker.jobs >= self.max_jobs or (rss is not None and rss > self.max_rss_mb):
+            self.stats['recycled'] += 1
+            worker.kill()
+            return
+        self._idle.append(worker)
+
+    def info(self) -> Dict[str, int]:
+        return {'size': self.size, 'idle': len(self._idle), **self.stats}
+
+    def shutdown(self):
+        while self._idle:
+            self._idle.pop().kill()
+
+
+_pools: Dict[str, JarWorkerPool] = {}
+
+
+def get_pool(jar_path: str) -> Optional[JarWorkerPool]:
+    """Return the process-wide pool for jar_path, or None when pooling is disabled."""
+    size = int(os.getenv('FACTEMICLI_POOL_SIZE', '0'))
+    if size <= 0:
+        return None
+    pool = _pools.get(jar_path)
+    if pool is None:
+        pool = JarWorkerPool(
+            jar_path,
+            size,
+            max_jobs=int(os.getenv('FACTEMICLI_POOL_MAX_JOBS', '50')),
+            max_rss_mb=float(os.getenv('FACTEMICLI_POOL_MAX_RSS_MB', '1536')),
+        )
+        _pools[jar_path] = pool
+    return pool
+
+
+async def run_jar_cmd(cmd: List[str], timeout: float, on_line: LineCallback = None) -> JarResult:
+    """Run a `java -jar <jar> ...` command, on a warm worker when the pool is enabled.
+
+    Commands of any other shape are spawned as-is.
+
+    Raises:
+        asyncio.TimeoutError: If the command exceeds timeout
+    """
+    if len(cmd) >= 3 and cmd[0] == 'java' and cmd[1] == '-jar' and os.path.isfile(cmd[2]):
+        pool = get_pool(cmd[2])
+        if pool is not None:
+            return await pool.run(list(cmd[3:]), timeout, on_line)
+    return await cold_run(cmd, timeout, on_line)
+
+
+def shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown()
+    _pools.clear()
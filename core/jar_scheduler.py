@@ -0,0 +1,201 @@
+"""
+FACTEMICLI.jar execution scheduler - bounds concurrent JVMs and queues the rest fairly
+
+Every JAR invocation goes through JarScheduler.run(). At most `limit` jobs run at
+once (sized from os.cpu_count() and available RAM); the rest wait in a two-level
+round-robin queue (per user, then per NIF inside a user) so one accountant
+validating twelve months cannot starve everyone else. When the queue is full the
+caller gets SchedulerBusy with a Retry-After estimate.
+
+Environment:
+    FACTEMICLI_MAX_CONCURRENT       hard override for the concurrency limit
+    FACTEMICLI_JOB_RAM_MB           RAM budget per running job (default 1024)
+    FACTEMICLI_MAX_QUEUE            max queued jobs overall (default 4 x limit)
+    FACTEMICLI_MAX_QUEUE_PER_USER   max queued jobs per user (default 3)
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from core.jar_pool import JarResult, LineCallback, run_jar_cmd
+
+
+class SchedulerBusy(Exception):
+    """Raised when a job cannot be queued; retry_after is in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _available_ram_mb() -> Optional[int]:
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_limit() -> int:
+    """Concurrency limit: min(CPUs, available RAM / per-job budget), at least 1."""
+    override = os.getenv('FACTEMICLI_MAX_CONCURRENT')
+    if override:
+        return max(1, int(override))
+    limit = os.cpu_count() or 1
+    ram = _available_ram_mb()
+    if ram is not None:
+        limit = min(limit, ram // int(os.getenv('FACTEMICLI_JOB_RAM_MB', '1024')))
+    return max(1, limit)
+
+
+class JarScheduler:
+    """Bounded, fair FIFO-per-key scheduler for JAR jobs."""
+
+    def __init__(self, limit: int, max_queue: int, max_queue_per_user: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self._running = 0
+        self._queued = 0
+        self._queued_by_user: Dict[str, int] = {}
+        # user -> nif -> waiters, both levels rotated round-robin
+        self._queues: "OrderedDict[str, OrderedDict[str, Deque[asyncio.Future]]]" = OrderedDict()
+        self._avg_seconds = 30.0
+
+    async def run(
+        self,
+        cmd: List[str],
+        timeout: float,
+        user: str,
+        nif: Optional[str] = None,
+        on_start: Optional[Callable[[], None]] = None,
+        on_line: LineCallback = None,
+    ) -> JarResult:
+        """Wait for a slot, run `cmd` via the worker pool and attach queue info to the result.
+
+        on_start fires once the slot is granted; on_line receives stdout lines.
+
+        Raises:
+            SchedulerBusy: If the global or per-user queue is full
+            asyncio.TimeoutError: If the JAR exceeds timeout
+        """
+        queued_at = time.monotonic()
+        position = await self.acquire(user, nif or '')
+        started = time.monotonic()
+        try:
+            if on_start is not None:
+                on_start()
+            result = await run_jar_cmd(cmd, timeout=timeout, on_line=on_line)
+        finally:
+            self._observe(time.monotonic() - started)
+            self.release()
+        result.queue = {'position': position, 'wait_ms': int((started - queued_at) * 1000)}
+        return result
+
+    async def acquire(self, user: str, nif: str) -> int:
+        """Take a run slot, waiting in the fair queue if needed.
+
+        Returns the queue position at enqueue time (0 = ran immediately).
+        """
+        if self._running < self.limit and self._queued == 0:
+            self._running += 1
+            return 0
+        if self._queued >= self.max_queue:
+            raise SchedulerBusy('Validation queue is full, try again later', self.retry_after())
+        if self._queued_by_user.get(user, 0) >= self.max_queue_per_user:
+            raise SchedulerBusy('Too many queued validations for this user', self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, OrderedDict()).setdefault(nif, deque()).append(fut)
+        self._queued += 1
+        self._queued_by_user[user] = self._queued_by_user.get(user, 0) + 1
+        position = self._queued
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed over just as the caller went away
+                self.release()
+            else:
+                self._remove(user, nif, fut)
+            raise
+        return position
+
+    def release(self):
+        """Hand the slot to the next fair waiter, or free it."""
+        fut = self._pop_next()
+        if fut is not None:
+            fut.set_result(None)
+        else:
+            self._running -= 1
+
+    def _pop_next(self) -> Optional[asyncio.Future]:
+        while self._queues:
+            user, nifs = next(iter(self._queues.items()))
+            self._queues.move_to_end(user)
+            nif, waiters = next(iter(nifs.items()))
+            nifs.move_to_end(nif)
+            fut = waiters.popleft()
+            self._forget(user, nif)
+            if not fut.done():
+                return fut
+        return None
+
+    def _remove(self, user: str, nif: str, fut: asyncio.Future):
+        waiters = self._queues.get(user, {}).get(nif)
+        if waiters is None or fut not in waiters:
+            return
+        waiters.remove(fut)
+        self._forget(user, nif)
+
+    def _forget(self, user: str, nif: str):
+        self._queued -= 1
+        self._queued_by_user[user] -= 1
+        if not self._queued_by_user[user]:
+            del self._queued_by_user[user]
+        nifs = self._queues[user]
+        if not nifs[nif]:
+            del nifs[nif]
+        if not nifs:
+            del self._queues[user]
+
+    def _observe(self, seconds: float):
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queued job would start."""
+        rounds = (self._queued + 1) / self.limit
+        return max(1, math.ceil(rounds * self._avg_seconds))
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'running': self._running,
+            'queued': self._queued,
+            'max_queue': self.max_queue,
+            'avg_job_seconds': round(self._avg_seconds, 1),
+        }
+
+
+_scheduler: Optional[JarScheduler] = None
+
+
+def get_scheduler() -> JarScheduler:
+    """Return the process-wide scheduler, creating it from the environment."""
+    global _scheduler
+    if _scheduler is None:
+        limit = default_limit()
+        _scheduler = JarScheduler(
+            limit,
+            max_queue=int(os.getenv('FACTEMICLI_MAX_QUEUE', str(4 * limit))),
+            max_queue_per_user=int(os.getenv('FACTEMICLI_MAX_QUEUE_PER_USER', '3')),
+        )
+    return _scheduler
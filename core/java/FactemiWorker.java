@@ -0,0 +1,115 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.util.jar.JarFile;
+
+/**
+ * Long-lived FACTEMICLI launcher driven by core/jar_pool.py.
+ *
+ * Loads FACTEMICLI.jar once and calls its Main-Class in-process for every job,
+ * so JVM startup, class loading and JIT warm-up are paid once per worker.
+ *
+ * Usage: java -Djava.security.manager=allow FactemiWorker.java /path/FACTEMICLI.jar
+ *
+ * Protocol (one job at a time):
+ *   worker -> "READY\n" once the JAR main class is loaded
+ *   python -> "JOB <argc>\n" followed by argc lines (one argument per line)
+ *   worker -> "RC <code> <stdout-bytes> <stderr-bytes>\n" + raw stdout + raw stderr
+ */
+public class FactemiWorker {
+
+    static final class ExitTrap extends SecurityException {
+        final int status;
+
+        ExitTrap(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    public static void main(String[] argv) throws Exception {
+        String jar = argv[0];
+        String mainClass;
+        try (JarFile jf = new JarFile(jar)) {
+            mainClass = jf.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+        ClassLoader loader = new URLClassLoader(new URL[] { new File(jar).toURI().toURL() },
+                FactemiWorker.class.getClassLoader());
+        Method entry = Class.forName(mainClass, true, loader).getMethod("main", String[].class);
+        trapExit();
+
+        PrintStream proto = new PrintStream(new FileOutputStream(FileDescriptor.out), false);
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        proto.print("READY\n");
+        proto.flush();
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (!line.startsWith("JOB ")) {
+                continue;
+            }
+            int argc = Integer.parseInt(line.substring(4).trim());
+            String[] args = new String[argc];
+            for (int i = 0; i < argc; i++) {
+                args[i] = in.readLine();
+            }
+            ByteArrayOutputStream out = new ByteArrayOutputStream();
+            ByteArrayOutputStream err = new ByteArrayOutputStream();
+            PrintStream origOut = System.out;
+            PrintStream origErr = System.err;
+            System.setOut(new PrintStream(out, true));
+            System.setErr(new PrintStream(err, true));
+            Thread.currentThread().setContextClassLoader(loader);
+            int rc = 0;
+            try {
+                entry.invoke(null, (Object) args);
+            } catch (InvocationTargetException e) {
+                Throwable cause = e.getCause();
+                if (cause instanceof ExitTrap) {
+                    rc = ((ExitTrap) cause).status;
+                } else {
+                    cause.printStackTrace();
+                    rc = 1;
+                }
+            } catch (ExitTrap e) {
+                rc = e.status;
+            } finally {
+                System.out.flush();
+                System.err.flush();
+                System.setOut(origOut);
+                System.setErr(origErr);
+            }
+            byte[] o = out.toByteArray();
+            byte[] e = err.toByteArray();
+            proto.print("RC " + rc + " " + o.length + " " + e.length + "\n");
+            proto.write(o);
+            proto.write(e);
+            proto.flush();
+        }
+    }
+
+    @SuppressWarnings("removal")
+    static void trapExit() {
+        // FACTEMICLI ends with System.exit(); turn it into an exception so the
+        // worker survives. Needs -Djava.security.manager=allow on JDK 18+.
+        System.setSecurityManager(new SecurityManager() {
+            @Override
+            public void checkPermission(java.security.Permission perm) {
+            }
+
+            @Override
+            public void checkExit(int status) {
+                throw new ExitTrap(status);
+            }
+        });
+    }
+}
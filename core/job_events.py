@@ -0,0 +1,88 @@
+"""
+In-process event buffers for background jobs, consumed as Server-Sent Events
+
+Each running job owns a JobEvents buffer. Producers call emit() from the event
+loop; any number of SSE subscribers follow() it and may resume from the last
+seen sequence number. Only the newest MAX_EVENTS are kept, so a chatty JAR
+cannot grow memory without bound.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+MAX_EVENTS = 5000
+RETENTION_SECONDS = 600
+HEARTBEAT_SECONDS = 15
+
+
+class JobEvents:
+    """Append-only, bounded event log with async followers."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.events: Deque[Tuple[int, str, Any]] = deque(maxlen=MAX_EVENTS)
+        self.seq = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def emit(self, event: str, data: Any = None):
+        self.seq += 1
+        self.events.append((self.seq, event, data))
+        self._wake()
+
+    def close(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def _wake(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[Optional[Tuple[int, str, Any]]]:
+        """Yield events with seq > after until the job closes.
+
+        Yields None every HEARTBEAT_SECONDS without news so callers can keep
+        proxies from timing the connection out.
+        """
+        while True:
+            for item in list(self.events):
+                if item[0] > after:
+                    after = item[0]
+                    yield item
+            if self.done:
+                return
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+
+
+def sse_format(item: Optional[Tuple[int, str, Any]]) -> str:
+    """Render one event (or a heartbeat for None) in text/event-stream format."""
+    if item is None:
+        return ': ping\n\n'
+    seq, event, data = item
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+_jobs: Dict[str, JobEvents] = {}
+
+
+def register(job_id: str) -> JobEvents:
+    """Create the buffer for a new job, pruning old finished ones."""
+    now = time.monotonic()
+    for jid in [j for j, ev in _jobs.items() if ev.done and now - ev.finished_at > RETENTION_SECONDS]:
+        del _jobs[jid]
+    ev = JobEvents(job_id)
+    _jobs[job_id] = ev
+    return ev
+
+
+def get(job_id: str) -> Optional[JobEvents]:
+    return _jobs.get(job_id)
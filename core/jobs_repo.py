@@ -0,0 +1,76 @@
+"""
+Validation Jobs Repository - MongoDB collection for background JAR validation jobs
+Keeps job status and final results so any worker (or a restarted one) can report them
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from core.deps import scoped_collection
+
+TERMINAL_STATUSES = ('done', 'failed', 'interrupted')
+
+
+class ValidationJobsRepo:
+    """Repository for validation_jobs collection
+
+    Document shape:
+    {
+      _id: str,                # job id (uuid hex)
+      username: str,
+      kind: str,               # e.g. 'validate-by-upload'
+      params: dict,            # upload_id, operation, ...
+      status: str,             # 'queued' | 'running' | 'done' | 'failed' | 'interrupted'
+      created_at: datetime,
+      updated_at: datetime,    # also refreshed periodically while running (heartbeat)
+      issues_count: int | None,
+      result: dict | None,     # endpoint-shaped response once done
+      error: str | None,
+    }
+    """
+
+    def __init__(self, db, country: str = 'pt'):
+        self.country = country
+        self.collection = scoped_collection(db, 'validation_jobs', country)
+
+    async def create_indexes(self):
+        """Create indexes (jobs expire after JOB_TTL_DAYS, default 7)"""
+        ttl = int(os.getenv('JOB_TTL_DAYS', '7')) * 86400
+        await self.collection.create_index('created_at', expireAfterSeconds=ttl)
+        await self.collection.create_index([('username', 1), ('created_at', -1)])
+
+    async def create(self, job_id: str, username: str, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        doc = {
+            '_id': job_id,
+            'username': username,
+            'kind': kind,
+            'params': params,
+            'status': 'queued',
+            'created_at': now,
+            'updated_at': now,
+            'issues_count': None,
+            'result': None,
+            'error': None,
+        }
+        await self.collection.insert_one(doc)
+        return doc
+
+    async def update(self, job_id: str, **fields):
+        """Set fields on a job and refresh updated_at"""
+        fields['updated_at'] = datetime.utcnow()
+        await self.collection.update_one({'_id': job_id}, {'$set': fields})
+
+    async def get(self, job_id: str, username: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({'_id': job_id, 'username': username})
+
+    async def mark_if_stale(self, doc: Dict[str, Any], stale_after: int) -> Dict[str, Any]:
+        """Flag a non-terminal job whose heartbeat stopped (e.g. worker restarted) as interrupted"""
+        if doc.get('status') in TERMINAL_STATUSES:
+            return doc
+        updated = doc.get('updated_at')
+        if updated and datetime.utcnow() - updated > timedelta(seconds=stale_after):
+            error = 'Worker stopped before the job finished; please resubmit'
+            await self.update(doc['_id'], status='interrupted', error=error)
+            doc = {**doc, 'status': 'interrupted', 'error': error}
+        return doc
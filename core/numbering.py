@@ -0,0 +1,85 @@
+"""
+Numbering checks for SalesInvoices series: gaps, duplicates, dates out of order
+
+Works on a DocumentIndex (core.doc_index), so it costs no XML parsing once the
+index exists: the index keeps every InvoiceNo ("FT A/123") as a series index
+and an integer sequence (int32/int64 columns), and its persisted 'number' sort
+order already lists each series contiguously in ascending sequence. That
+permutation is the per-series sorted index; check_numbering() walks it once:
+
+  NUMBER_GAP        numbers missing between the first and last of a series
+  DUPLICATE_NUMBER  the same number on more than one document
+  CANCELLED_REUSED  a number shared by a cancelled (status A) document and another
+  DATE_ORDER        a document dated before the previous number of its series
+  NUMBER_INVALID    an InvoiceNo without the "<series>/<number>" form
+
+Numbers before the first one in the file are not gaps: series carry over from
+earlier periods.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+from core.doc_index import DocumentIndex
+
+
+def _date(key: int) -> str:
+    return f'{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}'
+
+
+def check_numbering(index: DocumentIndex, max_issues: Optional[int] = None) -> Dict[str, Any]:
+    """Report: per-series summary, issue counts and issues (at most `max_issues` per code,
+    SAFT_NUMBERING_MAX_ISSUES, default 200)."""
+    if max_issues is None:
+        max_issues = int(os.getenv('SAFT_NUMBERING_MAX_ISSUES', '200'))
+    c = index.columns
+    series_col, seq_col, dates, status = c['series'], c['seq'], c['date'], c['status']
+    cancelled = {i for i, name in enumerate(index.statuses) if name == 'A'}
+    issues: List[Dict[str, Any]] = []
+    counts: Dict[str, int] = {}
+
+    def issue(code: str, series: str, message: str, **extra: Any) -> None:
+        n = counts[code] = counts.get(code, 0) + 1
+        if n <= max_issues:
+            issues.append({'level': 'error', 'code': code, 'message': message, 'series': series, **extra})
+
+    summary: Dict[str, Dict[str, Any]] = {}
+    current = -1
+    name = ''
+    prev_seq = prev_row = first = documents = missing = 0
+    invalid: List[int] = []
+    for row in index.sorts['number']:
+        sid = series_col[row]
+        if sid < 0:
+            invalid.append(row)
+            continue
+        seq = seq_col[row]
+        if sid != current:
+            if current >= 0:
+                summary[name] = {'documents': documents, 'first': first, 'last': prev_seq, 'missing': missing}
+            current, name = sid, index.series[sid]
+            first, documents, missing = seq, 1, 0
+            prev_seq, prev_row = seq, row
+            continue
+        documents += 1
+        if seq == prev_seq:
+            number = f'{name}/{seq}'
+            if status[row] in cancelled or status[prev_row] in cancelled:
+                issue('CANCELLED_REUSED', name, f'{number} is used by a cancelled document and another one',
+                      document=number)
+            else:
+                issue('DUPLICATE_NUMBER', name, f'{number} appears more than once', document=number)
+        elif seq > prev_seq + 1:
+            missing += seq - prev_seq - 1
+            lo, hi = prev_seq + 1, seq - 1
+            gap = f'{name}/{lo}' if lo == hi else f'{name}/{lo} to {name}/{hi}'
+            issue('NUMBER_GAP', name, f'{gap} missing', first=lo, last=hi)
+        if dates[row] < dates[prev_row] and dates[row]:
+            issue('DATE_ORDER', name, f'{name}/{seq} ({_date(dates[row])}) is dated before '
+                  f'{name}/{prev_seq} ({_date(dates[prev_row])})', document=f'{name}/{seq}')
+        prev_seq, prev_row = seq, row
+    if current >= 0:
+        summary[name] = {'documents': documents, 'first': first, 'last': prev_seq, 'missing': missing}
+    for row in invalid:
+        number = index.number(row)
+        issue('NUMBER_INVALID', number, f'InvoiceNo "{number}" has no "<series>/<number>" form', document=number)
+    return {'documents': index.count, 'series': summary, 'counts': counts, 'issues': issues}
@@ -0,0 +1,199 @@
+"""
+Local disk cache for storage objects fetched by Storage.fetch_to_local
+
+Files are content-addressed by (object key, ETag): <sha256(key)>-<sha256(etag)>.<ext>
+in OBJECT_CACHE_DIR. Every fetch revalidates with a HEAD (conditional, If-None-Match,
+when the ETag is already known), so an overwritten object is never served stale.
+Concurrent fetches of the same version share one download. Entries are evicted
+least-recently-used once the directory exceeds OBJECT_CACHE_MAX_MB; files handed
+out by fetch() are pinned until release() so a running JAR never loses its input.
+Files derived from an entry (e.g. a document index) are stored as sidecars,
+<entry>~<name>; they are not counted against the budget and go with their entry.
+
+Environment:
+    OBJECT_CACHE_DIR     cache directory (default <tmp>/saft_object_cache)
+    OBJECT_CACHE_MAX_MB  size budget in MB (default 2048; 0 keeps nothing after release)
+"""
+import asyncio
+import glob
+import hashlib
+import os
+import tempfile
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+TMP_PREFIX = '.part-'
+SIDECAR_SEP = '~'
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def not_modified(err: ClientError) -> bool:
+    code = str(err.response.get('Error', {}).get('Code', ''))
+    status = err.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in ('304', 'NotModified') or status == 304
+
+
+def precondition_failed(err: ClientError) -> bool:
+    code = str(err.response.get('Error', {}).get('Code', ''))
+    status = err.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in ('412', 'PreconditionFailed') or status == 412
+
+
+class ObjectCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()  # path -> size, LRU order
+        self._refs: Dict[str, int] = {}
+        self._current: Dict[str, Tuple[str, str]] = {}  # key -> (etag, path)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.size = 0
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Adopt files left by a previous process (oldest access first); drop partial downloads."""
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(TMP_PREFIX):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            if SIDECAR_SEP in name:
+                if not os.path.exists(path.split(SIDECAR_SEP, 1)[0]):
+                    self._unlink(path)
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found.append((st.st_atime, path, st.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self.size += size
+        self._evict()
+
+    def path_for(self, key: str, etag: str) -> str:
+        ext = os.path.splitext(key)[1][:16] or '.bin'
+        return os.path.join(self.root, f'{_digest(key)}-{_digest(etag)[:32]}{ext}')
+
+    def sidecar(self, path: str, name: str) -> str:
+        """Path for a file derived from the cached `path`, removed when `path` is."""
+        return f'{path}{SIDECAR_SEP}{name}'
+
+    async def fetch(self, key: str, head: Callable[[Optional[str]], Awaitable[Optional[str]]],
+                    download: Callable[[str, str], Awaitable[None]]) -> str:
+        """Return a pinned local path for `key`; call release(path) when done with it.
+
+        head(etag) returns the current ETag, or None when it still equals `etag`
+        (304). download(etag, target) writes that version of the object to target.
+        """
+        known = self._current.get(key)
+        etag = await head(known[0] if known else None)
+        if etag is None:
+            etag = known[0]
+        path = self.path_for(key, etag)
+        if known and known[1] != path:
+            self._forget(known[1])
+        self._current[key] = (etag, path)
+
+        if path in self._entries and os.path.exists(path):
+            self.hits += 1
+            self._entries.move_to_end(path)
+            self._pin(path)
+            return path
+        if path in self._entries:  # removed behind our back
+            self.size -= self._entries.pop(path)
+
+        flight = self._inflight.get(path)
+        if flight is None:
+            self.misses += 1
+            flight = asyncio.ensure_future(self._download(path, etag, download))
+            self._inflight[path] = flight
+            flight.add_done_callback(lambda _f, p=path: self._inflight.pop(p, None))
+        self._pin(path)  # before awaiting, so nothing evicts it between download and return
+        try:
+            await asyncio.shield(flight)
+        except BaseException:
+            self.release(path)
+            raise
+        self._entries.move_to_end(path)
+        return path
+
+    async def _download(self, path: str, etag: str, download):
+        tmp = os.path.join(self.root, f'{TMP_PREFIX}{uuid.uuid4().hex}')
+        try:
+            await download(etag, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        size = os.path.getsize(path)
+        self._entries[path] = size
+        self.size += size
+        self._evict(keep=path)
+
+    def _pin(self, path: str):
+        self._refs[path] = self._refs.get(path, 0) + 1
+
+    def release(self, path: str):
+        """Unpin a path returned by fetch(); it stays cached until evicted."""
+        refs = self._refs.get(path, 0) - 1
+        if refs > 0:
+            self._refs[path] = refs
+            return
+        self._refs.pop(path, None)
+        if path not in self._entries and path not in self._inflight:  # superseded while pinned
+            self._unlink(path)
+        self._evict()
+
+    def _forget(self, path: str):
+        """Drop a superseded version (deleted now, or on release if pinned)."""
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self.size -= size
+        if path not in self._refs:
+            self._unlink(path)
+
+    def _evict(self, keep: Optional[str] = None):
+        for path in list(self._entries):
+            if self.size <= self.max_bytes:
+                break
+            if path == keep or path in self._refs:
+                continue
+            self.size -= self._entries.pop(path)
+            self._unlink(path)
+
+    @staticmethod
+    def _unlink(path: str):
+        for target in [path] + glob.glob(glob.escape(path) + SIDECAR_SEP + '*'):
+            try:
+                os.unlink(target)
+            except OSError:
+                pass
+
+
+_default: Optional[ObjectCache] = None
+
+
+def default() -> ObjectCache:
+    global _default
+    if _default is None:
+        root = os.getenv('OBJECT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'saft_object_cache')
+        max_bytes = int(float(os.getenv('OBJECT_CACHE_MAX_MB', '2048')) * 1024 * 1024)
+        _default = ObjectCache(root, max_bytes)
+    return _default
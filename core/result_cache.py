@@ -0,0 +1,178 @@
+"""
+Validation result cache - reuse FACTEMICLI 'validar' results for byte-identical files
+
+Key = SHA-256 over (file SHA-256, JAR fingerprint, operation, user, AT password
+hash), so a new FACTEMICLI.jar, a different user or a changed password never
+sees a stale/foreign result. Only definitive outcomes are stored (is_definitive):
+a clean exit or the file's own validation errors, never a timeout, a crash or an
+AT authentication/connection failure, which may pass on the next try.
+Two tiers: a small in-process LRU and a Mongo collection with a TTL index
+(created at startup); both treat entries older than RESULT_CACHE_TTL_HOURS as
+misses, since the TTL monitor only runs once a minute. Archive fields
+(storage_key, validation_id, ...) belong to the run that archived and are not
+cached. Only 'validar' is ever cached; 'enviar' must always reach the AT.
+
+Environment:
+    RESULT_CACHE_ENABLED    '0' disables the cache (default '1')
+    RESULT_CACHE_SIZE       in-process LRU entries (default 128)
+    RESULT_CACHE_TTL_HOURS  entry lifetime (default 24)
+"""
+import copy
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from core.deps import scoped_collection
+
+CACHEABLE_OPERATIONS = ('validar',)
+STDOUT_LIMIT = 10000
+HASH_BLOCK = 1024 * 1024
+# Response keys never cached: per-request, or tied to the run that archived the file
+UNCACHED_KEYS = ('queue', 'transcript', 'cached', 'response_xml',
+                 'storage_key', 'validation_id', 'archived', 'save_error')
+
+# JAR outcomes that depend on AT or the network rather than on the file
+_TRANSIENT_RESPONSE = re.compile(r'<response\s+code="(?:401|403|407|408|429|5\d\d)"', re.IGNORECASE)
+_TRANSPORT_ERROR = re.compile(r'\b(?:java\.net|javax\.net\.ssl)\.\w+(?:Exception|Error)\b')
+
+
+def ttl_seconds() -> int:
+    return int(os.getenv('RESULT_CACHE_TTL_HOURS', '24')) * 3600
+
+
+def enabled() -> bool:
+    return os.getenv('RESULT_CACHE_ENABLED', '1') not in ('0', 'false', 'no')
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in fixed-size blocks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def jar_fingerprint(jar_path: str) -> Optional[str]:
+    """Identify the installed JAR by size and mtime (None if missing)."""
+    try:
+        st = os.stat(jar_path)
+    except OSError:
+        return None
+    return f'{st.st_size}:{int(st.st_mtime)}'
+
+
+def cache_key(file_hash: str, jar_path: str, operation: str, username: str,
+              password: Optional[str] = None) -> Optional[str]:
+    """Return the cache key, or None when the request must not be cached.
+
+    `password` is the AT password the JAR runs with (None for an anonymous run).
+    """
+    if operation not in CACHEABLE_OPERATIONS or not enabled():
+        return None
+    fp = jar_fingerprint(jar_path)
+    if fp is None:
+        return None
+    credential = hashlib.sha256(password.encode('utf-8')).hexdigest() if password else '-'
+    raw = '|'.join([file_hash, fp, operation, username, credential])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def is_definitive(response: Dict[str, Any], output: Optional[str] = None) -> bool:
+    """True if a JAR response depends only on the file: a clean exit, or its validation issues.
+
+    `output` is the complete JAR stdout + stderr (the response may hold a
+    truncated stdout); AT authentication, throttling or server errors and Java
+    network exceptions in it make the outcome transient.
+    """
+    if response.get('returncode') is None or response.get('timeout') or response.get('error'):
+        return False
+    if output is None:
+        output = (response.get('stdout') or '') + (response.get('stderr') or '')
+    if _TRANSIENT_RESPONSE.search(output) or _TRANSPORT_ERROR.search(output):
+        return False
+    return response['returncode'] == 0 or bool(response.get('issues'))
+
+
+class _LRU:
+    """Entries keep the time.time() they were stored at and expire after ttl_seconds()."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > ttl_seconds():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, value: Dict[str, Any], stored_at: Optional[float] = None):
+        self._data[key] = (time.time() if stored_at is None else stored_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+
+_memory = _LRU(int(os.getenv('RESULT_CACHE_SIZE', '128')))
+
+
+class ValidationResultCache:
+    """Two-tier (LRU + Mongo TTL) store for JAR validation responses"""
+
+    def __init__(self, db, country: str = 'pt'):
+        self.collection = scoped_collection(db, 'validation_cache', country)
+
+    async def create_indexes(self):
+        """TTL index on created_at (called once at startup)"""
+        await self.collection.create_index('created_at', expireAfterSeconds=ttl_seconds())
+
+    async def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached response flagged with cached=True, or None."""
+        if not key:
+            return None
+        value = _memory.get(key)
+        if value is None:
+            try:
+                doc = await self.collection.find_one({'_id': key})
+            except Exception as e:
+                print(f"[CACHE] lookup failed: {e}")
+                doc = None
+            if not doc:
+                return None
+            created_at = doc.get('created_at')
+            if not isinstance(created_at, datetime) or \
+                    datetime.utcnow() - created_at > timedelta(seconds=ttl_seconds()):
+                return None  # expired, the TTL monitor has not removed it yet
+            value = doc['response']
+            # Expires in memory when the Mongo entry does
+            _memory.put(key, value, time.time() - (datetime.utcnow() - created_at).total_seconds())
+        out = copy.deepcopy(value)
+        out['cached'] = True
+        return out
+
+    async def put(self, key: Optional[str], response: Dict[str, Any], output: Optional[str] = None):
+        """Store the cacheable subset of an endpoint response, if it is definitive (see is_definitive)."""
+        if not key or not is_definitive(response, output):
+            return
+        value = {k: v for k, v in response.items() if k not in UNCACHED_KEYS}
+        stdout = value.get('stdout') or ''
+        if len(stdout) > STDOUT_LIMIT:
+            value['stdout'] = stdout[:STDOUT_LIMIT] + '\n... [truncated]'
+        _memory.put(key, value)
+        try:
+            await self.collection.replace_one(
+                {'_id': key},
+                {'_id': key, 'created_at': datetime.utcnow(), 'response': value},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"[CACHE] store failed: {e}")
@@ -4,8 +4,9 @@ SAFT File Archiver - Utilities for compressing and storing SAFT files
 import os
 import zipfile
 import re
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional, Tuple
+from typing import BinaryIO, Dict, Any, Iterator, Optional, Tuple
 from pathlib import Path
 
 
@@ -50,6 +51,41 @@ def compress_xml_to_zip(xml_path: str, zip_path: str, original_filename: Optiona
     return os.path.getsize(zip_path)
 
 
+def find_xml_member(zf: zipfile.ZipFile) -> Optional[zipfile.ZipInfo]:
+    """
+    First .xml member of an archive (the SAFT written by compress_xml_to_zip), or None
+    """
+    for info in zf.infolist():
+        if not info.is_dir() and info.filename.lower().endswith('.xml'):
+            return info
+    return None
+
+
+@contextmanager
+def open_saft_xml(path: str) -> Iterator[BinaryIO]:
+    """
+    Open the SAFT XML in `path` for streaming reads, whether it is a plain XML file
+    or a ZIP archive holding it.
+
+    For archives the member is decompressed on the fly by ZipFile.open(), so the
+    XML is never extracted to disk nor read whole into memory; feed the handle to
+    an incremental parser (ET.iterparse / XMLPullParser).
+
+    Raises:
+        ValueError: the archive has no XML member
+    """
+    if not zipfile.is_zipfile(path):
+        with open(path, 'rb') as f:
+            yield f
+        return
+    with zipfile.ZipFile(path) as zf:
+        info = find_xml_member(zf)
+        if info is None:
+            raise ValueError('No XML file found in ZIP')
+        with zf.open(info) as member:
+            yield member
+
+
 def generate_storage_key(nif: str, year: str, month: str, filename: str, country: str = 'pt') -> str:
     """
     Generate B2/S3 object key for storing ZIP file
@@ -0,0 +1,185 @@
+"""
+Batch fix engine for SAF-T uploads
+
+Resolves every requested fix to byte ranges through the file's XmlLocator
+(core.xml_locator) and then rewrites the file in a single streaming copy:
+untouched bytes are copied block by block and each range is replaced on the
+way, so the cost is one sequential pass however many fixes there are. Each
+fix gets an outcome: applied, not_found, invalid, duplicate (an earlier fix
+already made the same change) or conflict (overlaps a different change).
+
+Supported fixes, as returned by issue detection:
+    INVALID_COUNTRY      customer_id, value, suggestion
+    EMPTY_TAX_EXEMPTION  location.line, selected_suggestion.{reason, code}
+"""
+import codecs
+import os
+import re
+import shutil
+import uuid
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from core.xml_locator import Reader
+
+COPY_BLOCK = 1024 * 1024
+TAX_CODE_LOOKAHEAD = 5  # lines, counting the TaxExemptionReason one
+
+Edit = Tuple[int, int, bytes]  # replace [start, end) with bytes
+
+_ENCODING_RE = re.compile(rb'<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+_EMPTY_REASON_RE = re.compile(rb'<TaxExemptionReason\s*/>', re.IGNORECASE)
+_EMPTY_CODE_RE = re.compile(rb'<TaxExemptionCode\s*/>', re.IGNORECASE)
+
+
+def file_encoding(reader: Reader) -> str:
+    """Encoding from the XML declaration (utf-8 when absent or unknown)."""
+    m = _ENCODING_RE.match(reader.mm, 0, 256)
+    if m:
+        try:
+            return codecs.lookup(m.group(1).decode('ascii')).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+class FixPlan:
+    """Edits and per-fix outcomes for one batch, in request order."""
+
+    def __init__(self, reader: Reader):
+        self.reader = reader
+        self.encoding = file_encoding(reader)
+        self.outcomes: List[Dict[str, Any]] = []
+        self._edits: Dict[Tuple[int, int], bytes] = {}
+        self._starts: List[int] = []  # sorted starts of claimed ranges
+        self._ends: Dict[int, int] = {}  # start -> end of claimed ranges
+
+    def _text(self, value: str) -> bytes:
+        return escape(value).encode(self.encoding, errors='xmlcharrefreplace')
+
+    def _claim(self, edits: List[Edit]) -> str:
+        """Register a fix's edits atomically; return its status."""
+        if not edits:
+            return 'not_found'
+        if all(self._edits.get((s, e)) == data for s, e, data in edits):
+            return 'duplicate'
+        for s, e, _ in edits:
+            i = bisect_left(self._starts, s)
+            if i < len(self._starts) and self._starts[i] < max(e, s + 1):
+                return 'conflict'
+            if i > 0 and self._ends[self._starts[i - 1]] > s:
+                return 'conflict'
+        for s, e, data in edits:
+            self._edits[(s, e)] = data
+            self._ends[s] = e
+            self._starts.insert(bisect_left(self._starts, s), s)
+        return 'applied'
+
+    def add(self, fix: Any) -> Dict[str, Any]:
+        code = fix.get('code') if isinstance(fix, dict) else None
+        outcome = {'index': len(self.outcomes), 'code': code, 'status': 'invalid', 'replacements': 0}
+        self.outcomes.append(outcome)
+        edits: Optional[List[Edit]] = None
+        if code == 'INVALID_COUNTRY' and fix.get('suggestion') and fix.get('customer_id') and fix.get('value'):
+            edits = self._country(fix['customer_id'], fix['value'], fix['suggestion'])
+        elif code == 'EMPTY_TAX_EXEMPTION' and isinstance(fix.get('selected_suggestion'), dict):
+            selected = fix['selected_suggestion']
+            line = (fix.get('location') or {}).get('line')
+            if isinstance(line, int) and line > 0 and selected.get('reason') and selected.get('code'):
+                edits = self._tax_exemption(line, selected['reason'], selected['code'])
+        if edits is not None:
+            outcome['status'] = self._claim(edits)
+            if outcome['status'] == 'applied':
+                outcome['replacements'] = 1 if code == 'EMPTY_TAX_EXEMPTION' else len(edits)
+        return outcome
+
+    def _country(self, customer_id: str, bad_value: str, new_value: str) -> List[Edit]:
+        """<Country>bad</Country> after the CustomerID inside that Customer record, or
+        (customer not found) every <Country>bad</Country> in the file."""
+        mm = self.reader.mm
+        locator = self.reader.locator
+        p = re.escape(locator.prefix)
+        value = re.compile(rb'(<' + p + rb'Country>)\s*' + re.escape(bad_value.encode('utf-8')) + rb'\s*</' + p + rb'Country>',
+                           re.IGNORECASE)
+        new = self._text(new_value)
+        closing = len(b'</' + locator.prefix + b'Country>')
+        span = locator.customer_span(customer_id)
+        if span is not None:
+            m = value.search(mm, *span)
+            return [(m.end(1), m.end() - closing, new)] if m else []
+        return [(m.end(1), m.end() - closing, new) for m in value.finditer(mm)]
+
+    def _tax_exemption(self, line: int, reason: str, code: str) -> List[Edit]:
+        """Fill the empty TaxExemptionReason on `line` and the next empty TaxExemptionCode."""
+        start = self.reader.line_offset(line)
+        if start is None:
+            return []
+        mm = self.reader.mm
+        end = mm.find(b'\n', start)
+        end = len(mm) if end < 0 else end
+        edits = [(m.start(), m.end(), b'<TaxExemptionReason>' + self._text(reason) + b'</TaxExemptionReason>')
+                 for m in _EMPTY_REASON_RE.finditer(mm, start, end)]
+        if not edits:
+            return []
+        limit = self.reader.line_offset(line + TAX_CODE_LOOKAHEAD)
+        m = _EMPTY_CODE_RE.search(mm, start, len(mm) if limit is None else limit)
+        if m is None:
+            return []
+        return edits + [(m.start(), m.end(), b'<TaxExemptionCode>' + self._text(code) + b'</TaxExemptionCode>')]
+
+    def edits(self) -> List[Edit]:
+        return sorted((s, e, data) for (s, e), data in self._edits.items())
+
+
+def unresolved(fixes: List[Any]) -> List[Dict[str, Any]]:
+    """Outcomes for a batch that could not be resolved at all (file not indexable)."""
+    return [{'index': i, 'code': fix.get('code') if isinstance(fix, dict) else None,
+             'status': 'not_found', 'replacements': 0} for i, fix in enumerate(fixes)]
+
+
+def plan_fixes(reader: Reader, fixes: List[Any]) -> FixPlan:
+    plan = FixPlan(reader)
+    for fix in fixes:
+        plan.add(fix)
+    return plan
+
+
+def apply_edits(path: str, edits: List[Edit]) -> None:
+    """Rewrite `path` with sorted, non-overlapping edits in one streaming pass (atomic rename)."""
+    tmp = os.path.join(os.path.dirname(os.path.abspath(path)), f'.{os.path.basename(path)}.{uuid.uuid4().hex}.tmp')
+    try:
+        with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+            pos = 0
+            for start, end, data in edits:
+                remaining = start - pos
+                while remaining > 0:
+                    block = src.read(min(COPY_BLOCK, remaining))
+                    if not block:
+                        break
+                    dst.write(block)
+                    remaining -= len(block)
+                dst.write(data)
+                src.seek(end)
+                pos = end
+            shutil.copyfileobj(src, dst, COPY_BLOCK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def apply_fixes(path: str, locator, fixes: List[Any]) -> Tuple[int, List[Dict[str, Any]]]:
+    """Apply `fixes` to the file indexed by `locator`; return (replacements, outcomes).
+
+    The file is only rewritten when at least one fix applies.
+    """
+    with locator.reader(path) as reader:
+        plan = plan_fixes(reader, fixes)
+        edits = plan.edits()
+    if edits:
+        apply_edits(path, edits)
+    return sum(o['replacements'] for o in plan.outcomes), plan.outcomes
@@ -0,0 +1,345 @@
+"""
+Hash-chain verification for SAF-T PT documents
+
+Every signed document carries Hash = base64(RSA-SHA1 signature of
+"Date;SystemEntryDate;DocumentNo;GrossTotal;PreviousHash"), PreviousHash being
+the Hash of the document before it in the same series (empty for the first
+document of a series). verify_chain() streams SalesInvoices, WorkingDocuments
+and Payments once, groups the documents by series ("FT A" of "FT A/123") and
+keeps only the last document of each series, so memory does not depend on the
+number of documents. It checks, per series:
+
+  SERIES_ORDER          numbers, dates and SystemEntryDate go forward
+  HASH_MISSING          signed sections (not Payments) have a Hash
+  HASH_CONTROL_INVALID  HashControl is a key version ("1", "1-FTM FT/12", ...)
+  HASH_CONTROL_CHANGED  the key version never goes back
+  HASH_INVALID          the signature matches the chain (with a public key)
+
+Documents integrated from other software (DocumentStatus/SourceBilling 'I')
+carry Hash "0" and are not part of the exporting software's chain: they are
+counted per series but neither checked nor chained. Recovered/manual documents
+('M') are signed by the software like its own and are verified.
+
+Signatures are checked in batches on a process pool shared by all requests
+(one per public key, started on first use and stopped by shutdown_pools();
+SAFT_HASH_WORKERS processes, default one per CPU; 0 or 1 checks in-process). The signed string uses the
+values as written in the file. The first document of a series whose number is
+not 1 chains to a previous period and is counted as unverified.
+"""
+import base64
+import hashlib
+import io
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Any, BinaryIO, Dict, List, NamedTuple, Optional, Tuple, Union
+
+Source = Union[str, bytes, BinaryIO]
+
+BATCH_SIZE = 4096
+
+
+class SectionSpec(NamedTuple):
+    document: str
+    number: str
+    date: str
+    signed: bool
+
+
+SECTIONS: Dict[str, SectionSpec] = {
+    'SalesInvoices': SectionSpec('Invoice', 'InvoiceNo', 'InvoiceDate', True),
+    'WorkingDocuments': SectionSpec('WorkDocument', 'DocumentNumber', 'WorkDate', True),
+    'Payments': SectionSpec('Payment', 'PaymentRefNo', 'TransactionDate', False),
+}
+
+_NUMBER_RE = re.compile(r'(?P<series>[^ ]+ [^/ ]+)/(?P<seq>[0-9]+)$')
+_CONTROL_RE = re.compile(r'(?P<version>[0-9]+)(-.+)?$')
+
+
+class Document(NamedTuple):
+    section: str
+    number: str
+    date: str
+    entry: str  # SystemEntryDate
+    gross: str
+    hash: str
+    control: str
+    source: str = 'P'  # DocumentStatus/SourceBilling (SourcePayment for Payments)
+
+
+class _Series:
+    __slots__ = ('name', 'section', 'documents', 'seq', 'number', 'date', 'entry', 'hash', 'version',
+                 'first', 'verified', 'invalid', 'unverified', 'integrated', 'batch')
+
+    def __init__(self, name: str, section: str):
+        self.name = name
+        self.section = section
+        self.documents = 0
+        self.seq = self.version = -1
+        self.number = self.date = self.entry = self.first = ''
+        self.hash: Optional[str] = None  # None until the chain can be followed
+        self.verified = self.invalid = self.unverified = self.integrated = 0
+        self.batch: List[Tuple[str, bytes, str]] = []
+
+    def summary(self) -> Dict[str, Any]:
+        return {'section': self.section, 'documents': self.documents, 'first': self.first, 'last': self.number,
+                'verified': self.verified, 'invalid': self.invalid, 'unverified': self.unverified,
+                'integrated': self.integrated}
+
+
+# -- signature workers --------------------------------------------------------------
+_KEY = None
+
+
+def _init_worker(pem: bytes) -> None:
+    global _KEY
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+    _KEY = load_pem_public_key(pem)
+
+
+def _verify_batch(items: List[Tuple[str, bytes, str]]) -> List[str]:
+    """Numbers of the documents in `items` (number, signed bytes, Hash) whose signature does not verify."""
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+    pkcs1, sha1 = padding.PKCS1v15(), hashes.SHA1()
+    bad = []
+    for number, message, signature in items:
+        try:
+            _KEY.verify(base64.b64decode(signature, validate=True), message, pkcs1, sha1)
+        except (InvalidSignature, ValueError):
+            bad.append(number)
+    return bad
+
+
+_pools: Dict[str, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(public_key: bytes, workers: int) -> ProcessPoolExecutor:
+    """The shared signature pool for `public_key`, started on first use."""
+    key = hashlib.sha256(public_key).hexdigest()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+                                                     initializer=_init_worker, initargs=(public_key,))
+        return pool
+
+
+def shutdown_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
+
+
+def load_public_key(path: Optional[str] = None) -> Optional[bytes]:
+    """PEM bytes of the software's public key (SAFT_HASH_PUBLIC_KEY), or None when not configured."""
+    path = path or os.getenv('SAFT_HASH_PUBLIC_KEY')
+    if not path:
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# -- streaming pass ------------------------------------------------------------------
+def iter_documents(source: Source):
+    """Yield a Document for every Invoice, WorkDocument and Payment, in file order.
+
+    Raises:
+        ET.ParseError: If XML is not well-formed
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    names: Dict[str, str] = {}
+    stack: List[Any] = []
+    path: List[str] = []
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        name = names.get(elem.tag)
+        if name is None:
+            name = names[elem.tag] = elem.tag.rpartition('}')[2]
+        if event == 'start':
+            stack.append(elem)
+            path.append(name)
+            continue
+        stack.pop()
+        path.pop()
+        depth = len(stack)
+        if depth == 3 and path[1] == 'SourceDocuments':
+            spec = SECTIONS.get(path[2])
+            if spec is not None and name == spec.document:
+                yield _document(elem, path[2], spec, names)
+        # Drop finished siblings, as saft_documents.iter_records does
+        if 0 < depth < 3 or (depth == 3 and path[1] != 'MasterFiles'):
+            stack[-1].clear()
+
+
+def _document(elem, section: str, spec: SectionSpec, names: Dict[str, str]) -> Document:
+    fields = {'number': '', 'date': '', 'entry': '', 'gross': '', 'hash': '', 'control': '', 'source': 'P'}
+    for child in elem:
+        name = names.get(child.tag) or child.tag.rpartition('}')[2]
+        if name == spec.number:
+            fields['number'] = (child.text or '').strip()
+        elif name == spec.date:
+            fields['date'] = (child.text or '').strip()
+        elif name == 'SystemEntryDate':
+            fields['entry'] = (child.text or '').strip()
+        elif name == 'Hash':
+            fields['hash'] = (child.text or '').strip()
+        elif name == 'HashControl':
+            fields['control'] = (child.text or '').strip()
+        elif name == 'DocumentStatus':
+            for status in child:
+                if status.tag.endswith(('SourceBilling', 'SourcePayment')):
+                    fields['source'] = (status.text or '').strip() or 'P'
+        elif name == 'DocumentTotals':
+            for total in child:
+                if total.tag.endswith('GrossTotal'):
+                    fields['gross'] = (total.text or '').strip()
+    return Document(section, **fields)
+
+
+# -- verifier ------------------------------------------------------------------------
+class ChainVerifier:
+    """Feed Documents in file order with add(); finish() returns the report.
+
+    With `public_key` (PEM bytes) signatures are verified; at most `max_issues`
+    issues (SAFT_HASH_MAX_ISSUES, default 200) are kept per code, counts are
+    always complete.
+    """
+
+    def __init__(self, public_key: Optional[bytes] = None, workers: Optional[int] = None,
+                 max_issues: Optional[int] = None):
+        if workers is None:
+            workers = int(os.getenv('SAFT_HASH_WORKERS') or os.cpu_count() or 1)
+        if max_issues is None:
+            max_issues = int(os.getenv('SAFT_HASH_MAX_ISSUES', '200'))
+        self.public_key = public_key
+        self.max_issues = max_issues
+        self.series: Dict[str, _Series] = {}
+        self.issues: List[Dict[str, Any]] = []
+        self.counts: Dict[str, int] = {}
+        self.documents = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[Future, Tuple[_Series, int]] = {}
+        self._workers = workers
+        if public_key is not None:
+            if workers > 1:
+                self._pool = get_pool(public_key, workers)
+            else:
+                _init_worker(public_key)
+
+    def _issue(self, code: str, series: _Series, number: str, message: str) -> None:
+        n = self.counts[code] = self.counts.get(code, 0) + 1
+        if n <= self.max_issues:
+            self.issues.append({'level': 'error', 'code': code, 'message': message,
+                                'series': series.name, 'document': number})
+
+    def add(self, doc: Document) -> None:
+        self.documents += 1
+        m = _NUMBER_RE.match(doc.number)
+        name, seq = (m.group('series'), int(m.group('seq'))) if m else (doc.number, -1)
+        key = f'{doc.section}:{name}'
+        s = self.series.get(key)
+        if s is None:
+            s = self.series[key] = _Series(name, doc.section)
+            s.first = doc.number
+            s.hash = '' if seq == 1 else None
+        s.documents += 1
+        if s.documents > 1:
+            if 0 <= seq <= s.seq:
+                self._issue('SERIES_ORDER', s, doc.number, f'{doc.number} comes after {s.number} in the file')
+            elif doc.date < s.date or doc.entry < s.entry:
+                self._issue('SERIES_ORDER', s, doc.number,
+                            f'{doc.number} ({doc.date}, {doc.entry}) is dated before {s.number} ({s.date}, {s.entry})')
+        signed = SECTIONS[doc.section].signed
+        if signed and doc.source == 'I':
+            # Integrated from other software: Hash "0", outside this software's chain
+            s.integrated += 1
+            s.seq, s.number, s.date, s.entry = seq, doc.number, doc.date, doc.entry
+            return
+        if signed:
+            self._check_control(s, doc)
+            if not doc.hash or doc.hash == '0':
+                self._issue('HASH_MISSING', s, doc.number, f'{doc.number} has no Hash')
+            elif self.public_key is not None:
+                if s.hash is None:
+                    s.unverified += 1
+                else:
+                    message = f'{doc.date};{doc.entry};{doc.number};{doc.gross};{s.hash}'.encode('utf-8')
+                    s.batch.append((doc.number, message, doc.hash))
+                    if len(s.batch) >= BATCH_SIZE:
+                        self._submit(s)
+        s.seq, s.number, s.date, s.entry, s.hash = seq, doc.number, doc.date, doc.entry, doc.hash
+
+    def _check_control(self, s: _Series, doc: Document) -> None:
+        m = _CONTROL_RE.match(doc.control)
+        if m is None:
+            self._issue('HASH_CONTROL_INVALID', s, doc.number,
+                        f'HashControl "{doc.control}" of {doc.number} is not a key version')
+            return
+        version = int(m.group('version'))
+        if version < s.version:
+            self._issue('HASH_CONTROL_CHANGED', s, doc.number,
+                        f'{doc.number} uses key version {version} after version {s.version}')
+        s.version = max(s.version, version)
+
+    def _submit(self, s: _Series) -> None:
+        batch, s.batch = s.batch, []
+        if self._pool is None:
+            self._collect(s, len(batch), _verify_batch(batch))
+            return
+        # Bounded in flight: the parse stays at most a couple of batches per worker ahead
+        while len(self._pending) >= self._workers * 2:
+            done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._collect(*self._pending.pop(future), future.result())
+        self._pending[self._pool.submit(_verify_batch, batch)] = (s, len(batch))
+
+    def _collect(self, s: _Series, size: int, bad: List[str]) -> None:
+        s.invalid += len(bad)
+        s.verified += size - len(bad)
+        for number in bad:
+            self._issue('HASH_INVALID', s, number, f'The Hash of {number} does not verify against the previous document')
+
+    def finish(self) -> Dict[str, Any]:
+        try:
+            for s in self.series.values():
+                if s.batch:
+                    self._submit(s)
+            for future in list(self._pending):
+                self._collect(*self._pending.pop(future), future.result())
+        finally:
+            self.close()
+        return {
+            'documents': self.documents,
+            'signatures_checked': self.public_key is not None,
+            'series': {s.name if s.section == 'SalesInvoices' else f'{s.section}:{s.name}': s.summary()
+                       for s in self.series.values()},
+            'counts': dict(self.counts),
+            'issues': self.issues,
+        }
+
+    def close(self) -> None:
+        """Drop this verifier's batches still in flight; the shared pool keeps running."""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pool = None
+
+
+def verify_chain(source: Source, public_key: Optional[bytes] = None, workers: Optional[int] = None,
+                 max_issues: Optional[int] = None) -> Dict[str, Any]:
+    """One streaming pass over `source` (path, bytes or binary file); see ChainVerifier.finish()."""
+    verifier = ChainVerifier(public_key, workers, max_issues)
+    try:
+        for doc in iter_documents(source):
+            verifier.add(doc)
+    except BaseException:
+        verifier.close()
+        raise
+    return verifier.finish()
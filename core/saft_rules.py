@@ -0,0 +1,353 @@
+"""
+Business rules for SAF-T PT files, checked in the validator's streaming pass
+
+RuleEngine is fed the start/end events of the iterparse in
+saft_validator.validate_saft_stream. Each finished document (Invoice,
+WorkDocument, StockMovement, Payment, GLE Transaction) is reduced to a small
+Document record and removed from the tree; each finished section (SalesInvoices,
+..., GeneralLedgerEntries) to a Section record with its control totals and the
+sums of its documents. Only the CustomerIDs of MasterFiles are kept, so memory
+does not grow with the number of documents.
+
+Rules live in RULES and are added with @rule(code, scope): fn(record, engine)
+returns a message when the record breaks the rule, None otherwise. Amounts are
+Decimal; sums are compared with a tolerance of one cent, plus half a cent per
+line for tax computed from rates (software may round line by line).
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+import os
+
+CENT = Decimal('0.01')
+LINE_ROUNDING = Decimal('0.005')
+HUNDRED = Decimal(100)
+ZERO = Decimal(0)
+
+
+class SectionSpec(NamedTuple):
+    document: str  # element of one document
+    number: str  # its identifier
+    status: str  # DocumentStatus child with its status
+    excluded: FrozenSet[str]  # statuses left out of TotalDebit/TotalCredit
+
+
+SECTIONS: Dict[str, SectionSpec] = {
+    'SalesInvoices': SectionSpec('Invoice', 'InvoiceNo', 'InvoiceStatus', frozenset({'A', 'F'})),
+    'MovementOfGoods': SectionSpec('StockMovement', 'DocumentNumber', 'MovementStatus', frozenset({'A'})),
+    'WorkingDocuments': SectionSpec('WorkDocument', 'DocumentNumber', 'WorkStatus', frozenset({'A', 'F'})),
+    'Payments': SectionSpec('Payment', 'PaymentRefNo', 'PaymentStatus', frozenset({'A'})),
+}
+GLE = 'GeneralLedgerEntries'
+
+
+def _dec(text: Optional[str]) -> Optional[Decimal]:
+    if text is None:
+        return None
+    try:
+        return Decimal(text.strip())
+    except InvalidOperation:
+        return None
+
+
+def _money(value: Decimal) -> str:
+    return str(value.quantize(CENT))
+
+
+@dataclass
+class Document:
+    section: str
+    number: Optional[str] = None
+    status: Optional[str] = None
+    customer_id: Optional[str] = None
+    lines: int = 0
+    debit: Decimal = ZERO
+    credit: Decimal = ZERO
+    tax: Decimal = ZERO  # signed like credit - debit
+    quantity: Decimal = ZERO
+    totals: Dict[str, Decimal] = field(default_factory=dict)
+
+    @property
+    def path(self) -> str:
+        if self.section == GLE:
+            return '/AuditFile/GeneralLedgerEntries/Journal/Transaction'
+        return f'/AuditFile/SourceDocuments/{self.section}/{SECTIONS[self.section].document}'
+
+
+@dataclass
+class Section:
+    name: str
+    declared: Dict[str, Decimal] = field(default_factory=dict)  # NumberOfEntries, TotalDebit, ...
+    entries: int = 0
+    lines: int = 0
+    debit: Decimal = ZERO
+    credit: Decimal = ZERO
+    quantity: Decimal = ZERO
+
+    @property
+    def path(self) -> str:
+        return '/AuditFile/' + (GLE if self.name == GLE else f'SourceDocuments/{self.name}')
+
+
+# -- rules ----------------------------------------------------------------------
+Rule = Callable[[Any, 'RuleEngine'], Optional[str]]
+RULES: List[Tuple[str, str, str, Rule]] = []  # (code, scope, level, fn)
+
+
+def rule(code: str, scope: str, level: str = 'error'):
+    """Register fn for `scope` 'document' (Document records) or 'section' (Section records)."""
+    def register(fn: Rule) -> Rule:
+        RULES.append((code, scope, level, fn))
+        return fn
+    return register
+
+
+@rule('NET_TOTAL_MISMATCH', 'document')
+def _net_total(doc: Document, engine: 'RuleEngine') -> Optional[str]:
+    declared = doc.totals.get('NetTotal')
+    if declared is None or doc.section == GLE:
+        return None
+    lines = abs(doc.credit - doc.debit)
+    if abs(lines - declared) > CENT:
+        return f'NetTotal {_money(declared)} differs from the sum of the lines {_money(lines)}'
+    return None
+
+
+@rule('TAX_PAYABLE_MISMATCH', 'document')
+def _tax_payable(doc: Document, engine: 'RuleEngine') -> Optional[str]:
+    declared = doc.totals.get('TaxPayable')
+    if declared is None or doc.section == GLE:
+        return None
+    computed = abs(doc.tax)
+    if abs(computed - declared) > CENT + LINE_ROUNDING * doc.lines:
+        return f'TaxPayable {_money(declared)} differs from the tax of the lines at their rates {_money(computed)}'
+    return None
+
+
+@rule('GROSS_TOTAL_MISMATCH', 'document')
+def _gross_total(doc: Document, engine: 'RuleEngine') -> Optional[str]:
+    t = doc.totals
+    if not {'NetTotal', 'TaxPayable', 'GrossTotal'} <= t.keys():
+        return None
+    if abs(t['NetTotal'] + t['TaxPayable'] - t['GrossTotal']) > CENT:
+        return (f"GrossTotal {_money(t['GrossTotal'])} is not NetTotal + TaxPayable "
+                f"({_money(t['NetTotal'] + t['TaxPayable'])})")
+    return None
+
+
+@rule('TRANSACTION_UNBALANCED', 'document')
+def _transaction_balance(doc: Document, engine: 'RuleEngine') -> Optional[str]:
+    if doc.section == GLE and doc.debit != doc.credit:
+        return f'Debit lines {_money(doc.debit)} and credit lines {_money(doc.credit)} do not balance'
+    return None
+
+
+@rule('CUSTOMER_NOT_FOUND', 'document')
+def _customer_reference(doc: Document, engine: 'RuleEngine') -> Optional[str]:
+    if doc.customer_id is not None and doc.customer_id not in engine.customers:
+        return f'CustomerID {doc.customer_id} is not in MasterFiles'
+    return None
+
+
+@rule('NUMBER_OF_ENTRIES_MISMATCH', 'section')
+def _number_of_entries(section: Section, engine: 'RuleEngine') -> Optional[str]:
+    declared = section.declared.get('NumberOfEntries')
+    if declared is not None and declared != section.entries:
+        return f'NumberOfEntries is {declared} but the section has {section.entries} entries'
+    declared = section.declared.get('NumberOfMovementLines')
+    if declared is not None and declared != section.lines:
+        return f'NumberOfMovementLines is {declared} but the documents have {section.lines} lines'
+    return None
+
+
+@rule('TOTAL_DEBIT_MISMATCH', 'section')
+def _total_debit(section: Section, engine: 'RuleEngine') -> Optional[str]:
+    declared = section.declared.get('TotalDebit')
+    if declared is not None and abs(declared - section.debit) > CENT:
+        return f'TotalDebit {_money(declared)} differs from the sum of the debit lines {_money(section.debit)}'
+    return None
+
+
+@rule('TOTAL_CREDIT_MISMATCH', 'section')
+def _total_credit(section: Section, engine: 'RuleEngine') -> Optional[str]:
+    declared = section.declared.get('TotalCredit')
+    if declared is not None and abs(declared - section.credit) > CENT:
+        return f'TotalCredit {_money(declared)} differs from the sum of the credit lines {_money(section.credit)}'
+    return None
+
+
+@rule('TOTAL_QUANTITY_MISMATCH', 'section')
+def _total_quantity(section: Section, engine: 'RuleEngine') -> Optional[str]:
+    declared = section.declared.get('TotalQuantityIssued')
+    if declared is not None and declared != section.quantity:
+        return f'TotalQuantityIssued {declared} differs from the sum of the line quantities {section.quantity}'
+    return None
+
+
+# -- engine ---------------------------------------------------------------------
+_CONTROL_FIELDS = ('NumberOfEntries', 'NumberOfMovementLines', 'TotalDebit', 'TotalCredit', 'TotalQuantityIssued')
+
+
+class RuleEngine:
+    """Consumes iterparse start/end events; finish() returns (issues, counts per code).
+
+    At most `max_issues` issues (SAFT_RULES_MAX_ISSUES, default 200) are kept
+    per code; the counts are always complete.
+    """
+
+    def __init__(self, max_issues: Optional[int] = None):
+        if max_issues is None:
+            max_issues = int(os.getenv('SAFT_RULES_MAX_ISSUES', '200'))
+        self.max_issues = max_issues
+        self.customers: Set[str] = set()
+        self.issues: List[Dict[str, Any]] = []
+        self.counts: Dict[str, int] = {}
+        self.documents = 0
+        self._sections: Dict[str, Section] = {}
+        self._stack: List[Tuple[Any, str]] = []
+        self._names: Dict[str, str] = {}
+        self._rules = {scope: [(c, lv, fn) for c, s, lv, fn in RULES if s == scope] for scope in ('document', 'section')}
+
+    def _local(self, tag: str) -> str:
+        name = self._names.get(tag)
+        if name is None:
+            name = self._names[tag] = tag.rpartition('}')[2]
+        return name
+
+    def start(self, elem) -> None:
+        self._stack.append((elem, self._local(elem.tag)))
+
+    def end(self, elem) -> None:
+        _, name = self._stack.pop()
+        parent, parent_name = self._stack[-1] if self._stack else (None, None)
+        if parent_name == 'MasterFiles':
+            if name == 'Customer':
+                cid = self._text(elem, 'CustomerID')
+                if cid is not None:
+                    self.customers.add(cid)
+            parent.remove(elem)
+        elif parent_name in SECTIONS and name == SECTIONS[parent_name].document:
+            self._document(self._read_document(elem, parent_name))
+            parent.remove(elem)
+        elif name == 'Transaction' and parent_name == 'Journal':
+            self._document(self._read_transaction(elem))
+            parent.remove(elem)
+        elif name == 'Journal' and parent_name == GLE:
+            parent.remove(elem)
+        elif (name in SECTIONS and parent_name == 'SourceDocuments') or (name == GLE and parent_name == 'AuditFile'):
+            section = self._section(name)
+            for child in elem:
+                cname = self._local(child.tag)
+                if cname in _CONTROL_FIELDS:
+                    value = _dec(child.text)
+                    if value is not None:
+                        section.declared[cname] = int(value) if cname.startswith('Number') else value
+            self._check('section', section, section.path)
+            if parent_name == 'SourceDocuments':
+                parent.remove(elem)
+
+    def finish(self) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        return self.issues, dict(self.counts)
+
+    # -- records --
+    def _section(self, name: str) -> Section:
+        section = self._sections.get(name)
+        if section is None:
+            section = self._sections[name] = Section(name)
+        return section
+
+    def _text(self, elem, name: str) -> Optional[str]:
+        for child in elem:
+            if self._local(child.tag) == name:
+                return (child.text or '').strip()
+        return None
+
+    def _read_document(self, elem, section: str) -> Document:
+        spec = SECTIONS[section]
+        doc = Document(section)
+        local = self._local
+        for child in elem:
+            name = local(child.tag)
+            if name == 'Line':
+                amount = ZERO
+                rate = tax_amount = None
+                for item in child:
+                    iname = local(item.tag)
+                    if iname == 'CreditAmount':
+                        amount = _dec(item.text) or ZERO
+                        doc.credit += amount
+                    elif iname == 'DebitAmount':
+                        amount = -(_dec(item.text) or ZERO)
+                        doc.debit -= amount
+                    elif iname == 'Quantity':
+                        doc.quantity += _dec(item.text) or ZERO
+                    elif iname == 'Tax':
+                        for t in item:
+                            tname = local(t.tag)
+                            if tname == 'TaxPercentage':
+                                rate = _dec(t.text)
+                            elif tname == 'TaxAmount':
+                                tax_amount = _dec(t.text)
+                doc.lines += 1
+                if rate is not None:
+                    doc.tax += amount * rate / HUNDRED
+                if tax_amount is not None:
+                    doc.tax += tax_amount if amount >= 0 else -tax_amount
+            elif name == spec.number:
+                doc.number = (child.text or '').strip()
+            elif name == 'CustomerID':
+                doc.customer_id = (child.text or '').strip()
+            elif name == 'DocumentStatus':
+                doc.status = self._text(child, spec.status)
+            elif name == 'DocumentTotals':
+                for total in child:
+                    tname = local(total.tag)
+                    if tname in ('NetTotal', 'TaxPayable', 'GrossTotal'):
+                        value = _dec(total.text)
+                        if value is not None:
+                            doc.totals[tname] = value
+        return doc
+
+    def _read_transaction(self, elem) -> Document:
+        doc = Document(GLE)
+        local = self._local
+        for child in elem:
+            name = local(child.tag)
+            if name == 'TransactionID':
+                doc.number = (child.text or '').strip()
+            elif name == 'CustomerID':
+                doc.customer_id = (child.text or '').strip()
+            elif name == 'Lines':
+                for line in child:
+                    lname = local(line.tag)
+                    if lname == 'DebitLine':
+                        doc.debit += _dec(self._text(line, 'DebitAmount')) or ZERO
+                        doc.lines += 1
+                    elif lname == 'CreditLine':
+                        doc.credit += _dec(self._text(line, 'CreditAmount')) or ZERO
+                        doc.lines += 1
+        return doc
+
+    def _document(self, doc: Document) -> None:
+        self.documents += 1
+        section = self._section(doc.section)
+        section.entries += 1
+        section.lines += doc.lines
+        if doc.section == GLE or doc.status not in SECTIONS[doc.section].excluded:
+            section.debit += doc.debit
+            section.credit += doc.credit
+            section.quantity += doc.quantity
+        self._check('document', doc, doc.path, doc.number)
+
+    def _check(self, scope: str, record, path: str, document: Optional[str] = None) -> None:
+        for code, level, fn in self._rules[scope]:
+            message = fn(record, self)
+            if message is None:
+                continue
+            n = self.counts[code] = self.counts.get(code, 0) + 1
+            if n > self.max_issues:
+                continue
+            issue = {'level': level, 'code': code, 'message': message, 'path': path}
+            if document is not None:
+                issue['document'] = document
+            self.issues.append(issue)
@@ -0,0 +1,120 @@
+"""
+SAF-T PT 1.04_01 simple-type facets used by the schema pre-check
+
+A transcription of the XSD restrictions behind the errors most files fail on
+(see saft_validator.schema_precheck): enumerations, date/dateTime/decimal
+lexical forms, integer ranges and mandatory/limited text lengths, keyed by the
+local name of the element that carries them. Structural rules (element order,
+cardinality) are left to FACTEMICLI.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, FrozenSet, Optional
+
+
+@dataclass(frozen=True)
+class SimpleType:
+    name: str
+    base: str = 'string'  # string | date | dateTime | decimal | integer
+    min_length: Optional[int] = None
+    max_length: Optional[int] = None
+    enumeration: Optional[FrozenSet[str]] = None
+    min_inclusive: Optional[int] = None
+    max_inclusive: Optional[int] = None
+
+
+# ISO 3166-1 alpha-2, plus the XSD's 'Desconhecido' (and XK, in use for Kosovo)
+COUNTRIES = frozenset('''
+AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM BN BO BQ BR BS BT BV BW BY BZ
+CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX CY CZ DE DJ DK DM DO DZ EC EE EG EH ER ES ET FI FJ FK FM FO FR
+GA GB GD GE GF GG GH GI GL GM GN GP GQ GR GS GT GU GW GY HK HM HN HR HT HU ID IE IL IM IN IO IQ IR IS IT JE JM JO JP
+KE KG KH KI KM KN KP KR KW KY KZ LA LB LC LI LK LR LS LT LU LV LY MA MC MD ME MF MG MH MK ML MM MN MO MP MQ MR MS
+MT MU MV MW MX MY MZ NA NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM PN PR PS PT PW PY QA RE RO RS
+RU RW SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV SX SY SZ TC TD TF TG TH TJ TK TL TM TN TO TR TT TV TW
+TZ UA UG UM US UY UZ VA VC VE VG VI VN VU WF WS YE YT ZA ZM ZW XK Desconhecido
+'''.split())
+
+_DATE = SimpleType('SAFdateType', 'date')
+_DATETIME = SimpleType('SAFdateTimeType', 'dateTime')
+_DECIMAL = SimpleType('SAFmonetaryType', 'decimal')
+_MANDATORY = SimpleType('SAFPTtextTypeMandatory', min_length=1)
+
+ELEMENT_TYPES: Dict[str, SimpleType] = {
+    'TaxExemptionReason': SimpleType('SAFPTPortugueseTaxExemptionReason', min_length=6, max_length=60),
+    'Country': SimpleType('Country', enumeration=COUNTRIES),
+    'InvoiceType': SimpleType('InvoiceType', enumeration=frozenset({'FT', 'FS', 'FR', 'ND', 'NC'})),
+    'InvoiceStatus': SimpleType('InvoiceStatus', enumeration=frozenset({'N', 'S', 'A', 'R', 'F'})),
+    'TaxType': SimpleType('TaxType', enumeration=frozenset({'IVA', 'IS', 'NS'})),
+    'TaxRegistrationNumber': SimpleType('SAFPTPortugueseVatNumber', 'integer',
+                                        min_inclusive=100000000, max_inclusive=999999999),
+    **{name: _DATE for name in ('StartDate', 'EndDate', 'DateCreated', 'InvoiceDate', 'TaxPointDate',
+                                'MovementDate', 'WorkDate', 'TransactionDate')},
+    **{name: _DATETIME for name in ('SystemEntryDate', 'InvoiceStatusDate', 'MovementStatusDate',
+                                    'WorkStatusDate', 'PaymentStatusDate')},
+    **{name: _DECIMAL for name in ('NetTotal', 'GrossTotal', 'TaxPayable', 'UnitPrice', 'CreditAmount',
+                                   'DebitAmount', 'Quantity', 'SettlementAmount', 'TaxAmount',
+                                   'TaxPercentage', 'TotalCredit', 'TotalDebit')},
+    **{name: _MANDATORY for name in ('CompanyName', 'CustomerID', 'CustomerTaxID', 'InvoiceNo',
+                                     'ProductCode', 'ProductDescription', 'AddressDetail', 'City')},
+}
+
+_DATE_RE = re.compile(r'-?\d{4,}-\d{2}-\d{2}(Z|[+-]\d{2}:\d{2})?$')
+_DATETIME_RE = re.compile(r'-?\d{4,}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2})?$')
+_DECIMAL_RE = re.compile(r'[+-]?(\d+(\.\d*)?|\.\d+)$')
+_INTEGER_RE = re.compile(r'[+-]?\d+$')
+_XSD_WS = ' \t\n\r'
+
+
+def _valid_date(text: str) -> bool:
+    if not _DATE_RE.match(text):
+        return False
+    try:
+        date.fromisoformat(text.lstrip('-')[:10])
+    except ValueError:
+        return False
+    return True
+
+
+def _valid_datetime(text: str) -> bool:
+    if not _DATETIME_RE.match(text):
+        return False
+    try:
+        datetime.fromisoformat(text.lstrip('-')[:19])
+    except ValueError:
+        return False
+    return True
+
+
+def check(element: str, t: SimpleType, raw: str) -> Optional[str]:
+    """Xerces-style message for an invalid value of `element`, or None when valid."""
+    if t.base == 'string':
+        value = raw
+        if t.enumeration is not None:
+            value = raw.strip(_XSD_WS)  # the enumerated types collapse whitespace
+            if value not in t.enumeration:
+                return (f"cvc-enumeration-valid: Value '{value}' is not facet-valid with respect to "
+                        f"enumeration of type '{t.name}'. It must be a value from the enumeration.")
+        if t.min_length is not None and len(value) < t.min_length:
+            return (f"cvc-minLength-valid: Value '{value}' with length = '{len(value)}' is not facet-valid with "
+                    f"respect to minLength '{t.min_length}' for type '{t.name}' of element '{element}'.")
+        if t.max_length is not None and len(value) > t.max_length:
+            return (f"cvc-maxLength-valid: Value '{value[:80]}' with length = '{len(value)}' is not facet-valid with "
+                    f"respect to maxLength '{t.max_length}' for type '{t.name}' of element '{element}'.")
+        return None
+    value = raw.strip(_XSD_WS)
+    ok = {
+        'date': _valid_date,
+        'dateTime': _valid_datetime,
+        'decimal': lambda v: bool(_DECIMAL_RE.match(v)),
+        'integer': lambda v: bool(_INTEGER_RE.match(v)),
+    }[t.base](value)
+    if not ok:
+        return f"cvc-datatype-valid.1.2.1: '{value}' is not a valid value for '{t.base}' of element '{element}'."
+    if t.min_inclusive is not None and int(value) < t.min_inclusive:
+        return (f"cvc-minInclusive-valid: Value '{value}' is not facet-valid with respect to minInclusive "
+                f"'{t.min_inclusive}' for type '{t.name}'.")
+    if t.max_inclusive is not None and int(value) > t.max_inclusive:
+        return (f"cvc-maxInclusive-valid: Value '{value}' is not facet-valid with respect to maxInclusive "
+                f"'{t.max_inclusive}' for type '{t.name}'.")
+    return None
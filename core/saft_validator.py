@@ -1,6 +1,12 @@
 import io
-from typing import List, Dict, Any, Tuple, Optional
+import os
+from typing import List, Dict, Any, Tuple, Optional, Union, BinaryIO
+from xml.parsers import expat
 from defusedxml import ElementTree as ET
+from defusedxml import DefusedXmlException, EntitiesForbidden
+from core import saft_rules, saft_schema
+
+HEADER_FIELDS = ['AuditFileVersion', 'CompanyName', 'TaxRegistrationNumber', 'FiscalYear', 'StartDate', 'EndDate', 'CurrencyCode']
 
 
 def _local(tag: str) -> str:
@@ -58,9 +64,7 @@ def validate_saft(root: Any) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         return issues, summary
 
     # Extract common header fields
-    fields = ['AuditFileVersion', 'CompanyName', 'TaxRegistrationNumber', 'FiscalYear', 'StartDate', 'EndDate', 'CurrencyCode']
-    for f in fields:
-        summary[f] = extract_text(header, f)
+    summary.update(header_summary(header))
 
     # Basic required field checks
     for f in ['AuditFileVersion', 'CompanyName', 'TaxRegistrationNumber']:
@@ -80,21 +84,58 @@ def validate_saft(root: Any) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     return issues, summary
 
 
-def extract_cli_params(root: Any) -> Dict[str, Optional[str]]:
-    """Extract parameters needed by FACTEMICLI.jar from the SAFT XML root.
+def validate_saft_stream(source: Union[str, bytes, BinaryIO], rules: bool = True) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Streaming counterpart of parse_xml + validate_saft, plus the business rules.
+
+    Reads the whole document (so malformed XML anywhere still raises) but only
+    keeps the Header; documents are handed to a core.saft_rules.RuleEngine and
+    dropped as they close, and other top-level sections are emptied, leaving a
+    skeleton root that validate_saft can inspect. Memory stays flat regardless
+    of file size. With `rules`, the rule findings follow the Header ones and
+    summary['rules'] holds the count per rule code.
+
+    Raises:
+        ET.ParseError: If XML is not well-formed
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    engine = saft_rules.RuleEngine() if rules else None
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = elem
+                if _local(elem.tag) != 'AuditFile':
+                    engine = None
+            if engine is not None:
+                engine.start(elem)
+            continue
+        depth -= 1
+        if engine is not None:
+            engine.end(elem)
+        if depth == 1 and _local(elem.tag) != 'Header':
+            elem.clear()
+    issues, summary = validate_saft(root)
+    if engine is not None and summary:
+        rule_issues, counts = engine.finish()
+        issues.extend(rule_issues)
+        summary['rules'] = counts
+        summary['documents'] = engine.documents
+    return issues, summary
+
+
+def header_summary(header: Any) -> Dict[str, Optional[str]]:
+    """Return the common Header fields (HEADER_FIELDS) as a dict."""
+    return {f: extract_text(header, f) for f in HEADER_FIELDS}
+
+
+def cli_params_from_header(header: Any) -> Dict[str, Optional[str]]:
+    """Extract nif/year/month from a Header element.
 
-    Returns keys: nif, year, month (all strings or None if missing).
     month is derived from StartDate (taking the MM part if in ISO format).
     """
-    params: Dict[str, Optional[str]] = { 'nif': None, 'year': None, 'month': None }
-    if _local(root.tag) != 'AuditFile':
-        return params
-    header = None
-    for child in root:
-        if _local(child.tag) == 'Header':
-            header = child; break
-    if header is None:
-        return params
     nif = extract_text(header, 'TaxRegistrationNumber')
     year = extract_text(header, 'FiscalYear')
     start = extract_text(header, 'StartDate')
@@ -107,5 +148,196 @@ def extract_cli_params(root: Any) -> Dict[str, Optional[str]]:
             # normalize to 2-digit month
             if len(m) == 1: m = f'0{m}'
             month = m
-    params['nif']=nif; params['year']=year; params['month']=month
-    return params
+    return { 'nif': nif, 'year': year, 'month': month }
+
+
+def extract_cli_params(root: Any) -> Dict[str, Optional[str]]:
+    """Extract parameters needed by FACTEMICLI.jar from the SAFT XML root.
+
+    Returns keys: nif, year, month (all strings or None if missing).
+    month is derived from StartDate (taking the MM part if in ISO format).
+    """
+    params: Dict[str, Optional[str]] = { 'nif': None, 'year': None, 'month': None }
+    if _local(root.tag) != 'AuditFile':
+        return params
+    header = None
+    for child in root:
+        if _local(child.tag) == 'Header':
+            header = child; break
+    if header is None:
+        return params
+    return cli_params_from_header(header)
+
+
+def read_header(source: Union[str, bytes, BinaryIO]) -> Tuple[Optional[str], Any]:
+    """Stream the XML until </Header> and return (root_local_tag, header_element).
+
+    Uses defusedxml's iterparse, so DTD entities/external references stay
+    forbidden. Parsing stops right after the Header closes, so the cost is
+    independent of the file size. Top-level siblings seen before the Header
+    are cleared as they complete to keep memory flat.
+
+    `source` may be a file path, raw bytes or a binary file object.
+    header_element is None when the root is not AuditFile or no Header exists.
+
+    Raises:
+        ET.ParseError: If the XML is malformed before the Header ends
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    root = None
+    root_tag = None
+    depth = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = elem
+                root_tag = _local(elem.tag)
+                if root_tag != 'AuditFile':
+                    return root_tag, None
+            continue
+        depth -= 1
+        if depth == 1:
+            if _local(elem.tag) == 'Header':
+                return root_tag, elem
+            root.clear()
+    return root_tag, None
+
+
+def read_header_info(source: Union[str, bytes, BinaryIO]) -> Tuple[Dict[str, Optional[str]], Dict[str, Any]]:
+    """Streaming counterpart of extract_cli_params + header summary.
+
+    Returns (params, summary); both are empty/None-filled when the Header
+    cannot be found.
+    """
+    _, header = read_header(source)
+    if header is None:
+        return { 'nif': None, 'year': None, 'month': None }, {}
+    return cli_params_from_header(header), header_summary(header)
+
+
+def _streaming_enabled() -> bool:
+    return os.getenv('SAFT_HEADER_STREAMING', '1') not in ('0', 'false', 'no')
+
+
+def load_cli_params(source: Union[str, bytes]) -> Dict[str, Optional[str]]:
+    """Return FACTEMICLI params (nif/year/month) for a file path or bytes.
+
+    Prefers the streaming header reader; falls back to the full DOM parse
+    when streaming is disabled (SAFT_HEADER_STREAMING=0) or fails for a
+    reason other than malformed XML.
+
+    Raises:
+        ET.ParseError: If XML is not well-formed
+    """
+    if _streaming_enabled():
+        try:
+            return read_header_info(source)[0]
+        except (ET.ParseError, DefusedXmlException):
+            raise
+        except Exception:
+            pass
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+    return extract_cli_params(parse_xml(data))
+
+
+# -------------------- Schema pre-check --------------------
+SCHEMA_READ_SIZE = 1024 * 1024
+
+
+def schema_precheck_enabled() -> bool:
+    return os.getenv('SAFT_SCHEMA_PRECHECK', '0') in ('1', 'true', 'yes')
+
+
+def schema_precheck_skips_jar() -> bool:
+    return os.getenv('SAFT_SCHEMA_SKIP_JAR', '0') in ('1', 'true', 'yes')
+
+
+class _StopPrecheck(Exception):
+    pass
+
+
+def _forbid_entities(name, is_parameter_entity, value, base, sysid, pubid, notation_name):
+    raise EntitiesForbidden(name, value, base, sysid, pubid, notation_name)
+
+
+def schema_precheck(source: Union[str, bytes, BinaryIO], max_errors: Optional[int] = None) -> List[str]:
+    """Check element values against the SAF-T PT 1.04_01 simple types (core.saft_schema).
+
+    One streaming expat pass; only the text of elements with a known type is
+    collected. Returns FACTEMICLI-style messages ("Linha: L; coluna: C; cvc-...")
+    so core.jar_output classifies them like the JAR's own output; an invalid
+    Customer Country gets the JAR's Country message. A malformed document adds
+    one final message. Stops after `max_errors` (SAFT_SCHEMA_MAX_ERRORS, default 1000).
+    """
+    if max_errors is None:
+        max_errors = int(os.getenv('SAFT_SCHEMA_MAX_ERRORS', '1000'))
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return schema_precheck(f, max_errors)
+
+    parser = expat.ParserCreate(namespace_separator='}')
+    parser.buffer_text = True
+    parser.SetParamEntityParsing(expat.XML_PARAM_ENTITY_PARSING_NEVER)
+    parser.EntityDeclHandler = _forbid_entities
+    messages: List[str] = []
+    names: Dict[str, str] = {}  # qualified -> local name
+    stack: List[str] = []
+    text: List[str] = []
+    customer = {'id': None}
+
+    def collect(data):
+        text.append(data)
+
+    def start(qname, _attrs):
+        name = names.get(qname)
+        if name is None:
+            name = names[qname] = qname.rpartition('}')[2]
+        stack.append(name)
+        if name in saft_schema.ELEMENT_TYPES:
+            text.clear()
+            parser.CharacterDataHandler = collect
+        else:
+            parser.CharacterDataHandler = None
+        if name == 'Customer':
+            customer['id'] = None
+
+    def end(_qname):
+        name = stack.pop()
+        t = saft_schema.ELEMENT_TYPES.get(name)
+        if t is None:
+            return
+        parser.CharacterDataHandler = None
+        value = ''.join(text)
+        if name == 'CustomerID' and 'Customer' in stack[-1:]:
+            customer['id'] = value.strip()
+        problem = saft_schema.check(name, t, value)
+        if problem is None:
+            return
+        if name == 'Country' and 'Customer' in stack[-2:]:
+            problem = (f'O valor ("{value.strip()}") no elemento "Country" do "Customer" com id {customer["id"]} '
+                       f'não é válido ({problem})')
+        messages.append(f'Linha: {parser.CurrentLineNumber}; coluna: {parser.CurrentColumnNumber + 1}; {problem}')
+        if len(messages) >= max_errors:
+            raise _StopPrecheck()
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    try:
+        while True:
+            chunk = source.read(SCHEMA_READ_SIZE)
+            parser.Parse(chunk, not chunk)
+            if not chunk:
+                break
+    except _StopPrecheck:
+        pass
+    except expat.ExpatError as e:
+        messages.append(f'Linha: {e.lineno}; coluna: {e.offset + 1}; XML mal formado: {expat.ErrorString(e.code)}')
+    return messages
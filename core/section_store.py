@@ -0,0 +1,242 @@
+"""
+Section store - persisted records of every SourceDocuments section and the GLE
+
+One streaming pass of saft_documents.iter_records(sections=True) feeds both the
+SalesInvoices DocumentIndex (core.doc_index) and a SectionStore for
+WorkingDocuments, MovementOfGoods, Payments and GeneralLedgerEntries
+transactions (saft_documents.SECTIONS), so the file is read once for all of
+them. Customer and supplier names come from the MasterFiles records of the same
+pass, which precede the documents in a SAF-T file.
+
+The store is a binary sidecar (<upload>.sections, or an object-cache sidecar):
+per section, the records as JSON lines (values in SECTIONS[...].fields order)
+and an int64 array of line offsets, so record i of any section is one seek
+away and a page is one contiguous read. While building, records are spooled
+to a temporary file per section; memory holds only the offsets and the
+MasterFiles names. Loaded stores keep the offsets (8 bytes per record) and
+share DocumentIndex's cache size (DOC_INDEX_CACHE_SIZE).
+"""
+import array
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import uuid
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from core import doc_index
+from core.saft_documents import SECTIONS
+
+MAGIC = b'SAFTSEC1'
+VERSION = 1
+
+
+class Section:
+    """The records of one section in a loaded store (file order)."""
+
+    def __init__(self, store: 'SectionStore', name: str, offsets: array.array, data_at: int):
+        self.store = store
+        self.name = name
+        self.fields = SECTIONS[name].fields
+        self.offsets = offsets  # count + 1 line starts, relative to data_at
+        self.data_at = data_at
+        self.count = len(offsets) - 1
+        self.id = f'{store.id}:{name}'  # for doc_index cursors
+
+    def records(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        stop = min(stop, self.count)
+        if start >= stop:
+            return []
+        with open(self.store.path, 'rb') as f:
+            f.seek(self.data_at + self.offsets[start])
+            data = f.read(self.offsets[stop] - self.offsets[start])
+        return [dict(zip(self.fields, json.loads(line))) for line in data.splitlines()]
+
+
+class SectionStore:
+    def __init__(self, path: str, meta: Dict[str, Any], sections: Dict[str, Section]):
+        self.path = path
+        self.meta = meta
+        self.sections = sections
+        self.id = hashlib.sha256(f"{meta['fingerprint']}|{meta['built']}".encode()).hexdigest()[:16]
+
+    def counts(self) -> Dict[str, int]:
+        return {name: s.count for name, s in self.sections.items()}
+
+    @classmethod
+    def load(cls, path: str) -> 'SectionStore':
+        with open(path, 'rb') as f:
+            head = f.read(12)
+            if head[:8] != MAGIC:
+                raise ValueError('not a section store')
+            (size,) = struct.unpack_from('<I', head, 8)
+            meta = json.loads(f.read(size))
+            if meta.get('version') != VERSION or meta.get('byteorder') != sys.byteorder:
+                raise ValueError('incompatible section store')
+            store = cls(path, meta, {})
+            pos = 12 + size
+            for name in SECTIONS:
+                count, data_size = meta['sections'][name]
+                offsets = array.array('q')
+                offsets.fromfile(f, count + 1)
+                pos += (count + 1) * offsets.itemsize
+                store.sections[name] = Section(store, name, offsets, pos)
+                pos += data_size
+                f.seek(pos)
+        return store
+
+
+class SectionWriter:
+    """Feed iter_records(sections=True) records with add(); finish() writes the store."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.customers: Dict[str, str] = {}
+        self.suppliers: Dict[str, str] = {}
+        self._spool: Dict[str, BinaryIO] = {}
+        self._offsets = {name: array.array('q', [0]) for name in SECTIONS}
+
+    def add(self, kind: str, rec: Dict[str, Any]) -> None:
+        if kind == 'customer':
+            if rec['CustomerID']:
+                self.customers[rec['CustomerID']] = rec['CompanyName']
+            return
+        if kind == 'supplier':
+            if rec['SupplierID']:
+                self.suppliers[rec['SupplierID']] = rec['CompanyName']
+            return
+        spec = SECTIONS.get(kind)
+        if spec is None:
+            return
+        if 'CustomerName' in rec and rec['CustomerID']:
+            rec['CustomerName'] = self.customers.get(rec['CustomerID'], '')
+        if 'SupplierName' in rec and rec['SupplierID']:
+            rec['SupplierName'] = self.suppliers.get(rec['SupplierID'], '')
+        spool = self._spool.get(kind)
+        if spool is None:
+            spool = self._spool[kind] = tempfile.TemporaryFile(dir=os.path.dirname(self.path) or None)
+        line = json.dumps([rec[name] for name in spec.fields], ensure_ascii=False).encode('utf-8') + b'\n'
+        spool.write(line)
+        offsets = self._offsets[kind]
+        offsets.append(offsets[-1] + len(line))
+
+    def finish(self, source_fingerprint: str) -> SectionStore:
+        meta = {
+            'version': VERSION,
+            'fingerprint': source_fingerprint,
+            'built': uuid.uuid4().hex,
+            'byteorder': sys.byteorder,
+            'sections': {name: [len(offsets) - 1, offsets[-1]] for name, offsets in self._offsets.items()},
+        }
+        header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        tmp = f'{self.path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(MAGIC + struct.pack('<I', len(header)) + header)
+                for name in SECTIONS:
+                    self._offsets[name].tofile(f)
+                    spool = self._spool.get(name)
+                    if spool is not None:
+                        spool.seek(0)
+                        shutil.copyfileobj(spool, f, 1024 * 1024)
+            os.replace(tmp, self.path)
+        finally:
+            self.close()
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        return SectionStore.load(self.path)
+
+    def close(self) -> None:
+        for spool in self._spool.values():
+            spool.close()
+        self._spool = {}
+
+
+def build(path: str, index_path: str, store_path: str,
+          source_fingerprint: str) -> Tuple[doc_index.DocumentIndex, SectionStore]:
+    """Read the SAFT file at `path` (XML or ZIP) once; write its DocumentIndex and SectionStore."""
+    from core.saft_archiver import open_saft_xml
+    from core.saft_documents import iter_records
+    writer = SectionWriter(store_path)
+
+    def invoices() -> Iterable[Tuple[str, Dict[str, Any]]]:
+        with open_saft_xml(path) as stream:
+            for kind, rec in iter_records(stream, offsets=True, lines=True, sections=True):
+                if kind in ('customer', 'invoice'):
+                    yield kind, rec
+                if kind != 'invoice':
+                    writer.add(kind, rec)
+
+    try:
+        index = doc_index.DocumentIndex.build(invoices(), source_fingerprint)
+    except BaseException:
+        writer.close()
+        raise
+    index.write(index_path)
+    return index, writer.finish(source_fingerprint)
+
+
+_loaded: 'OrderedDict[str, SectionStore]' = OrderedDict()
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _load_or_build(path: str, index_path: str, store_path: str, source_fingerprint: str) -> Tuple[SectionStore, bool]:
+    if os.path.isfile(store_path):
+        try:
+            store = SectionStore.load(store_path)
+            if store.meta['fingerprint'] == source_fingerprint:
+                return store, False
+        except (OSError, ValueError, KeyError):
+            pass
+    return build(path, index_path, store_path, source_fingerprint)[1], True
+
+
+async def get_store(path: str, index_path: str, store_path: str) -> Tuple[SectionStore, bool]:
+    """Return (store, built_now) for the SAFT file at `path`, loading the sidecar or building it once.
+
+    A build also (re)writes the DocumentIndex at `index_path`, from the same pass.
+    Concurrent callers for the same sidecar share one build.
+    """
+    source_fingerprint = doc_index.fingerprint(path)
+    store = _loaded.get(store_path)
+    if store is not None and store.meta['fingerprint'] == source_fingerprint:
+        _loaded.move_to_end(store_path)
+        return store, False
+    lock = _locks.setdefault(store_path, asyncio.Lock())
+    async with lock:
+        store = _loaded.get(store_path)
+        if store is not None and store.meta['fingerprint'] == source_fingerprint:
+            return store, False
+        store, built = await asyncio.to_thread(_load_or_build, path, index_path, store_path, source_fingerprint)
+        _loaded[store_path] = store
+        _loaded.move_to_end(store_path)
+        while len(_loaded) > max(doc_index._cache_size(), 1):
+            _loaded.popitem(last=False)
+    _locks.pop(store_path, None)
+    return store, built
+
+
+def page(section: Section, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """One page of `section` in file order, with doc_index cursors.
+
+    Raises:
+        doc_index.CursorError: If `cursor` was not issued for this section
+    """
+    limit = max(1, min(limit, doc_index.MAX_PAGE))
+    key = doc_index.query_key(section=section.name)
+    start = doc_index.decode_cursor(section, key, cursor) if cursor else 0
+    records = section.records(start, start + limit)
+    end = start + len(records)
+    return {
+        'ok': True,
+        'section': section.name,
+        'records': records,
+        'count': len(records),
+        'total': section.count,
+        'next_cursor': doc_index.encode_cursor(section, key, end) if end < section.count else None,
+    }
@@ -1,17 +1,114 @@
-import os,tempfile,boto3
+import asyncio,functools,io,os,shutil,threading,boto3
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import S3Transfer,TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError
+from core import object_cache
+
+# Uploads go through boto3's transfer manager: objects above the part size are sent
+# as multipart uploads with STORAGE_UPLOAD_CONCURRENCY parts in flight on its thread
+# pool, streaming from the file object (never the whole payload in memory).
+PART_SIZE=int(os.getenv('STORAGE_PART_SIZE_MB','8'))*1024*1024
+UPLOAD_CONCURRENCY=int(os.getenv('STORAGE_UPLOAD_CONCURRENCY','4'))
+# One boto3 client per process (it is thread-safe): credentials are resolved once and
+# its urllib3 pool keeps connections alive across requests. Blocking calls run on a
+# bounded executor so a burst of downloads cannot starve the default thread pool.
+MAX_POOL_CONNECTIONS=int(os.getenv('STORAGE_MAX_POOL_CONNECTIONS','50'))
+MAX_WORKERS=int(os.getenv('STORAGE_MAX_WORKERS','16'))
+
+# Cached downloads are pinned to the ETag the HEAD returned (If-Match), so an object
+# overwritten in between is never stored under the old version's name. s3transfer only
+# accepts IfMatch in newer releases; older ones fall back to one streamed GetObject.
+_TRANSFER_IF_MATCH='IfMatch' in S3Transfer.ALLOWED_DOWNLOAD_ARGS
+
+_clients={}
+_clients_lock=threading.Lock()
+_executor=ThreadPoolExecutor(max_workers=MAX_WORKERS,thread_name_prefix='storage')
+
+def get_client():
+    """Process-wide S3 client for the current B2_* settings."""
+    settings=tuple(os.getenv(k) for k in ('B2_ENDPOINT','B2_REGION','B2_KEY_ID','B2_APP_KEY','B2_ADDRESSING_STYLE'))
+    client=_clients.get(settings)
+    if client is None:
+        with _clients_lock:
+            client=_clients.get(settings)
+            if client is None:
+                endpoint,region,key_id,app_key,style=settings
+                client=boto3.client('s3',endpoint_url=endpoint,region_name=region,
+                    aws_access_key_id=key_id,aws_secret_access_key=app_key,
+                    config=Config(s3={'addressing_style':style or 'virtual'},max_pool_connections=MAX_POOL_CONNECTIONS,
+                        tcp_keepalive=True,retries={'mode':'standard','max_attempts':3}))
+                _clients[settings]=client
+    return client
+
+async def run_blocking(fn,*args,**kwargs):
+    """Run a blocking storage call on the bounded storage executor."""
+    return await asyncio.get_running_loop().run_in_executor(_executor,functools.partial(fn,*args,**kwargs))
+
 class Storage:
     def __init__(self):
         self.endpoint=os.getenv('B2_ENDPOINT'); self.region=os.getenv('B2_REGION'); self.bucket=os.getenv('B2_BUCKET')
-        self.client=boto3.client('s3',endpoint_url=self.endpoint,region_name=self.region,
-            aws_access_key_id=os.getenv('B2_KEY_ID'),aws_secret_access_key=os.getenv('B2_APP_KEY'),config=Config(s3={'addressing_style':'virtual'}))
+        self.client=get_client()
+        self.transfer_config=TransferConfig(multipart_threshold=PART_SIZE,multipart_chunksize=PART_SIZE,
+            max_concurrency=UPLOAD_CONCURRENCY,use_threads=True)
+    async def upload(self,full_key,source,content_type=None):
+        """Stream `source` (file path, file object or bytes) to `full_key` off the event loop.
+
+        Large payloads become multipart uploads of PART_SIZE parts sent in parallel.
+        """
+        extra={'ContentType':content_type} if content_type else None
+        def _upload():
+            if isinstance(source,(str,os.PathLike)):
+                self.client.upload_file(os.fspath(source),self.bucket,full_key,ExtraArgs=extra,Config=self.transfer_config)
+            else:
+                body=io.BytesIO(source) if isinstance(source,(bytes,bytearray)) else source
+                self.client.upload_fileobj(body,self.bucket,full_key,ExtraArgs=extra,Config=self.transfer_config)
+        await run_blocking(_upload); return full_key
     async def put(self,country,key,data,content_type=None):
         full=f"{country}/{key}" if not key.startswith(f"{country}/") else key
-        extra={'ContentType':content_type} if content_type else {}
-        self.client.put_object(Bucket=self.bucket,Key=full,Body=data,**extra); return full
+        return await self.upload(full,data,content_type=content_type)
+    async def download(self,full_key,target_path):
+        """Download `full_key` to `target_path` off the event loop (botocore errors propagate)."""
+        await run_blocking(self.client.download_file,self.bucket,full_key,target_path,Config=self.transfer_config)
+        return target_path
+    async def delete(self,full_key):
+        await run_blocking(self.client.delete_object,Bucket=self.bucket,Key=full_key)
     async def fetch_to_local(self,country,key):
+        """Local path of the object, served from the disk cache (see core.object_cache).
+
+        The file is shared and pinned: do not modify or delete it, call release_local(path).
+        """
         full=key if key.startswith(f"{country}/") else f"{country}/{key}"
-        tmp=tempfile.NamedTemporaryFile(delete=False,suffix='_saft.xml'); self.client.download_file(self.bucket,full,tmp.name); return tmp.name
+        async def _head(etag):
+            try:
+                r=await run_blocking(self.client.head_object,Bucket=self.bucket,Key=full,**({'IfNoneMatch':etag} if etag else {}))
+            except ClientError as e:
+                if etag and object_cache.not_modified(e): return None
+                raise
+            return r.get('ETag') or ''
+        def _get(etag,target):
+            if not etag or _TRANSFER_IF_MATCH:
+                self.client.download_file(self.bucket,full,target,Config=self.transfer_config,
+                    ExtraArgs={'IfMatch':etag} if etag else None)
+                return
+            body=self.client.get_object(Bucket=self.bucket,Key=full,IfMatch=etag)['Body']
+            with open(target,'wb') as f:
+                shutil.copyfileobj(body,f,PART_SIZE)
+        async def _download(etag,target):
+            await run_blocking(_get,etag,target)
+        cache_key=f"{self.endpoint}/{self.bucket}/{full}"
+        try:
+            return await object_cache.default().fetch(cache_key,_head,_download)
+        except ClientError as e:
+            if not object_cache.precondition_failed(e): raise
+        # replaced between HEAD and GET: the next HEAD sees the new ETag
+        return await object_cache.default().fetch(cache_key,_head,_download)
+    def release_local(self,path):
+        """Unpin a path returned by fetch_to_local (it stays cached until evicted)."""
+        object_cache.default().release(path)
+    def local_sidecar(self,path,name):
+        """Path for a file derived from a fetch_to_local copy; evicted together with it."""
+        return object_cache.default().sidecar(path,name)
 
     async def presign_put(self, country, key, content_type=None, expires=900):
         """Generate a pre-signed URL for uploading via HTTP PUT."""
@@ -19,12 +116,12 @@ class Storage:
         params = { 'Bucket': self.bucket, 'Key': full }
         if content_type:
             params['ContentType'] = content_type
-        url = self.client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires)
+        url = await run_blocking(self.client.generate_presigned_url, 'put_object', Params=params, ExpiresIn=expires)
         headers = { 'Content-Type': content_type } if content_type else {}
         return { 'url': url, 'headers': headers, 'object': full, 'expires_in': expires }
 
     async def presign_get(self, country, key, expires=900):
         """Generate a pre-signed URL for downloading via HTTP GET."""
         full = key if key.startswith(f"{country}/") else f"{country}/{key}"
-        url = self.client.generate_presigned_url('get_object', Params={ 'Bucket': self.bucket, 'Key': full }, ExpiresIn=expires)
+        url = await run_blocking(self.client.generate_presigned_url, 'get_object', Params={ 'Bucket': self.bucket, 'Key': full }, ExpiresIn=expires)
         return { 'url': url, 'object': full, 'expires_in': expires }
@@ -0,0 +1,314 @@
+"""
+XML locator - byte-offset index of a SAF-T file for issue location lookups
+
+Built in one pass over the raw bytes (no XML parse), so JAR messages can be
+located without rereading the file: cumulative newline counts per BLOCK bytes
+(line <-> byte offset), the span of every MasterFiles/Customer by CustomerID,
+and the spans of SalesInvoices/Invoice and of their <Line> elements. Everything
+is kept in flat arrays and persisted as a sidecar next to the data
+(<upload>.loc), keyed by the file fingerprint like core.doc_index. Lookups open
+the file with mmap and read only the few KB around the target.
+
+Tags are matched literally with the root element's namespace prefix; SAF-T
+elements carry no attributes, so '<Customer>' and '<Invoice>' are exact.
+
+Environment:
+    XML_LOCATOR_CACHE_SIZE  locators kept loaded in memory (default 8)
+"""
+import array
+import asyncio
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.doc_index import fingerprint
+
+MAGIC = b'SAFTLOC1'
+VERSION = 1
+BLOCK = 16 * 1024
+SNIPPET_CHARS = 400
+COLUMN_SCAN_LIMIT = 1024 * 1024  # longer line prefixes get a byte-based column
+
+# name -> array typecode, in file order after the header
+_ARRAYS = (('newlines', 'q'), ('customer_start', 'q'), ('customer_end', 'q'),
+           ('invoice_start', 'q'), ('invoice_end', 'q'), ('line_start', 'q'))
+_ROOT_RE = re.compile(rb'<([A-Za-z_][\w.-]*:)?AuditFile[\s>]')
+
+
+def _section(mm, prefix: bytes, name: bytes, start: int = 0, end: Optional[int] = None) -> Tuple[int, int]:
+    """(start, end) of the first <name>...</name> in mm[start:end], or (-1, -1)."""
+    end = len(mm) if end is None else end
+    s = mm.find(b'<' + prefix + name + b'>', start, end)
+    if s < 0:
+        return -1, -1
+    e = mm.find(b'</' + prefix + name + b'>', s, end)
+    return (s, e) if e >= 0 else (-1, -1)
+
+
+def _spans(mm, open_tag: bytes, close_tag: bytes, start: int, end: int) -> Tuple[array.array, array.array]:
+    starts, ends = array.array('q'), array.array('q')
+    pos = mm.find(open_tag, start, end)
+    while pos >= 0:
+        close = mm.find(close_tag, pos, end)
+        if close < 0:
+            break
+        starts.append(pos)
+        ends.append(close + len(close_tag))
+        pos = mm.find(open_tag, close, end)
+    return starts, ends
+
+
+class XmlLocator:
+    def __init__(self, meta: Dict, arrays: Dict[str, array.array]):
+        self.meta = meta
+        self.prefix: bytes = meta['prefix'].encode('utf-8')
+        self.customer_ids: List[str] = meta['customer_ids']
+        self.arrays = arrays
+        self._customers: Optional[Dict[str, int]] = None
+
+    # -- build / persist ---------------------------------------------------
+    @classmethod
+    def build(cls, path: str) -> 'XmlLocator':
+        """Index `path` (a plain XML file). Raises ValueError if it is not a SAF-T XML."""
+        source_fingerprint = fingerprint(path)
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError('empty file')
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            root = _ROOT_RE.search(mm, 0, 64 * 1024)
+            if root is None:
+                raise ValueError('no SAF-T AuditFile root element')
+            prefix = root.group(1) or b''
+            arrays = {name: array.array(code) for name, code in _ARRAYS}
+
+            newlines = arrays['newlines']
+            total = 0
+            for pos in range(0, len(mm), BLOCK):
+                newlines.append(total)
+                total += mm[pos:pos + BLOCK].count(b'\n')
+            newlines.append(total)
+
+            customer_ids: List[str] = []
+            ms, me = _section(mm, prefix, b'MasterFiles')
+            if ms >= 0:
+                starts, ends = _spans(mm, b'<' + prefix + b'Customer>', b'</' + prefix + b'Customer>', ms, me)
+                id_re = re.compile(rb'<' + re.escape(prefix) + rb'CustomerID>\s*([^<]*?)\s*<')
+                for s, e in zip(starts, ends):
+                    m = id_re.search(mm, s, e)
+                    customer_ids.append(m.group(1).decode('utf-8', 'replace') if m else '')
+                arrays['customer_start'], arrays['customer_end'] = starts, ends
+
+            ss, se = _section(mm, prefix, b'SourceDocuments')
+            if ss >= 0:
+                ss, se = _section(mm, prefix, b'SalesInvoices', ss, se)
+            if ss >= 0:
+                arrays['invoice_start'], arrays['invoice_end'] = _spans(
+                    mm, b'<' + prefix + b'Invoice>', b'</' + prefix + b'Invoice>', ss, se)
+                line_tag = b'<' + prefix + b'Line>'
+                line_start = arrays['line_start']
+                pos = mm.find(line_tag, ss, se)
+                while pos >= 0:
+                    line_start.append(pos)
+                    pos = mm.find(line_tag, pos + len(line_tag), se)
+        finally:
+            mm.close()
+        meta = {
+            'version': VERSION,
+            'fingerprint': source_fingerprint,
+            'byteorder': sys.byteorder,
+            'block': BLOCK,
+            'prefix': prefix.decode('utf-8'),
+            'customer_ids': customer_ids,
+        }
+        return cls(meta, arrays)
+
+    def write(self, path: str) -> None:
+        """Write atomically (temp file + rename)."""
+        meta = dict(self.meta, sizes=[len(self.arrays[name]) for name, _ in _ARRAYS])
+        header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for name, _ in _ARRAYS:
+                self.arrays[name].tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'XmlLocator':
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:8] != MAGIC:
+            raise ValueError('not an XML locator')
+        (size,) = struct.unpack_from('<I', data, 8)
+        meta = json.loads(data[12:12 + size])
+        if meta.get('version') != VERSION or meta.get('byteorder') != sys.byteorder \
+                or meta.get('block') != BLOCK:
+            raise ValueError('incompatible XML locator')
+        view = memoryview(data)
+        pos = 12 + size
+        arrays = {}
+        for (name, code), n in zip(_ARRAYS, meta.pop('sizes')):
+            arr = array.array(code)
+            end = pos + n * arr.itemsize
+            arr.frombytes(view[pos:end])
+            arrays[name] = arr
+            pos = end
+        return cls(meta, arrays)
+
+    # -- lookups -----------------------------------------------------------
+    @contextmanager
+    def reader(self, path: str) -> Iterator['Reader']:
+        """Lookups against the indexed file, served from an mmap of it."""
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield Reader(self, mm)
+        finally:
+            mm.close()
+
+    def customer_span(self, customer_id: str) -> Optional[Tuple[int, int]]:
+        if self._customers is None:
+            self._customers = {}
+            for i, cid in enumerate(self.customer_ids):
+                self._customers.setdefault(cid, i)
+        i = self._customers.get(customer_id)
+        if i is None:
+            return None
+        return self.arrays['customer_start'][i], self.arrays['customer_end'][i]
+
+    def invoice_span(self, offset: int) -> Optional[Tuple[int, int]]:
+        """Span of the Invoice containing `offset`, if any."""
+        starts = self.arrays['invoice_start']
+        i = bisect_right(starts, offset) - 1
+        if i < 0 or offset >= self.arrays['invoice_end'][i]:
+            return None
+        return starts[i], self.arrays['invoice_end'][i]
+
+
+class Reader:
+    def __init__(self, locator: XmlLocator, mm: mmap.mmap):
+        self.locator = locator
+        self.mm = mm
+
+    def line_offset(self, line: int) -> Optional[int]:
+        """Byte offset where 1-based `line` starts (None past the end)."""
+        if line < 1:
+            return None
+        if line == 1:
+            return 0
+        newlines = self.locator.arrays['newlines']
+        k = line - 1  # newlines before the line
+        if k > newlines[-1]:
+            return None
+        block = bisect_left(newlines, k) - 1
+        pos = block * BLOCK - 1
+        for _ in range(k - newlines[block]):
+            pos = self.mm.find(b'\n', pos + 1)
+        return pos + 1
+
+    def line_col(self, offset: int) -> Tuple[int, int]:
+        """1-based (line, column) of a byte offset; columns count characters."""
+        block = offset // BLOCK
+        line = self.locator.arrays['newlines'][block] + self.mm[block * BLOCK:offset].count(b'\n') + 1
+        start = self.line_offset(line)
+        if offset - start > COLUMN_SCAN_LIMIT:
+            return line, offset - start + 1
+        return line, len(self.mm[start:offset].decode('utf-8', 'replace')) + 1
+
+    def snippet(self, line: int, column: Optional[int] = None) -> Optional[str]:
+        """Text of `line` (up to SNIPPET_CHARS, centred on `column` when longer)."""
+        start = self.line_offset(line)
+        if start is None:
+            return None
+        width = SNIPPET_CHARS * 4  # worst-case UTF-8 bytes per char
+        if column and column > SNIPPET_CHARS // 2:
+            start += max(0, (column - SNIPPET_CHARS // 2) - 1)
+        end = self.mm.find(b'\n', start, start + width)
+        text = self.mm[start:end if end >= 0 else start + width].decode('utf-8', 'replace')
+        return text.rstrip('\r')[:SNIPPET_CHARS]
+
+    def find_country(self, customer_id: str, value: str) -> Optional[int]:
+        """Offset of <Country>value</Country> in that customer's record (first one in the
+        file if the customer is not indexed), else of the record itself."""
+        p = re.escape(self.locator.prefix)
+        pattern = re.compile(rb'<' + p + rb'Country>\s*' + re.escape(value.encode('utf-8')) + rb'\s*</' + p + rb'Country>',
+                             re.IGNORECASE)
+        span = self.locator.customer_span(customer_id)
+        m = pattern.search(self.mm, *span) if span else pattern.search(self.mm)
+        if m:
+            return m.start()
+        return span[0] if span else None
+
+    def element_at(self, offset: int) -> Dict[str, str]:
+        """InvoiceNo and LineNumber of the invoice line containing `offset` ({} outside invoices)."""
+        span = self.locator.invoice_span(offset)
+        if span is None:
+            return {}
+        p = re.escape(self.locator.prefix)
+        found = {}
+        m = re.compile(rb'<' + p + rb'InvoiceNo>([^<]*)<').search(self.mm, span[0], span[1])
+        if m:
+            found['invoice_no'] = m.group(1).decode('utf-8', 'replace').strip()
+        lines = self.locator.arrays['line_start']
+        i = bisect_right(lines, offset) - 1
+        if i >= 0 and lines[i] >= span[0]:
+            m = re.compile(rb'<' + p + rb'LineNumber>([^<]*)<').search(self.mm, lines[i], offset)
+            if m:
+                found['line_number'] = m.group(1).decode('utf-8', 'replace').strip()
+        return found
+
+
+# -- loading ----------------------------------------------------------------
+_loaded: 'OrderedDict[str, XmlLocator]' = OrderedDict()
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _cache_size() -> int:
+    return int(os.getenv('XML_LOCATOR_CACHE_SIZE', '8'))
+
+
+def load_or_build(xml_path: str, locator_path: str) -> XmlLocator:
+    """The sidecar at `locator_path` if it matches `xml_path`, else a fresh build (written there)."""
+    source_fingerprint = fingerprint(xml_path)
+    if os.path.isfile(locator_path):
+        try:
+            locator = XmlLocator.load(locator_path)
+            if locator.meta['fingerprint'] == source_fingerprint:
+                return locator
+        except (OSError, ValueError, KeyError):
+            pass
+    locator = XmlLocator.build(xml_path)
+    locator.write(locator_path)
+    return locator
+
+
+async def get_locator(xml_path: str, locator_path: str) -> XmlLocator:
+    """Loaded locator for `xml_path`, building its sidecar once (in a worker thread).
+
+    Raises OSError / ValueError when the file cannot be indexed.
+    """
+    current = fingerprint(xml_path)
+    locator = _loaded.get(locator_path)
+    if locator is not None and locator.meta['fingerprint'] == current:
+        _loaded.move_to_end(locator_path)
+        return locator
+    lock = _locks.setdefault(locator_path, asyncio.Lock())
+    async with lock:
+        locator = _loaded.get(locator_path)
+        if locator is None or locator.meta['fingerprint'] != current:
+            locator = await asyncio.to_thread(load_or_build, xml_path, locator_path)
+            _loaded[locator_path] = locator
+        _loaded.move_to_end(locator_path)
+        while len(_loaded) > max(_cache_size(), 1):
+            _loaded.popitem(last=False)
+    _locks.pop(locator_path, None)
+    return locator
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from typing import Optional
@@ -11,6 +12,16 @@ from core.models import ATSecretIn, ATSecretOut, PresignUploadIn, PresignUploadO
 from core.storage import Storage
 from core.submitter import Submitter
 from core.analysis_repo import AnalysisRepo
+from core.jar_pool import get_pool, shutdown_pools
+from core.jar_scheduler import get_scheduler, SchedulerBusy
+from core.jobs_repo import ValidationJobsRepo, TERMINAL_STATUSES
+from core import job_events
+from core import result_cache
+from core import chunked_upload
+from core import xml_locator
+from core import jar_output
+from core import saft_fixes
+from core.result_cache import ValidationResultCache
 # from core.fix_rules import get_rules_manager, detect_issue_with_rules  # Not needed for this release
 import os
 import os.path
@@ -19,6 +30,8 @@ from pathlib import Path
 import asyncio
 import uuid
 import json
+import hashlib
+import tempfile
 try:
     from botocore.exceptions import ClientError  # type: ignore
 except Exception:  # pragma: no cover
@@ -32,6 +45,10 @@ ALGORITHM = "HS256"
 USER_NOT_FOUND = "User not found"
 UPLOAD_ROOT = os.getenv('UPLOAD_ROOT', '/var/saft/uploads')
 DEFAULT_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(5*1024*1024)))  # 5MB
+STREAM_BUFFER_SIZE = 256 * 1024  # request bodies are written to disk in blocks of this size
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '120'))
+JOB_MAX_STORED_ISSUES = 5000
 
 
 def get_country(request: Request) -> str:
@@ -44,6 +61,17 @@ def _jar_path() -> str:
     # Centralize JAR path resolution to avoid duplicated literals
     return os.getenv('FACTEMICLI_JAR_PATH', '/opt/factemi/FACTEMICLI.jar')
 
+async def _run_jar(cmd: list[str], timeout: float, username: str, nif: str | None, on_start=None, on_line=None):
+    """Run a FACTEMICLI command through the shared scheduler.
+
+    Raises HTTP 429 with Retry-After when the queue is full; asyncio.TimeoutError
+    propagates so each endpoint can shape its own timeout response.
+    """
+    try:
+        return await get_scheduler().run(cmd, timeout=timeout, user=username, nif=nif, on_start=on_start, on_line=on_line)
+    except SchedulerBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': str(e.retry_after)})
+
 def _ensure_upload_root():
     """Create UPLOAD_ROOT if missing and log to stdout for Render visibility."""
     try:
@@ -58,6 +86,69 @@ def _upload_paths(upload_id: str):
     base = os.path.join(UPLOAD_ROOT, upload_id)
     return base + '.meta', base + '.bin'
 
+def _upload_index_path(upload_id: str):
+    """Document index sidecar of an upload (see core.doc_index)."""
+    return os.path.join(UPLOAD_ROOT, upload_id) + '.docs'
+
+def _upload_sections_path(upload_id: str):
+    """Section store sidecar of an upload (see core.section_store)."""
+    return os.path.join(UPLOAD_ROOT, upload_id) + '.sections'
+
+def _upload_locator_path(upload_id: str):
+    """Element/line offset index sidecar of an upload (see core.xml_locator)."""
+    return os.path.join(UPLOAD_ROOT, upload_id) + '.loc'
+
+_locator_builds: set = set()  # strong refs to background builds started by upload_finish
+
+async def _upload_locator(upload_id: str, bin_path: str):
+    """Cached XmlLocator of an upload, or None if it cannot be indexed (e.g. not XML)."""
+    try:
+        return await xml_locator.get_locator(bin_path, _upload_locator_path(upload_id))
+    except (OSError, ValueError) as e:
+        print(f"[UPLOAD] indice de localizacao indisponivel para {upload_id}: {e}")
+        return None
+
+async def _spool_upload(file: UploadFile, suffix: str = '.xml') -> tuple[str, int, str]:
+    """Copy a multipart upload to a temp file in STREAM_BUFFER_SIZE blocks.
+
+    Starlette already spools the multipart body to disk while reading
+    request.stream(); this copies it without ever holding the file in memory.
+    Returns (path, size, sha256).
+    """
+    def _copy():
+        h = hashlib.sha256()
+        size = 0
+        file.file.seek(0)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            for block in iter(lambda: file.file.read(STREAM_BUFFER_SIZE), b''):
+                h.update(block)
+                tmp.write(block)
+                size += len(block)
+        return tmp.name, size, h.hexdigest()
+    return await asyncio.to_thread(_copy)
+
+def _read_meta(meta_path: str) -> dict:
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_meta(meta_path: str, meta: dict):
+    # Write-then-rename so concurrent chunk requests never read a half-written .meta
+    tmp_path = f'{meta_path}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+async def _upload_sha256(upload_id: str) -> str:
+    """SHA-256 of an upload: from its meta when recorded at finish, else hashed from disk once."""
+    meta_path, bin_path = _upload_paths(upload_id)
+    meta = await asyncio.to_thread(_read_meta, meta_path)
+    if meta.get('sha256'):
+        return meta['sha256']
+    digest = await asyncio.to_thread(result_cache.file_sha256, bin_path)
+    meta['sha256'] = digest
+    await asyncio.to_thread(_write_meta, meta_path, meta)
+    return digest
+
 # -------------------- Auth dependency --------------------
 async def get_current_user(
     request: Request, token: str = Depends(oauth2_scheme), db=Depends(get_db)
@@ -79,230 +170,37 @@ async def get_current_user(
 # -------------------- JAR error extraction helpers --------------------
 import re
 
-SUGGEST_COUNTRY_MAP = {
-    'CVE': 'CV',  # currency CVE mistaken as Country; should be CV
-    'CPV': 'CV',  # alpha-3 to alpha-2
-    'PRT': 'PT', 'ESP': 'ES', 'FRA': 'FR', 'DEU': 'DE', 'GBR': 'GB', 'ROU': 'RO',
-}
-
-def _extract_jar_errors(stdout: str) -> list[str]:
-    if not stdout:
-        print("[DEBUG] _extract_jar_errors: stdout is empty")
-        return []
-    # Find errors XML block
-    errs: list[str] = []
-    try:
-        print(f"[DEBUG] _extract_jar_errors: Searching for <errors> block in {len(stdout)} chars of stdout")
-        m = re.search(r"<errors>(.*?)</errors>", stdout, re.DOTALL | re.IGNORECASE)
-        if m:
-            block = m.group(1)
-            print(f"[DEBUG] _extract_jar_errors: Found <errors> block with {len(block)} chars")
-            for em in re.finditer(r"<error>(.*?)</error>", block, re.DOTALL | re.IGNORECASE):
-                msg = em.group(1).strip()
-                errs.append(msg)
-                print(f"[DEBUG] _extract_jar_errors: Extracted error: {msg[:100]}...")
-        else:
-            print("[DEBUG] _extract_jar_errors: NO <errors> block found in stdout")
-            print(f"[DEBUG] _extract_jar_errors: stdout preview: {stdout[:500]}")
-    except Exception as e:
-        print(f"[DEBUG] _extract_jar_errors: Exception: {e}")
-    print(f"[DEBUG] _extract_jar_errors: Returning {len(errs)} errors")
-    return errs
-
-def _find_line_info(xml_path: str, customer_id: str, bad_value: str):
-    """Return (line, column, context) for the offending Country value when possible."""
-    try:
-        # Read with latin-1 fallback given JAR output hints
-        try:
-            txt = Path(xml_path).read_text(encoding='utf-8', errors='replace')
-        except Exception:
-            txt = Path(xml_path).read_text(encoding='latin-1', errors='replace')
-        # Heuristic: look for <CustomerID>id</CustomerID>, then nearest <Country>bad</Country>
-        cid_pat = re.compile(rf"<CustomerID>\s*{re.escape(customer_id)}\s*</CustomerID>", re.IGNORECASE)
-        ct_pat = re.compile(rf"<Country>\s*{re.escape(bad_value)}\s*</Country>", re.IGNORECASE)
-        m = cid_pat.search(txt)
-        start_idx = m.start() if m else 0
-        m2 = ct_pat.search(txt, pos=start_idx)
-        idx = (m2.start() if m2 else (m.start() if m else 0))
-        # Compute line/column
-        pre = txt[:idx]
-        line = pre.count('\n') + 1
-        col = len(pre.split('\n')[-1]) + 1
-        # Extract small context line
-        lines = txt.splitlines()
-        snippet = lines[line-1] if 0 <= line-1 < len(lines) else ''
-        return line, col, snippet[:400]
-    except Exception:
-        return None, None, None
-
-def _detect_issues_from_stdout(stdout: str, xml_path: str) -> list[dict]:
-    print(f"[DEBUG] _detect_issues_from_stdout: Called with xml_path={xml_path}")
-    issues = []
-    errors = _extract_jar_errors(stdout)
-    print(f"[DEBUG] _detect_issues_from_stdout: Processing {len(errors)} errors")
-
-    for msg in errors:
-        print(f"[DEBUG] _detect_issues_from_stdout: Analyzing error: {msg[:100]}...")
-
-        # Try custom rules FIRST (disabled for this release)
-        # custom_issue = detect_issue_with_rules(msg, xml_path)
-        # if custom_issue:
-        #     print(f"[DEBUG] _detect_issues_from_stdout: MATCH via custom rule! code={custom_issue.get('code')}, rule_id={custom_issue.get('rule_id')}")
-        #     issues.append(custom_issue)
-        #     continue
-
-        # Pattern 1: Country invalid (PT JAR message)
-        m = re.search(r"O valor \(\"(?P<val>[^\"]+)\"\) no elemento \"Country\" do \"Customer\" com id (?P<cid>[A-Za-z0-9_\-]+)", msg)
-        if m:
-            bad = m.group('val')
-            cid = m.group('cid')
-            suggestion = SUGGEST_COUNTRY_MAP.get(bad)
-            print(f"[DEBUG] _detect_issues_from_stdout: MATCH! CustomerID={cid}, value={bad}, suggestion={suggestion}")
-            line, col, context = _find_line_info(xml_path, cid, bad)
-            print(f"[DEBUG] _detect_issues_from_stdout: Location: line={line}, col={col}")
-            issues.append({
-                'code': 'INVALID_COUNTRY',
-                'message': msg,
-                'customer_id': cid,
-                'value': bad,
-                'suggestion': suggestion,
-                'location': {'line': line, 'column': col, 'context': context}
-            })
-            continue
-
-        # Pattern 2: TaxExemptionReason empty (minLength validation)
-        # Example: "Linha: 548869; coluna: 33; cvc-minLength-valid: Value '' with length = '0' is not facet-valid..."
-        m = re.search(r"Linha:\s*(?P<line>\d+);\s*coluna:\s*(?P<col>\d+);\s*cvc-minLength-valid.*?element.*?SAFPTPortugueseTaxExemptionReason", msg, re.IGNORECASE)
-        if not m:
-            # Try alternative pattern
-            m = re.search(r"Linha:\s*(?P<line>\d+);\s*coluna:\s*(?P<col>\d+).*?TaxExemptionReason", msg, re.IGNORECASE)
-
-        if m:
-            line_num = int(m.group('line'))
-            col_num = int(m.group('col'))
-            print(f"[DEBUG] _detect_issues_from_stdout: MATCH! TaxExemptionReason empty at line={line_num}, col={col_num}")
-
-            # Extract context from XML
-            try:
-                txt = Path(xml_path).read_text(encoding='utf-8', errors='replace')
-                lines = txt.splitlines()
-                snippet = lines[line_num-1] if 0 <= line_num-1 < len(lines) else ''
-            except:
-                snippet = None
-
-            # Multiple suggestions for TaxExemptionReason
-            issues.append({
-                'code': 'EMPTY_TAX_EXEMPTION',
-                'message': msg,
-                'location': {'line': line_num, 'column': col_num, 'context': snippet},
-                'suggestions': [
-                    {
-                        'label': 'M16 - Isento Artigo 14.º do RITI',
-                        'reason': 'Isento Artigo 14.º do RITI (ou similar)',
-                        'code': 'M16'
-                    },
-                    {
-                        'label': 'M0 - Isento Artigo 9.º do RITI',
-                        'reason': 'Isento Artigo 9.º do RITI (ou similar)',
-                        'code': 'M0'
-                    }
-                ]
-            })
-            continue
-
-        # Fallback generic error
-        print(f"[DEBUG] _detect_issues_from_stdout: No pattern match, adding as JAR_ERROR")
-        print(f"[DEBUG] _detect_issues_from_stdout: Full error message: {msg}")
-        issues.append({ 'code': 'JAR_ERROR', 'message': msg })
-
-    print(f"[DEBUG] _detect_issues_from_stdout: Returning {len(issues)} issues")
+def _detect_issues_from_stdout(stdout: str, xml_path: str, locator=None) -> list[dict]:
+    """Issues for a complete JAR stdout, located through the file's XmlLocator
+    (`locator`, or one built on first need). See core.jar_output."""
+    stream = jar_output.IssueStream(xml_path, locator)
+    issues = stream.feed(stdout or '') + stream.close()
+    print(f"[JAR] {len(issues)} erros: {stream.counts}")
     return issues
 
-def _apply_country_fix(xml_text: str, customer_id: str, bad_value: str, new_value: str) -> tuple[str, int]:
-    """Replace <Country>bad</Country> for a specific CustomerID only.
-    Returns (new_text, replacements_count).
-    """
-    try:
-        # minimal-scoped replacement: inside the Customer block containing that CustomerID
-        pattern = re.compile(
-            rf"(<Customer>(?:(?!</Customer>).)*?<CustomerID>\s*{re.escape(customer_id)}\s*</CustomerID>(?:(?!</Customer>).)*?<Country>)\s*{re.escape(bad_value)}\s*(</Country>(?:(?!</Customer>).)*?</Customer>)",
-            re.IGNORECASE | re.DOTALL,
-        )
-        count = 0
-        def repl(m):
-            nonlocal count
-            count += 1
-            return m.group(1) + new_value + m.group(2)
-        new_text, n = pattern.subn(repl, xml_text, count=1)
-        if n == 0:
-            # Fallback: global first occurrence of <Country>bad</Country>
-            new_text2, n2 = re.subn(rf"(<Country>)\s*{re.escape(bad_value)}\s*(</Country>)", r"\g<1>"+new_value+r"\g<2>", xml_text, flags=re.IGNORECASE)
-            return (new_text2 if n2 else xml_text, n2)
-        return new_text, n
-    except Exception:
-        return xml_text, 0
+async def _schema_precheck(xml_path: str, label: str, issue_stream=None):
+    """Optional in-process schema pre-check (SAFT_SCHEMA_PRECHECK, facets only) before a JAR run.
 
-def _apply_tax_exemption_fix(xml_text: str, line_num: int, reason: str, code: str) -> tuple[str, int]:
+    Returns (precheck, issues): precheck is None when disabled, else
+    {'errors', 'skipped_jar'}; issues are the pre-check messages classified and
+    located like JAR output (through `issue_stream`, or a stream of its own).
+    With precheck['skipped_jar'] the caller answers with the issues instead of
+    spawning the JAR.
     """
-    Replace empty TaxExemptionReason and TaxExemptionCode at specific line.
-    Returns (new_text, replacements_count).
-
-    Searches for pattern:
-        <TaxExemptionReason />
-        <TaxExemptionCode />
-
-    And replaces with:
-        <TaxExemptionReason>{reason}</TaxExemptionReason>
-        <TaxExemptionCode>{code}</TaxExemptionCode>
-    """
-    try:
-        lines = xml_text.splitlines(keepends=True)
-        if line_num < 1 or line_num > len(lines):
-            return xml_text, 0
-
-        # Look for the empty TaxExemptionReason at the specified line
-        # and TaxExemptionCode on following lines (within 5 lines)
-        target_idx = line_num - 1  # 0-indexed
-
-        # Check if this line contains empty TaxExemptionReason
-        if not re.search(r'<TaxExemptionReason\s*/>', lines[target_idx], re.IGNORECASE):
-            print(f"[DEBUG] _apply_tax_exemption_fix: Line {line_num} doesn't contain empty TaxExemptionReason")
-            return xml_text, 0
-
-        # Find TaxExemptionCode in the next few lines
-        code_idx = None
-        for i in range(target_idx, min(target_idx + 5, len(lines))):
-            if re.search(r'<TaxExemptionCode\s*/>', lines[i], re.IGNORECASE):
-                code_idx = i
-                break
-
-        if code_idx is None:
-            print(f"[DEBUG] _apply_tax_exemption_fix: TaxExemptionCode not found near line {line_num}")
-            return xml_text, 0
-
-        print(f"[DEBUG] _apply_tax_exemption_fix: Replacing at line {line_num} (TaxExemptionCode at line {code_idx+1})")
-
-        # Replace TaxExemptionReason
-        lines[target_idx] = re.sub(
-            r'<TaxExemptionReason\s*/>',
-            f'<TaxExemptionReason>{reason}</TaxExemptionReason>',
-            lines[target_idx],
-            flags=re.IGNORECASE
-        )
-
-        # Replace TaxExemptionCode
-        lines[code_idx] = re.sub(
-            r'<TaxExemptionCode\s*/>',
-            f'<TaxExemptionCode>{code}</TaxExemptionCode>',
-            lines[code_idx],
-            flags=re.IGNORECASE
-        )
-
-        new_text = ''.join(lines)
-        return new_text, 1
-    except Exception as e:
-        print(f"[DEBUG] _apply_tax_exemption_fix: Exception: {e}")
-        return xml_text, 0
+    from core.saft_validator import schema_precheck, schema_precheck_enabled, schema_precheck_skips_jar
+    if not schema_precheck_enabled():
+        return None, []
+    messages = await asyncio.to_thread(schema_precheck, xml_path)
+    print(f"[SCHEMA] {label} {len(messages)} erros no pre-check")
+    if issue_stream is not None:
+        issues = await asyncio.to_thread(issue_stream.add, messages)
+    else:
+        stream = jar_output.IssueStream(xml_path)
+        try:
+            issues = await asyncio.to_thread(stream.add, messages)
+        finally:
+            stream.close()
+    return {'errors': len(messages), 'skipped_jar': bool(messages) and schema_precheck_skips_jar()}, issues
 
 @router.post('/upload/apply-fixes-and-validate')
 async def upload_apply_fixes_and_validate(request: Request, current=Depends(get_current_user), db=Depends(get_db)):
@@ -314,53 +212,29 @@ async def upload_apply_fixes_and_validate(request: Request, current=Depends(get_
     meta_path, bin_path = _upload_paths(upload_id)
     if not os.path.isfile(meta_path) or not os.path.isfile(bin_path):
         raise HTTPException(status_code=404, detail='upload not found')
-    # Read file text
+    # Resolve all fixes through the offset index and rewrite the file in one pass
+    locator = await _upload_locator(upload_id, bin_path)
     try:
-        try:
-            txt = Path(bin_path).read_text(encoding='utf-8', errors='replace')
-        except Exception:
-            txt = Path(bin_path).read_text(encoding='latin-1', errors='replace')
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f'Failed to read upload: {e}')
-    # Apply fixes
-    applied = 0
-    for fx in fixes:
-        if not isinstance(fx, dict):
-            continue
-
-        # Country fix (single suggestion)
-        if fx.get('code') == 'INVALID_COUNTRY' and fx.get('suggestion') and fx.get('customer_id') and fx.get('value'):
-            txt, n = _apply_country_fix(txt, fx['customer_id'], fx['value'], fx['suggestion'])
-            applied += n
-            print(f"[DEBUG] Applied INVALID_COUNTRY fix: {n} replacements")
-
-        # TaxExemption fix (multiple suggestions)
-        elif fx.get('code') == 'EMPTY_TAX_EXEMPTION' and fx.get('selected_suggestion'):
-            selected = fx['selected_suggestion']
-            location = fx.get('location') or {}
-            line_num = location.get('line')
-            if line_num and selected.get('reason') and selected.get('code'):
-                txt, n = _apply_tax_exemption_fix(txt, line_num, selected['reason'], selected['code'])
-                applied += n
-                print(f"[DEBUG] Applied EMPTY_TAX_EXEMPTION fix: {n} replacements (option: {selected.get('label')})")
-
-    # Write back only if changes were made
+        if locator is not None:
+            applied, outcomes = await asyncio.to_thread(saft_fixes.apply_fixes, bin_path, locator, fixes)
+        else:  # not an indexable SAF-T XML: nothing can be located
+            applied, outcomes = 0, saft_fixes.unresolved(fixes)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f'Failed to apply fixes: {e}')
+    print(f"[DEBUG] apply-fixes: {applied} replacements, {sum(o['status'] == 'applied' for o in outcomes)}/{len(outcomes)} fixes applied")
     if applied > 0:
-        try:
-            Path(bin_path).write_text(txt, encoding='utf-8', errors='strict')
-        except Exception:
-            # fallback to latin-1
-            Path(bin_path).write_text(txt, encoding='latin-1', errors='strict')
+        # Content changed: the recorded hash no longer identifies it
+        meta = _read_meta(meta_path)
+        meta.pop('sha256', None)
+        _write_meta(meta_path, meta)
 
     # Re-run validation with JAR (same as validate-jar-by-upload minimal subset)
-    from core.saft_validator import parse_xml, extract_cli_params
+    from core.saft_validator import load_cli_params
     try:
-        data = await asyncio.to_thread(lambda: open(bin_path, 'rb').read())
-        root = parse_xml(data)
-        params = extract_cli_params(root)
+        params = await asyncio.to_thread(load_cli_params, bin_path)
         nif = params.get('nif'); year = params.get('year'); month = params.get('month')
     except Exception as e:
-        return { 'ok': False, 'error': f'Invalid XML after fixes: {e}', 'path': bin_path }
+        return { 'ok': False, 'error': f'Invalid XML after fixes: {e}', 'path': bin_path, 'applied': applied, 'fixes': outcomes }
 
     country = get_country(request)
     repo = UsersRepo(db, country)
@@ -378,12 +252,11 @@ async def upload_apply_fixes_and_validate(request: Request, current=Depends(get_
         safe_cmd = list(cmd)
     TIMEOUT = int(os.getenv('FACTEMICLI_TIMEOUT','300'))
     try:
-        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=TIMEOUT)
+            proc = await _run_jar(cmd, TIMEOUT, current['username'], nif)
         except asyncio.TimeoutError:
-            proc.kill()
             return { 'ok': False, 'timeout': True, 'cmd_masked': safe_cmd, 'jar_path': jar_path }
+        stdout, stderr = proc.stdout, proc.stderr
         stdout_str = stdout.decode() if stdout else ''
         stderr_str = stderr.decode() if stderr else ''
         # success based on XML code
@@ -398,7 +271,7 @@ async def upload_apply_fixes_and_validate(request: Request, current=Depends(get_
         except Exception:
             ok = (proc.returncode == 0)
             stats = None
-        detailed_issues = _detect_issues_from_stdout(stdout_str, bin_path)
+        detailed_issues = _detect_issues_from_stdout(stdout_str, bin_path, await _upload_locator(upload_id, bin_path))
         limit = 10000
         def trunc(s: str) -> str:
             if s is None: return ''
@@ -411,15 +284,19 @@ async def upload_apply_fixes_and_validate(request: Request, current=Depends(get_
             'args': {'nif':nif,'year':year,'month':month},
             'cmd_masked': safe_cmd,
             'jar_path': jar_path,
-            'applied': applied
+            'applied': applied,
+            'fixes': outcomes,
+            'queue': proc.queue
         }
         if stats is not None:
             resp['statistics'] = {k:v for k,v in stats.items() if k != 'raw_xml'}
         if detailed_issues:
             resp['issues'] = detailed_issues
         return resp
+    except HTTPException:
+        raise
     except Exception as e:
-        return { 'ok': False, 'error': f'{e.__class__.__name__}: {e}', 'applied': applied }
+        return { 'ok': False, 'error': f'{e.__class__.__name__}: {e}', 'applied': applied, 'fixes': outcomes }
 
 
 @router.get("/health")
@@ -427,6 +304,35 @@ def health_pt():
     return {"status": "ok", "country": "pt"}
 
 
+_startup_tasks: set = set()  # strong refs to background startup work
+
+
+async def _create_ttl_indexes():
+    """TTL indexes that expire cached JAR results (RESULT_CACHE_TTL_HOURS) and jobs (JOB_TTL_DAYS)."""
+    from core.deps import get_db
+    db = get_db()
+    for repo in (ValidationResultCache(db, 'pt'), ValidationJobsRepo(db, 'pt')):
+        try:
+            await repo.create_indexes()
+        except Exception as e:
+            print(f"[STARTUP] create_indexes failed for {repo.collection.name}: {e}")
+
+
+@router.on_event("startup")
+async def _start_index_creation():
+    # In the background: an unreachable Mongo must not hold up startup
+    task = asyncio.create_task(_create_ttl_indexes())
+    _startup_tasks.add(task)
+    task.add_done_callback(_startup_tasks.discard)
+
+
+@router.on_event("shutdown")
+def _stop_jar_workers():
+    from core import saft_hash
+    shutdown_pools()
+    saft_hash.shutdown_pools()
+
+
 @router.get("/jar/status")
 def jar_status():
     path=_jar_path()
@@ -437,7 +343,9 @@ def jar_status():
             size=os.path.getsize(path)
         except Exception:
             size=None
-    return {"ok": exists, "path": path, "size": size}
+    pool = get_pool(path)
+    pool_info = pool.info() if pool else None
+    return {"ok": exists, "path": path, "size": size, "pool": pool_info, "scheduler": get_scheduler().info()}
 
 
 @router.get("/jar/run-check")
@@ -499,39 +407,136 @@ async def upload_start(request: Request, current=Depends(get_current_user)):
         with open(bin_path, 'wb') as f:
             if size > 0:
                 f.truncate(size)
-        with open(meta_path, 'w', encoding='utf-8') as f:
-            json.dump({'upload_id': upload_id, 'filename': filename, 'size': size, 'bin_path': bin_path}, f)
+        _write_meta(meta_path, chunked_upload.new_meta(upload_id, filename, size, bin_path, DEFAULT_CHUNK_SIZE))
     try:
         await asyncio.to_thread(_create_files)
     except Exception as e:
         print(f"[UPLOAD] ERRO ao preparar upload: {e}")
         raise HTTPException(status_code=500, detail=f'Failed to prepare upload: {e}')
-    return { 'ok': True, 'upload_id': upload_id, 'chunk_size': DEFAULT_CHUNK_SIZE }
+    chunked_upload.get_hasher(upload_id, create=True)
+    return { 'ok': True, 'upload_id': upload_id, 'chunk_size': DEFAULT_CHUNK_SIZE, 'encodings': chunked_upload.supported_encodings() }
 
 
 @router.put('/upload/chunk')
 async def upload_chunk(request: Request, upload_id: str, index: int = 0, offset: int | None = None, current=Depends(get_current_user)):
+    """Store one chunk, streaming (and inflating, per Content-Encoding) straight into the file.
+
+    An optional X-Chunk-SHA256 header carries the digest of the decompressed chunk.
+    """
     meta_path, bin_path = _upload_paths(upload_id)
     if not os.path.isfile(meta_path) or not os.path.isfile(bin_path):
         raise HTTPException(status_code=404, detail='upload_id not found')
+    meta = await asyncio.to_thread(_read_meta, meta_path)
+    chunk_size = meta.get('chunk_size', DEFAULT_CHUNK_SIZE)
     if offset is None:
-        offset = index * DEFAULT_CHUNK_SIZE
-    data = await request.body()
-    print(f"[UPLOAD] CHUNK {index} → offset={offset}, bytes={len(data)}")
-    def _write_chunk():
-        with open(bin_path, 'r+b') as f:
-            f.seek(offset)
-            f.write(data)
+        offset = index * chunk_size
+    elif 'chunks' in meta and offset != index * chunk_size:
+        raise HTTPException(status_code=400, detail=f'offset {offset} does not match chunk {index}')
+    encoding = request.headers.get('Content-Encoding')
+    try:
+        chunked_upload.check_index(meta, index)
+        decoder = chunked_upload.ChunkDecoder(encoding, chunked_upload.max_chunk_bytes(meta, index, DEFAULT_CHUNK_SIZE))
+    except chunked_upload.UnsupportedEncoding as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except chunked_upload.ChunkError as e:
+        print(f"[UPLOAD] CHUNK {index} rejeitado: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Chunks of one upload may arrive in parallel: positional writes on a shared fd
+    fd = chunked_upload.fds.acquire(upload_id, bin_path)
+    sha = hashlib.sha256()
+    wire_bytes = 0
+    written = 0
+    pending = bytearray()
+
+    async def _flush():
+        nonlocal written
+        if pending:
+            block = bytes(pending)
+            pending.clear()
+            await asyncio.to_thread(chunked_upload.pwrite_all, fd, block, offset + written)
+            written += len(block)
+
     try:
-        await asyncio.to_thread(_write_chunk)
+        try:
+            async for block in request.stream():
+                wire_bytes += len(block)
+                out = decoder.feed(block)
+                sha.update(out)
+                pending += out
+                if len(pending) >= STREAM_BUFFER_SIZE:
+                    await _flush()
+            out = decoder.finish()
+            sha.update(out)
+            pending += out
+            await _flush()
+            digest = sha.hexdigest()
+            chunked_upload.check_chunk(meta, index, written, digest, request.headers.get('X-Chunk-SHA256'))
+        except chunked_upload.ChunkError as e:
+            print(f"[UPLOAD] CHUNK {index} rejeitado: {e}")
+            if written and 'chunks' in meta:
+                # Bytes on disk no longer match what was recorded for this chunk
+                async with chunked_upload.lock(upload_id):
+                    meta = await asyncio.to_thread(_read_meta, meta_path)
+                    if chunked_upload.is_received(meta, index):
+                        chunked_upload.unmark_received(meta, index)
+                        meta.pop('sha256', None)
+                        await asyncio.to_thread(_write_meta, meta_path, meta)
+            raise HTTPException(status_code=400, detail=str(e))
+        print(f"[UPLOAD] CHUNK {index} → offset={offset}, bytes={written}, wire={wire_bytes}, encoding={decoder.encoding}")
+        if 'chunks' not in meta:
+            # Upload started before chunk bookkeeping existed: nothing to record
+            return { 'ok': True, 'bytes': written, 'offset': offset }
+        # Data is on disk before its bit is set, so any received chunk can be read back
+        async with chunked_upload.lock(upload_id):
+            meta = await asyncio.to_thread(_read_meta, meta_path)
+            chunked_upload.mark_received(meta, index, digest, wire_bytes)
+            meta.pop('sha256', None)
+            await asyncio.to_thread(_write_meta, meta_path, meta)
+        if chunked_upload.has_layout(meta):
+            # Extend the whole-file hash over the contiguous prefix received so far
+            hasher = chunked_upload.get_hasher(upload_id, create=True)
+            async with hasher.lock:
+                await asyncio.to_thread(
+                    hasher.advance, meta,
+                    lambda i: chunked_upload.pread_blocks(fd, chunked_upload.chunk_length(meta, i), i * chunk_size, STREAM_BUFFER_SIZE),
+                )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[UPLOAD] ERRO no chunk {index}: {e}")
         raise HTTPException(status_code=500, detail=f'Failed to write chunk: {e}')
-    return { 'ok': True, 'bytes': len(data), 'offset': offset }
+    finally:
+        chunked_upload.fds.release(upload_id)
+    return { 'ok': True, 'bytes': written, 'wire_bytes': wire_bytes, 'offset': offset, 'sha256': digest }
+
+
+@router.get('/upload/status')
+async def upload_status(upload_id: str, current=Depends(get_current_user)):
+    """Which chunks the server already holds, so a client can resume an interrupted upload."""
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(meta_path) or not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='upload not found')
+    meta = await asyncio.to_thread(_read_meta, meta_path)
+    missing = chunked_upload.missing_chunks(meta)
+    return {
+        'ok': True,
+        'upload_id': upload_id,
+        'size': meta.get('size'),
+        'chunk_size': meta.get('chunk_size', DEFAULT_CHUNK_SIZE),
+        'chunks': meta.get('chunks'),
+        'missing': missing,
+        'complete': not missing,
+        'sha256': meta.get('sha256'),
+        'encodings': chunked_upload.supported_encodings(),
+        **chunked_upload.transfer_sizes(meta),
+    }
 
 
 @router.post('/upload/finish')
 async def upload_finish(request: Request, current=Depends(get_current_user)):
+    """Close an upload: 409 with the missing chunk indices if incomplete, 422 if the
+    optional client `sha256` does not match what the server received."""
     body = await request.json()
     upload_id = body.get('upload_id')
     if not upload_id:
@@ -540,8 +545,37 @@ async def upload_finish(request: Request, current=Depends(get_current_user)):
     if not os.path.isfile(meta_path) or not os.path.isfile(bin_path):
         raise HTTPException(status_code=404, detail='upload not found')
     print(f"[UPLOAD] FINISH upload_id={upload_id}, path={bin_path}")
-    # Just respond OK; use next endpoint to trigger validation on server side
-    return { 'ok': True, 'upload_id': upload_id, 'path': bin_path }
+    async with chunked_upload.lock(upload_id):
+        meta = await asyncio.to_thread(_read_meta, meta_path)
+        missing = chunked_upload.missing_chunks(meta)
+        if missing:
+            print(f"[UPLOAD] FINISH recusado: faltam {len(missing)} chunks")
+            raise HTTPException(status_code=409, detail={
+                'message': 'upload incomplete',
+                'missing': missing[:1000],
+                'missing_count': len(missing),
+            })
+        hasher = chunked_upload.get_hasher(upload_id)
+        if 'chunks' in meta and hasher is not None and hasher.consistent(meta):
+            sha256 = hasher.hexdigest()
+        else:
+            # No in-process hash (restart, other worker, legacy upload): hash from disk once
+            sha256 = await asyncio.to_thread(result_cache.file_sha256, bin_path)
+        expected = (body.get('sha256') or '').strip().lower()
+        if expected and expected != sha256:
+            raise HTTPException(status_code=422, detail=f'sha256 mismatch: client {expected}, server {sha256}')
+        meta['sha256'] = sha256
+        await asyncio.to_thread(_write_meta, meta_path, meta)
+    chunked_upload.discard(upload_id)
+    # Index element/line offsets now, off the request, so issue lookups never rescan the file
+    task = asyncio.create_task(_upload_locator(upload_id, bin_path))
+    _locator_builds.add(task)
+    task.add_done_callback(_locator_builds.discard)
+    sizes = chunked_upload.transfer_sizes(meta)
+    if sizes['wire_bytes']:
+        print(f"[UPLOAD] FINISH {upload_id}: {sizes['raw_bytes']} bytes recebidos em {sizes['wire_bytes']} na rede")
+    # Use next endpoint to trigger validation on server side
+    return { 'ok': True, 'upload_id': upload_id, 'path': bin_path, 'sha256': sha256, **sizes }
 
 
 @router.post('/validate-jar-by-upload')
@@ -557,19 +591,37 @@ async def validate_with_jar_by_upload(
     meta_path, bin_path = _upload_paths(upload_id)
     if not os.path.isfile(meta_path) or not os.path.isfile(bin_path):
         raise HTTPException(status_code=404, detail='upload not found')
-    print(f"[VALIDATE] upload_id={upload_id}, operation={operation}, user={current['username']}")
-    # Reuse existing flow by reading XML and executing JAR (similar to by_key)
-    from core.saft_validator import parse_xml, extract_cli_params
+    return await _validate_upload(upload_id, current['username'], get_country(request), db, operation=operation, full=full)
+
+
+async def _validate_upload(
+    upload_id: str,
+    username: str,
+    country: str,
+    db,
+    operation: str = 'validar',
+    full: int = 0,
+    emit=None,
+):
+    """Validate (or submit) a chunked upload with FACTEMICLI.jar and archive successes.
+
+    Shared by /validate-jar-by-upload and the background job API. `emit`, when
+    given, is called as emit(event, data) for progress: 'started', 'stdout'
+    (one per JAR output line), 'issue' (one per error, as the JAR reports it),
+    'issues' and 'archived'.
+    """
+    emit = emit or (lambda event, data=None: None)
+    meta_path, bin_path = _upload_paths(upload_id)
+    print(f"[VALIDATE] upload_id={upload_id}, operation={operation}, user={username}")
+    # Reuse existing flow by reading the XML Header and executing JAR (similar to by_key)
+    from core.saft_validator import load_cli_params
     try:
-        data = await asyncio.to_thread(lambda: open(bin_path, 'rb').read())
-    except Exception as e:
+        params = await asyncio.to_thread(load_cli_params, bin_path)
+    except OSError as e:
         print(f"[VALIDATE] ERRO ao ler ficheiro: {e}")
         raise HTTPException(status_code=500, detail=f'Failed to read upload: {e}')
-    try:
-        root = parse_xml(data)
     except Exception as e:
         return { 'ok': False, 'error': f'Invalid XML: {e}', 'jar_path': _jar_path() }
-    params = extract_cli_params(root)
     nif = params.get('nif'); year = params.get('year'); month = params.get('month')
     missing = [k for k in ['nif','year','month'] if not params.get(k)]
     if missing:
@@ -577,12 +629,11 @@ async def validate_with_jar_by_upload(
     # Delegate to validate_with_jar_by_key-like local execution
     # For brevity and to avoid duplication, call into the by_key implementation by mocking saft_path
     # But here we inline minimal subset
-    country = get_country(request)
     repo = UsersRepo(db, country)
-    u = await repo.get(current['username'])
+    u = await repo.get(username)
     if not u:
         raise HTTPException(status_code=401, detail=USER_NOT_FOUND)
-    selected_pass = await _select_at_password(repo, current['username'], nif)
+    selected_pass = await _select_at_password(repo, username, nif)
     if not selected_pass and operation == 'enviar':
         return { 'ok': False, 'error': f'Operation "enviar" requires AT password for NIF {nif}. Save it first.' }
 
@@ -595,14 +646,52 @@ async def validate_with_jar_by_upload(
     else:
         cmd = ['java','-jar',jar_path,'-op','validar','-i',bin_path]
         safe_cmd = list(cmd)
+    cache = ValidationResultCache(db, country)
+    cache_key = None
+    if operation in result_cache.CACHEABLE_OPERATIONS and not full:
+        cache_key = result_cache.cache_key(await _upload_sha256(upload_id), jar_path, operation, username, selected_pass)
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            print(f"[VALIDATE] cache hit upload_id={upload_id}")
+            emit('issues', cached.get('issues') or [])
+            return cached
     TIMEOUT = int(os.getenv('FACTEMICLI_TIMEOUT','300'))
+    # Issues are parsed and located as the JAR writes them, not after the whole stdout
+    issue_stream = jar_output.IssueStream(bin_path, await _upload_locator(upload_id, bin_path))
+    detailed_issues = []
+    # Optional schema pre-check; may answer without spawning the JAR
+    try:
+        precheck, precheck_issues = await _schema_precheck(bin_path, f"upload_id={upload_id}", issue_stream)
+    except BaseException:
+        issue_stream.close()
+        raise
+    if precheck is not None and precheck['skipped_jar']:
+        issue_stream.close()
+        emit('issues', precheck_issues)
+        return {
+            'ok': False,
+            'issues': precheck_issues,
+            'schema_precheck': precheck,
+            'args': {'nif': nif, 'year': year, 'month': month},
+            'jar_path': jar_path,
+        }
+    def on_line(line):
+        emit('stdout', line.decode(errors='replace').rstrip('\r\n'))
+        for issue in issue_stream.feed(line):
+            detailed_issues.append(issue)
+            emit('issue', issue)
     try:
-        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=TIMEOUT)
+            proc = await _run_jar(
+                cmd, TIMEOUT, username, nif,
+                on_start=lambda: emit('started', {'cmd_masked': safe_cmd}),
+                on_line=on_line,
+            )
         except asyncio.TimeoutError:
-            proc.kill()
             return { 'ok': False, 'timeout': True, 'cmd_masked': safe_cmd, 'jar_path': jar_path }
+        finally:
+            detailed_issues.extend(issue_stream.close())
+        stdout, stderr = proc.stdout, proc.stderr
         # Determine true success from JAR response XML, not only return code
         try:
             from core.saft_archiver import is_validation_successful, parse_jar_response_xml
@@ -634,13 +723,7 @@ async def validate_with_jar_by_upload(
         print(stdout_str[:1000])
         print("=" * 80)
 
-        detailed_issues = _detect_issues_from_stdout(stdout_str, bin_path)
-
-        print(f"[DEBUG] validate-jar-by-upload: detailed_issues count: {len(detailed_issues)}")
-        if detailed_issues:
-            import json
-            print(f"[DEBUG] validate-jar-by-upload: issues JSON:")
-            print(json.dumps(detailed_issues, indent=2, ensure_ascii=False))
+        print(f"[JAR] {len(detailed_issues)} erros: {issue_stream.counts}")
         print("=" * 80)
 
         # No archive here to keep response smaller; UI will handle like other endpoints
@@ -656,12 +739,16 @@ async def validate_with_jar_by_upload(
             'stderr': trunc(stderr_str),
             'args': {'nif':nif,'year':year,'month':month},
             'cmd_masked': safe_cmd,
-            'jar_path': jar_path
+            'jar_path': jar_path,
+            'queue': proc.queue
         }
         if stats is not None:
             resp_obj['statistics'] = {k:v for k,v in stats.items() if k != 'raw_xml'}
             if stats.get('raw_xml') and full:
                 resp_obj['response_xml'] = stats.get('raw_xml')
+        if precheck is not None:
+            resp_obj['schema_precheck'] = {**precheck, 'issues': precheck_issues}
+        emit('issues', detailed_issues)
         if detailed_issues:
             resp_obj['issues'] = detailed_issues
             print(f"[DEBUG] validate-jar-by-upload: Added {len(detailed_issues)} issues to response")
@@ -679,7 +766,7 @@ async def validate_with_jar_by_upload(
                 print(f"[DEBUG]   - year: {year}")
                 print(f"[DEBUG]   - month: {month}")
                 print(f"[DEBUG]   - operation: {operation}")
-                print(f"[DEBUG]   - username: {current['username']}")
+                print(f"[DEBUG]   - username: {username}")
 
                 import tempfile
                 import zipfile
@@ -718,7 +805,7 @@ async def validate_with_jar_by_upload(
                 # Upload to B2
                 storage = Storage()
                 print(f"[DEBUG] validate-jar-by-upload: Uploading to B2 bucket: {storage.bucket}")
-                storage.client.upload_file(temp_zip_path, storage.bucket, storage_key)
+                await storage.upload(storage_key, temp_zip_path)
                 print(f"[DEBUG] validate-jar-by-upload: ✅ Uploaded to B2 successfully")
 
                 # Save to validation history
@@ -728,7 +815,7 @@ async def validate_with_jar_by_upload(
                 print(f"[DEBUG]   - storage_key: {storage_key}")
 
                 validation_id = await history_repo.save_validation(
-                    username=current['username'],
+                    username=username,
                     nif=nif,
                     year=year,
                     month=month,
@@ -754,6 +841,7 @@ async def validate_with_jar_by_upload(
                 # Add to response
                 resp_obj['storage_key'] = storage_key
                 resp_obj['validation_id'] = validation_id
+                emit('archived', {'storage_key': storage_key, 'validation_id': validation_id})
 
                 # Clean up temp file
                 try:
@@ -768,11 +856,171 @@ async def validate_with_jar_by_upload(
                 # Don't fail the request, just log the error
                 resp_obj['save_error'] = str(save_error)
 
+        await cache.put(cache_key, resp_obj, stdout_str + stderr_str)
         return resp_obj
+    except HTTPException:
+        raise
     except Exception as e:
         return { 'ok': False, 'error': f'{e.__class__.__name__}: {e}' }
 
 
+# --------------------------- Background validation jobs ----------------------------
+@router.post('/jobs/validate-by-upload')
+async def submit_validation_job(
+    request: Request,
+    upload_id: str,
+    current=Depends(get_current_user),
+    db=Depends(get_db),
+    operation: str = 'validar',
+    full: int = 0,
+):
+    """Queue /validate-jar-by-upload as a background job and return its id immediately.
+
+    Poll GET /pt/jobs/{job_id} or stream GET /pt/jobs/{job_id}/events (SSE).
+    """
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(meta_path) or not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='upload not found')
+    country = get_country(request)
+    job_id = uuid.uuid4().hex
+    jobs = ValidationJobsRepo(db, country)
+    await jobs.create(job_id, current['username'], 'validate-by-upload', {'upload_id': upload_id, 'operation': operation, 'full': full})
+    events = job_events.register(job_id)
+    events.emit('queued', {'job_id': job_id, 'scheduler': get_scheduler().info()})
+    events.task = asyncio.create_task(
+        _run_validation_job(job_id, events, jobs, upload_id, current['username'], country, db, operation, full)
+    )
+    print(f"[JOBS] queued job_id={job_id} upload_id={upload_id} operation={operation} user={current['username']}")
+    return {
+        'ok': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/pt/jobs/{job_id}',
+        'events_url': f'/pt/jobs/{job_id}/events',
+    }
+
+
+async def _run_validation_job(job_id, events, jobs, upload_id, username, country, db, operation, full):
+    status = {'value': 'queued'}
+    pending = []
+
+    async def _persist(**fields):
+        try:
+            await jobs.update(job_id, **fields)
+        except Exception as e:
+            print(f"[JOBS] failed to persist job {job_id}: {e}")
+
+    def emit(event, data=None):
+        events.emit(event, data)
+        if event == 'started':
+            status['value'] = 'running'
+            pending.append(asyncio.create_task(_persist(status='running')))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            await _persist(status=status['value'])
+
+    hb = asyncio.create_task(heartbeat())
+    try:
+        result = await _validate_upload(upload_id, username, country, db, operation=operation, full=full, emit=emit)
+        issues = result.get('issues') or []
+        stored = result
+        if len(issues) > JOB_MAX_STORED_ISSUES:
+            stored = {**result, 'issues': issues[:JOB_MAX_STORED_ISSUES], 'issues_truncated': True}
+        await _persist(status='done', result=stored, issues_count=len(issues))
+        events.emit('result', result)
+    except HTTPException as e:
+        await _persist(status='failed', error=str(e.detail))
+        events.emit('failed', {'error': e.detail, 'status_code': e.status_code})
+    except Exception as e:
+        error = f'{e.__class__.__name__}: {e}'
+        print(f"[JOBS] job {job_id} failed: {error}")
+        await _persist(status='failed', error=error)
+        events.emit('failed', {'error': error})
+    finally:
+        hb.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        events.close()
+
+
+async def _load_job(job_id: str, request: Request, current, db):
+    jobs = ValidationJobsRepo(db, get_country(request))
+    doc = await jobs.get(job_id, current['username'])
+    if not doc:
+        raise HTTPException(status_code=404, detail='job not found')
+    if job_events.get(job_id) is None:
+        # Not running in this process: detect jobs orphaned by a restart
+        doc = await jobs.mark_if_stale(doc, JOB_STALE_SECONDS)
+    return jobs, doc
+
+
+def _job_view(doc) -> dict:
+    return {
+        'ok': True,
+        'job_id': doc['_id'],
+        'kind': doc.get('kind'),
+        'status': doc.get('status'),
+        'params': doc.get('params'),
+        'created_at': doc.get('created_at'),
+        'updated_at': doc.get('updated_at'),
+        'issues_count': doc.get('issues_count'),
+        'result': doc.get('result'),
+        'error': doc.get('error'),
+    }
+
+
+@router.get('/jobs/{job_id}')
+async def get_validation_job(job_id: str, request: Request, current=Depends(get_current_user), db=Depends(get_db)):
+    _, doc = await _load_job(job_id, request, current, db)
+    return _job_view(doc)
+
+
+@router.get('/jobs/{job_id}/events')
+async def stream_validation_job(job_id: str, request: Request, current=Depends(get_current_user), db=Depends(get_db)):
+    """Server-Sent Events: queued, started, stdout (one per JAR line), issues, archived, result|failed.
+
+    Supports resuming with the Last-Event-ID header while the job runs in this
+    process; otherwise the job is followed from Mongo until it finishes.
+    """
+    jobs, doc = await _load_job(job_id, request, current, db)
+    try:
+        last_id = int(request.headers.get('last-event-id') or 0)
+    except ValueError:
+        last_id = 0
+    live = job_events.get(job_id)
+
+    async def _live():
+        async for item in live.follow(last_id):
+            yield job_events.sse_format(item)
+
+    async def _from_db():
+        current_doc = doc
+        seen = None
+        seq = 0
+        while True:
+            if current_doc.get('status') != seen:
+                seen = current_doc.get('status')
+                seq += 1
+                yield job_events.sse_format((seq, 'status', {'status': seen}))
+            if seen in TERMINAL_STATUSES:
+                seq += 1
+                if seen == 'done':
+                    yield job_events.sse_format((seq, 'result', current_doc.get('result')))
+                else:
+                    yield job_events.sse_format((seq, 'failed', {'error': current_doc.get('error')}))
+                return
+            await asyncio.sleep(2)
+            current_doc = await jobs.get(job_id, current['username']) or current_doc
+            current_doc = await jobs.mark_if_stale(current_doc, JOB_STALE_SECONDS)
+
+    return StreamingResponse(
+        _live() if live is not None else _from_db(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @router.post('/secrets/at/entries', response_model=ATSecretOut)
 async def upsert_at_entry(
     entry: ATEntryIn,
@@ -963,8 +1211,10 @@ async def upload_file(
 ):
     country = get_country(request)
     storage = Storage()
+    # Pass the spooled file object: boto3 streams it instead of one bytes blob in RAM
+    file.file.seek(0)
     key = await storage.put(
-        country, file.filename, await file.read(), content_type=file.content_type
+        country, file.filename, file.file, content_type=file.content_type
     )
     return {"ok": True, "object": key}
 
@@ -985,23 +1235,29 @@ async def analyze_file(
     """
     country = get_country(request)
     repo = AnalysisRepo(db, country)
-    from core.saft_validator import parse_xml, validate_saft
-    data = await file.read()
+    from core.saft_validator import validate_saft_stream
+    saft_path, _, _ = await _spool_upload(file)
     issues = []
     summary = {}
     status = 'ok'
     try:
-        root = parse_xml(data)
-        issues, summary = validate_saft(root)
-        status = 'ok' if not any(i.get('level') == 'error' for i in issues) else 'errors'
-    except Exception as e:
-        status = 'invalid-xml'
-        issues = [{ 'level': 'error', 'code': 'XML_INVALID', 'message': str(e), 'path': '/' }]
+        try:
+            issues, summary = await asyncio.to_thread(validate_saft_stream, saft_path)
+            status = 'ok' if not any(i.get('level') == 'error' for i in issues) else 'errors'
+        except Exception as e:
+            status = 'invalid-xml'
+            issues = [{ 'level': 'error', 'code': 'XML_INVALID', 'message': str(e), 'path': '/' }]
 
-    object_key = None
-    if status == 'ok':
-        storage = Storage()
-        object_key = await storage.put(country, file.filename, data, content_type=file.content_type)
+        object_key = None
+        if status == 'ok':
+            storage = Storage()
+            with open(saft_path, 'rb') as f:
+                object_key = await storage.put(country, file.filename, f, content_type=file.content_type)
+    finally:
+        try:
+            os.unlink(saft_path)
+        except OSError:
+            pass
 
     record = await repo.create(
         current['username'],
@@ -1074,7 +1330,7 @@ async def jar_install(
 
     # Download from bucket to target path
     try:
-        storage.client.download_file(storage.bucket, full, target_path)
+        await storage.download(full, target_path)
     except ClientError as e:
         code = (e.response.get('Error', {}).get('Code') if hasattr(e, 'response') else None) or 'ClientError'
         # Map common S3 error codes
@@ -1115,21 +1371,15 @@ async def validate_with_jar(
         operation: operation to perform - 'validar' (validation only) or 'enviar' (submit to AT)
         dry_run: if 1, return command without executing (preview mode)
     """
-    from core.saft_validator import parse_xml, extract_cli_params
+    from core.saft_validator import load_cli_params
     from core.security import decrypt
-    import tempfile
 
-    # Prepare local temp file (perform sync I/O in a worker thread to keep endpoint responsive)
-    data = await file.read()
-    def _write_tmp(payload: bytes) -> str:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xml') as tmp:
-            tmp.write(payload)
-            return tmp.name
-    saft_path = await asyncio.to_thread(_write_tmp, data)
+    # Prepare local temp file (copied in blocks in a worker thread; hashed on the way)
+    saft_path, _, file_hash = await _spool_upload(file)
 
-    # Extract params from XML
+    # Extract params from XML (streams the Header only)
     try:
-        root = parse_xml(data)
+        params = await asyncio.to_thread(load_cli_params, saft_path)
     except Exception as e:
         return {
             'ok': False,
@@ -1139,7 +1389,6 @@ async def validate_with_jar(
             'jar_path': _jar_path(),
             'transcript': { 'error': 'invalid-xml' }
         }
-    params = extract_cli_params(root)
     nif = params.get('nif'); year = params.get('year'); month = params.get('month')
     missing = [k for k in ['nif','year','month'] if not params.get(k)]
     if missing:
@@ -1289,19 +1538,33 @@ async def validate_with_jar(
             'message': f'Dry run - comando "{op}" não foi executado'
         }
 
+    cache = ValidationResultCache(db, country)
+    cache_key = None
+    if op in result_cache.CACHEABLE_OPERATIONS and not full:
+        cache_key = result_cache.cache_key(file_hash, jar_path, op, username, selected_pass)
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    precheck, precheck_issues = await _schema_precheck(saft_path, f"file={file.filename}")
+    if precheck is not None and precheck['skipped_jar']:
+        return {
+            'ok': False,
+            'issues': precheck_issues,
+            'schema_precheck': precheck,
+            'args': {'nif':nif,'year':year,'month':month},
+            'cmd_masked': safe_cmd,
+            'jar_path': jar_path,
+            'transcript': transcript,
+        }
+
     try:
         # Allow configurable timeout for large files/long validations
         TIMEOUT = int(os.getenv('FACTEMICLI_TIMEOUT', '300'))
 
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=TIMEOUT)
+            proc = await _run_jar(cmd, TIMEOUT, username, nif)
         except asyncio.TimeoutError:
-            proc.kill()
             # Return a structured timeout result instead of raising, so the UI can show the command
             limit = 10000 if not full else None
             def trunc(s: str) -> str:
@@ -1321,6 +1584,7 @@ async def validate_with_jar(
                 'jar_path': jar_path,
                 'transcript': transcript
             }
+        stdout, stderr = proc.stdout, proc.stderr
         ok = (proc.returncode == 0)
         
         # Decode outputs
@@ -1374,7 +1638,7 @@ async def validate_with_jar(
                     storage_key = generate_storage_key(nif, year, month, zip_filename, country=country)
                     print(f"[DEBUG] Uploading to B2 with key: {storage_key}")
                     storage = Storage()
-                    storage.client.upload_file(temp_zip, storage.bucket, storage_key)
+                    await storage.upload(storage_key, temp_zip)
                     print(f"[DEBUG] Upload successful!")
                     
                     # Save validation record to MongoDB
@@ -1437,7 +1701,8 @@ async def validate_with_jar(
             'cmd_masked': safe_cmd,
             'cmd': safe_cmd if os.getenv('EXPOSE_CMD','0')=='1' else None,
             'jar_path': jar_path,
-            'transcript': transcript
+            'transcript': transcript,
+            'queue': proc.queue
         }
         
         # Add archive info if available
@@ -1447,7 +1712,10 @@ async def validate_with_jar(
             response['archived'] = True
         if archive_error:
             response['archive_error'] = archive_error
+        if precheck is not None:
+            response['schema_precheck'] = {**precheck, 'issues': precheck_issues}
         
+        await cache.put(cache_key, response, stdout_str + stderr_str)
         return response
     except HTTPException:
         raise
@@ -1483,105 +1751,117 @@ async def validate_with_jar_by_key(
 ):
     """Validate or submit a SAFT XML that already exists in Backblaze, referenced by object_key.
 
-    Downloads the object to a temp file and runs the same flow as validate_with_jar, avoiding large uploads.
+    Fetches the object through the local object cache and runs the same flow as validate_with_jar, avoiding large uploads.
     """
-    from core.saft_validator import parse_xml, extract_cli_params
+    from core.saft_validator import load_cli_params
     from core.storage import Storage
     import tempfile
 
     country = get_country(request)
     username = current["username"]
 
-    # Download to local temp file
+    # Local copy from the object cache (pinned until released below)
     storage = Storage()
     saft_path = await storage.fetch_to_local(country, body.object_key)
-    original_name = os.path.basename(body.object_key)
-
-    # Read file bytes for XML parsing
     try:
-        with open(saft_path, 'rb') as f:
-            data = f.read()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read object: {e}")
+        original_name = os.path.basename(body.object_key)
 
-    # Extract params
-    try:
-        root = parse_xml(data)
-    except Exception as e:
-        return {
-            'ok': False,
-            'error': f"Invalid XML: {str(e)}",
-            'args': None,
-            'cmd_masked': None,
-            'jar_path': _jar_path(),
-            'transcript': { 'error': 'invalid-xml' }
-        }
-    params = extract_cli_params(root)
-    nif = params.get('nif'); year = params.get('year'); month = params.get('month')
-    missing = [k for k in ['nif','year','month'] if not params.get(k)]
-    if missing:
-        return {
-            'ok': False,
-            'error': f"Missing fields in XML for CLI: {', '.join(missing)}",
-            'args': {'nif': nif, 'year': year, 'month': month},
-            'cmd_masked': None,
-            'jar_path': _jar_path(),
-            'transcript': { 'error': 'missing-fields' }
-        }
+        # Extract params (streams the Header only)
+        try:
+            params = await asyncio.to_thread(load_cli_params, saft_path)
+        except OSError as e:
+            raise HTTPException(status_code=400, detail=f"Failed to read object: {e}")
+        except Exception as e:
+            return {
+                'ok': False,
+                'error': f"Invalid XML: {str(e)}",
+                'args': None,
+                'cmd_masked': None,
+                'jar_path': _jar_path(),
+                'transcript': { 'error': 'invalid-xml' }
+            }
+        nif = params.get('nif'); year = params.get('year'); month = params.get('month')
+        missing = [k for k in ['nif','year','month'] if not params.get(k)]
+        if missing:
+            return {
+                'ok': False,
+                'error': f"Missing fields in XML for CLI: {', '.join(missing)}",
+                'args': {'nif': nif, 'year': year, 'month': month},
+                'cmd_masked': None,
+                'jar_path': _jar_path(),
+                'transcript': { 'error': 'missing-fields' }
+            }
 
-    # Credentials
-    repo = UsersRepo(db, country)
-    u = await repo.get(username)
-    if not u:
-        raise HTTPException(status_code=401, detail=USER_NOT_FOUND)
-    selected_pass = await _select_at_password(repo, username, nif)
-    if not selected_pass and operation == 'enviar':
-        return {
-            'ok': False,
-            'error': f'Operation "enviar" requires AT password for NIF {nif}. Save it in Credenciais first.',
-            'returncode': None,
-            'stdout': '',
-            'stderr': '',
-            'args': {'nif':nif,'year':year,'month':month},
-            'cmd_masked': ['java','-jar',_jar_path(),' -n ',nif,' -p ','***',' -a ',year,' -m ',month,' -op ',operation,' -i ',saft_path],
-            'jar_path': _jar_path(),
-            'transcript': { 'op': operation }
-        }
+        # Credentials
+        repo = UsersRepo(db, country)
+        u = await repo.get(username)
+        if not u:
+            raise HTTPException(status_code=401, detail=USER_NOT_FOUND)
+        selected_pass = await _select_at_password(repo, username, nif)
+        if not selected_pass and operation == 'enviar':
+            return {
+                'ok': False,
+                'error': f'Operation "enviar" requires AT password for NIF {nif}. Save it in Credenciais first.',
+                'returncode': None,
+                'stdout': '',
+                'stderr': '',
+                'args': {'nif':nif,'year':year,'month':month},
+                'cmd_masked': ['java','-jar',_jar_path(),' -n ',nif,' -p ','***',' -a ',year,' -m ',month,' -op ',operation,' -i ',saft_path],
+                'jar_path': _jar_path(),
+                'transcript': { 'op': operation }
+            }
 
-    # Build command as in validate_with_jar
-    jar_path = _jar_path()
-    op = operation
-    if selected_pass:
-        cmd = ['java','-jar',jar_path,'-n',nif,'-p',selected_pass,'-a',year,'-m',month,'-op',op,'-i',saft_path]
-        safe_cmd = list(cmd)
-        for i, part in enumerate(safe_cmd):
-            if part == selected_pass:
-                safe_cmd[i] = '***'
-    else:
-        cmd = ['java','-jar',jar_path,'-op','validar','-i',saft_path]
-        safe_cmd = list(cmd)
+        # Build command as in validate_with_jar
+        jar_path = _jar_path()
+        op = operation
+        if selected_pass:
+            cmd = ['java','-jar',jar_path,'-n',nif,'-p',selected_pass,'-a',year,'-m',month,'-op',op,'-i',saft_path]
+            safe_cmd = list(cmd)
+            for i, part in enumerate(safe_cmd):
+                if part == selected_pass:
+                    safe_cmd[i] = '***'
+        else:
+            cmd = ['java','-jar',jar_path,'-op','validar','-i',saft_path]
+            safe_cmd = list(cmd)
 
-    if dry_run:
-        return {
-            'ok': True,
-            'dry_run': True,
-            'returncode': None,
-            'stdout': '',
-            'stderr': '',
-            'args': {'nif':nif,'year':year,'month':month},
-            'cmd_masked': safe_cmd,
-            'jar_path': jar_path,
-            'message': f'Dry run - comando "{op}" não foi executado'
-        }
+        if dry_run:
+            return {
+                'ok': True,
+                'dry_run': True,
+                'returncode': None,
+                'stdout': '',
+                'stderr': '',
+                'args': {'nif':nif,'year':year,'month':month},
+                'cmd_masked': safe_cmd,
+                'jar_path': jar_path,
+                'message': f'Dry run - comando "{op}" não foi executado'
+            }
 
-    # Execute
-    try:
+        cache = ValidationResultCache(db, country)
+        cache_key = None
+        if op in result_cache.CACHEABLE_OPERATIONS and not full:
+            file_hash = await asyncio.to_thread(result_cache.file_sha256, saft_path)
+            cache_key = result_cache.cache_key(file_hash, jar_path, op, username, selected_pass)
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        precheck, precheck_issues = await _schema_precheck(saft_path, f"object_key={body.object_key}")
+        if precheck is not None and precheck['skipped_jar']:
+            return {
+                'ok': False,
+                'issues': precheck_issues,
+                'schema_precheck': precheck,
+                'args': {'nif':nif,'year':year,'month':month},
+                'cmd_masked': safe_cmd,
+                'jar_path': jar_path,
+            }
+
+        # Execute
         TIMEOUT = int(os.getenv('FACTEMICLI_TIMEOUT', '300'))
-        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=TIMEOUT)
+            proc = await _run_jar(cmd, TIMEOUT, username, nif)
         except asyncio.TimeoutError:
-            proc.kill()
             return {
                 'ok': False,
                 'error': 'Validation timed out',
@@ -1593,6 +1873,7 @@ async def validate_with_jar_by_key(
                 'cmd_masked': safe_cmd,
                 'jar_path': jar_path,
             }
+        stdout, stderr = proc.stdout, proc.stderr
         ok = (proc.returncode == 0)
         stdout_str = stdout.decode() if stdout else ''
         stderr_str = stderr.decode() if stderr else ''
@@ -1621,7 +1902,7 @@ async def validate_with_jar_by_key(
                     zip_size = compress_xml_to_zip(saft_path, temp_zip, original_filename=original_name)
                     storage_key = generate_storage_key(nif, year, month, zip_filename, country=country)
                     storage = Storage()
-                    storage.client.upload_file(temp_zip, storage.bucket, storage_key)
+                    await storage.upload(storage_key, temp_zip)
                     history_repo = ValidationHistoryRepo(db, country=country)
                     validation_id = await history_repo.save_validation(
                         username=username,
@@ -1658,6 +1939,7 @@ async def validate_with_jar_by_key(
             'args': {'nif':nif,'year':year,'month':month},
             'cmd_masked': safe_cmd,
             'jar_path': jar_path,
+            'queue': proc.queue,
         }
         if validation_id:
             resp['validation_id'] = validation_id
@@ -1665,12 +1947,12 @@ async def validate_with_jar_by_key(
             resp['archived'] = True
         if archive_error:
             resp['archive_error'] = archive_error
+        if precheck is not None:
+            resp['schema_precheck'] = {**precheck, 'issues': precheck_issues}
+        await cache.put(cache_key, resp, stdout_str + stderr_str)
         return resp
     finally:
-        try:
-            os.unlink(saft_path)
-        except Exception:
-            pass
+        storage.release_local(saft_path)
 
 
 @router.get("/validation-history")
@@ -1783,10 +2065,7 @@ async def delete_validation_history(
             print(f"[DELETE-HISTORY] Deleting from B2: {storage_key}")
 
             # Delete from B2
-            storage.client.delete_object(
-                Bucket=storage.bucket,
-                Key=storage_key
-            )
+            await storage.delete(storage_key)
 
             b2_deleted = True
             print(f"[DELETE-HISTORY] Successfully deleted from B2: {storage_key}")
@@ -1825,70 +2104,66 @@ async def submit(
     - Looks up matching AT password in at_entries by ident=NIF; falls back to legacy single 'at'
     - Invokes the JAR and returns diagnostics (masked command, stdout/stderr)
     """
-    from core.saft_validator import parse_xml, extract_cli_params
+    from core.saft_validator import load_cli_params
     from core.security import decrypt
     country = get_country(request)
     storage = Storage()
     local_path = await storage.fetch_to_local(country, object_key)
-    # Parse XML to get NIF
-    try:
-        data = await asyncio.to_thread(Path(local_path).read_bytes)
-        root = parse_xml(data)
-        params = extract_cli_params(root)
-        nif = params.get('nif'); year = params.get('year'); month = params.get('month')
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid XML: {str(e)}")
-    if not (nif and year and month):
-        raise HTTPException(status_code=400, detail="Missing nif/year/month in XML")
-
-    repo = UsersRepo(db, country)
-    u = await repo.get(current["username"])
-    if not u:
-        raise HTTPException(status_code=401, detail=USER_NOT_FOUND)
-    selected_pass = await _select_at_password(repo, current['username'], nif)
-    if not selected_pass:
-        raise HTTPException(status_code=400, detail=f"AT password not found for NIF {nif}. Save it under Credenciais.")
-
-    # Build command similar to validate-jar
-    jar_path = _jar_path()
-    if not os.path.isfile(jar_path):
-        raise HTTPException(status_code=400, detail=f"FACTEMICLI.jar not found at {jar_path}")
-    input_arg = '@' + local_path
-    cmd = ['java','-jar',jar_path,'-n',nif,'-p',selected_pass,'-a',year,'-m',month,'-op','enviar','-i',input_arg]
     try:
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
+        # Parse XML Header to get NIF
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=60)
-        except asyncio.TimeoutError:
-            proc.kill()
-            raise HTTPException(status_code=504, detail="Submission timed out")
-        out_text = (stdout.decode() if stdout else '') + (('\n' + stderr.decode()) if stderr else '')
-        ok = (proc.returncode == 0)
-        safe_cmd = list(cmd)
+            params = await asyncio.to_thread(load_cli_params, local_path)
+            nif = params.get('nif'); year = params.get('year'); month = params.get('month')
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid XML: {str(e)}")
+        if not (nif and year and month):
+            raise HTTPException(status_code=400, detail="Missing nif/year/month in XML")
+
+        repo = UsersRepo(db, country)
+        u = await repo.get(current["username"])
+        if not u:
+            raise HTTPException(status_code=401, detail=USER_NOT_FOUND)
+        selected_pass = await _select_at_password(repo, current['username'], nif)
+        if not selected_pass:
+            raise HTTPException(status_code=400, detail=f"AT password not found for NIF {nif}. Save it under Credenciais.")
+
+        # Build command similar to validate-jar
+        jar_path = _jar_path()
+        if not os.path.isfile(jar_path):
+            raise HTTPException(status_code=400, detail=f"FACTEMICLI.jar not found at {jar_path}")
+        input_arg = '@' + local_path
+        cmd = ['java','-jar',jar_path,'-n',nif,'-p',selected_pass,'-a',year,'-m',month,'-op','enviar','-i',input_arg]
         try:
-            for i, part in enumerate(safe_cmd):
-                if part == selected_pass:
-                    safe_cmd[i] = '***'
-        except Exception:
-            pass
-        if not ok:
-            raise HTTPException(status_code=502, detail={
-                'message': 'Submission failed',
-                'returncode': proc.returncode,
-                'stdout': (stdout.decode() if stdout else '')[:4000],
-                'stderr': (stderr.decode() if stderr else '')[:4000],
-                'cmd': safe_cmd if os.getenv('EXPOSE_CMD','0')=='1' else None,
-                'args': {'nif':nif,'year':year,'month':month}
-            })
-        return { 'ok': True, 'output': out_text[:4000], 'returncode': proc.returncode, 'args': {'nif':nif,'year':year,'month':month}, 'cmd': safe_cmd if os.getenv('EXPOSE_CMD','0')=='1' else None }
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to invoke JAR: {e.__class__.__name__}: {str(e)}")
+            try:
+                proc = await _run_jar(cmd, 60, current['username'], nif)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail="Submission timed out")
+            stdout, stderr = proc.stdout, proc.stderr
+            out_text = (stdout.decode() if stdout else '') + (('\n' + stderr.decode()) if stderr else '')
+            ok = (proc.returncode == 0)
+            safe_cmd = list(cmd)
+            try:
+                for i, part in enumerate(safe_cmd):
+                    if part == selected_pass:
+                        safe_cmd[i] = '***'
+            except Exception:
+                pass
+            if not ok:
+                raise HTTPException(status_code=502, detail={
+                    'message': 'Submission failed',
+                    'returncode': proc.returncode,
+                    'stdout': (stdout.decode() if stdout else '')[:4000],
+                    'stderr': (stderr.decode() if stderr else '')[:4000],
+                    'cmd': safe_cmd if os.getenv('EXPOSE_CMD','0')=='1' else None,
+                    'args': {'nif':nif,'year':year,'month':month}
+                })
+            return { 'ok': True, 'output': out_text[:4000], 'returncode': proc.returncode, 'args': {'nif':nif,'year':year,'month':month}, 'cmd': safe_cmd if os.getenv('EXPOSE_CMD','0')=='1' else None, 'queue': proc.queue }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to invoke JAR: {e.__class__.__name__}: {str(e)}")
+    finally:
+        storage.release_local(local_path)
 
 
 # ==================== Fix Rules Management Endpoints ====================
@@ -1951,86 +2226,13 @@ async def extract_documents_from_upload(request: Request, current=Depends(get_cu
 
     try:
         import xml.etree.ElementTree as ET
+        from core import doc_index
 
-        # Read XML file
+        # One streaming pass builds (or reuses) the persisted document index
         print(f"[DOCS] Extracting documents from {bin_path}")
-        tree = ET.parse(bin_path)
-        root = tree.getroot()
-
-        # Define namespace (SAFT-PT uses a specific namespace)
-        ns = {'saft': 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'}
-
-        # Try to detect namespace from root
-        if root.tag.startswith('{'):
-            detected_ns = root.tag[root.tag.find('{')+1:root.tag.find('}')]
-            ns = {'saft': detected_ns}
-            print(f"[DOCS] Detected namespace: {detected_ns}")
-
-        documents = []
-
-        # Extract SalesInvoices (SourceDocuments/SalesInvoices/Invoice)
-        sales_invoices_path = './/saft:SourceDocuments/saft:SalesInvoices/saft:Invoice'
-        invoices = root.findall(sales_invoices_path, ns)
-
-        # If namespace doesn't work, try without it
-        if len(invoices) == 0:
-            print("[DOCS] No documents found with namespace, trying without namespace")
-            sales_invoices_path = './/SourceDocuments/SalesInvoices/Invoice'
-            invoices = root.findall(sales_invoices_path)
-
-        print(f"[DOCS] Found {len(invoices)} invoices")
-
-        for inv in invoices:
-            try:
-                # Helper function to safely get text
-                def get_text(elem, path, default=''):
-                    found = elem.find(path, ns) if ns else elem.find(path)
-                    if found is None:
-                        # Try without namespace
-                        path_without_ns = path.replace('saft:', '')
-                        found = elem.find(path_without_ns)
-                    return found.text if found is not None and found.text else default
-
-                doc = {
-                    'InvoiceNo': get_text(inv, 'saft:InvoiceNo') or get_text(inv, 'InvoiceNo'),
-                    'InvoiceDate': get_text(inv, 'saft:InvoiceDate') or get_text(inv, 'InvoiceDate'),
-                    'InvoiceType': get_text(inv, 'saft:InvoiceType') or get_text(inv, 'InvoiceType'),
-                    'DocumentStatus': get_text(inv, 'saft:DocumentStatus/saft:InvoiceStatus') or get_text(inv, 'DocumentStatus/InvoiceStatus'),
-                    'CustomerID': get_text(inv, 'saft:CustomerID') or get_text(inv, 'CustomerID'),
-                    'CustomerName': '',  # Will try to fetch from MasterFiles later
-                    'NetTotal': get_text(inv, 'saft:DocumentTotals/saft:NetTotal') or get_text(inv, 'DocumentTotals/NetTotal') or '0',
-                    'TaxPayable': get_text(inv, 'saft:DocumentTotals/saft:TaxPayable') or get_text(inv, 'DocumentTotals/TaxPayable') or '0',
-                    'GrossTotal': get_text(inv, 'saft:DocumentTotals/saft:GrossTotal') or get_text(inv, 'DocumentTotals/GrossTotal') or '0',
-                }
-
-                documents.append(doc)
-            except Exception as e:
-                print(f"[DOCS] Error extracting invoice: {e}")
-                continue
-
-        # Try to match CustomerNames from MasterFiles
-        try:
-            customers_path = './/saft:MasterFiles/saft:Customer'
-            customers = root.findall(customers_path, ns)
-
-            if len(customers) == 0:
-                customers_path = './/MasterFiles/Customer'
-                customers = root.findall(customers_path)
-
-            # Create a mapping of CustomerID -> CustomerName
-            customer_names = {}
-            for cust in customers:
-                cust_id = get_text(cust, 'saft:CustomerID') or get_text(cust, 'CustomerID')
-                cust_name = get_text(cust, 'saft:CompanyName') or get_text(cust, 'CompanyName')
-                if cust_id:
-                    customer_names[cust_id] = cust_name
-
-            # Match names
-            for doc in documents:
-                if doc['CustomerID'] in customer_names:
-                    doc['CustomerName'] = customer_names[doc['CustomerID']]
-        except Exception as e:
-            print(f"[DOCS] Could not match customer names: {e}")
+        index, _ = await doc_index.get_index(_upload_index_path(upload_id), doc_index.fingerprint(bin_path),
+                                             lambda: doc_index.file_records(bin_path))
+        documents = await asyncio.to_thread(lambda: [index.record(r) for r in range(index.count)])
 
         print(f"[DOCS] Returning {len(documents)} documents")
         return {
@@ -2059,119 +2261,18 @@ async def extract_documents_from_storage(request: Request, current=Depends(get_c
 
     country = get_country(request)
     storage = Storage()
+    local_path = None
 
     try:
         import xml.etree.ElementTree as ET
-        import tempfile
 
-        # Fetch file from storage to temporary location
+        # Fetch file from storage (served from the local object cache on repeat opens)
         print(f"[DOCS] Fetching file from storage: {storage_key}")
         local_path = await storage.fetch_to_local(country, storage_key)
 
-        # The storage_key points to a ZIP file, so we need to extract the XML
-        import zipfile
-
-        # Check if it's a ZIP file
-        if storage_key.endswith('.zip'):
-            print(f"[DOCS] Extracting XML from ZIP: {local_path}")
-            with zipfile.ZipFile(local_path, 'r') as zip_ref:
-                # Find XML file in ZIP
-                xml_files = [f for f in zip_ref.namelist() if f.endswith('.xml')]
-                if not xml_files:
-                    raise HTTPException(status_code=400, detail='No XML file found in ZIP')
-
-                # Extract first XML file to temp location
-                xml_filename = xml_files[0]
-                print(f"[DOCS] Found XML in ZIP: {xml_filename}")
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.xml') as tmp:
-                    tmp.write(zip_ref.read(xml_filename))
-                    xml_path = tmp.name
-        else:
-            # Direct XML file
-            xml_path = local_path
-
-        # Read and parse XML file
-        print(f"[DOCS] Parsing XML: {xml_path}")
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        # Define namespace
-        ns = {'saft': 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'}
-
-        # Try to detect namespace from root
-        if root.tag.startswith('{'):
-            detected_ns = root.tag[root.tag.find('{')+1:root.tag.find('}')]
-            ns = {'saft': detected_ns}
-            print(f"[DOCS] Detected namespace: {detected_ns}")
-
-        documents = []
-
-        # Build customer map (for customer names)
-        customers = {}
-        customers_path = './/saft:MasterFiles/saft:Customer'
-        for customer in root.findall(customers_path, ns):
-            cust_id_elem = customer.find('saft:CustomerID', ns)
-            cust_name_elem = customer.find('saft:CompanyName', ns)
-            if cust_id_elem is not None and cust_name_elem is not None:
-                customers[cust_id_elem.text] = cust_name_elem.text
-
-        # Extract SalesInvoices
-        sales_invoices_path = './/saft:SourceDocuments/saft:SalesInvoices/saft:Invoice'
-        invoices = root.findall(sales_invoices_path, ns)
-
-        # If namespace doesn't work, try without it
-        if len(invoices) == 0:
-            print("[DOCS] No documents found with namespace, trying without namespace")
-            sales_invoices_path = './/SourceDocuments/SalesInvoices/Invoice'
-            invoices = root.findall(sales_invoices_path)
-            ns = None
-
-        print(f"[DOCS] Found {len(invoices)} invoices")
-
-        for inv in invoices:
-            try:
-                # Helper function to safely get text
-                def get_text(elem, path, default=''):
-                    found = elem.find(path, ns) if ns else elem.find(path)
-                    return found.text if found is not None and found.text else default
-
-                invoice_no = get_text(inv, 'saft:InvoiceNo' if ns else 'InvoiceNo')
-                invoice_date = get_text(inv, 'saft:InvoiceDate' if ns else 'InvoiceDate')
-                invoice_type = get_text(inv, 'saft:InvoiceType' if ns else 'InvoiceType')
-                customer_id = get_text(inv, 'saft:CustomerID' if ns else 'CustomerID')
-
-                # Get totals
-                doc_totals = inv.find('saft:DocumentTotals' if ns else 'DocumentTotals', ns) if ns else inv.find('DocumentTotals')
-                net_total = get_text(doc_totals, 'saft:NetTotal' if ns else 'NetTotal', '0') if doc_totals is not None else '0'
-                tax_payable = get_text(doc_totals, 'saft:TaxPayable' if ns else 'TaxPayable', '0') if doc_totals is not None else '0'
-                gross_total = get_text(doc_totals, 'saft:GrossTotal' if ns else 'GrossTotal', '0') if doc_totals is not None else '0'
-
-                # Get document status
-                doc_status = inv.find('saft:DocumentStatus' if ns else 'DocumentStatus', ns) if ns else inv.find('DocumentStatus')
-                status_code = get_text(doc_status, 'saft:InvoiceStatus' if ns else 'InvoiceStatus', 'N') if doc_status is not None else 'N'
-
-                documents.append({
-                    'InvoiceNo': invoice_no,
-                    'InvoiceDate': invoice_date,
-                    'InvoiceType': invoice_type,
-                    'CustomerID': customer_id,
-                    'CustomerName': customers.get(customer_id, ''),
-                    'NetTotal': net_total,
-                    'TaxPayable': tax_payable,
-                    'GrossTotal': gross_total,
-                    'DocumentStatus': status_code
-                })
-
-            except Exception as e:
-                print(f"[DOCS] Error processing invoice: {e}")
-                continue
-
-        # Clean up temp file if we created one
-        if storage_key.endswith('.zip') and xml_path != local_path:
-            try:
-                os.unlink(xml_path)
-            except:
-                pass
+        print(f"[DOCS] Extracting documents from: {storage_key}")
+        index, _ = await _stored_document_index(storage, local_path)
+        documents = await asyncio.to_thread(lambda: [index.record(r) for r in range(index.count)])
 
         print(f"[DOCS] Returning {len(documents)} documents from storage")
         return {
@@ -2180,6 +2281,8 @@ async def extract_documents_from_storage(request: Request, current=Depends(get_c
             'total': len(documents)
         }
 
+    except HTTPException:
+        raise
     except ET.ParseError as e:
         print(f"[DOCS] XML Parse Error: {e}")
         raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
@@ -2188,3 +2291,399 @@ async def extract_documents_from_storage(request: Request, current=Depends(get_c
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f'Failed to extract documents: {str(e)}')
+    finally:
+        if local_path:
+            storage.release_local(local_path)
+
+
+async def _stored_document_index(storage, local_path: str):
+    """Document index of a fetch_to_local copy, kept as an object-cache sidecar.
+
+    Archives are read in place: the XML member is decompressed as the parser pulls it.
+    """
+    from core import doc_index
+    try:
+        return await doc_index.get_index(storage.local_sidecar(local_path, 'docs'), doc_index.fingerprint(local_path),
+                                         lambda: doc_index.file_records(local_path))
+    except ValueError as e:  # archive without an XML member
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _document_page(index, built: bool, sort: str, order: str, limit: int, cursor: Optional[str],
+                   filters: dict) -> dict:
+    """One page of an index listing (runs in a worker thread)."""
+    from core import doc_index
+    if sort not in doc_index.SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(doc_index.SORT_KEYS)}")
+    if order not in ('asc', 'desc'):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    limit = max(1, min(limit, doc_index.MAX_PAGE))
+    key = doc_index.query_key(sort=sort, order=order, **filters)
+    try:
+        start = doc_index.decode_cursor(index, key, cursor) if cursor else 0
+    except doc_index.CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    split = lambda v: [x.strip() for x in v.split(',') if x.strip()] if v else None
+    match = index.matcher(
+        date_from=filters['date_from'], date_to=filters['date_to'], types=split(filters['type']),
+        statuses=split(filters['status']), customer=filters['customer'],
+        min_total=filters['min_total'], max_total=filters['max_total'],
+    )
+    rows, next_pos = index.page(sort, order == 'desc', start, limit, match)
+    resp = {
+        'ok': True,
+        'documents': [index.record(r) for r in rows],
+        'count': len(rows),
+        'next_cursor': doc_index.encode_cursor(index, key, next_pos) if next_pos is not None else None,
+        'index': {'documents': index.count, 'built': built},
+    }
+    if not cursor:
+        resp['total'] = index.total(match)
+    return resp
+
+
+@router.get('/upload/documents')
+async def list_upload_documents(
+    upload_id: str,
+    current=Depends(get_current_user),
+    sort: str = 'file',
+    order: str = 'asc',
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    customer: Optional[str] = None,
+    min_total: Optional[str] = None,
+    max_total: Optional[str] = None,
+):
+    """
+    Page through the documents (SalesInvoices) of an uploaded SAFT file
+
+    The first call builds a persisted document index (one streaming pass); later
+    pages are served from it without re-reading the XML.
+
+    Query parameters:
+    - sort: file (document order), date, number, customer or total; order: asc | desc
+    - limit: page size (default 100, max 1000); cursor: next_cursor of the previous page
+    - date_from / date_to: YYYY-MM-DD, inclusive
+    - type / status: comma-separated InvoiceType / InvoiceStatus values
+    - customer: CustomerID, or part of the customer name
+    - min_total / max_total: GrossTotal range
+
+    Returns documents, next_cursor (null on the last page) and, on the first page, total matches.
+    """
+    import xml.etree.ElementTree as ET
+    from core import doc_index
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='Upload file not found')
+    try:
+        index, built = await doc_index.get_index(_upload_index_path(upload_id), doc_index.fingerprint(bin_path),
+                                                 lambda: doc_index.file_records(bin_path))
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    filters = dict(date_from=date_from, date_to=date_to, type=type, status=status, customer=customer,
+                   min_total=min_total, max_total=max_total)
+    return await asyncio.to_thread(_document_page, index, built, sort, order, limit, cursor, filters)
+
+
+@router.get('/history/documents')
+async def list_stored_documents(
+    request: Request,
+    storage_key: str,
+    current=Depends(get_current_user),
+    sort: str = 'file',
+    order: str = 'asc',
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    customer: Optional[str] = None,
+    min_total: Optional[str] = None,
+    max_total: Optional[str] = None,
+):
+    """
+    Page through the documents of an archived SAFT file (ZIP or XML) in storage
+
+    Same parameters and response as GET /upload/documents; the index is kept
+    next to the locally cached copy of the object.
+    """
+    import xml.etree.ElementTree as ET
+    country = get_country(request)
+    storage = Storage()
+    local_path = await storage.fetch_to_local(country, storage_key)
+    try:
+        index, built = await _stored_document_index(storage, local_path)
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    finally:
+        storage.release_local(local_path)
+    filters = dict(date_from=date_from, date_to=date_to, type=type, status=status, customer=customer,
+                   min_total=min_total, max_total=max_total)
+    return await asyncio.to_thread(_document_page, index, built, sort, order, limit, cursor, filters)
+
+
+
+def _export_response(path: str, name: str, format: str, gzip: bool, done=None) -> StreamingResponse:
+    """Stream the SalesInvoices of the SAFT file (XML or ZIP) at `path` as CSV/XLSX (see core.doc_export)."""
+    import xml.etree.ElementTree as ET
+    from core import doc_export
+    from core.saft_archiver import open_saft_xml
+    if format not in doc_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(doc_export.FORMATS)}")
+    media_type, extension = doc_export.FORMATS[format]
+    filename = f'{name}.{extension}'
+    headers = {'X-Accel-Buffering': 'no'}
+    if gzip:
+        media_type, filename = 'application/gzip', f'{filename}.gz'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    def chunks():
+        rows = 0
+        try:
+            with open_saft_xml(path) as stream:
+                def counted():
+                    nonlocal rows
+                    for doc in doc_export.iter_documents(stream):
+                        rows += 1
+                        yield doc
+                yield from doc_export.export_chunks(counted(), format, gzip)
+            print(f"[EXPORT] {filename}: {rows} documentos")
+        except (ET.ParseError, ValueError) as e:
+            # Headers are already sent: the download ends short
+            print(f"[EXPORT] {filename}: stopped after {rows} documentos: {e}")
+        finally:
+            if done is not None:
+                done()
+
+    return StreamingResponse(chunks(), media_type=media_type, headers=headers)
+
+
+@router.get('/upload/documents/export')
+async def export_upload_documents(upload_id: str, format: str = 'csv', gzip: bool = False,
+                                  current=Depends(get_current_user)):
+    """
+    Download the documents (SalesInvoices) of an uploaded SAFT file as CSV or XLSX
+
+    Rows are streamed from a single parse of the file as it is read, so the
+    download starts at once and memory does not grow with the number of
+    documents. gzip=true compresses the output (.csv.gz / .xlsx.gz).
+    """
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='Upload file not found')
+    return _export_response(bin_path, f'documents-{upload_id}', format, gzip)
+
+
+@router.get('/history/documents/export')
+async def export_stored_documents(request: Request, storage_key: str, format: str = 'csv', gzip: bool = False,
+                                  current=Depends(get_current_user)):
+    """
+    Same as GET /upload/documents/export for an archived SAFT file (ZIP or XML) in storage
+    """
+    country = get_country(request)
+    storage = Storage()
+    local_path = await storage.fetch_to_local(country, storage_key)
+    name = os.path.splitext(os.path.basename(storage_key))[0] or 'documents'
+    try:
+        return _export_response(local_path, name, format, gzip, lambda: storage.release_local(local_path))
+    except HTTPException:
+        storage.release_local(local_path)
+        raise
+
+
+async def _section_listing(path: str, index_path: str, store_path: str, section: Optional[str], limit: int,
+                           cursor: Optional[str]) -> dict:
+    """Counts per section, or one page of `section` (see core.section_store)."""
+    import xml.etree.ElementTree as ET
+    from core import doc_index, section_store
+    from core.saft_documents import SECTIONS
+    if section is not None and section not in SECTIONS:
+        detail = f"section must be one of: {', '.join(SECTIONS)}"
+        if section == 'SalesInvoices':
+            detail += ' (SalesInvoices are listed by GET /documents)'
+        raise HTTPException(status_code=400, detail=detail)
+    try:
+        store, built = await section_store.get_store(path, index_path, store_path)
+        index, _ = await doc_index.get_index(index_path, doc_index.fingerprint(path),
+                                             lambda: doc_index.file_records(path))
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    except ValueError as e:  # archive without an XML member
+        raise HTTPException(status_code=400, detail=str(e))
+    if section is None:
+        return {'ok': True, 'sections': {'SalesInvoices': index.count, **store.counts()}, 'built': built}
+    try:
+        return await asyncio.to_thread(section_store.page, store.sections[section], limit, cursor)
+    except doc_index.CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get('/upload/sections')
+async def list_upload_sections(upload_id: str, section: Optional[str] = None, limit: int = 100,
+                               cursor: Optional[str] = None, current=Depends(get_current_user)):
+    """
+    Records of every SourceDocuments section and the GeneralLedgerEntries of an uploaded SAFT file
+
+    The first call reads the file once and stores WorkingDocuments,
+    MovementOfGoods, Payments and GeneralLedgerEntries transactions (plus the
+    SalesInvoices document index of GET /upload/documents) as sidecars.
+
+    Without `section`, returns the number of records per section; with it,
+    one page (limit, max 1000; cursor: next_cursor of the previous page).
+    """
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='Upload file not found')
+    resp = await _section_listing(bin_path, _upload_index_path(upload_id), _upload_sections_path(upload_id),
+                                  section, limit, cursor)
+    if section is None:
+        print(f"[SECTIONS] upload_id={upload_id} {resp['sections']}")
+    return resp
+
+
+@router.get('/history/sections')
+async def list_stored_sections(request: Request, storage_key: str, section: Optional[str] = None, limit: int = 100,
+                               cursor: Optional[str] = None, current=Depends(get_current_user)):
+    """
+    Same as GET /upload/sections for an archived SAFT file (ZIP or XML) in storage
+    """
+    country = get_country(request)
+    storage = Storage()
+    local_path = await storage.fetch_to_local(country, storage_key)
+    try:
+        resp = await _section_listing(local_path, storage.local_sidecar(local_path, 'docs'),
+                                      storage.local_sidecar(local_path, 'sections'), section, limit, cursor)
+    finally:
+        storage.release_local(local_path)
+    if section is None:
+        print(f"[SECTIONS] storage_key={storage_key} {resp['sections']}")
+    return resp
+
+
+@router.get('/upload/numbering')
+async def check_upload_numbering(upload_id: str, current=Depends(get_current_user)):
+    """
+    Numbering gaps, duplicates, reused cancelled numbers and dates out of order
+    per InvoiceNo series of an uploaded SAFT file (see core.numbering)
+
+    Uses the same persisted document index as GET /upload/documents.
+    """
+    import xml.etree.ElementTree as ET
+    from core import doc_index, numbering
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='Upload file not found')
+    try:
+        index, _ = await doc_index.get_index(_upload_index_path(upload_id), doc_index.fingerprint(bin_path),
+                                             lambda: doc_index.file_records(bin_path))
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    report = await asyncio.to_thread(numbering.check_numbering, index)
+    print(f"[NUMBERING] upload_id={upload_id} {len(report['series'])} series: {report['counts']}")
+    return {'ok': not report['counts'], **report}
+
+
+@router.get('/history/numbering')
+async def check_stored_numbering(request: Request, storage_key: str, current=Depends(get_current_user)):
+    """
+    Same as GET /upload/numbering for an archived SAFT file (ZIP or XML) in storage
+    """
+    import xml.etree.ElementTree as ET
+    from core import numbering
+    country = get_country(request)
+    storage = Storage()
+    local_path = await storage.fetch_to_local(country, storage_key)
+    try:
+        index, _ = await _stored_document_index(storage, local_path)
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    finally:
+        storage.release_local(local_path)
+    report = await asyncio.to_thread(numbering.check_numbering, index)
+    print(f"[NUMBERING] storage_key={storage_key} {len(report['series'])} series: {report['counts']}")
+    return {'ok': not report['counts'], **report}
+
+
+@router.get('/upload/aggregates')
+async def upload_aggregates(upload_id: str, month_from: Optional[str] = None, month_to: Optional[str] = None,
+                            top: int = 10, current=Depends(get_current_user)):
+    """
+    Totals of an uploaded SAFT file's SalesInvoices by month, InvoiceType,
+    DocumentStatus, tax rate and customer, plus the top customers (see core.aggregates)
+
+    month_from/month_to ('YYYY-MM') limit the period. Uses the same persisted
+    document index as GET /upload/documents.
+    """
+    import xml.etree.ElementTree as ET
+    from core import aggregates, doc_index
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='Upload file not found')
+    try:
+        index, _ = await doc_index.get_index(_upload_index_path(upload_id), doc_index.fingerprint(bin_path),
+                                             lambda: doc_index.file_records(bin_path))
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    try:
+        report = await asyncio.to_thread(aggregates.aggregate, index, month_from, month_to, top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"[AGGREGATES] upload_id={upload_id} {report['totals']['documents']} documentos, gross={report['totals']['gross']}")
+    return report
+
+
+@router.get('/history/aggregates')
+async def stored_aggregates(request: Request, storage_key: str, month_from: Optional[str] = None,
+                            month_to: Optional[str] = None, top: int = 10, current=Depends(get_current_user)):
+    """
+    Same as GET /upload/aggregates for an archived SAFT file (ZIP or XML) in storage
+    """
+    import xml.etree.ElementTree as ET
+    from core import aggregates
+    country = get_country(request)
+    storage = Storage()
+    local_path = await storage.fetch_to_local(country, storage_key)
+    try:
+        index, _ = await _stored_document_index(storage, local_path)
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    finally:
+        storage.release_local(local_path)
+    try:
+        report = await asyncio.to_thread(aggregates.aggregate, index, month_from, month_to, top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"[AGGREGATES] storage_key={storage_key} {report['totals']['documents']} documentos, gross={report['totals']['gross']}")
+    return report
+
+@router.get('/upload/hash-chain')
+async def verify_upload_hash_chain(upload_id: str, current=Depends(get_current_user)):
+    """
+    Verify the document hash chains of an uploaded SAFT file
+
+    Streams SalesInvoices, WorkingDocuments and Payments once and checks each
+    series for order, Hash/HashControl consistency and, when SAFT_HASH_PUBLIC_KEY
+    points to the software's public key, the RSA signature chain (see core.saft_hash).
+
+    Returns documents, signatures_checked, series (per-series counts), counts and issues.
+    """
+    import xml.etree.ElementTree as ET
+    from core import saft_hash
+    meta_path, bin_path = _upload_paths(upload_id)
+    if not os.path.isfile(bin_path):
+        raise HTTPException(status_code=404, detail='Upload file not found')
+    try:
+        public_key = saft_hash.load_public_key()
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f'Failed to read SAFT_HASH_PUBLIC_KEY: {e}')
+    try:
+        report = await asyncio.to_thread(saft_hash.verify_chain, bin_path, public_key)
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid XML: {str(e)}')
+    print(f"[HASH] upload_id={upload_id} {report['documents']} documentos, {len(report['series'])} series: {report['counts']}")
+    return {'ok': not report['counts'], **report}
@@ -42,7 +42,7 @@ async def diagnostics(request: Request, db=Depends(get_db)):
     Checks secret key, Mongo, upload root, Java, JAR and B2 connectivity.
     """
     import asyncio, socket, shutil, platform, sys, tempfile
-    from core.storage import Storage
+    from core.storage import Storage, run_blocking
 
     upload_root = os.getenv('UPLOAD_ROOT', '/var/saft/uploads')
     jar_path = os.getenv('FACTEMICLI_JAR_PATH', '/opt/factemi/FACTEMICLI.jar')
@@ -110,7 +110,7 @@ async def diagnostics(request: Request, db=Depends(get_db)):
                 return True, None
             except Exception as ex:
                 return False, str(ex)
-        ok, err = await asyncio.to_thread(_head)
+        ok, err = await run_blocking(_head)
         b2_info['ok'] = ok
         if not ok:
             b2_info['error'] = err
@@ -683,11 +683,11 @@ app.include_router(router_pt, prefix='/pt')
 
 @app.post('/ui/validate')
 async def ui_validate(file: UploadFile = File(...)):
-    from core.saft_validator import parse_xml, validate_saft
-    data = await file.read()
+    import asyncio
+    from core.saft_validator import validate_saft_stream
     try:
-        root = parse_xml(data)
-        issues, summary = validate_saft(root)
+        # parse the spooled upload in place; the body is never held in memory whole
+        issues, summary = await asyncio.to_thread(validate_saft_stream, file.file)
         status = 'ok' if not any(i['level'] == 'error' for i in issues) else 'errors'
         return JSONResponse({ 'status': status, 'summary': summary, 'issues': issues })
     except Exception as e:
@@ -271,7 +271,7 @@ async def diagnostics(request: Request, db=Depends(get_db)):
     - B2 (S3) client configuration and basic connectivity
     """
     import time, tempfile, asyncio, os, os.path, socket, sys, platform, shutil
-    from core.storage import Storage
+    from core.storage import Storage, run_blocking
 
     now = time.time()
     app_env = os.getenv('APP_ENV', 'dev')
@@ -375,7 +375,7 @@ async def diagnostics(request: Request, db=Depends(get_db)):
                 return True, None
             except Exception as ex:
                 return False, str(ex)
-        ok, err = await asyncio.to_thread(_try_checks)
+        ok, err = await run_blocking(_try_checks)
         b2_info['ok'] = ok
         if not ok:
             b2_info['error'] = err
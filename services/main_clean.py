@@ -152,11 +152,11 @@ app.include_router(router_pt, prefix='/pt')
 
 @app.post('/ui/validate', tags=['UI'])
 async def ui_validate(file: UploadFile = File(...)):
-    from core.saft_validator import parse_xml, validate_saft
-    data = await file.read()
+    import asyncio
+    from core.saft_validator import validate_saft_stream
     try:
-        root = parse_xml(data)
-        issues, summary = validate_saft(root)
+        # parse the spooled upload in place; the body is never held in memory whole
+        issues, summary = await asyncio.to_thread(validate_saft_stream, file.file)
         status = 'ok' if not any(i['level'] == 'error' for i in issues) else 'errors'
         return JSONResponse({ 'status': status, 'summary': summary, 'issues': issues })
     except Exception as e:
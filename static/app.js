@@ -91,6 +91,130 @@ window.clearLog = function() {
     if (el) el.textContent = '(log vazio)';
 };
 
+// SHA-256 em hex (null quando crypto.subtle não existe, p.ex. http:// fora de localhost)
+window.sha256Hex = async function(buf) {
+    if (!(window.crypto && window.crypto.subtle)) return null;
+    const digest = await window.crypto.subtle.digest('SHA-256', buf);
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+};
+
+// Upload segmentado para /pt/upload/* com digest por chunk e retoma.
+// O upload_id fica em localStorage por ficheiro: se a ligação cair, voltar a
+// escolher o mesmo ficheiro envia só os chunks que o servidor ainda não tem.
+// Os chunks seguem em paralelo (opts.parallel ou window.UPLOAD_PARALLEL, default 4).
+window.uploadChunked = async function(file, opts = {}) {
+    const log = opts.log || (() => {});
+    const onProgress = opts.onProgress || (() => {});
+    const auth = { 'Authorization': 'Bearer ' + (state.token || '') };
+    const resumeKey = `saft_upload:${file.name}:${file.size}:${file.lastModified}`;
+    let uploadId = null;
+    let chunkSize = 0;
+    let pending = null;
+    let encodings = [];
+
+    let savedId = null;
+    try { savedId = localStorage.getItem(resumeKey); } catch (_e) { /* ignore */ }
+    if (savedId) {
+        const stRes = await fetch(`/pt/upload/status?upload_id=${savedId}`, { headers: auth });
+        const st = stRes.ok ? await stRes.json() : null;
+        if (st && st.chunks != null && !st.complete) {
+            uploadId = savedId;
+            chunkSize = st.chunk_size;
+            pending = st.missing;
+            encodings = st.encodings || [];
+            log(`↩️ A retomar upload ${uploadId}: faltam ${pending.length}/${st.chunks} chunks`);
+        }
+    }
+    if (!uploadId) {
+        const startRes = await fetch('/pt/upload/start', {
+            method: 'POST', headers: { 'Content-Type': 'application/json', ...auth },
+            body: JSON.stringify({ filename: file.name, size: file.size })
+        });
+        if (!startRes.ok) {
+            const errText = await startRes.text();
+            throw new Error(`Falha no upload/start (${startRes.status}): ${errText}`);
+        }
+        const start = await startRes.json();
+        if (!start.upload_id) throw new Error('Sem upload_id na resposta');
+        uploadId = start.upload_id;
+        chunkSize = start.chunk_size || (5 * 1024 * 1024);
+        encodings = start.encodings || [];
+        pending = Array.from({ length: Math.ceil(file.size / chunkSize) }, (_v, i) => i);
+        try { localStorage.setItem(resumeKey, uploadId); } catch (_e) { /* ignore */ }
+        log(`✅ Upload iniciado: id=${uploadId}, chunk=${Math.round(chunkSize/1024)}KB`);
+    }
+
+    const totalChunks = Math.ceil(file.size / chunkSize);
+    let done = totalChunks - pending.length;
+    // XML SAF-T comprime 10-20x: gzip no browser quando o servidor e o browser suportam
+    const gzip = opts.compress !== false && typeof CompressionStream !== 'undefined' && encodings.includes('gzip');
+    const putChunk = async (index) => {
+        const offset = index * chunkSize;
+        const slice = file.slice(offset, Math.min(offset + chunkSize, file.size));
+        const buf = await slice.arrayBuffer();
+        const digest = await sha256Hex(buf);  // sempre sobre os bytes descomprimidos
+        const headers = { ...auth };
+        if (digest) headers['X-Chunk-SHA256'] = digest;
+        let body = buf;
+        if (gzip) {
+            body = await new Response(slice.stream().pipeThrough(new CompressionStream('gzip'))).arrayBuffer();
+            headers['Content-Encoding'] = 'gzip';
+        }
+        log(`📦 Enviando chunk ${index+1}/${totalChunks} (${Math.round(buf.byteLength/1024)}KB` +
+            (gzip ? ` → ${Math.round(body.byteLength/1024)}KB gzip` : '') + ')...');
+        // Falhas de rede, 5xx e digest errado (corrupção em trânsito) são repetidas com backoff
+        for (let attempt = 1; ; attempt++) {
+            let putRes = null;
+            let errText = '';
+            try {
+                putRes = await fetch(`/pt/upload/chunk?upload_id=${uploadId}&index=${index}`, { method: 'PUT', headers, body });
+                if (putRes.ok) break;
+                errText = await putRes.text();
+            } catch (e) {
+                errText = e.message;
+            }
+            const retryable = !putRes || putRes.status >= 500 || putRes.status === 400;
+            if (!retryable || attempt >= 4) {
+                throw new Error(`Falha no chunk ${index} (${putRes ? putRes.status : 'rede'}): ${errText}`);
+            }
+            log(`⚠️ Chunk ${index+1} falhou (${errText}); nova tentativa ${attempt+1}/4`);
+            await new Promise(r => setTimeout(r, 1000 * 2 ** (attempt - 1)));
+        }
+        done++;
+        onProgress(Math.round((done / Math.max(totalChunks, 1)) * 100));
+    };
+    // Janela de N pedidos em paralelo: cada "lane" tira o próximo índice da fila.
+    // Num erro definitivo as restantes lanes param e o upload fica retomável.
+    const queue = pending.slice();
+    let failed = null;
+    const lane = async () => {
+        while (queue.length && !failed) {
+            const index = queue.shift();
+            try {
+                await putChunk(index);
+            } catch (e) {
+                failed = failed || e;
+            }
+        }
+    };
+    const parallel = Math.max(1, opts.parallel || window.UPLOAD_PARALLEL || 4);
+    await Promise.all(Array.from({ length: Math.min(parallel, queue.length) }, lane));
+    if (failed) throw failed;
+
+    const finishRes = await fetch('/pt/upload/finish', {
+        method: 'POST', headers: { 'Content-Type': 'application/json', ...auth },
+        body: JSON.stringify({ upload_id: uploadId })
+    });
+    if (!finishRes.ok) {
+        const errText = await finishRes.text();
+        throw new Error(`Falha no upload/finish (${finishRes.status}): ${errText}`);
+    }
+    const finish = await finishRes.json();
+    try { localStorage.removeItem(resumeKey); } catch (_e) { /* ignore */ }
+    log(`✅ Upload 100% completo (${totalChunks} chunks)`);
+    return { uploadId, sha256: finish.sha256 };
+};
+
 // Upload direto para B2 usando URL presignado
 window.presignUpload = async function() {
     if (!state.token) { setStatus('⚠️ Faça login primeiro', 'error'); return; }
@@ -201,53 +325,13 @@ window.validateSmart = async function() {
         logLine('📤 Iniciando upload segmentado...');
         setStatus('📤 A enviar ficheiro em chunks...', 'info');
 
-        console.log('[DEBUG] validateSmart: Sending upload/start request with token');
-
-        // start
-        const startRes = await fetch('/pt/upload/start', {
-            method: 'POST', headers: { 'Content-Type': 'application/json', 'Authorization': 'Bearer ' + state.token },
-            body: JSON.stringify({ filename: f.name, size: f.size })
-        });
-
-        console.log('[DEBUG] validateSmart: upload/start response status:', startRes.status);
-
-        if (!startRes.ok) {
-            const errText = await startRes.text();
-            console.error('[DEBUG] validateSmart: upload/start FAILED:', errText);
-            throw new Error(`Falha no upload/start (${startRes.status}): ${errText}`);
-        }
-        const start = await startRes.json();
-        if (!start.upload_id) throw new Error('Sem upload_id na resposta');
-        const uploadId = start.upload_id;
-        const chunkSize = start.chunk_size || (5 * 1024 * 1024);
-        logLine(`✅ Upload iniciado: id=${uploadId}, chunk=${Math.round(chunkSize/1024)}KB`);
-        let sent = 0; let index = 0;
-        const totalChunks = Math.ceil(f.size / chunkSize);
-        while (sent < f.size) {
-            const slice = f.slice(sent, Math.min(sent + chunkSize, f.size));
-            const buf = await slice.arrayBuffer();
-            logLine(`📦 Enviando chunk ${index+1}/${totalChunks} (${Math.round(slice.size/1024)}KB)...`);
-            const putRes = await fetch(`/pt/upload/chunk?upload_id=${uploadId}&index=${index}`, {
-                method: 'PUT', headers: { 'Authorization': 'Bearer ' + state.token }, body: buf
-            });
-            if (!putRes.ok) {
-                const errText = await putRes.text();
-                throw new Error(`Falha no chunk ${index} (${putRes.status}): ${errText}`);
+        const { uploadId } = await uploadChunked(f, {
+            log: logLine,
+            onProgress: (pct) => {
+                if (progBar) progBar.style.width = pct + '%';
+                if (progText) progText.textContent = pct + '%';
             }
-            sent += slice.size; index++;
-            const pct = Math.round((sent / f.size) * 100);
-            if (progBar) progBar.style.width = pct + '%';
-            if (progText) progText.textContent = pct + '%';
-        }
-        logLine(`✅ Upload 100% completo (${totalChunks} chunks)`);
-        const finishRes = await fetch('/pt/upload/finish', {
-            method: 'POST', headers: { 'Content-Type': 'application/json', 'Authorization': 'Bearer ' + state.token },
-            body: JSON.stringify({ upload_id: uploadId })
         });
-        if (!finishRes.ok) {
-            const errText = await finishRes.text();
-            throw new Error(`Falha no upload/finish (${finishRes.status}): ${errText}`);
-        }
         logLine('🔍 A validar ficheiro no servidor...');
         setStatus('🔍 A validar ficheiro...', 'info');
         // validate via upload
@@ -2960,69 +3044,10 @@ window.checkDocs = async function() {
 
         try {
             // Perform chunked upload (same as validateSmart)
-            const startRes = await fetch('/pt/upload/start', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': 'Bearer ' + (window.state && window.state.token ? window.state.token : '')
-                },
-                body: JSON.stringify({ filename: file.name, size: file.size })
-            });
-
-            if (!startRes.ok) {
-                const errText = await startRes.text();
-                throw new Error(`Falha no upload/start (${startRes.status}): ${errText}`);
-            }
-
-            const start = await startRes.json();
-            if (!start.upload_id) throw new Error('Sem upload_id na resposta');
-
-            uploadId = start.upload_id;
-            const chunkSize = start.chunk_size || (5 * 1024 * 1024);
-            logLine(`[DOCS] Upload iniciado: id=${uploadId}, chunk=${Math.round(chunkSize/1024)}KB`);
-
-            let sent = 0;
-            let index = 0;
-            const totalChunks = Math.ceil(file.size / chunkSize);
-
-            // Upload chunks
-            while (sent < file.size) {
-                const slice = file.slice(sent, Math.min(sent + chunkSize, file.size));
-                const buf = await slice.arrayBuffer();
-
-                const putRes = await fetch(`/pt/upload/chunk?upload_id=${uploadId}&index=${index}`, {
-                    method: 'PUT',
-                    headers: { 'Authorization': 'Bearer ' + (window.state && window.state.token ? window.state.token : '') },
-                    body: buf
-                });
-
-                if (!putRes.ok) {
-                    const errText = await putRes.text();
-                    throw new Error(`Falha no chunk ${index} (${putRes.status}): ${errText}`);
-                }
-
-                sent += slice.size;
-                index++;
-                const pct = Math.round((sent / file.size) * 100);
-                setStatus(`📤 A fazer upload... ${pct}%`, 'info');
-            }
-
-            logLine(`[DOCS] Upload 100% completo (${totalChunks} chunks)`);
-
-            // Finalize upload
-            const finishRes = await fetch('/pt/upload/finish', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': 'Bearer ' + (window.state && window.state.token ? window.state.token : '')
-                },
-                body: JSON.stringify({ upload_id: uploadId })
-            });
-
-            if (!finishRes.ok) {
-                const errText = await finishRes.text();
-                throw new Error(`Falha no upload/finish (${finishRes.status}): ${errText}`);
-            }
+            ({ uploadId } = await uploadChunked(file, {
+                log: (msg) => logLine('[DOCS] ' + msg),
+                onProgress: (pct) => setStatus(`📤 A fazer upload... ${pct}%`, 'info')
+            }));
 
             // Store upload ID
             if (!window.state) window.state = {};
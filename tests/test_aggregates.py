@@ -0,0 +1,57 @@
+import pytest
+
+from core import doc_index
+from core.aggregates import aggregate
+from core.saft_documents import iter_records
+
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+
+
+def _invoice(no, date, customer='C1', status='N', kind='FT', lines=(('100.00', '23'),), net='100.00',
+             tax='23.00', gross='123.00'):
+    amount = 'DebitAmount' if kind == 'NC' else 'CreditAmount'
+    body = ''.join(f'<Line><{amount}>{a}</{amount}><Tax><TaxPercentage>{p}</TaxPercentage></Tax></Line>'
+                   for a, p in lines)
+    return (f'<Invoice><InvoiceNo>{kind} A/{no}</InvoiceNo><DocumentStatus><InvoiceStatus>{status}</InvoiceStatus>'
+            f'</DocumentStatus><InvoiceDate>{date}</InvoiceDate><InvoiceType>{kind}</InvoiceType>'
+            f'<CustomerID>{customer}</CustomerID>{body}<DocumentTotals><TaxPayable>{tax}</TaxPayable>'
+            f'<NetTotal>{net}</NetTotal><GrossTotal>{gross}</GrossTotal></DocumentTotals></Invoice>')
+
+
+def _index(tmp_path, invoices):
+    xml = (f'<AuditFile xmlns="{NS}"><MasterFiles><Customer><CustomerID>C1</CustomerID><CompanyName>Alfa</CompanyName>'
+           '</Customer><Customer><CustomerID>C2</CustomerID><CompanyName>Beta</CompanyName></Customer></MasterFiles>'
+           f'<SourceDocuments><SalesInvoices>{"".join(invoices)}</SalesInvoices></SourceDocuments></AuditFile>')
+    index = doc_index.DocumentIndex.build(iter_records(xml.encode(), offsets=True, lines=True), 'fp')
+    path = tmp_path / 'x.docs'
+    index.write(str(path))
+    return doc_index.DocumentIndex.load(str(path))
+
+
+def test_totals_by_dimension(tmp_path):
+    index = _index(tmp_path, [
+        _invoice(1, '2025-08-30', lines=(('100.00', '23'), ('50.00', '6.00')), net='150.00', tax='26.00',
+                 gross='176.00'),
+        _invoice(2, '2025-09-01', customer='C2'),
+        _invoice(3, '2025-09-02', status='A'),
+        _invoice(1, '2025-09-03', kind='NC', lines=(('10.00', '23.00'),), net='10.00', tax='2.30', gross='12.30'),
+    ])
+    report = aggregate(index)
+    assert report['totals'] == {'documents': 3, 'net': '240.00', 'tax': '46.70', 'gross': '286.70'}
+    assert report['by_month'] == {'2025-08': {'documents': 1, 'net': '150.00', 'tax': '26.00', 'gross': '176.00'},
+                                  '2025-09': {'documents': 2, 'net': '90.00', 'tax': '20.70', 'gross': '110.70'}}
+    assert report['by_type']['NC'] == {'documents': 1, 'net': '-10.00', 'tax': '-2.30', 'gross': '-12.30'}
+    assert report['by_status']['A'] == {'documents': 1, 'net': '100.00', 'tax': '23.00', 'gross': '123.00'}
+    assert report['by_tax_rate'] == {'6': {'base': '50.00', 'tax': '3.00'}, '23': {'base': '190.00', 'tax': '43.70'}}
+    assert [(c['customer_id'], c['customer_name'], c['gross']) for c in report['top_customers']] == [
+        ('C1', 'Alfa', '163.70'), ('C2', 'Beta', '123.00')]
+
+    september = aggregate(index, '2025-09', '2025-09', top=1)
+    assert september['totals']['gross'] == '110.70'
+    assert september['by_tax_rate'] == {'23': {'base': '90.00', 'tax': '20.70'}}
+    assert [c['customer_id'] for c in september['top_customers']] == ['C2']
+
+
+def test_invalid_month(tmp_path):
+    with pytest.raises(ValueError):
+        aggregate(_index(tmp_path, []), month_from='2025-13')
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from core import chunked_upload
+from core.chunked_upload import ChunkError, FileHasher
+
+
+def _meta(size=10, chunk_size=4):
+    return chunked_upload.new_meta('u1', 'a.xml', size, '/tmp/u1.bin', chunk_size)
+
+
+def test_check_chunk_rejects_bad_index_length_and_digest():
+    meta = _meta()
+    assert meta['chunks'] == 3
+    digest = hashlib.sha256(b'ij').hexdigest()
+    chunked_upload.check_chunk(meta, 2, 2, digest, expected_sha256=digest)
+    with pytest.raises(ChunkError):
+        chunked_upload.check_index(meta, 3)
+    with pytest.raises(ChunkError):
+        chunked_upload.check_chunk(meta, 0, 3, digest)
+    with pytest.raises(ChunkError):
+        chunked_upload.check_chunk(meta, 2, 2, digest, expected_sha256='00' * 32)
+
+
+def test_out_of_order_chunks_hash_to_whole_file():
+    content = b'abcdefghij'
+    chunks = [content[0:4], content[4:8], content[8:10]]
+    meta = _meta()
+    hasher = FileHasher()
+    for index in (2, 0, 1):
+        chunked_upload.mark_received(meta, index, hashlib.sha256(chunks[index]).hexdigest())
+        hasher.advance(meta, lambda i: [chunks[i][:2], chunks[i][2:]])
+    assert chunked_upload.missing_chunks(meta) == []
+    assert hasher.consistent(meta)
+    assert hasher.hexdigest() == hashlib.sha256(content).hexdigest()
+
+    # Rewriting an already-hashed chunk with other bytes invalidates the running hash
+    chunked_upload.mark_received(meta, 0, hashlib.sha256(b'ABCD').hexdigest())
+    assert not hasher.consistent(meta)
+
+
+def test_missing_chunks_reports_gaps():
+    meta = _meta()
+    chunked_upload.mark_received(meta, 1, 'x')
+    assert chunked_upload.missing_chunks(meta) == [0, 2]
+    assert chunked_upload.missing_chunks({'size': 10}) == []
+
+
+def test_parallel_pwrites_through_fd_cache(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    path = tmp_path / 'u2.bin'
+    content = bytes(range(256)) * 64
+    path.write_bytes(b'\0' * len(content))
+    cache = chunked_upload.FdCache(max_open=1)
+    fd = cache.acquire('u2', str(path))
+    with ThreadPoolExecutor(8) as ex:
+        list(ex.map(lambda off: chunked_upload.pwrite_all(fd, content[off:off + 1000], off),
+                    reversed(range(0, len(content), 1000))))
+    assert b''.join(chunked_upload.pread_blocks(fd, 10, 1000, block_size=3)) == content[1000:1010]
+
+    cache.close('u2')  # still referenced: deferred
+    assert len(cache) == 1
+    cache.release('u2')
+    assert len(cache) == 0
+    assert path.read_bytes() == content
+
+
+def test_decoder_inflates_gzip_and_refuses_bombs():
+    import gzip
+
+    payload = b'<SalesInvoices/>' * 1000
+    wire = gzip.compress(payload)
+    dec = chunked_upload.ChunkDecoder('gzip', len(payload))
+    out = b''.join(dec.feed(wire[i:i + 100]) for i in range(0, len(wire), 100)) + dec.finish()
+    assert out == payload
+
+    with pytest.raises(ChunkError):
+        dec = chunked_upload.ChunkDecoder('gzip', len(payload) - 1)
+        dec.feed(wire)
+        dec.finish()
+    with pytest.raises(ChunkError):
+        chunked_upload.ChunkDecoder('gzip', len(payload)).finish()  # empty / truncated stream
+    with pytest.raises(chunked_upload.UnsupportedEncoding):
+        chunked_upload.ChunkDecoder('br', 10)
+
+
+def test_idle_upload_state_is_dropped(monkeypatch):
+    monkeypatch.setenv('UPLOAD_STATE_IDLE_SECONDS', '0')
+
+    async def scenario():
+        chunked_upload.get_hasher('gone', create=True)
+        held = chunked_upload.lock('held')
+        async with held:
+            chunked_upload.lock('new')  # sweeps idle uploads
+            assert chunked_upload.get_hasher('gone') is None
+            assert chunked_upload.lock('held') is held  # locked: kept
+        chunked_upload.discard('held')
+        chunked_upload.discard('new')
+
+    asyncio.run(scenario())
+    assert not chunked_upload._last_used
@@ -0,0 +1,62 @@
+import csv
+import gzip
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+
+from core import doc_export
+from core.saft_documents import INVOICE_FIELDS
+
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def _saft(n):
+    invoices = ''.join(
+        f'<Invoice><InvoiceNo>FT A/{i}</InvoiceNo><DocumentStatus><InvoiceStatus>N</InvoiceStatus></DocumentStatus>'
+        f'<InvoiceDate>2025-09-01</InvoiceDate><InvoiceType>FT</InvoiceType><CustomerID>C1</CustomerID>'
+        '<DocumentTotals><TaxPayable>2.30</TaxPayable><NetTotal>10.00</NetTotal><GrossTotal>12.30</GrossTotal>'
+        '</DocumentTotals></Invoice>' for i in range(1, n + 1))
+    return (f'<AuditFile xmlns="{NS}"><MasterFiles><Customer><CustomerID>C1</CustomerID>'
+            '<CompanyName>Sá &amp; Filhos</CompanyName></Customer></MasterFiles>'
+            f'<SourceDocuments><SalesInvoices>{invoices}</SalesInvoices></SourceDocuments></AuditFile>').encode()
+
+
+def test_csv_gzip():
+    data = gzip.decompress(b''.join(doc_export.export_chunks(doc_export.iter_documents(_saft(3)), 'csv', gzip=True)))
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+    assert rows[0] == list(INVOICE_FIELDS)
+    assert rows[1] == ['FT A/1', '2025-09-01', 'FT', 'N', 'C1', 'Sá & Filhos', '10.00', '2.30', '12.30']
+    assert len(rows) == 4
+
+
+def test_xlsx_is_streamed_in_chunks(monkeypatch):
+    monkeypatch.setattr(doc_export, 'CHUNK_SIZE', 1024)
+    read = []
+
+    def documents():
+        for doc in doc_export.iter_documents(_saft(500)):
+            read.append(doc['InvoiceNo'])
+            yield doc
+
+    stream = doc_export.export_chunks(documents(), 'xlsx')
+    chunks = [next(stream)]
+    assert len(read) < 50  # the download starts before the documents are all read
+    chunks.extend(stream)
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+        assert zf.testzip() is None
+        sheet = ET.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+    rows = sheet.find(f'{MAIN}sheetData')
+    assert len(rows) == 501
+    cells = list(rows[1])
+    assert ''.join(cells[5].itertext()) == 'Sá & Filhos'
+    assert cells[8].find(f'{MAIN}v').text == '12.30'
+
+
+def test_csv_neutralizes_formulas():
+    docs = [{**dict.fromkeys(INVOICE_FIELDS, ''), 'InvoiceNo': 'FT A/1', 'CustomerName': '=HYPERLINK("x")',
+             'CustomerID': '@SUM(A1)', 'NetTotal': '-10.00', 'TaxPayable': '+1', 'GrossTotal': '-12.30'}]
+    rows = list(csv.reader(io.StringIO(b''.join(doc_export.csv_chunks(docs)).decode('utf-8-sig'))))
+    row = dict(zip(rows[0], rows[1]))
+    assert (row['CustomerName'], row['CustomerID']) == ('\'=HYPERLINK("x")', "'@SUM(A1)")
+    assert (row['NetTotal'], row['TaxPayable'], row['GrossTotal']) == ('-10.00', "'+1", '-12.30')
@@ -0,0 +1,94 @@
+import asyncio
+import io
+
+from core import doc_index
+from core.saft_documents import iter_records
+
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+
+
+def _saft(n=25):
+    invoices = ''.join(
+        f'<Invoice><InvoiceNo>FT A/{i + 1}</InvoiceNo><DocumentStatus><InvoiceStatus>{"A" if i % 5 == 0 else "N"}'
+        f'</InvoiceStatus></DocumentStatus><InvoiceDate>2025-09-{i % 28 + 1:02d}</InvoiceDate>'
+        f'<InvoiceType>{"NC" if i % 4 == 0 else "FT"}</InvoiceType><CustomerID>C{i % 3}</CustomerID>'
+        f'<DocumentTotals><TaxPayable>0.23</TaxPayable><NetTotal>1</NetTotal>'
+        f'<GrossTotal>{i + 1}.005</GrossTotal></DocumentTotals></Invoice>'
+        for i in range(n))
+    customers = ''.join(f'<Customer><CustomerID>C{c}</CustomerID><CompanyName>Cliente {c}</CompanyName></Customer>'
+                        for c in range(3))
+    return (f'<AuditFile xmlns="{NS}"><MasterFiles>{customers}</MasterFiles><SourceDocuments>'
+            f'<SalesInvoices>{invoices}</SalesInvoices></SourceDocuments></AuditFile>').encode()
+
+
+class TinyReads(io.BytesIO):
+    """Hands the parser a few bytes at a time so tags straddle read boundaries."""
+    def read(self, size=-1):
+        return super().read(7)
+
+
+def test_build_roundtrip_and_offsets(tmp_path):
+    data = _saft()
+    index = doc_index.DocumentIndex.build(iter_records(TinyReads(data), offsets=True), 'fp')
+    path = tmp_path / 'x.docs'
+    index.write(str(path))
+    loaded = doc_index.DocumentIndex.load(str(path))
+    assert loaded.count == 25
+    first = loaded.record(0)
+    assert first == {
+        'InvoiceNo': 'FT A/1', 'InvoiceDate': '2025-09-01', 'InvoiceType': 'NC', 'DocumentStatus': 'A',
+        'CustomerID': 'C0', 'CustomerName': 'Cliente 0', 'NetTotal': '1.00', 'TaxPayable': '0.23',
+        'GrossTotal': '1.01', 'ByteOffset': first['ByteOffset'], 'ByteLength': first['ByteLength'],
+    }
+    for row in range(loaded.count):
+        rec = loaded.record(row)
+        span = data[rec['ByteOffset']:rec['ByteOffset'] + rec['ByteLength']]
+        assert span.startswith(b'<Invoice>') and span.endswith(b'</Invoice>')
+        assert f'<InvoiceNo>{rec["InvoiceNo"]}<'.encode() in span
+
+
+def test_cursor_pages_cover_filtered_sorted_listing():
+    index = doc_index.DocumentIndex.build(iter_records(_saft(), offsets=True), 'fp')
+    filters = dict(types=['FT'], statuses=['N'], customer='cliente 1', min_total='3')
+    match = index.matcher(**filters)
+    key = doc_index.query_key(sort='number', order='desc', **filters)
+    seen, cursor = [], None
+    while True:
+        start = doc_index.decode_cursor(index, key, cursor) if cursor else 0
+        rows, nxt = index.page('number', True, start, 2, match)
+        seen += [index.record(r)['InvoiceNo'] for r in rows]
+        if nxt is None:
+            break
+        cursor = doc_index.encode_cursor(index, key, nxt)
+    expected = [f'FT A/{i + 1}' for i in range(24, -1, -1)
+                if i % 4 and i % 5 and i % 3 == 1 and i + 1 >= 3]
+    assert seen == expected and index.total(match) == len(expected)
+    try:
+        doc_index.decode_cursor(index, doc_index.query_key(sort='date', order='asc'), cursor)
+        assert False, 'cursor accepted for another query'
+    except doc_index.CursorError:
+        pass
+
+
+def test_get_index_persists_and_rebuilds_when_data_changes(tmp_path):
+    data = tmp_path / 'u.bin'
+    data.write_bytes(_saft(10))
+    sidecar = str(tmp_path / 'u.docs')
+    builds = []
+
+    def records():
+        builds.append(1)
+        return doc_index.file_records(str(data))
+
+    async def scenario():
+        first = await asyncio.gather(*(doc_index.get_index(sidecar, doc_index.fingerprint(str(data)), records)
+                                       for _ in range(3)))
+        doc_index._loaded.clear()
+        reloaded, built = await doc_index.get_index(sidecar, doc_index.fingerprint(str(data)), records)
+        data.write_bytes(_saft(12))
+        changed, rebuilt = await doc_index.get_index(sidecar, doc_index.fingerprint(str(data)), records)
+        return first, (reloaded.count, built), (changed.count, rebuilt)
+
+    first, reloaded, changed = asyncio.run(scenario())
+    assert [built for _, built in first].count(True) == 1
+    assert reloaded == (10, False) and changed == (12, True) and len(builds) == 2
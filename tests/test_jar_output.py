@@ -0,0 +1,53 @@
+import random
+
+from core import jar_output
+
+COUNTRY = 'O valor ("CVE") no elemento "Country" do "Customer" com id C{i} nao e valido'
+EXEMPTION = "Linha: {i}; coluna: 33; cvc-minLength-valid: Value '' with length = '0' is not facet-valid for element TaxExemptionReason"
+
+
+def _stdout(n=60):
+    errors = ''.join(f'<error>{(COUNTRY if i % 3 == 0 else EXEMPTION if i % 3 == 1 else "Erro & <b>generico</b> ç {i}").format(i=i)}</error>\n'
+                     for i in range(n))
+    return ('A validar...\n<?xml version="1.0" encoding="UTF-8"?>\n<response><code>-3</code>'
+            f'<message>Erros</message><errors>\n{errors}</errors><error>ignored</error></response>\n')
+
+
+def test_chunked_feed_matches_whole_output():
+    out = _stdout()
+    whole = jar_output.extract_errors(out)
+    assert len(whole) == 60
+    assert whole[2] == 'Erro & <b>generico</b> ç 2'
+    data = out.encode('utf-8')
+    rnd = random.Random(1)
+    for _ in range(50):
+        stream = jar_output.IssueStream()
+        issues, pos = [], 0
+        while pos < len(data):
+            step = rnd.randint(1, 40)
+            issues += stream.feed(data[pos:pos + step])
+            pos += step
+        issues += stream.close()
+        assert [i['message'] for i in issues] == whole
+    assert stream.counts == {'INVALID_COUNTRY': 20, 'EMPTY_TAX_EXEMPTION': 20, 'JAR_ERROR': 20}
+    assert issues[0]['suggestion'] == 'CV' and issues[0]['location']['line'] is None
+    assert issues[1]['location'] == {'line': 1, 'column': 33, 'context': None}
+
+
+def test_message_cap_and_truncated_output(monkeypatch):
+    monkeypatch.setattr(jar_output, 'MAX_ERROR_CHARS', 10)
+    parser = jar_output.ErrorParser()
+    assert parser.feed('<errors><error>' + 'x' * 50 + '</error><error>cut') == ['x' * 10]
+    assert parser.close() == ['cut']
+
+
+def test_registered_classifier(monkeypatch):
+    monkeypatch.setattr(jar_output, 'CLASSIFIERS', list(jar_output.CLASSIFIERS))
+
+    @jar_output.classifier('MISSING_HASH', r'elemento "Hash" do documento (?P<doc>[^ ]+)')
+    def _missing_hash(m, message, locate):
+        return {'code': 'MISSING_HASH', 'message': message, 'document': m.group('doc')}
+
+    issue = jar_output.classify('Falta o elemento "Hash" do documento FT/1 ...')
+    assert issue == {'code': 'MISSING_HASH', 'message': 'Falta o elemento "Hash" do documento FT/1 ...',
+                     'document': 'FT/1'}
@@ -0,0 +1,162 @@
+import asyncio
+import sys
+
+import pytest
+
+from core import jar_pool
+
+
+def test_run_jar_cmd_spawns_non_jar_commands_cold():
+    res = asyncio.run(jar_pool.run_jar_cmd([sys.executable, '-c', 'print("hi")'], timeout=30))
+    assert res.returncode == 0 and res.stdout.strip() == b'hi' and not res.warm
+
+
+def test_cold_run_timeout_kills_process():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(jar_pool.cold_run([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5))
+
+
+def test_pool_disabled_by_default(monkeypatch):
+    monkeypatch.delenv('FACTEMICLI_POOL_SIZE', raising=False)
+    assert jar_pool.get_pool('/opt/factemi/FACTEMICLI.jar') is None
+
+
+def test_cold_run_streams_stdout_lines():
+    lines = []
+    code = 'import sys\nfor i in range(3): print(i, flush=True)\nsys.stderr.write("warn")'
+    res = asyncio.run(jar_pool.cold_run([sys.executable, '-c', code], timeout=30, on_line=lines.append))
+    assert lines == [b'0\n', b'1\n', b'2\n']
+    assert res.stdout == b'0\n1\n2\n' and res.stderr == b'warn'
+
+
+class HangingWorker:
+    def __init__(self):
+        self.killed = False
+
+    def alive(self):
+        return not self.killed
+
+    async def run(self, args, timeout):
+        await asyncio.sleep(30)
+
+    def kill(self):
+        self.killed = True
+
+
+def test_cancelled_pool_job_discards_its_worker():
+    pool = jar_pool.JarWorkerPool('/opt/factemi/FACTEMICLI.jar', size=1)
+    worker = HangingWorker()
+    pool._idle.append(worker)
+
+    async def scenario():
+        task = asyncio.ensure_future(pool.run(['-h'], timeout=30))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert worker.killed and pool._idle == []
+
+
+def test_cold_run_keeps_lines_longer_than_the_stream_limit():
+    lines = []
+    code = (f'import sys\nsys.stdout.write("a\\n" + "x" * {jar_pool.STREAM_LIMIT + 500000} + "\\nend\\n")\n'
+            'sys.stdout.write("no newline")')
+    expected = b'a\n' + b'x' * (jar_pool.STREAM_LIMIT + 500000) + b'\nend\nno newline'
+    res = asyncio.run(jar_pool.cold_run([sys.executable, '-c', code], timeout=30, on_line=lines.append))
+    assert res.stdout == expected and b''.join(lines) == expected
+    assert lines[0] == b'a\n' and lines[-2:] == [b'end\n', b'no newline']
+    assert max(len(line) for line in lines) < jar_pool.STREAM_LIMIT + jar_pool.STREAM_BLOCK
+
+
+FAKE_WORKER = r'''
+import sys
+log = sys.argv[1]
+out = sys.stdout.buffer
+out.write(b"READY\n")
+out.flush()
+for line in sys.stdin.buffer:
+    if not line.startswith(b"JOB "):
+        continue
+    args = [sys.stdin.buffer.readline().rstrip(b"\n") for _ in range(int(line.split()[1]))]
+    with open(log, "ab") as f:
+        f.write(b" ".join(args) + b"\n")
+    if b"crash" in args:
+        sys.exit(3)  # dies mid-job, after running it
+    body = b"ok " + b" ".join(args) + b"\n"
+    out.write(b"RC 0 %d 0\n" % len(body) + body)
+    out.flush()
+'''
+
+
+def _fake_pool(monkeypatch, tmp_path, **kwargs):
+    log = tmp_path / 'jobs.log'
+    monkeypatch.setattr(jar_pool.JarWorker, '_command', lambda self: [sys.executable, '-c', FAKE_WORKER, str(log)])
+    pool = jar_pool.JarWorkerPool('/opt/factemi/FACTEMICLI.jar', size=1, **kwargs)
+    cold = []
+
+    async def fake_cold(args, timeout, on_line=None):
+        cold.append(args)
+        return jar_pool.JarResult(0, b'cold\n', b'')
+
+    monkeypatch.setattr(pool, '_cold', fake_cold)
+    workers = []
+    start = jar_pool.JarWorker.start
+
+    async def tracked_start(self):
+        workers.append(self)
+        await start(self)
+
+    monkeypatch.setattr(jar_pool.JarWorker, 'start', tracked_start)
+
+    async def reap():  # wait for killed workers before the loop closes
+        pool.shutdown()
+        for w in workers:
+            await w.proc.wait()
+
+    return pool, log, cold, reap
+
+
+def test_pool_runs_jobs_on_a_warm_worker_and_recycles_it(monkeypatch, tmp_path):
+    pool, log, cold, reap = _fake_pool(monkeypatch, tmp_path, max_jobs=2)
+    lines = []
+
+    async def scenario():
+        results = [await pool.run(['-op', 'validar', str(i)], timeout=30, on_line=lines.append) for i in range(3)]
+        await reap()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [r.stdout for r in results] == [b'ok -op validar 0\n', b'ok -op validar 1\n', b'ok -op validar 2\n']
+    assert all(r.warm and r.returncode == 0 for r in results) and lines == [r.stdout for r in results]
+    assert (pool.stats['spawned'], pool.stats['recycled'], pool.stats['warm'], cold) == (2, 1, 3, [])
+    assert log.read_bytes().count(b'\n') == 3
+
+
+def test_worker_crash_after_dispatch_is_not_run_again(monkeypatch, tmp_path):
+    pool, log, cold, reap = _fake_pool(monkeypatch, tmp_path)
+
+    async def scenario():
+        try:
+            with pytest.raises(jar_pool.WorkerJobError):
+                await pool.run(['-op', 'enviar', 'crash'], timeout=30)
+        finally:
+            await reap()
+
+    asyncio.run(scenario())
+    assert cold == [] and log.read_bytes() == b'-op enviar crash\n'
+    assert pool._idle == []
+
+
+def test_failure_before_dispatch_falls_back_to_cold(monkeypatch, tmp_path):
+    pool, log, cold, reap = _fake_pool(monkeypatch, tmp_path)
+
+    async def scenario():
+        try:
+            return await pool.run(['-i', 'a\nb'], timeout=30)
+        finally:
+            await reap()
+
+    result = asyncio.run(scenario())
+    assert result.stdout == b'cold\n' and cold == [['-i', 'a\nb']] and not log.exists()
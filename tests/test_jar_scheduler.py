@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from core.jar_scheduler import JarScheduler, SchedulerBusy
+
+
+def test_round_robin_between_users():
+    async def scenario():
+        sched = JarScheduler(limit=1, max_queue=10, max_queue_per_user=5)
+        order = []
+        await sched.acquire('holder', '')
+
+        async def job(user, nif):
+            await sched.acquire(user, nif)
+            order.append(user)
+            sched.release()
+
+        tasks = [asyncio.create_task(job('alice', str(m))) for m in range(3)]
+        tasks.append(asyncio.create_task(job('bob', '1')))
+        await asyncio.sleep(0)
+        sched.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ['alice', 'bob', 'alice', 'alice']
+
+
+def test_queue_limits_raise_busy():
+    async def scenario():
+        sched = JarScheduler(limit=1, max_queue=2, max_queue_per_user=1)
+        await sched.acquire('a', '')
+        waiter = asyncio.create_task(sched.acquire('a', ''))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy) as exc:
+            await sched.acquire('a', '')
+        assert exc.value.retry_after >= 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert sched.info()['queued'] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,29 @@
+import asyncio
+
+from core import job_events
+
+
+def test_follow_replays_and_resumes():
+    async def scenario():
+        ev = job_events.register('job1')
+        ev.emit('queued', {'job_id': 'job1'})
+        ev.emit('stdout', 'line 1')
+
+        async def collect(after):
+            return [item async for item in ev.follow(after)]
+
+        follower = asyncio.create_task(collect(0))
+        resumed = asyncio.create_task(collect(1))
+        await asyncio.sleep(0)
+        ev.emit('result', {'ok': True})
+        ev.close()
+        return await follower, await resumed
+
+    full, resumed = asyncio.run(scenario())
+    assert [e for _, e, _ in full] == ['queued', 'stdout', 'result']
+    assert [seq for seq, _, _ in resumed] == [2, 3]
+
+
+def test_sse_format():
+    assert job_events.sse_format((3, 'stdout', 'olá')) == 'id: 3\nevent: stdout\ndata: "olá"\n\n'
+    assert job_events.sse_format(None) == ': ping\n\n'
@@ -0,0 +1,30 @@
+from core import doc_index
+from core.numbering import check_numbering
+
+
+def _index(docs):
+    """docs: (InvoiceNo, day, status) in file order."""
+    records = (('invoice', {'InvoiceNo': no, 'InvoiceDate': f'2025-09-{day:02d}', 'InvoiceType': 'FT',
+                            'DocumentStatus': status, 'CustomerID': 'C1', 'NetTotal': '1', 'TaxPayable': '0',
+                            'GrossTotal': '1'})
+               for no, day, status in docs)
+    return doc_index.DocumentIndex.build(records, 'fp')
+
+
+def test_clean_series_carry_over_from_previous_period():
+    report = check_numbering(_index([('FT A/41', 1, 'N'), ('FT B/1', 1, 'N'), ('FT A/42', 2, 'N')]))
+    assert report['counts'] == {}
+    assert report['series'] == {'FT A': {'documents': 2, 'first': 41, 'last': 42, 'missing': 0},
+                                'FT B': {'documents': 1, 'first': 1, 'last': 1, 'missing': 0}}
+
+
+def test_gaps_duplicates_reuse_dates_and_invalid(tmp_path):
+    index = _index([('FT A/1', 1, 'N'), ('FT A/2', 2, 'N'), ('FT A/2', 2, 'N'), ('FT A/10', 3, 'N'),
+                    ('FT A/3', 2, 'A'), ('FT A/3', 4, 'N'), ('FT A/5', 1, 'N'), ('FATURA', 1, 'N')])
+    path = tmp_path / 'x.docs'
+    index.write(str(path))
+    report = check_numbering(doc_index.DocumentIndex.load(str(path)))
+    found = [(i['code'], i.get('document') or f"{i['first']}-{i['last']}") for i in report['issues']]
+    assert found == [('DUPLICATE_NUMBER', 'FT A/2'), ('CANCELLED_REUSED', 'FT A/3'), ('NUMBER_GAP', '4-4'),
+                     ('DATE_ORDER', 'FT A/5'), ('NUMBER_GAP', '6-9'), ('NUMBER_INVALID', 'FATURA')]
+    assert report['series']['FT A'] == {'documents': 7, 'first': 1, 'last': 10, 'missing': 5}
@@ -0,0 +1,115 @@
+import asyncio
+import os
+
+from core.object_cache import ObjectCache
+
+
+class FakeBucket:
+    """Object versions by key plus call counters, shaped like Storage's head/download."""
+
+    def __init__(self):
+        self.objects = {}
+        self.heads = 0
+        self.conditional_heads = 0
+        self.downloads = 0
+
+    def fns(self, key):
+        async def head(etag):
+            self.heads += 1
+            current = f'"v{len(self.objects[key])}"'
+            if etag is not None:
+                self.conditional_heads += 1
+                if etag == current:
+                    return None
+            return current
+
+        async def download(etag, target):
+            self.downloads += 1
+            await asyncio.sleep(0.01)
+            assert etag == f'"v{len(self.objects[key])}"'
+            with open(target, 'wb') as f:
+                f.write(self.objects[key][-1])
+        return head, download
+
+    def put(self, key, data):
+        self.objects.setdefault(key, []).append(data)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_repeat_fetch_is_a_conditional_hit(tmp_path):
+    bucket = FakeBucket()
+    bucket.put('pt/a.zip', b'first')
+    cache = ObjectCache(str(tmp_path), 1024)
+
+    async def scenario():
+        p1 = await cache.fetch('pt/a.zip', *bucket.fns('pt/a.zip'))
+        cache.release(p1)
+        p2 = await cache.fetch('pt/a.zip', *bucket.fns('pt/a.zip'))
+        cache.release(p2)
+        return p1, p2
+
+    p1, p2 = asyncio.run(scenario())
+    assert p1 == p2 and p1.endswith('.zip') and _read(p2) == b'first'
+    assert (bucket.downloads, bucket.conditional_heads) == (1, 1)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_concurrent_fetches_share_one_download(tmp_path):
+    bucket = FakeBucket()
+    bucket.put('pt/a.xml', b'x' * 100)
+    cache = ObjectCache(str(tmp_path), 1024)
+
+    async def scenario():
+        paths = await asyncio.gather(*(cache.fetch('pt/a.xml', *bucket.fns('pt/a.xml')) for _ in range(10)))
+        for p in paths:
+            cache.release(p)
+        return set(paths)
+
+    assert len(asyncio.run(scenario())) == 1
+    assert bucket.downloads == 1
+    assert not [n for n in os.listdir(tmp_path) if n.startswith('.part-')]
+
+
+def test_new_etag_replaces_the_old_version(tmp_path):
+    bucket = FakeBucket()
+    bucket.put('pt/a.xml', b'old')
+    cache = ObjectCache(str(tmp_path), 1024)
+
+    async def scenario():
+        old = await cache.fetch('pt/a.xml', *bucket.fns('pt/a.xml'))
+        bucket.put('pt/a.xml', b'new')
+        new = await cache.fetch('pt/a.xml', *bucket.fns('pt/a.xml'))
+        assert _read(old) == b'old'  # still pinned by the first caller
+        cache.release(old)
+        assert not os.path.exists(old)
+        cache.release(new)
+        return new
+
+    assert _read(asyncio.run(scenario())) == b'new'
+    assert bucket.downloads == 2
+
+
+def test_lru_eviction_skips_pinned_files(tmp_path):
+    bucket = FakeBucket()
+    for name in 'abc':
+        bucket.put(f'pt/{name}.xml', name.encode() * 400)
+    cache = ObjectCache(str(tmp_path), 1000)
+
+    async def scenario():
+        a = await cache.fetch('pt/a.xml', *bucket.fns('pt/a.xml'))
+        b = await cache.fetch('pt/b.xml', *bucket.fns('pt/b.xml'))
+        cache.release(b)
+        c = await cache.fetch('pt/c.xml', *bucket.fns('pt/c.xml'))  # over budget: b goes, a is pinned
+        assert os.path.exists(a) and not os.path.exists(b) and os.path.exists(c)
+        cache.release(a)
+        cache.release(c)
+        return a, c
+
+    a, c = asyncio.run(scenario())
+    assert cache.size == 800 and os.path.exists(a) and os.path.exists(c)
+    # A new process adopts what is on disk, evicting down to its own budget
+    assert ObjectCache(str(tmp_path), 500).size == 400
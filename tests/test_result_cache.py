@@ -0,0 +1,81 @@
+import asyncio
+
+from core import result_cache
+from core.result_cache import ValidationResultCache
+
+
+class FakeCollection:
+    def __init__(self): self.docs = {}
+    async def find_one(self, q): return self.docs.get(q['_id'])
+    async def replace_one(self, q, doc, upsert=False): self.docs[q['_id']] = doc
+
+
+def test_only_validar_is_cacheable(tmp_path):
+    jar = tmp_path / 'FACTEMICLI.jar'
+    jar.write_bytes(b'jar')
+    key = result_cache.cache_key('abc', str(jar), 'validar', 'alice', 'secret')
+    assert key and key != result_cache.cache_key('abc', str(jar), 'validar', 'bob', 'secret')
+    assert key != result_cache.cache_key('abc', str(jar), 'validar', 'alice', 'fixed')  # password changed
+    assert key != result_cache.cache_key('abc', str(jar), 'validar', 'alice')
+    assert result_cache.cache_key('abc', str(jar), 'enviar', 'alice', 'secret') is None
+    assert result_cache.cache_key('abc', str(tmp_path / 'missing.jar'), 'validar', 'alice', 'secret') is None
+
+
+def test_roundtrip_marks_cached_and_truncates():
+    col = FakeCollection()
+    cache = ValidationResultCache({'pt_validation_cache': col}, 'pt')
+    resp = {'ok': True, 'returncode': 0, 'stdout': 'x' * 20000, 'issues': [{'code': 'JAR_ERROR'}], 'queue': {}}
+
+    async def scenario():
+        await cache.put('k1', resp)
+        result_cache._memory._data.clear()  # force the Mongo tier
+        return await cache.get('k1'), await cache.get('missing')
+
+    hit, miss = asyncio.run(scenario())
+    assert miss is None
+    assert hit['cached'] is True and 'queue' not in hit
+    assert hit['issues'] == resp['issues'] and len(hit['stdout']) < 10100
+
+
+def test_expired_entries_and_archive_fields_are_not_served(monkeypatch):
+    from datetime import datetime, timedelta
+    col = FakeCollection()
+    cache = ValidationResultCache({'pt_validation_cache': col}, 'pt')
+    resp = {'ok': True, 'returncode': 0, 'archived': True, 'storage_key': 'pt/x.zip', 'validation_id': 'v1'}
+
+    async def scenario():
+        await cache.put('k2', resp)
+        fresh = await cache.get('k2')
+        col.docs['k2']['created_at'] -= timedelta(hours=25)
+        result_cache._memory._data.clear()
+        from_mongo = await cache.get('k2')
+        await cache.put('k3', resp)
+        monkeypatch.setattr(result_cache.time, 'time', lambda: datetime.utcnow().timestamp() + 25 * 3600)
+        return fresh, from_mongo, result_cache._memory.get('k3')
+
+    fresh, from_mongo, from_memory = asyncio.run(scenario())
+    assert fresh['ok'] and not {'archived', 'storage_key', 'validation_id'} & fresh.keys()
+    assert from_mongo is None and from_memory is None
+
+
+def test_only_definitive_outcomes_are_stored():
+    col = FakeCollection()
+    cache = ValidationResultCache({'pt_validation_cache': col}, 'pt')
+    rejected = {'ok': False, 'returncode': 1, 'stdout': '<error>x</error>', 'issues': [{'code': 'JAR_ERROR'}]}
+    outcomes = {
+        'clean': ({'ok': True, 'returncode': 0, 'stdout': '<response code="200"></response>'}, None),
+        'rejected': (rejected, None),
+        'auth': ({'ok': False, 'returncode': 1, 'stdout': ''}, '<response code="401"><msg>senha</msg></response>'),
+        'network': ({'ok': False, 'returncode': 0, 'stdout': '',
+                     'stderr': 'java.net.UnknownHostException: servicos.portaldasfinancas.gov.pt'}, None),
+        'crash': ({'ok': False, 'returncode': 1, 'stdout': 'Exception in thread "main"'}, None),
+        'timeout': ({'ok': False, 'timeout': True, 'returncode': None}, None),
+    }
+
+    async def scenario():
+        for key, (resp, output) in outcomes.items():
+            await cache.put(key, resp, output)
+
+    result_cache._memory._data.clear()
+    asyncio.run(scenario())
+    assert set(col.docs) == {'clean', 'rejected'}
@@ -0,0 +1,30 @@
+import zipfile
+
+import pytest
+
+from core.saft_archiver import compress_xml_to_zip, open_saft_xml
+
+XML = b'<?xml version="1.0"?><AuditFile>' + b'<Line><Quantity>1</Quantity></Line>' * 5000 + b'</AuditFile>'
+
+
+def test_open_saft_xml_streams_zip_member_and_plain_file(tmp_path):
+    xml = tmp_path / 'saft.xml'
+    xml.write_bytes(XML)
+    archive = tmp_path / 'saft.zip'
+    compress_xml_to_zip(str(xml), str(archive), original_filename='SAFT_2025_09.xml')
+
+    for path in (archive, xml):
+        with open_saft_xml(str(path)) as f:
+            blocks = list(iter(lambda: f.read(4096), b''))
+        assert b''.join(blocks) == XML
+        assert max(map(len, blocks)) <= 4096
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['saft.xml', 'saft.zip']
+
+
+def test_open_saft_xml_rejects_archive_without_xml(tmp_path):
+    archive = tmp_path / 'other.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('readme.txt', 'nothing here')
+    with pytest.raises(ValueError):
+        with open_saft_xml(str(archive)):
+            pass
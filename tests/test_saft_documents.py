@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+from core.saft_documents import INVOICE_FIELDS, extract_documents, iter_records
+
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+
+
+def _invoice(no, customer, status='N', gross='12.30'):
+    return (f'<Invoice><InvoiceNo>{no}</InvoiceNo><DocumentStatus><InvoiceStatus>{status}</InvoiceStatus>'
+            f'</DocumentStatus><InvoiceDate>2025-09-01</InvoiceDate><InvoiceType>FT</InvoiceType>'
+            f'<CustomerID>{customer}</CustomerID><Line><LineNumber>1</LineNumber></Line>'
+            f'<DocumentTotals><TaxPayable>2.30</TaxPayable><NetTotal>10.00</NetTotal>'
+            f'<GrossTotal>{gross}</GrossTotal></DocumentTotals></Invoice>')
+
+
+def _saft(xmlns=True):
+    attr = f' xmlns="{NS}"' if xmlns else ''
+    return (f'<AuditFile{attr}><Header><TaxRegistrationNumber>1</TaxRegistrationNumber></Header>'
+            '<MasterFiles><Customer><CustomerID>C1</CustomerID><CompanyName>ACME</CompanyName></Customer>'
+            '<Product><ProductCode>P1</ProductCode></Product></MasterFiles>'
+            '<SourceDocuments><SalesInvoices><NumberOfEntries>2</NumberOfEntries>'
+            + _invoice('FT A/1', 'C1') + _invoice('FT A/2', 'C9', status='A', gross='') +
+            '</SalesInvoices><WorkingDocuments><WorkDocument><DocumentNumber>OR 1</DocumentNumber>'
+            '<CustomerID>C1</CustomerID></WorkDocument></WorkingDocuments></SourceDocuments>'
+            '</AuditFile>').encode()
+
+
+@pytest.mark.parametrize('xmlns', [True, False])
+def test_extract_documents_single_pass(xmlns):
+    docs = extract_documents(io.BytesIO(_saft(xmlns)))
+    assert [tuple(d) for d in docs] == [INVOICE_FIELDS] * 2
+    assert docs[0] == {
+        'InvoiceNo': 'FT A/1', 'InvoiceDate': '2025-09-01', 'InvoiceType': 'FT', 'DocumentStatus': 'N',
+        'CustomerID': 'C1', 'CustomerName': 'ACME', 'NetTotal': '10.00', 'TaxPayable': '2.30', 'GrossTotal': '12.30',
+    }
+    assert (docs[1]['DocumentStatus'], docs[1]['CustomerName'], docs[1]['GrossTotal']) == ('A', '', '0')
+
+
+def test_iter_records_only_yields_customers_and_sales_invoices():
+    kinds = [(kind, rec.get('InvoiceNo') or rec.get('CustomerID')) for kind, rec in iter_records(_saft())]
+    assert kinds == [('customer', 'C1'), ('invoice', 'FT A/1'), ('invoice', 'FT A/2')]
@@ -0,0 +1,87 @@
+from core import saft_fixes, xml_locator
+
+SAFT = '''<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:OECD:StandardAuditFile-Tax:PT_1.04_01">
+  <MasterFiles>
+    <Customer>
+      <CustomerID>C1</CustomerID>
+      <BillingAddress><Country>CVE</Country></BillingAddress>
+    </Customer>
+    <Customer>
+      <CustomerID>C2</CustomerID>
+      <BillingAddress><Country> CVE </Country></BillingAddress>
+      <ShipToAddress><Country>CVE</Country></ShipToAddress>
+    </Customer>
+  </MasterFiles>
+  <SourceDocuments>
+    <SalesInvoices>
+      <Invoice>
+        <Line>
+          <TaxExemptionReason />
+          <TaxExemptionCode />
+        </Line>
+        <Line>
+          <TaxExemptionReason/>
+          <Tax><TaxCode>ISE</TaxCode></Tax>
+          <TaxExemptionCode/>
+        </Line>
+        <Line><Country>XX</Country></Line>
+      </Invoice>
+    </SalesInvoices>
+  </SourceDocuments>
+</AuditFile>
+'''
+
+
+def _line(text, needle, nth=0):
+    lines = text.split('\n')
+    return [i + 1 for i, l in enumerate(lines) if needle in l][nth]
+
+
+def _tax(line, reason='Isento Artigo 14.º & RITI', code='M16'):
+    return {'code': 'EMPTY_TAX_EXEMPTION', 'location': {'line': line},
+            'selected_suggestion': {'reason': reason, 'code': code}}
+
+
+def test_batch_applies_in_one_pass_with_outcomes(tmp_path):
+    path = tmp_path / 'saft.xml'
+    path.write_bytes(SAFT.encode('utf-8'))
+    locator = xml_locator.XmlLocator.build(str(path))
+    first = _line(SAFT, '<TaxExemptionReason />')
+    second = _line(SAFT, '<TaxExemptionReason/>')
+    fixes = [
+        {'code': 'INVALID_COUNTRY', 'customer_id': 'C2', 'value': 'CVE', 'suggestion': 'CV'},
+        _tax(first),
+        _tax(first),                                   # same change again
+        _tax(first, code='M0'),                        # different change, same place
+        _tax(second),
+        {'code': 'INVALID_COUNTRY', 'customer_id': 'C9', 'value': 'xx', 'suggestion': 'PT'},  # unknown: whole file
+        {'code': 'INVALID_COUNTRY', 'customer_id': 'C1', 'value': 'ESP', 'suggestion': 'ES'},
+        _tax(first + 1),                               # no empty reason on that line
+        {'code': 'EMPTY_TAX_EXEMPTION', 'selected_suggestion': {'reason': 'x'}},
+        'garbage',
+    ]
+    applied, outcomes = saft_fixes.apply_fixes(str(path), locator, fixes)
+    assert [o['status'] for o in outcomes] == [
+        'applied', 'applied', 'duplicate', 'conflict', 'applied', 'applied', 'not_found', 'not_found',
+        'invalid', 'invalid']
+    assert applied == 4
+
+    text = path.read_text(encoding='utf-8')
+    assert '<CustomerID>C1</CustomerID>\n      <BillingAddress><Country>CVE</Country>' in text
+    assert '<Country>CV</Country></BillingAddress>\n      <ShipToAddress><Country>CVE</Country>' in text
+    assert '<Line><Country>PT</Country></Line>' in text
+    assert text.count('<TaxExemptionReason>Isento Artigo 14.º &amp; RITI</TaxExemptionReason>') == 2
+    assert text.count('<TaxExemptionCode>M16</TaxExemptionCode>') == 2
+    assert '<TaxExemptionCode />' not in text and '<TaxExemptionCode/>' not in text
+    assert len(text.split('\n')) == len(SAFT.split('\n'))
+
+
+def test_no_applicable_fix_leaves_file_untouched(tmp_path):
+    path = tmp_path / 'saft.xml'
+    path.write_bytes(SAFT.encode('utf-8'))
+    before = path.stat().st_mtime_ns
+    locator = xml_locator.XmlLocator.build(str(path))
+    applied, outcomes = saft_fixes.apply_fixes(str(path), locator, [_tax(1)])
+    assert applied == 0 and outcomes[0]['status'] == 'not_found'
+    assert path.stat().st_mtime_ns == before
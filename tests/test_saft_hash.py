@@ -0,0 +1,81 @@
+import base64
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from core import saft_hash
+
+KEY = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+PEM = KEY.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def _sign(message):
+    return base64.b64encode(KEY.sign(message.encode(), padding.PKCS1v15(), hashes.SHA1())).decode()
+
+
+def _saft(docs):
+    """docs: (number, day, control[, tamper]) in file order, chained per series."""
+    prev, invoices = {}, []
+    for number, day, control, *tamper in docs:
+        series = number.rsplit('/', 1)[0]
+        date, entry = f'2025-09-{day:02d}', f'2025-09-{day:02d}T10:00:00'
+        h = _sign(f'{date};{entry};{number};12.30;{prev.get(series, "")}')
+        prev[series] = h
+        invoices.append(f'<Invoice><InvoiceNo>{number}</InvoiceNo><Hash>{h}</Hash><HashControl>{control}</HashControl>'
+                        f'<InvoiceDate>{date}</InvoiceDate><SystemEntryDate>{entry}</SystemEntryDate>'
+                        f'<DocumentTotals><GrossTotal>{"99.99" if tamper else "12.30"}</GrossTotal></DocumentTotals>'
+                        '</Invoice>')
+    return ('<AuditFile xmlns="urn:OECD:StandardAuditFile-Tax:PT_1.04_01"><SourceDocuments><SalesInvoices>'
+            + ''.join(invoices) + '<Invoice><InvoiceNo>FT C/1</InvoiceNo><HashControl>1</HashControl></Invoice>'
+            '</SalesInvoices><Payments><Payment><PaymentRefNo>RG A/1</PaymentRefNo></Payment></Payments>'
+            '</SourceDocuments></AuditFile>').encode()
+
+
+def test_valid_chains_interleaved_series():
+    xml = _saft([('FT A/1', 1, '1'), ('FT B/7', 1, '1'), ('FT A/2', 2, '1'), ('FT B/8', 3, '2'), ('FT A/3', 3, '1')])
+    report = saft_hash.verify_chain(xml, PEM, workers=0)
+    assert report['counts'] == {'HASH_MISSING': 1}
+    assert report['series']['FT A'] == {'section': 'SalesInvoices', 'documents': 3, 'first': 'FT A/1',
+                                        'last': 'FT A/3', 'verified': 3, 'invalid': 0, 'unverified': 0,
+                                        'integrated': 0}
+    assert report['series']['FT B']['unverified'] == 1 and report['series']['FT B']['verified'] == 1
+    assert report['series']['Payments:RG A']['documents'] == 1
+
+
+def test_broken_chain_order_and_control():
+    xml = _saft([('FT A/1', 1, '2'), ('FT A/2', 2, '1', 'tampered'), ('FT A/3', 1, 'x'), ('FT A/3', 4, '2')])
+    report = saft_hash.verify_chain(xml, PEM, workers=0)
+    found = [(i['code'], i['document']) for i in report['issues']]
+    assert ('HASH_INVALID', 'FT A/2') in found
+    assert ('HASH_CONTROL_CHANGED', 'FT A/2') in found
+    assert ('SERIES_ORDER', 'FT A/3') in found and ('HASH_CONTROL_INVALID', 'FT A/3') in found
+    assert report['series']['FT A']['invalid'] == 1 and report['series']['FT A']['verified'] == 3
+    assert report['counts']['SERIES_ORDER'] == 2
+
+
+def test_without_key_only_structure():
+    report = saft_hash.verify_chain(_saft([('FT A/1', 1, '1')]))
+    assert report['signatures_checked'] is False and report['series']['FT A']['verified'] == 0
+
+
+def test_signature_pool_is_shared_across_requests():
+    xml = _saft([('FT A/1', 1, '1'), ('FT A/2', 2, '1')])
+    try:
+        first = saft_hash.verify_chain(xml, PEM, workers=2)
+        pool = saft_hash.get_pool(PEM, 2)
+        second = saft_hash.verify_chain(xml, PEM, workers=2)
+        assert saft_hash.get_pool(PEM, 2) is pool and len(saft_hash._pools) == 1
+        assert first['series']['FT A']['verified'] == second['series']['FT A']['verified'] == 2
+    finally:
+        saft_hash.shutdown_pools()
+    assert saft_hash._pools == {}
+
+
+def test_integrated_documents_are_outside_the_chain():
+    xml = _saft([('FT A/1', 1, '1'), ('FT A/2', 2, '1')])
+    integrated = ('<Invoice><InvoiceNo>FT X/5</InvoiceNo><DocumentStatus><SourceBilling>I</SourceBilling>'
+                  '</DocumentStatus><Hash>0</Hash><HashControl>0</HashControl></Invoice>')
+    xml = xml.replace(b'<Invoice><InvoiceNo>FT A/2', integrated.encode() + b'<Invoice><InvoiceNo>FT A/2', 1)
+    report = saft_hash.verify_chain(xml, PEM, workers=0)
+    assert report['counts'] == {'HASH_MISSING': 1}  # only FT C/1, produced by the software
+    assert report['series']['FT X']['integrated'] == 1 and report['series']['FT A']['verified'] == 2
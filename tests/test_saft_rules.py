@@ -0,0 +1,60 @@
+from core import saft_rules
+from core.saft_validator import validate_saft_stream
+
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+
+
+def _invoice(no, status='N', customer='C1', lines=((20, 23), (5, 6)), net='25.00', tax='4.90', gross='29.90',
+             debit=False):
+    amount = 'DebitAmount' if debit else 'CreditAmount'
+    body = ''.join(f'<Line><{amount}>{a}</{amount}><Tax><TaxPercentage>{p}</TaxPercentage></Tax></Line>'
+                   for a, p in lines)
+    return (f'<Invoice><InvoiceNo>{no}</InvoiceNo><DocumentStatus><InvoiceStatus>{status}</InvoiceStatus>'
+            f'</DocumentStatus><InvoiceType>FT</InvoiceType><CustomerID>{customer}</CustomerID>{body}'
+            f'<DocumentTotals><TaxPayable>{tax}</TaxPayable><NetTotal>{net}</NetTotal>'
+            f'<GrossTotal>{gross}</GrossTotal></DocumentTotals></Invoice>')
+
+
+def _saft(invoices, entries, debit='5.00', credit='50.00', gle=''):
+    return (f'<AuditFile xmlns="{NS}"><Header><AuditFileVersion>1.04_01</AuditFileVersion>'
+            '<CompanyName>ACME</CompanyName><TaxRegistrationNumber>123456789</TaxRegistrationNumber>'
+            '<StartDate>2025-09-01</StartDate><EndDate>2025-09-30</EndDate></Header>'
+            '<MasterFiles><Customer><CustomerID>C1</CustomerID></Customer></MasterFiles>'
+            f'{gle}<SourceDocuments><SalesInvoices><NumberOfEntries>{entries}</NumberOfEntries>'
+            f'<TotalDebit>{debit}</TotalDebit><TotalCredit>{credit}</TotalCredit>{"".join(invoices)}'
+            '</SalesInvoices></SourceDocuments></AuditFile>').encode()
+
+
+def test_consistent_file_has_no_rule_issues():
+    invoices = [_invoice('FT A/1'), _invoice('FT A/2'), _invoice('FT A/3', status='A'),
+                _invoice('NC A/1', lines=((5, 0),), net='5.00', tax='0.00', gross='5.00', debit=True)]
+    issues, summary = validate_saft_stream(_saft(invoices, 4))
+    assert issues == []
+    assert summary['rules'] == {} and summary['documents'] == 4
+
+
+def test_rule_violations():
+    gle = ('<GeneralLedgerEntries><NumberOfEntries>1</NumberOfEntries><TotalDebit>10</TotalDebit>'
+           '<TotalCredit>10</TotalCredit><Journal><Transaction><TransactionID>T1</TransactionID><Lines>'
+           '<DebitLine><DebitAmount>10</DebitAmount></DebitLine><CreditLine><CreditAmount>9</CreditAmount>'
+           '</CreditLine></Lines></Transaction></Journal></GeneralLedgerEntries>')
+    invoices = [_invoice('FT A/1', net='24.00', gross='28.90'), _invoice('FT A/2', tax='5.90', gross='30.90'),
+                _invoice('FT A/3', customer='C9'), _invoice('FT A/4', gross='30.00')]
+    issues, summary = validate_saft_stream(_saft(invoices, 5, gle=gle))
+    found = {(i['code'], i.get('document')) for i in issues}
+    assert found == {
+        ('NET_TOTAL_MISMATCH', 'FT A/1'), ('TAX_PAYABLE_MISMATCH', 'FT A/2'), ('CUSTOMER_NOT_FOUND', 'FT A/3'),
+        ('GROSS_TOTAL_MISMATCH', 'FT A/4'), ('TRANSACTION_UNBALANCED', 'T1'), ('TOTAL_CREDIT_MISMATCH', None),
+        ('NUMBER_OF_ENTRIES_MISMATCH', None), ('TOTAL_DEBIT_MISMATCH', None),
+    }
+    assert summary['rules']['NUMBER_OF_ENTRIES_MISMATCH'] == 1
+    assert all(i['level'] == 'error' for i in issues)
+
+
+def test_issue_cap_keeps_counts():
+    engine = saft_rules.RuleEngine(max_issues=2)
+    doc = saft_rules.Document('SalesInvoices', number='X', customer_id='C9')
+    for _ in range(5):
+        engine._document(doc)
+    issues, counts = engine.finish()
+    assert len(issues) == 2 and counts == {'CUSTOMER_NOT_FOUND': 5}
@@ -0,0 +1,89 @@
+import pytest
+from defusedxml import EntitiesForbidden
+
+from core import jar_output
+from core.saft_validator import parse_xml, extract_cli_params, read_header_info, load_cli_params, schema_precheck
+
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+HEADER = f"""<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="{NS}">
+  <Header>
+    <AuditFileVersion>1.04_01</AuditFileVersion>
+    <CompanyName>ACME</CompanyName>
+    <TaxRegistrationNumber>123456789</TaxRegistrationNumber>
+    <FiscalYear>2025</FiscalYear>
+    <StartDate>2025-9-01</StartDate>
+    <EndDate>2025-09-30</EndDate>
+  </Header>
+"""
+
+
+def test_streaming_header_matches_dom():
+    xml = (HEADER + "<SourceDocuments/></AuditFile>").encode()
+    params, summary = read_header_info(xml)
+    assert params == extract_cli_params(parse_xml(xml))
+    assert params == {'nif': '123456789', 'year': '2025', 'month': '09'}
+    assert summary['CompanyName'] == 'ACME'
+
+
+def test_streaming_header_stops_before_body(tmp_path):
+    # The body is truncated/malformed; only the Header must be read.
+    path = tmp_path / 'saft.xml'
+    path.write_bytes((HEADER + "<SourceDocuments><Invoice>").encode())
+    assert load_cli_params(str(path))['nif'] == '123456789'
+
+
+def test_streaming_header_rejects_entities():
+    xml = b'<!DOCTYPE x [<!ENTITY a "b">]><AuditFile><Header>&a;</Header></AuditFile>'
+    with pytest.raises(EntitiesForbidden):
+        read_header_info(xml)
+
+
+def test_dom_fallback(monkeypatch):
+    monkeypatch.setenv('SAFT_HEADER_STREAMING', '0')
+    xml = (HEADER + "</AuditFile>").encode()
+    assert load_cli_params(xml)['month'] == '09'
+
+
+BODY = """  <MasterFiles>
+    <Customer>
+      <CustomerID>C1</CustomerID>
+      <BillingAddress><AddressDetail>Rua</AddressDetail><City>Praia</City><Country>CVE</Country></BillingAddress>
+    </Customer>
+  </MasterFiles>
+  <SourceDocuments><SalesInvoices><Invoice><InvoiceNo>FT A/1</InvoiceNo><InvoiceType>FT</InvoiceType>
+    <Line><Tax><TaxType>IVA</TaxType></Tax><TaxExemptionReason></TaxExemptionReason><SettlementAmount>0.00</SettlementAmount></Line>
+  </Invoice></SalesInvoices></SourceDocuments>
+</AuditFile>"""
+
+
+def test_schema_precheck_reports_jar_style_messages():
+    messages = schema_precheck((HEADER + BODY).encode())
+    assert len(messages) == 3
+    assert messages[0].startswith("Linha: 8; coluna: 25; cvc-datatype-valid.1.2.1: '2025-9-01'")
+    issues = [jar_output.classify(m) for m in messages]
+    assert [i['code'] for i in issues] == ['JAR_ERROR', 'INVALID_COUNTRY', 'EMPTY_TAX_EXEMPTION']
+    assert issues[1]['customer_id'] == 'C1' and issues[1]['suggestion'] == 'CV'
+    assert issues[2]['location']['line'] == 18
+    assert schema_precheck((HEADER + BODY).encode(), max_errors=1) == messages[:1]
+
+
+def test_schema_precheck_malformed_and_entities():
+    assert schema_precheck((HEADER + BODY).replace('2025-9-01', '2025-09-01').encode()[:-20])[-1].startswith('Linha: ')
+    with pytest.raises(EntitiesForbidden):
+        schema_precheck(b'<!DOCTYPE a [<!ENTITY e "x">]><a>&e;</a>')
+
+
+def test_jar_endpoints_precheck_returns_located_issues(monkeypatch, tmp_path):
+    import asyncio
+    from saft_pt_doctor.routers_pt import _schema_precheck
+    path = tmp_path / 'saft.xml'
+    path.write_bytes((HEADER + BODY).encode())
+    monkeypatch.setenv('SAFT_SCHEMA_PRECHECK', '0')
+    assert asyncio.run(_schema_precheck(str(path), 'test')) == (None, [])
+
+    monkeypatch.setenv('SAFT_SCHEMA_PRECHECK', '1')
+    precheck, issues = asyncio.run(_schema_precheck(str(path), 'test'))
+    assert precheck == {'errors': 3, 'skipped_jar': False}
+    assert [i['code'] for i in issues] == ['JAR_ERROR', 'INVALID_COUNTRY', 'EMPTY_TAX_EXEMPTION']
+    assert issues[2]['location']['line'] == 18
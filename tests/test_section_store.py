@@ -0,0 +1,56 @@
+import pytest
+
+from core import doc_index, section_store
+
+NS = 'urn:OECD:StandardAuditFile-Tax:PT_1.04_01'
+
+
+def _saft(payments=5):
+    payment = ('<Payment><PaymentRefNo>RG A/{n}</PaymentRefNo><TransactionDate>2025-09-0{n}</TransactionDate>'
+               '<PaymentType>RG</PaymentType><DocumentStatus><PaymentStatus>N</PaymentStatus></DocumentStatus>'
+               '<CustomerID>C1</CustomerID><DocumentTotals><TaxPayable>0.00</TaxPayable><NetTotal>{n}.00</NetTotal>'
+               '<GrossTotal>{n}.00</GrossTotal></DocumentTotals></Payment>')
+    return (f'<AuditFile xmlns="{NS}"><MasterFiles>'
+            '<Customer><CustomerID>C1</CustomerID><CompanyName>Alfa</CompanyName></Customer>'
+            '<Supplier><SupplierID>S1</SupplierID><CompanyName>Beta</CompanyName></Supplier></MasterFiles>'
+            '<GeneralLedgerEntries><Journal><JournalID>VND</JournalID><Description>Vendas</Description>'
+            '<Transaction><TransactionID>2025-09-01 VND 1</TransactionID><TransactionDate>2025-09-01</TransactionDate>'
+            '<Description>FT A/1</Description><CustomerID>C1</CustomerID><Lines>'
+            '<DebitLine><DebitAmount>12.30</DebitAmount></DebitLine><CreditLine><CreditAmount>10.00</CreditAmount>'
+            '</CreditLine><CreditLine><CreditAmount>2.30</CreditAmount></CreditLine></Lines></Transaction>'
+            '</Journal></GeneralLedgerEntries><SourceDocuments><SalesInvoices>'
+            '<Invoice><InvoiceNo>FT A/1</InvoiceNo><InvoiceDate>2025-09-01</InvoiceDate><InvoiceType>FT</InvoiceType>'
+            '<CustomerID>C1</CustomerID><DocumentTotals><GrossTotal>12.30</GrossTotal></DocumentTotals></Invoice>'
+            '</SalesInvoices><MovementOfGoods><StockMovement><DocumentNumber>GR A/1</DocumentNumber>'
+            '<MovementDate>2025-09-02</MovementDate><MovementType>GR</MovementType><DocumentStatus>'
+            '<MovementStatus>N</MovementStatus></DocumentStatus><SupplierID>S1</SupplierID></StockMovement>'
+            '</MovementOfGoods><WorkingDocuments><WorkDocument><DocumentNumber>OR A/1</DocumentNumber>'
+            '<WorkType>OR</WorkType><CustomerID>C9</CustomerID></WorkDocument></WorkingDocuments>'
+            f'<Payments>{"".join(payment.format(n=n) for n in range(1, payments + 1))}</Payments>'
+            '</SourceDocuments></AuditFile>').encode()
+
+
+def test_single_pass_builds_index_and_sections(tmp_path):
+    path = tmp_path / 'saft.xml'
+    path.write_bytes(_saft())
+    index, store = section_store.build(str(path), str(tmp_path / 'x.docs'), str(tmp_path / 'x.sections'),
+                                       doc_index.fingerprint(str(path)))
+    assert index.count == 1 and index.record(0)['CustomerName'] == 'Alfa'
+    assert doc_index.DocumentIndex.load(str(tmp_path / 'x.docs')).count == 1
+
+    store = section_store.SectionStore.load(str(tmp_path / 'x.sections'))
+    assert store.counts() == {'WorkingDocuments': 1, 'MovementOfGoods': 1, 'Payments': 5, 'GeneralLedgerEntries': 1}
+    (gle,) = store.sections['GeneralLedgerEntries'].records(0, 10)
+    assert (gle['JournalID'], gle['Description'], gle['CustomerName'], gle['TotalDebit'], gle['TotalCredit']) == (
+        'VND', 'FT A/1', 'Alfa', '12.30', '12.30')
+    (movement,) = store.sections['MovementOfGoods'].records(0, 1)
+    assert (movement['DocumentStatus'], movement['SupplierName'], movement['GrossTotal']) == ('N', 'Beta', '0')
+    assert store.sections['WorkingDocuments'].records(0, 1)[0]['CustomerName'] == ''
+
+    payments = store.sections['Payments']
+    first = section_store.page(payments, limit=2)
+    assert [r['PaymentRefNo'] for r in first['records']] == ['RG A/1', 'RG A/2'] and first['total'] == 5
+    rest = section_store.page(payments, limit=10, cursor=first['next_cursor'])
+    assert [r['GrossTotal'] for r in rest['records']] == ['3.00', '4.00', '5.00'] and rest['next_cursor'] is None
+    with pytest.raises(doc_index.CursorError):
+        section_store.page(store.sections['WorkingDocuments'], limit=2, cursor=first['next_cursor'])
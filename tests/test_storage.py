@@ -0,0 +1,78 @@
+import asyncio
+import io
+import threading
+
+from botocore.exceptions import ClientError
+
+from core import object_cache
+from core.storage import Storage
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def upload_file(self, path, bucket, key, ExtraArgs=None, Config=None):
+        self.calls.append(('file', path, key, ExtraArgs, Config, threading.current_thread()))
+
+    def upload_fileobj(self, body, bucket, key, ExtraArgs=None, Config=None):
+        self.calls.append(('fileobj', body.read(), key, ExtraArgs, Config, threading.current_thread()))
+
+
+def test_put_and_upload_stream_off_the_event_loop(monkeypatch):
+    monkeypatch.setenv('B2_BUCKET', 'b')
+    storage = Storage()
+    storage.client = RecordingClient()
+
+    async def scenario():
+        k1 = await storage.put('pt', 'a.xml', b'<x/>', content_type='text/xml')
+        k2 = await storage.put('pt', 'pt/b.xml', io.BytesIO(b'<y/>'))
+        k3 = await storage.upload('pt/archive/c.zip', '/tmp/c.zip')
+        return k1, k2, k3
+
+    assert asyncio.run(scenario()) == ('pt/a.xml', 'pt/b.xml', 'pt/archive/c.zip')
+    (kind1, body1, _, extra1, cfg, th), (_, body2, _, extra2, _, _), (kind3, path3, _, _, _, _) = storage.client.calls
+    assert (kind1, body1, extra1) == ('fileobj', b'<x/>', {'ContentType': 'text/xml'})
+    assert body2 == b'<y/>' and extra2 is None
+    assert (kind3, path3) == ('file', '/tmp/c.zip')
+    assert cfg.multipart_chunksize == storage.transfer_config.multipart_chunksize
+    assert th is not threading.main_thread()
+
+
+class ReplacedObjectClient:
+    """An object overwritten between fetch_to_local's HEAD and its download."""
+
+    def __init__(self):
+        self.version = '"v1"'
+        self.gets = []
+
+    def head_object(self, Bucket, Key, IfNoneMatch=None):
+        return {'ETag': self.version}
+
+    def _read(self, etag):
+        self.gets.append(etag)
+        if self.version == '"v1"':
+            self.version = '"v2"'
+        if etag != self.version:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'},
+                               'ResponseMetadata': {'HTTPStatusCode': 412}}, 'GetObject')
+        return self.version.encode()
+
+    def download_file(self, bucket, key, target, Config=None, ExtraArgs=None):
+        data = self._read(ExtraArgs['IfMatch'])
+        with open(target, 'wb') as f:
+            f.write(data)
+
+    def get_object(self, Bucket, Key, IfMatch):
+        return {'Body': io.BytesIO(self._read(IfMatch))}
+
+
+def test_fetch_to_local_downloads_only_the_version_it_checked(monkeypatch, tmp_path):
+    monkeypatch.setattr(object_cache, '_default', object_cache.ObjectCache(str(tmp_path), 1 << 20))
+    storage = Storage()
+    storage.client = ReplacedObjectClient()
+    path = asyncio.run(storage.fetch_to_local('pt', 'a.xml'))
+    with open(path, 'rb') as f:
+        assert f.read() == b'"v2"'
+    assert storage.client.gets == ['"v1"', '"v2"']
+    storage.release_local(path)
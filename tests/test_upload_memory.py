@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import os
+import threading
+import tracemalloc
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+# Memory ceiling for streamed uploads: request bodies must never be buffered whole.
+# The chunked path gets the full 1 GB under tracemalloc; multipart parsing is
+# too slow for that (python-multipart is pure Python), so it uses a smaller body
+# and watches RSS instead.
+UPLOAD_MB = int(os.getenv('SAFT_MEMORY_TEST_MB', '1024'))
+MULTIPART_MB = int(os.getenv('SAFT_MEMORY_TEST_MULTIPART_MB', '24'))
+PEAK_LIMIT = 4 * 1024 * 1024
+MIB = 1024 * 1024
+BLOCK = (b'<Line><ProductCode>X</ProductCode><Quantity>1</Quantity></Line>\n' * 20000)[:MIB]
+MESSAGE = 64 * 1024  # roughly what an ASGI server hands over per receive()
+
+
+def _routers():
+    # Imported lazily: importing the router at collection time would bind the real
+    # UsersRepo before other tests' client fixtures patch it
+    from saft_pt_doctor import routers_pt
+    return routers_pt
+
+
+def _app():
+    routers_pt = _routers()
+    app = FastAPI()
+    app.include_router(routers_pt.router, prefix='/pt')
+    app.dependency_overrides[routers_pt.get_current_user] = lambda: {'username': 'u'}
+    return app
+
+
+def _traced(coro_factory):
+    tracemalloc.start()
+    try:
+        result = asyncio.run(coro_factory())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def _rss_bytes():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _rss_growth(coro_factory):
+    """Run the coroutine while sampling RSS; return (result, max growth in bytes)."""
+    base = _rss_bytes()
+    peak = [base]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.005):
+            peak[0] = max(peak[0], _rss_bytes())
+
+    t = threading.Thread(target=sample)
+    t.start()
+    try:
+        result = asyncio.run(coro_factory())
+    finally:
+        done.set()
+        t.join()
+    return result, peak[0] - base
+
+
+async def _mib_stream(n_mib, expected=None):
+    for _ in range(n_mib):
+        if expected is not None:
+            expected.update(BLOCK)
+        for i in range(0, MIB, MESSAGE):
+            yield BLOCK[i:i + MESSAGE]
+
+
+def test_chunked_upload_of_1gb_has_bounded_peak_memory(monkeypatch, tmp_path):
+    monkeypatch.setattr(_routers(), 'UPLOAD_ROOT', str(tmp_path))
+    app = _app()
+    size = UPLOAD_MB * MIB
+    expected = hashlib.sha256()
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as c:
+            start = (await c.post('/pt/upload/start', json={'filename': 'big.xml', 'size': size})).json()
+            chunk_mib = start['chunk_size'] // MIB
+            for index in range(-(-UPLOAD_MB // chunk_mib)):
+                n = min(chunk_mib, UPLOAD_MB - index * chunk_mib)
+                r = await c.put(f"/pt/upload/chunk?upload_id={start['upload_id']}&index={index}",
+                                content=_mib_stream(n, expected))
+                assert r.status_code == 200, r.text
+            return start['upload_id'], await c.post('/pt/upload/finish', json={'upload_id': start['upload_id']})
+
+    try:
+        (upload_id, finish), peak = _traced(scenario)
+        assert finish.status_code == 200, finish.text
+        assert finish.json()['sha256'] == expected.hexdigest()
+        assert os.path.getsize(tmp_path / f'{upload_id}.bin') == size
+        assert peak < PEAK_LIMIT, f'peak {peak / 1e6:.1f} MB'
+    finally:
+        for f in tmp_path.glob('*.bin'):
+            f.unlink()
+
+
+class CountingStorage:
+    """Consumes the body the way boto3 does: block reads from a file object."""
+    received = 0
+
+    async def put(self, country, key, data, content_type=None):
+        for block in iter(lambda: data.read(256 * 1024), b''):
+            CountingStorage.received += len(block)
+        return f'{country}/{key}'
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='needs Linux /proc')
+def test_multipart_file_upload_streams_to_storage(monkeypatch):
+    monkeypatch.setattr(_routers(), 'Storage', CountingStorage)
+    app = _app()
+    boundary = 'saftboundary'
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="big.xml"\r\n'
+            'Content-Type: text/xml\r\n\r\n').encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    async def body():
+        yield head
+        async for block in _mib_stream(MULTIPART_MB):
+            yield block
+        yield tail
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as c:
+            return await c.post('/pt/files/upload', content=body(), headers={
+                'Content-Type': f'multipart/form-data; boundary={boundary}',
+            })
+
+    r, growth = _rss_growth(scenario)
+    assert r.status_code == 200, r.text
+    assert CountingStorage.received == MULTIPART_MB * MIB
+    # Buffering the file would grow RSS by at least its size
+    assert growth < MULTIPART_MB * MIB // 2, f'RSS grew {growth / 1e6:.1f} MB'
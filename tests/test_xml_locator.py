@@ -0,0 +1,84 @@
+from core import xml_locator
+
+SAFT = '''<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:OECD:StandardAuditFile-Tax:PT_1.04_01">
+  <MasterFiles>
+    <Customer>
+      <CustomerID>C1</CustomerID>
+      <BillingAddress><Country>PT</Country></BillingAddress>
+    </Customer>
+    <Customer>
+      <CustomerID>C2</CustomerID>
+      <CompanyName>Ação Lda</CompanyName>
+      <BillingAddress><Country>CVE</Country></BillingAddress>
+    </Customer>
+  </MasterFiles>
+  <SourceDocuments>
+    <SalesInvoices>
+      <Invoice>
+        <InvoiceNo>FT A/1</InvoiceNo>
+        <Line>
+          <LineNumber>1</LineNumber>
+          <TaxExemptionReason />
+        </Line>
+        <Line>
+          <LineNumber>2</LineNumber>
+          <TaxExemptionReason />
+        </Line>
+      </Invoice>
+    </SalesInvoices>
+  </SourceDocuments>
+</AuditFile>
+'''
+
+
+def _lines(text):
+    return text.split('\n')
+
+
+def test_locator_lookups_match_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(xml_locator, 'BLOCK', 64)  # many blocks for a small file
+    xml = tmp_path / 'saft.xml'
+    xml.write_bytes(SAFT.encode('utf-8'))
+    loc_path = str(tmp_path / 'saft.loc')
+    xml_locator.load_or_build(str(xml), loc_path)
+    locator = xml_locator.XmlLocator.load(loc_path)
+    assert locator.customer_ids == ['C1', 'C2']
+
+    data = SAFT.encode('utf-8')
+    lines = _lines(SAFT)
+    with locator.reader(str(xml)) as r:
+        for n in range(1, len(lines) + 1):
+            offset = r.line_offset(n)
+            assert offset == len(b'\n'.join(l.encode() for l in lines[:n - 1])) + (1 if n > 1 else 0)
+            assert r.line_col(offset) == (n, 1)
+            assert r.snippet(n) == lines[n - 1]
+        assert r.line_offset(len(lines) + 1) is None
+
+        offset = r.find_country('C2', 'cve')
+        assert data[offset:].startswith(b'<Country>CVE')
+        line, col = r.line_col(offset)
+        assert lines[line - 1][col - 1:].startswith('<Country>CVE')
+        assert r.find_country('C1', 'CVE') == data.index(b'<Customer>')  # not in C1: its record
+
+        second = data.index(b'<TaxExemptionReason />', data.index(b'<LineNumber>2'))
+        assert r.element_at(second) == {'invoice_no': 'FT A/1', 'line_number': '2'}
+        assert r.element_at(data.index(b'<MasterFiles>')) == {}
+
+
+def test_detect_issues_uses_locator(tmp_path):
+    from saft_pt_doctor.routers_pt import _detect_issues_from_stdout
+    xml = tmp_path / 'saft.xml'
+    xml.write_bytes(SAFT.encode('utf-8'))
+    lines = _lines(SAFT)
+    reason_line = lines.index('          <TaxExemptionReason />', lines.index('          <LineNumber>2</LineNumber>')) + 1
+    stdout = ('<response><errors>'
+              '<error>O valor ("CVE") no elemento "Country" do "Customer" com id C2 nao e valido</error>'
+              f'<error>Linha: {reason_line}; coluna: 33; cvc-minLength-valid: element TaxExemptionReason</error>'
+              '</errors></response>')
+    country, exemption = _detect_issues_from_stdout(stdout, str(xml))
+    assert country['code'] == 'INVALID_COUNTRY' and country['suggestion'] == 'CV'
+    assert country['location']['line'] == 11
+    assert 'CVE' in country['location']['context']
+    assert exemption['location'] == {'line': reason_line, 'column': 33, 'context': lines[reason_line - 1],
+                                     'invoice_no': 'FT A/1', 'line_number': '2'}